@@ -16,9 +16,15 @@ from pathlib import Path
 # 導入現有的 RAG 功能
 from rag_chain import run_rag
 from loader.doc_parser import load_and_split_documents
-from vectorstore.index_manager import get_vectorstore
+from loader.pending_writes import PendingIndexWrites
+from loader.file_catalog import clear_catalog
+from vectorstore.index_manager import add_documents_bulk
+from vectorstore.query_batcher import get_query_batch_stats
+from db.query_cache import get_query_cache_stats
+from vectorstore.parent_store import split_into_children
+from llm.provider_selector import warmup_llm
 from config import get_config, validate_config
-import redis
+from utils.session_store import SessionStore
 
 # 驗證配置
 try:
@@ -39,17 +45,8 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Redis 連接
-redis_client = None
-try:
-    redis_client = redis.Redis(
-        host=get_config("REDIS_HOST", "localhost"),
-        port=int(get_config("REDIS_PORT", "6379")),
-        decode_responses=True
-    )
-    redis_client.ping()
-except:
-    print("警告：Redis 連接失敗，將無法保存對話歷史")
+# 對話記錄存放（Redis 連接池，不可用時退回記憶體）
+session_store = SessionStore()
 
 # 資料模型
 class ChatMessage(BaseModel):
@@ -79,6 +76,21 @@ class IndexedFile(BaseModel):
 connected_clients: Dict[str, WebSocket] = {}
 sessions: Dict[str, List[ChatMessage]] = {}
 
+@app.on_event("startup")
+async def warmup_llm_client():
+    """啟動時在背景建立共用 LLM 客戶端並做健康檢查，避免第一個請求承擔這些成本"""
+    asyncio.get_running_loop().run_in_executor(None, warmup_llm)
+
+@app.on_event("startup")
+async def connect_session_store():
+    """啟動時建立 Redis 連接池"""
+    await session_store.connect()
+
+@app.on_event("shutdown")
+async def close_session_store():
+    """關閉 Redis 連接池"""
+    await session_store.close()
+
 # API 端點
 
 @app.get("/")
@@ -114,12 +126,10 @@ async def chat(request: ChatRequest):
         print(f"   Query: {request.query}")
         print(f"   Sources: {request.sources}")
         
-        # 執行 RAG 查詢
+        # 執行 RAG 查詢（在執行緒池中執行，並行請求的查詢嵌入才能合併成批次）
         try:
-            results = run_rag(
-                enhanced_query,
-                sources=request.sources,
-                files=None
+            results = await asyncio.get_running_loop().run_in_executor(
+                None, run_rag, enhanced_query, request.sources, None
             )
         except Exception as rag_error:
             print(f"❌ RAG 執行錯誤: {str(rag_error)}")
@@ -189,57 +199,29 @@ async def chat(request: ChatRequest):
         elif not combined_answer:
             combined_answer = "抱歉，在選定的資料來源中沒有找到相關資訊。"
         
-        # 保存到 Redis（如果可用）
-        if redis_client:
-            try:
-                session_key = f"rag_session:{session_id}"
-                
-                # 準備要保存的訊息
-                messages_to_save = []
-                if request.context_messages:
-                    for msg in request.context_messages:
-                        if hasattr(msg, 'dict'):
-                            messages_to_save.append(msg.dict())
-                        elif isinstance(msg, dict):
-                            messages_to_save.append(msg)
-                        else:
-                            # 嘗試轉換為字典
-                            try:
-                                messages_to_save.append({
-                                    'role': getattr(msg, 'role', 'unknown'),
-                                    'content': getattr(msg, 'content', str(msg))
-                                })
-                            except:
-                                pass
-                
-                # 添加當前的問答
-                messages_to_save.append({
-                    'role': 'user',
-                    'content': request.query,
-                    'timestamp': datetime.now().isoformat()
-                })
-                messages_to_save.append({
-                    'role': 'assistant',
-                    'content': combined_answer,
-                    'sources': list(set(used_sources)),
-                    'timestamp': datetime.now().isoformat()
-                })
-                
-                session_data = {
-                    "messages": messages_to_save,
-                    "last_update": datetime.now().isoformat()
-                }
-                
-                redis_client.setex(
-                    session_key,
-                    86400,  # 24小時過期
-                    json.dumps(session_data, ensure_ascii=False)
-                )
-                print(f"✅ 已保存對話到 Redis: {session_key}")
-            except Exception as redis_error:
-                print(f"⚠️ 保存到 Redis 失敗: {str(redis_error)}")
-                # Redis 錯誤不應該影響主要功能
-                pass
+        # 保存對話：只追加本輪問答，session 不存在時才以前端帶來的歷史補種
+        try:
+            history = None
+            if request.context_messages:
+                history = [
+                    msg.dict() if hasattr(msg, 'dict') else msg
+                    for msg in request.context_messages
+                    if hasattr(msg, 'dict') or isinstance(msg, dict)
+                ]
+
+            now = datetime.now().isoformat()
+            await session_store.append_messages(
+                session_id,
+                [
+                    {'role': 'user', 'content': request.query, 'timestamp': now},
+                    {'role': 'assistant', 'content': combined_answer,
+                     'sources': list(set(used_sources)), 'timestamp': now},
+                ],
+                history=history
+            )
+        except Exception as store_error:
+            # 保存錯誤不應該影響主要功能
+            print(f"⚠️ 保存對話失敗: {str(store_error)}")
         
         # 返回結果
         response = ChatResponse(
@@ -273,6 +255,16 @@ async def chat(request: ChatRequest):
             detail=f"服務器內部錯誤：{str(e)}"
         )
 
+@app.get("/api/sessions/{session_id}")
+async def get_session_messages(session_id: str, limit: Optional[int] = None):
+    """讀取已保存的對話記錄"""
+    messages = await session_store.get_messages(session_id, limit=limit)
+    return {
+        "session_id": session_id,
+        "messages": messages,
+        "backend": session_store.backend
+    }
+
 @app.post("/api/chat/upload")
 async def chat_with_files(
     query: str,
@@ -297,10 +289,8 @@ async def chat_with_files(
                     temp_files.append(temp_path)
         
         # 執行 RAG 查詢
-        results = run_rag(
-            query,
-            sources=sources,
-            files=temp_files if temp_files else None
+        results = await asyncio.get_running_loop().run_in_executor(
+            None, run_rag, query, sources, temp_files if temp_files else None
         )
         
         # 整合結果（同上）
@@ -383,12 +373,14 @@ async def add_to_knowledge_base(files: List[UploadFile] = File(...)):
                 'date': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
             })
         
-        # 載入並索引文檔
-        docs = load_and_split_documents(temp_files)
+        # 載入並索引文檔（去重狀態等向量寫入成功後才保存）
+        pending = PendingIndexWrites({path: info['name'] for path, info in zip(temp_files, file_infos)})
+        docs = load_and_split_documents(temp_files, pending=pending)
         if docs:
-            vs = get_vectorstore()
-            vs.add_documents(docs)
-            
+            add_documents_bulk(split_into_children(docs))
+        pending.commit()
+        
+        if docs or pending.duplicates:
             # 更新索引記錄
             index_file = "vector_db/indexed_files.json"
             existing_files = []
@@ -407,6 +399,8 @@ async def add_to_knowledge_base(files: List[UploadFile] = File(...)):
             with open(index_file, 'w', encoding='utf-8') as f:
                 json.dump({'files': existing_files}, f, ensure_ascii=False, indent=2)
             
+            if not docs:
+                return {"success": True, "message": f"{len(files)} 個檔案的內容都已索引過，無需重新嵌入"}
             return {"success": True, "message": f"成功索引 {len(files)} 個檔案"}
         else:
             return {"success": False, "message": "無法載入檔案內容"}
@@ -437,6 +431,13 @@ async def clear_knowledge_base():
             shutil.rmtree(chroma_path)
             os.makedirs(chroma_path, exist_ok=True)
         
+        if get_config("VECTOR_DB", "chroma") == "local":
+            from vectorstore.local_store import clear_local_vectorstore
+            clear_local_vectorstore()
+        
+        # 清空檔案目錄
+        clear_catalog()
+        
         # 清空索引記錄
         index_file = "vector_db/indexed_files.json"
         if os.path.exists(index_file):
@@ -492,6 +493,19 @@ async def get_config_info():
         }
     }
 
+@app.get("/api/embeddings/batch-stats")
+async def get_embedding_batch_stats():
+    """查詢嵌入微批次的統計（批次大小分布）"""
+    stats = get_query_batch_stats()
+    if stats is None:
+        return {"enabled": False}
+    return {"enabled": True, **stats}
+
+@app.get("/api/db/cache-stats")
+async def get_db_cache_stats():
+    """查詢 NL-to-SQL 翻譯快取與查詢結果快取的統計（命中率等）"""
+    return get_query_cache_stats()
+
 @app.post("/api/export-chat")
 async def export_chat(messages: List[ChatMessage]):
     """匯出對話記錄"""
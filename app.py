@@ -3,6 +3,7 @@ import os
 from pathlib import Path
 import streamlit as st
 from rag_chain import run_rag
+from loader.file_catalog import clear_catalog
 import tempfile
 import sys
 import json
@@ -211,7 +212,7 @@ with st.sidebar:
         st.markdown("### 新增到知識庫")
         kb_files = st.file_uploader(
             "拖放或選擇檔案",
-            type=["pdf", "docx", "doc", "txt", "md", "html", "htm", "xlsx", "xls", "json", "log", "csv"],
+            type=["pdf", "docx", "doc", "txt", "md", "html", "htm", "xlsx", "xls", "json", "log", "csv", "zip", "gz", "zst"],
             accept_multiple_files=True,
             key="kb_uploader"
         )
@@ -229,13 +230,18 @@ with st.sidebar:
                 
                 try:
                     from loader.doc_parser import load_and_split_documents
-                    from vectorstore.index_manager import get_vectorstore
+                    from loader.pending_writes import PendingIndexWrites
+                    from vectorstore.index_manager import add_documents_bulk
+                    from vectorstore.parent_store import split_into_children
                     
-                    docs = load_and_split_documents(temp_files)
+                    # 去重狀態等向量寫入成功後才保存
+                    pending = PendingIndexWrites({path: f.name for path, f in zip(temp_files, kb_files)})
+                    docs = load_and_split_documents(temp_files, pending=pending)
                     if docs:
-                        vs = get_vectorstore()
-                        vs.add_documents(docs)
-                        
+                        add_documents_bulk(split_into_children(docs))
+                    pending.commit()
+                    
+                    if docs or pending.duplicates:
                         # 更新索引記錄
                         for uploaded_file in kb_files:
                             file_info = {
@@ -273,6 +279,10 @@ with st.sidebar:
                 if os.path.exists(chroma_path):
                     shutil.rmtree(chroma_path)
                     os.makedirs(chroma_path, exist_ok=True)
+                if get_config("VECTOR_DB", "chroma") == "local":
+                    from vectorstore.local_store import clear_local_vectorstore
+                    clear_local_vectorstore()
+                clear_catalog()
                 if os.path.exists(index_file):
                     os.remove(index_file)
                 st.session_state.indexed_files = []
@@ -392,7 +402,7 @@ with input_container:
     with st.expander("📎 附加檔案（可選）", expanded=False):
         uploaded_files = st.file_uploader(
             "拖放檔案到這裡，或點擊瀏覽",
-            type=["pdf", "docx", "doc", "txt", "md", "html", "htm", "xlsx", "xls", "json", "log", "csv"],
+            type=["pdf", "docx", "doc", "txt", "md", "html", "htm", "xlsx", "xls", "json", "log", "csv", "zip", "gz", "zst"],
             accept_multiple_files=True,
             key="temp_uploader",
             help="這些檔案只會用於本次對話，不會保存到知識庫"
@@ -24,7 +24,7 @@ DEFAULT_CONFIG = {
     "OLLAMA_MODEL": "llama3",
     "OLLAMA_BASE_URL": "http://localhost:11434",
     "VECTOR_DB": "chroma",
-    "EMBED_PROVIDER": "huggingface",  # 預設使用免費的 HuggingFace
+    "EMBEDDING_PROVIDER": "huggingface",  # 預設使用免費的 HuggingFace
     "HUGGINGFACE_MODEL": "sentence-transformers/all-MiniLM-L6-v2",
     "CHUNK_SIZE": 1000,
     "CHUNK_OVERLAP": 100,
@@ -61,7 +61,7 @@ def validate_config():
     # Ollama 不需要 API key
     
     # 根據嵌入提供者檢查
-    embed_provider = get_config("EMBED_PROVIDER")
+    embed_provider = get_config("EMBEDDING_PROVIDER")
     if embed_provider == "openai":
         required_keys.append("OPENAI_API_KEY")
     # HuggingFace 不需要 API key
@@ -76,7 +76,7 @@ def validate_config():
 def is_free_mode() -> bool:
     """檢查是否在免費模式下運行（使用 Ollama + HuggingFace）"""
     return (get_config("LLM_PROVIDER") == "ollama" and 
-            get_config("EMBED_PROVIDER") == "huggingface")
+            get_config("EMBEDDING_PROVIDER") == "huggingface")
 
 
 # 匯出的公開 API
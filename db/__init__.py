@@ -7,7 +7,9 @@
 
 主要功能：
 - 自然語言查詢轉換
-- SQL 執行
+- 資料庫結構探查（含快取與相關性裁剪）
+- NL-to-SQL 翻譯快取與查詢結果快取
+- SQL 執行（伺服器端游標串流、自動 LIMIT、分頁）
 - 結果格式化
 """
 
@@ -15,11 +17,21 @@ from .sql_executor import (
     query_database,
     nl_to_sql,
     execute_sql,
+    iter_sql_rows,
+    fetch_sql_page,
+    ensure_row_limit,
+    strip_sql_comments,
+    summarize_sql_result,
+    QueryResult,
+    QueryFailure,
     get_db_config,
     create_engine,
     get_database_schema,
+    refresh_database_schema,
     test_connection,
 )
+from .schema_inspector import invalidate_schema_cache
+from .query_cache import clear_query_caches, get_query_cache_stats
 
 # 支援的資料庫類型
 SUPPORTED_DB_TYPES = ["postgresql", "mysql"]
@@ -66,9 +78,20 @@ __all__ = [
     "query_database",
     "nl_to_sql",
     "execute_sql",
+    "iter_sql_rows",
+    "fetch_sql_page",
+    "ensure_row_limit",
+    "strip_sql_comments",
+    "summarize_sql_result",
+    "QueryResult",
+    "QueryFailure",
     "get_db_config",
     "create_engine",
     "get_database_schema",
+    "refresh_database_schema",
+    "invalidate_schema_cache",
+    "clear_query_caches",
+    "get_query_cache_stats",
     "test_connection",
     "SUPPORTED_DB_TYPES",
     "DEFAULT_DB_CONFIG",
@@ -0,0 +1,181 @@
+# db/query_cache.py
+"""
+查詢快取模組
+
+提供 NL-to-SQL 的兩層快取：
+- 翻譯快取：正規化問題 + 結構版本 -> 產生的 SQL
+- 結果快取：SQL 文字 -> 查詢結果（短 TTL）
+
+兩者皆為有大小上限的 LRU，並記錄命中率等統計。
+"""
+
+import re
+import time
+import json
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Hashable
+
+from config import get_config
+
+_MISSING = object()
+
+
+class TTLCache:
+    """執行緒安全的 LRU + TTL 快取"""
+
+    def __init__(self, name: str, max_size: int = 128, ttl_seconds: float = 60):
+        """
+        初始化快取
+
+        Args:
+            name: 快取名稱（用於統計輸出）
+            max_size: 最多保存的項目數，0 表示停用
+            ttl_seconds: 項目有效時間（秒）
+        """
+        self.name = name
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        """取得快取值，過期或不存在時返回 default"""
+        if not self.enabled:
+            return default
+
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any):
+        """寫入快取值，超過上限時淘汰最久未使用的項目"""
+        if not self.enabled:
+            return
+
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl_seconds)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """清空快取（保留統計）"""
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回快取統計"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+_TRAILING_PUNCT = re.compile(r"[\s?？。.!！,，;；]+$")
+_WHITESPACE = re.compile(r"\s+")
+# 字串常值（原樣保留）或常值以外的空白
+_SQL_LITERAL_OR_WHITESPACE = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")|\s+""")
+
+
+def normalize_question(question: str) -> str:
+    """
+    正規化自然語言問題，讓只差空白、全半形或結尾標點的問題共用快取
+
+    不轉換大小寫：問題中的值可能區分大小寫（'Bob' 與 'bob' 應產生不同的 SQL）。
+
+    Args:
+        question: 自然語言問題
+
+    Returns:
+        正規化後的問題
+    """
+    text = unicodedata.normalize("NFKC", question).strip()
+    text = _WHITESPACE.sub(" ", text)
+    return _TRAILING_PUNCT.sub("", text)
+
+
+def normalize_sql(sql: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """正規化 SQL 文字（合併字串常值以外的空白、去除結尾分號），並附上參數"""
+    text = _SQL_LITERAL_OR_WHITESPACE.sub(lambda m: m.group(1) or " ", sql)
+    text = text.strip().rstrip(";").strip()
+    if params:
+        text += " -- " + json.dumps(params, sort_keys=True, default=str)
+    return text
+
+
+_caches_lock = threading.Lock()
+_sql_cache: Optional[TTLCache] = None
+_result_cache: Optional[TTLCache] = None
+
+
+def get_sql_cache() -> TTLCache:
+    """獲取 NL-to-SQL 翻譯快取（單例）"""
+    global _sql_cache
+    with _caches_lock:
+        if _sql_cache is None:
+            _sql_cache = TTLCache(
+                "nl_to_sql",
+                max_size=int(get_config("NL_SQL_CACHE_SIZE", "256")),
+                ttl_seconds=float(get_config("NL_SQL_CACHE_TTL", "3600")),
+            )
+        return _sql_cache
+
+
+def get_result_cache() -> TTLCache:
+    """獲取 SQL 結果快取（單例）"""
+    global _result_cache
+    with _caches_lock:
+        if _result_cache is None:
+            _result_cache = TTLCache(
+                "sql_result",
+                max_size=int(get_config("SQL_RESULT_CACHE_SIZE", "128")),
+                ttl_seconds=float(get_config("SQL_RESULT_CACHE_TTL", "60")),
+            )
+        return _result_cache
+
+
+def clear_query_caches():
+    """清空翻譯與結果快取"""
+    get_sql_cache().clear()
+    get_result_cache().clear()
+
+
+def get_query_cache_stats() -> Dict[str, Dict[str, Any]]:
+    """返回兩層快取的統計資訊"""
+    return {
+        "nl_to_sql": get_sql_cache().stats(),
+        "sql_result": get_result_cache().stats(),
+    }
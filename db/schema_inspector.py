@@ -0,0 +1,311 @@
+# db/schema_inspector.py
+"""
+資料庫結構探查模組
+
+透過 SQLAlchemy inspector 從實際資料庫讀取結構，並提供：
+- 帶 TTL 的結構快取（可手動刷新）
+- 依問題相關性裁剪資料表，只把相關的表放進 NL-to-SQL 提示
+"""
+
+import re
+import time
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Callable, Set
+
+import sqlalchemy
+
+logger = logging.getLogger(__name__)
+
+# 無法連線資料庫時使用的示例結構（與舊版固定描述相同）
+EXAMPLE_SCHEMA_TABLES: List[Dict[str, Any]] = [
+    {
+        "name": "products",
+        "comment": "產品表",
+        "columns": [
+            {"name": "id", "type": "INTEGER", "primary_key": True},
+            {"name": "name", "type": "VARCHAR(255)"},
+            {"name": "price", "type": "DECIMAL(10,2)"},
+            {"name": "category", "type": "VARCHAR(100)"},
+            {"name": "stock", "type": "INTEGER"},
+            {"name": "created_at", "type": "TIMESTAMP"},
+        ],
+        "foreign_keys": [],
+    },
+    {
+        "name": "orders",
+        "comment": "訂單表",
+        "columns": [
+            {"name": "id", "type": "INTEGER", "primary_key": True},
+            {"name": "customer_name", "type": "VARCHAR(255)"},
+            {"name": "order_date", "type": "DATE"},
+            {"name": "total_amount", "type": "DECIMAL(10,2)"},
+            {"name": "status", "type": "VARCHAR(50)"},
+        ],
+        "foreign_keys": [],
+    },
+    {
+        "name": "order_items",
+        "comment": "訂單明細",
+        "columns": [
+            {"name": "id", "type": "INTEGER", "primary_key": True},
+            {"name": "order_id", "type": "INTEGER"},
+            {"name": "product_id", "type": "INTEGER"},
+            {"name": "quantity", "type": "INTEGER"},
+            {"name": "unit_price", "type": "DECIMAL(10,2)"},
+        ],
+        "foreign_keys": [
+            {"column": "order_id", "ref_table": "orders", "ref_column": "id"},
+            {"column": "product_id", "ref_table": "products", "ref_column": "id"},
+        ],
+    },
+]
+
+# 探查失敗時，示例結構只快取這麼久（秒），避免每個問題都去敲一個掛掉的資料庫
+FALLBACK_TTL_SECONDS = 30
+
+_cache_lock = threading.Lock()
+_schema_cache: Optional[Dict[str, Any]] = None
+
+
+def inspect_schema(engine) -> List[Dict[str, Any]]:
+    """
+    使用 SQLAlchemy inspector 讀取資料庫結構
+
+    Args:
+        engine: SQLAlchemy 引擎
+
+    Returns:
+        資料表描述列表，每個元素包含 name、comment、columns、foreign_keys
+    """
+    inspector = sqlalchemy.inspect(engine)
+    table_names = inspector.get_table_names()
+
+    # SQLAlchemy 2.0 提供批次反射，寬表結構時可大幅減少往返次數
+    multi_columns = {}
+    multi_pks = {}
+    multi_fks = {}
+    multi_comments = {}
+    if hasattr(inspector, "get_multi_columns"):
+        try:
+            multi_columns = {name: cols for (_, name), cols in inspector.get_multi_columns().items()}
+            multi_pks = {name: pk for (_, name), pk in inspector.get_multi_pk_constraint().items()}
+            multi_fks = {name: fks for (_, name), fks in inspector.get_multi_foreign_keys().items()}
+            multi_comments = {name: c for (_, name), c in inspector.get_multi_table_comment().items()}
+        except (NotImplementedError, sqlalchemy.exc.SQLAlchemyError) as e:
+            logger.debug(f"批次反射不可用，改為逐表讀取: {e}")
+
+    tables = []
+    for table_name in table_names:
+        columns = multi_columns.get(table_name)
+        if columns is None:
+            columns = inspector.get_columns(table_name)
+
+        pk = multi_pks.get(table_name)
+        if pk is None:
+            pk = inspector.get_pk_constraint(table_name)
+        pk_columns = set(pk.get("constrained_columns") or []) if pk else set()
+
+        fks = multi_fks.get(table_name)
+        if fks is None:
+            fks = inspector.get_foreign_keys(table_name)
+
+        comment = multi_comments.get(table_name)
+        if comment is None:
+            try:
+                comment = inspector.get_table_comment(table_name)
+            except NotImplementedError:
+                comment = None
+        comment_text = comment.get("text") if isinstance(comment, dict) else None
+
+        foreign_keys = []
+        for fk in fks or []:
+            for col, ref_col in zip(fk.get("constrained_columns", []), fk.get("referred_columns", [])):
+                foreign_keys.append({
+                    "column": col,
+                    "ref_table": fk.get("referred_table"),
+                    "ref_column": ref_col,
+                })
+
+        tables.append({
+            "name": table_name,
+            "comment": comment_text,
+            "columns": [
+                {
+                    "name": col["name"],
+                    "type": str(col.get("type", "")),
+                    "primary_key": col["name"] in pk_columns,
+                    "comment": col.get("comment"),
+                }
+                for col in columns
+            ],
+            "foreign_keys": foreign_keys,
+        })
+
+    return tables
+
+
+def format_schema(tables: List[Dict[str, Any]]) -> str:
+    """
+    將資料表描述格式化為提示用的文字
+
+    Args:
+        tables: 資料表描述列表
+
+    Returns:
+        結構描述文字
+    """
+    lines = ["", "資料表："]
+    for i, table in enumerate(tables, 1):
+        title = f"{i}. {table['name']}"
+        if table.get("comment"):
+            title += f" ({table['comment']})"
+        lines.append(title)
+
+        fk_map = {fk["column"]: fk for fk in table.get("foreign_keys", [])}
+        for col in table.get("columns", []):
+            line = f"   - {col['name']}: {col.get('type', '')}"
+            if col.get("primary_key"):
+                line += " (主鍵)"
+            elif col["name"] in fk_map:
+                fk = fk_map[col["name"]]
+                line += f" (外鍵 -> {fk['ref_table']}.{fk['ref_column']})"
+            if col.get("comment"):
+                line += f"  # {col['comment']}"
+            lines.append(line)
+        lines.append("")
+
+    return "\n".join(lines)
+
+
+def compute_schema_version(tables: List[Dict[str, Any]]) -> str:
+    """計算結構版本（結構內容的雜湊），結構變動時版本隨之改變"""
+    return hashlib.sha1(format_schema(tables).encode("utf-8")).hexdigest()[:12]
+
+
+def get_schema_snapshot(loader: Callable[[], List[Dict[str, Any]]],
+                        ttl_seconds: int = 600,
+                        refresh: bool = False) -> Dict[str, Any]:
+    """
+    取得（可能已快取的）資料庫結構快照
+
+    Args:
+        loader: 實際探查資料庫結構的函數
+        ttl_seconds: 快取有效時間（秒）
+        refresh: 是否忽略快取強制重新探查
+
+    Returns:
+        快照字典：tables、version、fetched_at、is_fallback
+    """
+    global _schema_cache
+
+    with _cache_lock:
+        now = time.time()
+        if _schema_cache and not refresh:
+            ttl = FALLBACK_TTL_SECONDS if _schema_cache["is_fallback"] else ttl_seconds
+            if now - _schema_cache["fetched_at"] < ttl:
+                return _schema_cache
+
+        try:
+            tables = loader()
+            is_fallback = False
+            logger.info(f"已探查資料庫結構：{len(tables)} 個資料表")
+        except Exception as e:
+            if _schema_cache and not _schema_cache["is_fallback"]:
+                # 探查失敗時沿用過期的真實結構，比示例結構更可靠
+                logger.warning(f"資料庫結構探查失敗，沿用過期快取: {e}")
+                _schema_cache = {**_schema_cache, "fetched_at": now}
+                return _schema_cache
+            logger.warning(f"資料庫結構探查失敗，使用示例結構: {e}")
+            tables = EXAMPLE_SCHEMA_TABLES
+            is_fallback = True
+
+        _schema_cache = {
+            "tables": tables,
+            "version": compute_schema_version(tables),
+            "fetched_at": now,
+            "is_fallback": is_fallback,
+        }
+        return _schema_cache
+
+
+def invalidate_schema_cache():
+    """清除結構快取，下次取用時重新探查"""
+    global _schema_cache
+    with _cache_lock:
+        _schema_cache = None
+
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+")
+_CJK_PATTERN = re.compile(r"[\u4e00-\u9fff]+")
+
+
+def _tokenize(text: str) -> Set[str]:
+    """切出英數詞（含簡單的單複數正規化）與中文雙字詞"""
+    text = (text or "").lower()
+    tokens = set()
+    for word in _WORD_PATTERN.findall(text.replace("_", " ")):
+        tokens.add(word)
+        if len(word) > 3 and word.endswith("s"):
+            tokens.add(word[:-1])
+    for run in _CJK_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.add(run)
+        tokens.update(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _table_tokens(table: Dict[str, Any]) -> Dict[str, Set[str]]:
+    """分別取出表名與欄位相關的詞"""
+    name_tokens = _tokenize(table["name"]) | _tokenize(table.get("comment") or "")
+    column_tokens = set()
+    for col in table.get("columns", []):
+        column_tokens |= _tokenize(col["name"])
+        column_tokens |= _tokenize(col.get("comment") or "")
+    return {"name": name_tokens, "columns": column_tokens}
+
+
+def prune_schema(tables: List[Dict[str, Any]], question: str,
+                 max_tables: int = 8) -> List[Dict[str, Any]]:
+    """
+    依問題相關性裁剪資料表
+
+    表名／表註解命中的權重高於欄位命中；入選資料表透過外鍵關聯的表也會一併保留，
+    以便 LLM 能產生正確的 JOIN。沒有任何表命中時回傳完整結構。
+
+    Args:
+        tables: 完整的資料表描述列表
+        question: 自然語言問題
+        max_tables: 最多保留的資料表數（不含外鍵補上的表）
+
+    Returns:
+        裁剪後的資料表描述列表（保持原順序）
+    """
+    if len(tables) <= 1:
+        return tables
+
+    question_tokens = _tokenize(question)
+    scores = {}
+    for table in tables:
+        tokens = _table_tokens(table)
+        score = 3 * len(question_tokens & tokens["name"]) + len(question_tokens & tokens["columns"])
+        if score:
+            scores[table["name"]] = score
+
+    if not scores:
+        return tables
+
+    selected = set(sorted(scores, key=lambda name: -scores[name])[:max_tables])
+
+    # 補上外鍵兩端的關聯表
+    related = set()
+    for table in tables:
+        for fk in table.get("foreign_keys", []):
+            if table["name"] in selected:
+                related.add(fk["ref_table"])
+            elif fk["ref_table"] in selected and table["name"] in scores:
+                related.add(table["name"])
+    selected |= related
+
+    return [table for table in tables if table["name"] in selected]
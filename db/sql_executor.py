@@ -1,10 +1,24 @@
 # db/sql_executor.py
+import copy
+import re
 import sqlalchemy
 from sqlalchemy.exc import SQLAlchemyError
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Iterator
 import logging
 from config import get_config
-from llm.provider_selector import get_llm
+from llm.provider_selector import get_shared_llm
+from .schema_inspector import (
+    inspect_schema,
+    format_schema,
+    get_schema_snapshot,
+    prune_schema,
+)
+from .query_cache import (
+    get_sql_cache,
+    get_result_cache,
+    normalize_question,
+    normalize_sql,
+)
 
 # 設定日誌
 logger = logging.getLogger(__name__)
@@ -17,27 +31,49 @@ def query_database(nl_query: str) -> List[Dict[str, Any]]:
         nl_query: 自然語言查詢
         
     Returns:
-        查詢結果列表
+        查詢結果列表；失敗時為 QueryFailure（以 isinstance 判斷，結果中的 "error" 欄位可能是真實資料）
     """
     try:
         # 獲取 SQL 查詢語句
         sql = nl_to_sql(nl_query)
         logger.info(f"Generated SQL: {sql}")
         
+        # 短時間內相同的 SQL 直接返回快取結果
+        result_cache = get_result_cache()
+        cache_key = normalize_sql(sql)
+        cached_results = result_cache.get(cache_key)
+        if cached_results is not None:
+            logger.info("SQL 結果快取命中")
+            # 深複製：呼叫端修改返回的列不會影響快取
+            return copy.deepcopy(cached_results)
+        
         # 執行查詢
         results = execute_sql(sql)
+        
+        # 結果過大時不快取，避免佔用過多記憶體
+        if len(results) <= int(get_config("SQL_RESULT_CACHE_MAX_ROWS", "1000")):
+            result_cache.set(cache_key, copy.deepcopy(results))
         return results
         
     except Exception as e:
         logger.error(f"Database query failed: {str(e)}")
-        return [{"error": f"查詢失敗: {str(e)}"}]
+        return QueryFailure(f"查詢失敗: {str(e)}")
 
 def nl_to_sql(nl_query: str) -> str:
     """將自然語言轉換為 SQL"""
-    # 獲取資料庫結構資訊
-    db_schema = get_database_schema()
     db_type = get_config("DB_TYPE", "postgresql")
     
+    # 相同問題（且結構未變動）直接使用快取的 SQL，不再呼叫 LLM
+    sql_cache = get_sql_cache()
+    cache_key = (_get_schema_snapshot()["version"], db_type, normalize_question(nl_query))
+    cached_sql = sql_cache.get(cache_key)
+    if cached_sql is not None:
+        logger.info("NL-to-SQL 快取命中")
+        return cached_sql
+    
+    # 獲取與問題相關的資料庫結構資訊
+    db_schema = get_database_schema(nl_query)
+    
     system_prompt = f"""你是一個資料庫查詢助手。根據以下資料庫結構，將自然語言問題轉換為 SQL 查詢語句。
 
 資料庫結構：
@@ -51,8 +87,8 @@ def nl_to_sql(nl_query: str) -> str:
 5. 使用適當的 JOIN 來連接相關資料表
 """
 
-    # 使用 LangChain 的 LLM
-    llm = get_llm()
+    # 使用共用的 LLM 客戶端（不會每個問題都重新建立）
+    llm = get_shared_llm(temperature=float(get_config("SQL_LLM_TEMPERATURE", "0.7")))
     
     # 建構提示
     prompt = f"{system_prompt}\n\n問題：{nl_query}\n\nSQL："
@@ -90,36 +126,269 @@ def nl_to_sql(nl_query: str) -> str:
     if any(keyword in sql.upper() for keyword in ["DROP", "DELETE", "TRUNCATE", "ALTER"]):
         raise ValueError("不允許執行危險的 SQL 操作")
     
+    sql_cache.set(cache_key, sql)
     return sql
 
-def execute_sql(sql: str, params: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-    """執行 SQL 查詢"""
-    # 獲取資料庫連接參數
-    db_config = get_db_config()
+class QueryResult(list):
+    """查詢結果（字典列表），額外記錄是否因筆數上限而被截斷"""
+    
+    def __init__(self, rows=(), truncated: bool = False, max_rows: Optional[int] = None):
+        super().__init__(rows)
+        self.truncated = truncated
+        self.max_rows = max_rows
+    
+    def copy(self) -> "QueryResult":
+        return QueryResult(self, truncated=self.truncated, max_rows=self.max_rows)
+
+class QueryFailure(QueryResult):
+    """
+    查詢失敗的結果
+    
+    保留 [{"error": 訊息}] 一列以相容直接顯示結果的呼叫端；判斷是否失敗應使用
+    isinstance(result, QueryFailure)，資料表本身也可能有名為 error 的欄位。
+    """
+    
+    def __init__(self, error: str):
+        super().__init__([{"error": error}])
+        self.error = error
+    
+    def copy(self) -> "QueryFailure":
+        return QueryFailure(self.error)
+
+# 字串常值（原樣保留）與註解（-- 到行尾、/* */）
+_SQL_COMMENT_PATTERN = re.compile(
+    r"""(?P<literal>'(?:[^']|'')*'|"(?:[^"]|"")*")|--[^\n]*|/\*.*?\*/""",
+    re.DOTALL,
+)
+
+# 最外層結尾的鎖定子句（LIMIT 必須放在它之前）；後面沒有括號，因此不會誤判子查詢中的 FOR UPDATE
+_LOCKING_CLAUSE_PATTERN = re.compile(
+    r"\s+(?:FOR\s+(?:NO\s+KEY\s+)?UPDATE|FOR\s+(?:KEY\s+)?SHARE|LOCK\s+IN\s+SHARE\s+MODE)\b[^()]*$",
+    re.IGNORECASE,
+)
+
+_LIMIT_PATTERNS = [
+    # LIMIT n OFFSET m [ROWS]
+    re.compile(r"\bLIMIT\s+(?P<count>\d+)\s+OFFSET\s+\d+(?:\s+ROWS?)?\s*$", re.IGNORECASE),
+    # MySQL: LIMIT offset, count
+    re.compile(r"\bLIMIT\s+\d+\s*,\s*(?P<count>\d+)\s*$", re.IGNORECASE),
+    # LIMIT n
+    re.compile(r"\bLIMIT\s+(?P<count>\d+)\s*$", re.IGNORECASE),
+    # 標準 SQL（Oracle、SQL Server、PostgreSQL）：[OFFSET m ROWS] FETCH FIRST|NEXT n ROWS ONLY
+    re.compile(r"\bFETCH\s+(?:FIRST|NEXT)\s+(?P<count>\d+)\s+ROWS?\s+ONLY\s*$", re.IGNORECASE),
+]
+
+# 其他形式的 FETCH（PERCENT、WITH TIES、省略筆數或使用參數）：不補 LIMIT，原樣執行
+_OTHER_FETCH_PATTERN = re.compile(r"\bFETCH\s+(?:FIRST|NEXT)\b[^()]*$", re.IGNORECASE)
+
+# 只有 OFFSET m ROWS：補上 FETCH NEXT（這些資料庫不接受在後面加 LIMIT）
+_OFFSET_ROWS_PATTERN = re.compile(r"\bOFFSET\s+\S+\s+ROWS?\s*$", re.IGNORECASE)
+
+# SQL Server：最外層的 SELECT [DISTINCT] TOP n / TOP (n)
+_OUTER_TOP_PATTERN = re.compile(
+    r"^\(?\s*SELECT\s+(?:(?:DISTINCT|ALL)\s+)?TOP\s*(?P<open>\()?\s*(?P<count>\d+)\s*(?(open)\))(?!\s*PERCENT)",
+    re.IGNORECASE,
+)
+_TOP_PATTERN = re.compile(r"\bSELECT\s+(?:(?:DISTINCT|ALL)\s+)?TOP\b", re.IGNORECASE)
+
+def strip_sql_comments(sql: str) -> str:
+    """
+    移除 SQL 註解（-- 與 /* */），字串常值中的同樣字元不受影響
+    
+    Args:
+        sql: SQL 語句
+        
+    Returns:
+        移除註解後的 SQL（每個註解換成一個空白）
+    """
+    return _SQL_COMMENT_PATTERN.sub(lambda m: m.group("literal") or " ", sql)
+
+def ensure_row_limit(sql: str, max_rows: int) -> str:
+    """
+    確保 SELECT 查詢帶有不超過 max_rows 的 LIMIT
+    
+    先移除註解（結尾的 -- 註解會把補上的 LIMIT 一起註解掉）；只檢查最外層語句結尾的 LIMIT，
+    子查詢中的 LIMIT 不影響外層筆數，因此仍會補上。LIMIT 放在 FOR UPDATE 等鎖定子句之前。
+    已有 FETCH FIRST|NEXT n ROWS ONLY 或最外層 SELECT TOP n 時收斂其中的筆數；只有
+    OFFSET m ROWS 時補上 FETCH NEXT；使用 TOP 的 SQL Server 查詢與其他 FETCH 形式不補 LIMIT。
+    
+    Args:
+        sql: SQL 語句
+        max_rows: 最大筆數
+        
+    Returns:
+        加上（或收斂）LIMIT 後的 SQL
+    """
+    stripped = strip_sql_comments(sql).strip().rstrip(";").strip()
+    if not re.match(r"^\(?\s*(SELECT|WITH)\b", stripped, re.IGNORECASE):
+        return stripped
+    
+    locking = _LOCKING_CLAUSE_PATTERN.search(stripped)
+    body, suffix = (stripped[:locking.start()], stripped[locking.start():]) if locking else (stripped, "")
+    
+    for pattern in _LIMIT_PATTERNS + [_OUTER_TOP_PATTERN]:
+        match = pattern.search(body)
+        if match:
+            if int(match.group("count")) <= max_rows:
+                return stripped
+            start, end = match.span("count")
+            return body[:start] + str(max_rows) + body[end:] + suffix
+    
+    if _OTHER_FETCH_PATTERN.search(body) or _TOP_PATTERN.search(body):
+        return stripped
+    if _OFFSET_ROWS_PATTERN.search(body):
+        return f"{body} FETCH NEXT {max_rows} ROWS ONLY{suffix}"
+    
+    return f"{body} LIMIT {max_rows}{suffix}"
+
+def iter_sql_rows(sql: str, params: Dict[str, Any] = None,
+                  batch_size: int = 500) -> Iterator[Dict[str, Any]]:
+    """
+    以伺服器端游標串流讀取查詢結果
     
-    # 建立引擎
-    engine = create_engine(db_config)
+    每次只從資料庫取 batch_size 筆，呼叫端可以隨時停止迭代而不必載入全部結果。
+    
+    Args:
+        sql: SQL 語句
+        params: 查詢參數
+        batch_size: 每批讀取筆數
+        
+    Yields:
+        每一列的字典
+    """
+    engine = create_engine(get_db_config())
     
     try:
         with engine.connect() as conn:
+            # stream_results 讓 psycopg2 / pymysql 使用伺服器端游標
+            conn = conn.execution_options(stream_results=True, max_row_buffer=batch_size)
+            
             # 使用參數化查詢以防止 SQL 注入
             if params:
                 result = conn.execute(sqlalchemy.text(sql), params)
             else:
                 result = conn.execute(sqlalchemy.text(sql))
             
-            # 轉換結果為字典列表
-            rows = result.fetchall()
-            columns = result.keys()
-            
-            return [dict(zip(columns, row)) for row in rows]
-            
+            columns = list(result.keys())
+            try:
+                while True:
+                    rows = result.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield dict(zip(columns, row))
+            finally:
+                result.close()
+                
     except SQLAlchemyError as e:
         logger.error(f"SQL execution failed: {str(e)}")
         raise
     finally:
         engine.dispose()
 
+def execute_sql(sql: str, params: Dict[str, Any] = None,
+                max_rows: Optional[int] = None) -> QueryResult:
+    """
+    執行 SQL 查詢，最多返回 max_rows 筆
+    
+    SELECT 查詢會自動補上 LIMIT（多取一筆用來判斷是否截斷），
+    並以串流方式讀取，避免 SELECT * 打在大表上時耗盡記憶體。
+    
+    Args:
+        sql: SQL 語句
+        params: 查詢參數
+        max_rows: 最大筆數，預設為 SQL_MAX_ROWS
+        
+    Returns:
+        QueryResult（字典列表），truncated 表示是否還有更多資料
+    """
+    if max_rows is None:
+        max_rows = int(get_config("SQL_MAX_ROWS", "1000"))
+    batch_size = min(max_rows + 1, int(get_config("SQL_FETCH_BATCH_SIZE", "500")))
+    
+    limited_sql = ensure_row_limit(sql, max_rows + 1)
+    
+    rows = []
+    truncated = False
+    for row in iter_sql_rows(limited_sql, params, batch_size=batch_size):
+        if len(rows) >= max_rows:
+            truncated = True
+            break
+        rows.append(row)
+    
+    if truncated:
+        logger.warning(f"查詢結果超過 {max_rows} 筆，已截斷")
+    
+    return QueryResult(rows, truncated=truncated, max_rows=max_rows)
+
+def fetch_sql_page(sql: str, page: int = 1, page_size: int = 100,
+                   params: Dict[str, Any] = None) -> QueryResult:
+    """
+    分頁讀取查詢結果
+    
+    Args:
+        sql: SELECT 語句
+        page: 頁碼（從 1 開始）
+        page_size: 每頁筆數
+        params: 查詢參數
+        
+    Returns:
+        該頁的 QueryResult，truncated 表示是否還有下一頁
+    """
+    inner_sql = sql.strip().rstrip(";")
+    offset = max(page - 1, 0) * page_size
+    paged_sql = f"SELECT * FROM ({inner_sql}) AS _page LIMIT {page_size + 1} OFFSET {offset}"
+    
+    rows = list(iter_sql_rows(paged_sql, params, batch_size=page_size + 1))
+    has_more = len(rows) > page_size
+    return QueryResult(rows[:page_size], truncated=has_more, max_rows=page_size)
+
+def summarize_sql_result(results: List[Dict[str, Any]], max_rows: int = 20,
+                         max_cell_chars: int = 80, max_chars: int = 4000) -> str:
+    """
+    將查詢結果整理成精簡的表格文字（用於回答與提示，而非直接 str() 整個結果）
+    
+    Args:
+        results: 查詢結果
+        max_rows: 最多顯示的列數
+        max_cell_chars: 單一欄位最多顯示的字數
+        max_chars: 整段文字的長度上限
+        
+    Returns:
+        表格文字
+    """
+    if not results:
+        return "查詢結果：沒有符合條件的資料"
+    
+    columns = list(results[0].keys())
+    
+    def cell(value: Any) -> str:
+        text = "" if value is None else str(value).replace("\n", " ").replace("|", "\\|")
+        if len(text) > max_cell_chars:
+            text = text[:max_cell_chars - 1] + "…"
+        return text
+    
+    lines = [
+        "| " + " | ".join(columns) + " |",
+        "|" + "---|" * len(columns),
+    ]
+    total_len = sum(len(line) + 1 for line in lines)
+    shown = 0
+    for row in results[:max_rows]:
+        line = "| " + " | ".join(cell(row.get(col)) for col in columns) + " |"
+        if total_len + len(line) + 1 > max_chars:
+            break
+        lines.append(line)
+        total_len += len(line) + 1
+        shown += 1
+    
+    total = f"{len(results)}+" if getattr(results, "truncated", False) else str(len(results))
+    header = f"查詢結果：共 {total} 筆"
+    if shown < len(results):
+        header += f"，僅顯示前 {shown} 筆"
+    
+    return header + "\n\n" + "\n".join(lines)
+
 def get_db_config() -> str:
     """獲取資料庫連接字串"""
     db_type = get_config("DB_TYPE", "postgresql")
@@ -147,33 +416,50 @@ def create_engine(connection_string: str):
         echo=False  # 生產環境設為 False
     )
 
-def get_database_schema() -> str:
-    """獲取資料庫結構（示例）"""
-    # 實際應用中，這應該從資料庫動態讀取
-    return """
-資料表：
-1. products (產品表)
-   - id: INTEGER (主鍵)
-   - name: VARCHAR(255)
-   - price: DECIMAL(10,2)
-   - category: VARCHAR(100)
-   - stock: INTEGER
-   - created_at: TIMESTAMP
-
-2. orders (訂單表)
-   - id: INTEGER (主鍵)
-   - customer_name: VARCHAR(255)
-   - order_date: DATE
-   - total_amount: DECIMAL(10,2)
-   - status: VARCHAR(50)
-
-3. order_items (訂單明細)
-   - id: INTEGER (主鍵)
-   - order_id: INTEGER (外鍵 -> orders.id)
-   - product_id: INTEGER (外鍵 -> products.id)
-   - quantity: INTEGER
-   - unit_price: DECIMAL(10,2)
-"""
+def get_database_schema(question: Optional[str] = None, refresh: bool = False) -> str:
+    """
+    獲取資料庫結構描述
+
+    結構透過 SQLAlchemy inspector 從實際資料庫讀取並快取（SCHEMA_CACHE_TTL 秒）；
+    無法連線時退回示例結構。
+
+    Args:
+        question: 自然語言問題；提供時只保留與問題相關的資料表
+        refresh: 是否忽略快取重新探查
+
+    Returns:
+        結構描述文字
+    """
+    tables = _get_schema_snapshot(refresh)["tables"]
+
+    if question:
+        max_tables = int(get_config("SCHEMA_MAX_TABLES", "8"))
+        pruned = prune_schema(tables, question, max_tables=max_tables)
+        if len(pruned) < len(tables):
+            logger.info(f"結構裁剪：{len(tables)} -> {len(pruned)} 個資料表")
+        tables = pruned
+
+    return format_schema(tables)
+
+def refresh_database_schema() -> int:
+    """強制重新探查資料庫結構，返回資料表數量"""
+    return len(_get_schema_snapshot(refresh=True)["tables"])
+
+def _get_schema_snapshot(refresh: bool = False) -> Dict[str, Any]:
+    """取得資料庫結構快照（含版本），使用 SCHEMA_CACHE_TTL 快取"""
+    return get_schema_snapshot(
+        _inspect_live_schema,
+        ttl_seconds=int(get_config("SCHEMA_CACHE_TTL", "600")),
+        refresh=refresh,
+    )
+
+def _inspect_live_schema() -> List[Dict[str, Any]]:
+    """連線實際資料庫並讀取結構"""
+    engine = create_engine(get_db_config())
+    try:
+        return inspect_schema(engine)
+    finally:
+        engine.dispose()
 
 def test_connection() -> bool:
     """測試資料庫連接"""
@@ -7,7 +7,7 @@ LLM (Large Language Model) 提供者模組
 - Ollama (本地模型)
 """
 
-from .provider_selector import get_llm
+from .provider_selector import get_llm, get_shared_llm, warmup_llm, clear_llm_registry
 
 # 版本資訊
 __version__ = "1.0.0"
@@ -26,6 +26,9 @@ DEFAULT_MODELS = {
 # 匯出的公開 API
 __all__ = [
     "get_llm",
+    "get_shared_llm",
+    "warmup_llm",
+    "clear_llm_registry",
     "SUPPORTED_PROVIDERS",
     "DEFAULT_MODELS",
 ]
\ No newline at end of file
@@ -5,6 +5,8 @@ from config import get_config
 import requests
 import json
 import os
+import threading
+from typing import Any, Dict, Optional, Tuple
 
 class SimpleOllama:
     """完全獨立的 Ollama 客戶端，不使用任何 LangChain 基類"""
@@ -98,36 +100,75 @@ class SimpleOllama:
         
         return self.predict(prompt)
     
+    def health_check(self, preload: bool = True) -> bool:
+        """
+        檢查 Ollama 服務是否可用，並可預先載入模型
+        
+        Args:
+            preload: 是否要求 Ollama 先把模型載入記憶體（避免第一個問題等待載入）
+            
+        Returns:
+            服務是否可用
+        """
+        try:
+            response = requests.get(f"{self.base_url}/api/tags", timeout=5)
+            if response.status_code != 200:
+                print(f"⚠️ Ollama 健康檢查失敗: {response.status_code}")
+                return False
+            
+            if preload:
+                # 不帶 prompt 的 generate 請求只會載入模型
+                requests.post(
+                    f"{self.base_url}/api/generate",
+                    json={"model": self.model, "keep_alive": "10m"},
+                    timeout=300
+                )
+            return True
+        except requests.exceptions.RequestException as e:
+            print(f"⚠️ Ollama 健康檢查失敗: {e}")
+            return False
+    
     @property
     def _llm_type(self):
         """返回 LLM 類型"""
         return "ollama"
 
-def get_llm(provider=None):
+def _default_model(provider: str) -> str:
+    """返回提供者在配置中的預設模型"""
+    if provider in ["claude", "anthropic"]:
+        return get_config("CLAUDE_MODEL", "claude-3-opus-20240229")
+    elif provider == "openai":
+        return get_config("OPENAI_MODEL", "gpt-3.5-turbo")
+    elif provider == "ollama":
+        return get_config("OLLAMA_MODEL", "llama3")
+    return ""
+
+def get_llm(provider=None, model=None, temperature=0.7):
     """
-    獲取 LLM 實例
+    獲取 LLM 實例（每次呼叫都建立新實例，一般情況請使用 get_shared_llm）
     
     Args:
         provider: LLM 提供者，可選 'openai', 'claude', 'anthropic', 'ollama'
                  如果不指定，從環境變數讀取
+        model: 模型名稱，如果不指定，從環境變數讀取
+        temperature: 取樣溫度
     
     Returns:
         LLM 實例
     """
     # 使用配置系統
     provider = provider or get_config("LLM_PROVIDER")
+    model = model or _default_model(provider)
     
     if provider in ["claude", "anthropic"]:
         api_key = get_config("ANTHROPIC_API_KEY")
         if not api_key:
             raise ValueError("ANTHROPIC_API_KEY not found in environment variables")
         
-        model = get_config("CLAUDE_MODEL", "claude-3-opus-20240229")
-        
         return ChatAnthropic(
             model=model,
             anthropic_api_key=api_key,
-            temperature=0.7,
+            temperature=temperature,
         )
     
     elif provider == "openai":
@@ -135,24 +176,94 @@ def get_llm(provider=None):
         if not api_key:
             raise ValueError("OPENAI_API_KEY not found in environment variables")
         
-        model = get_config("OPENAI_MODEL", "gpt-3.5-turbo")
-        
         return ChatOpenAI(
             model=model,
             openai_api_key=api_key,
-            temperature=0.7,
+            temperature=temperature,
         )
     
     elif provider == "ollama":
-        model = get_config("OLLAMA_MODEL", "llama3")
         base_url = get_config("OLLAMA_BASE_URL", "http://localhost:11434")
         
         # 使用簡單的 Ollama 實現，完全避開 LangChain 的 Ollama 類
         return SimpleOllama(
             model=model,
             base_url=base_url,
-            temperature=0.7
+            temperature=temperature
         )
     
     else:
-        raise ValueError(f"Unsupported LLM_PROVIDER: {provider}. Supported: openai, claude, anthropic, ollama")
\ No newline at end of file
+        raise ValueError(f"Unsupported LLM_PROVIDER: {provider}. Supported: openai, claude, anthropic, ollama")
+
+
+# 共用的 LLM 實例註冊表：(provider, model, temperature) -> LLM 實例
+_llm_registry: Dict[Tuple[str, str, float], Any] = {}
+_registry_lock = threading.Lock()
+
+
+def _registry_key(provider: Optional[str], model: Optional[str], temperature: float) -> Tuple[str, str, float]:
+    """計算註冊表的鍵（claude 與 anthropic 視為同一提供者）"""
+    provider = provider or get_config("LLM_PROVIDER")
+    model = model or _default_model(provider)
+    if provider == "claude":
+        provider = "anthropic"
+    return provider, model, float(temperature)
+
+
+def get_shared_llm(provider=None, model=None, temperature=0.7):
+    """
+    從共用註冊表獲取 LLM 實例
+    
+    同一組 provider/model/temperature 在整個行程中只建立一次（第一次使用時才建立），
+    RAGChain 與 SQL 執行器共用同一個客戶端。
+    
+    Args:
+        provider: LLM 提供者，如果不指定，從環境變數讀取
+        model: 模型名稱，如果不指定，從環境變數讀取
+        temperature: 取樣溫度
+    
+    Returns:
+        LLM 實例
+    """
+    key = _registry_key(provider, model, temperature)
+    
+    llm = _llm_registry.get(key)
+    if llm is not None:
+        return llm
+    
+    with _registry_lock:
+        # 取得鎖之後再檢查一次，避免併發時重複建立
+        llm = _llm_registry.get(key)
+        if llm is None:
+            llm = get_llm(provider=key[0], model=key[1], temperature=key[2])
+            _llm_registry[key] = llm
+        return llm
+
+
+def warmup_llm(provider=None, model=None, temperature=0.7) -> bool:
+    """
+    預先建立共用 LLM 實例並執行健康檢查
+    
+    Args:
+        provider: LLM 提供者，如果不指定，從環境變數讀取
+        model: 模型名稱，如果不指定，從環境變數讀取
+        temperature: 取樣溫度
+    
+    Returns:
+        LLM 是否可用
+    """
+    try:
+        llm = get_shared_llm(provider=provider, model=model, temperature=temperature)
+    except Exception as e:
+        print(f"⚠️ LLM 預熱失敗: {e}")
+        return False
+    
+    if hasattr(llm, "health_check"):
+        return llm.health_check()
+    return True
+
+
+def clear_llm_registry():
+    """清空共用 LLM 註冊表（配置變更後使用）"""
+    with _registry_lock:
+        _llm_registry.clear()
\ No newline at end of file
@@ -10,9 +10,19 @@
 - JSON (.json)
 - 純文字 (.txt)
 - Log 檔案 (.log) - 支援通用、Android ANR、Android Tombstone
+- 壓縮檔 (.zip, .gz, .zst) - bugreport 與壓縮 log，串流讀取不解壓到磁碟
 """
 
 from .doc_parser import load_and_split_documents
+from .file_catalog import FileCatalog, get_file_catalog, attach_file_metadata, clear_catalog
+from .crash_signature import CrashSignatureIndex, get_crash_signature_index, attach_crash_occurrences
+from .log_record_index import LogRecordIndex, get_log_record_index, parse_query_constraints, build_search_filter
+from .log_template_miner import TemplateMiner, LogTemplateIndex, get_log_template_index, collapse_repetitive_lines
+from .chunk_dedup import ChunkSignatureStore, get_chunk_signature_store, deduplicate_chunks
+from .pending_writes import PendingIndexWrites
+from .pdf_loader import PdfPageIndex, get_pdf_page_index, iter_pdf_pages, load_pdf
+from .tabular_loader import iter_csv_rows, iter_excel_sheets, iter_json_records, load_csv, load_excel, load_json
+from .offset_splitter import OffsetTextSplitter, TokenCounter, get_token_counter
 
 # 支援的文件格式
 SUPPORTED_EXTENSIONS = [
@@ -27,6 +37,9 @@ SUPPORTED_EXTENSIONS = [
     ".json",
     ".txt",
     ".log",
+    ".zip",
+    ".gz",
+    ".zst",
 ]
 
 # 檔案大小限制 (MB)
@@ -76,6 +89,38 @@ def is_log_file(filename: str) -> bool:
 # 匯出的公開 API
 __all__ = [
     "load_and_split_documents",
+    "FileCatalog",
+    "get_file_catalog",
+    "attach_file_metadata",
+    "clear_catalog",
+    "CrashSignatureIndex",
+    "get_crash_signature_index",
+    "attach_crash_occurrences",
+    "LogRecordIndex",
+    "get_log_record_index",
+    "parse_query_constraints",
+    "build_search_filter",
+    "TemplateMiner",
+    "LogTemplateIndex",
+    "get_log_template_index",
+    "collapse_repetitive_lines",
+    "ChunkSignatureStore",
+    "get_chunk_signature_store",
+    "deduplicate_chunks",
+    "PendingIndexWrites",
+    "PdfPageIndex",
+    "get_pdf_page_index",
+    "iter_pdf_pages",
+    "load_pdf",
+    "iter_csv_rows",
+    "iter_excel_sheets",
+    "iter_json_records",
+    "load_csv",
+    "load_excel",
+    "load_json",
+    "OffsetTextSplitter",
+    "TokenCounter",
+    "get_token_counter",
     "SUPPORTED_EXTENSIONS",
     "is_supported_file",
     "is_log_file",
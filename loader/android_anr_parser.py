@@ -8,6 +8,7 @@ import re
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from .base_log_parser import BaseLogParser
+from .crash_signature import anr_signature
 from langchain.schema import Document
 
 
@@ -78,6 +79,7 @@ class AndroidANRParser(BaseLogParser):
         thread_states = {}
         blocked_threads = []
         main_thread_state = None
+        main_thread_status = None
         
         current_thread = None
         for line in lines:
@@ -87,8 +89,9 @@ class AndroidANRParser(BaseLogParser):
                 thread_count += 1
                 current_thread = thread_match.group(1)
                 if current_thread == "main":
-                    # 特別關注主線程
-                    pass
+                    # 特別關注主線程：記錄標頭上的狀態（Blocked、Native、Waiting...）
+                    status_match = re.search(r'tid=\d+\s+(\w+)', line)
+                    main_thread_status = status_match.group(1) if status_match else None
             
             # 檢測線程狀態
             if current_thread:
@@ -127,11 +130,29 @@ class AndroidANRParser(BaseLogParser):
             'thread_states': thread_states,
             'blocked_threads': len(blocked_threads),
             'main_thread_state': main_thread_state,
+            'main_thread_status': main_thread_status,
             'has_deadlock_risk': has_deadlock,
             'severity': severity,
             'file_size_mb': len(content) / (1024 * 1024),
         }
     
+    def split_units(self, content: str) -> List[str]:
+        """traces 檔案中每個「----- pid N at ... -----」區段是一個獨立進程"""
+        return self.split_on_headers(content, r'^----- pid \d+ at .*-----\s*$')
+    
+    def is_low_value_unit(self, log_info: Dict[str, Any]) -> bool:
+        """主線程沒有阻塞、也沒有其他線程在等鎖的進程（一般是被順帶 dump 的閒置進程）"""
+        return (
+            log_info.get('blocked_threads', 0) == 0
+            and not log_info.get('has_deadlock_risk')
+            and log_info.get('main_thread_state') != 'D'
+            and log_info.get('main_thread_status') not in ('Blocked', 'Waiting', 'TimedWaiting', 'Monitor')
+        )
+    
+    def compute_crash_signature(self, content: str, log_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """崩潰簽名：主線程的阻塞堆疊"""
+        return anr_signature(content)
+    
     def _calculate_anr_severity(self, main_thread_state: Optional[str], 
                                 blocked_threads: List[Dict], 
                                 thread_states: Dict[str, int]) -> str:
@@ -163,8 +184,6 @@ class AndroidANRParser(BaseLogParser):
             {
                 'chunk_method': 'anr_summary',
                 'chunk_type': 'summary',
-                'severity': log_info.get('severity', 'unknown'),
-                **log_info
             }
         )
         documents.append(summary_doc)
@@ -287,7 +306,6 @@ PID: {log_info.get('pid', 'Unknown')}
                         'is_main_thread': thread_name == 'main',
                         'is_blocked': is_blocked,
                         'has_stack_trace': has_stack,
-                        'severity': log_info.get('severity', 'unknown'),
                     }
                 )
                 documents.append(doc)
@@ -0,0 +1,360 @@
+"""
+Android Logcat 解析器
+
+專門處理 `adb logcat` 輸出（threadtime / brief 格式）：
+- 以欄位式（numpy）解析每一行的時間、pid、tid、等級、tag，不逐行建立物件
+- 依時間窗、pid（可選 tag）分組成片段
+- 嵌入前可過濾雜訊 tag 與低等級記錄
+"""
+
+from typing import List, Dict, Any
+from langchain.schema import Document
+from config import get_config
+from .base_log_parser import BaseLogParser
+from .log_record_index import MAX_DISTINCT_VALUES, find_package_names, is_app_package
+from .logcat_columns import (
+    HAS_NUMPY, LEVEL_LETTERS, THREADTIME, LogcatColumns,
+    detect_logcat_format, parse_logcat_columns, format_time_ms,
+)
+
+if HAS_NUMPY:
+    import numpy as np
+
+
+class AndroidLogcatParser(BaseLogParser):
+    """Android Logcat 解析器"""
+
+    def __init__(self, chunk_size: int = 2000, chunk_overlap: int = 200):
+        super().__init__(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        self._columns_cache = None
+
+    def get_log_type(self) -> str:
+        return "android_logcat"
+
+    def can_parse(self, file_path: str, content_sample: str) -> bool:
+        """大部分行符合 threadtime 或 brief 格式時視為 logcat"""
+        return HAS_NUMPY and detect_logcat_format(content_sample) is not None
+
+    def get_patterns(self) -> Dict[str, str]:
+        """返回 logcat 相關的正則表達式"""
+        return {
+            'threadtime': r'^\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3}\s+\d+\s+\d+ [VDIWEFA] ',
+            'brief': r'^[VDIWEFA]/[^(]+\(\s*\d+\): ',
+            'timestamp': r'\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3}',
+            'fatal_exception': 'FATAL EXCEPTION',
+            'anr': 'ANR in ',
+            'native_crash': '*** *** *** *** *** *** *** *** *** *** *** *** *** *** *** ***',
+        }
+
+    def _columns(self, content: str) -> LogcatColumns:
+        """解析欄位（同一份內容只解析一次，供結構分析與分塊共用）"""
+        if self._columns_cache is not None and self._columns_cache[0] is content:
+            return self._columns_cache[1]
+
+        log_format = detect_logcat_format(content[:5000]) or THREADTIME
+        columns = parse_logcat_columns(content, log_format)
+        self._columns_cache = (content, columns)
+        return columns
+
+    def analyze_log_structure(self, content: str) -> Dict[str, Any]:
+        """分析 logcat 結構（全部以欄位統計）"""
+        columns = self._columns(content)
+        patterns = self.get_patterns()
+        records = columns.valid
+        record_count = int(records.sum())
+
+        level_counts = np.bincount(columns.level[records], minlength=len(LEVEL_LETTERS))
+        tag_counts = np.bincount(columns.tag_id[records], minlength=len(columns.tags))
+        top_tags = [(columns.tags[i], int(tag_counts[i])) for i in np.argsort(-tag_counts)[:10] if tag_counts[i]]
+        pids, pid_counts = np.unique(columns.pid[records], return_counts=True)
+        top_pids = [(int(pids[i]), int(pid_counts[i])) for i in np.argsort(-pid_counts)[:10]]
+
+        times = columns.time_ms[records & (columns.time_ms >= 0)]
+        time_range = (format_time_ms(times.min()), format_time_ms(times.max())) if len(times) else None
+
+        fatal_count = content.count(patterns['fatal_exception'])
+        anr_count = content.count(patterns['anr'])
+        native_crash_count = content.count(patterns['native_crash'])
+
+        level_dict = {LEVEL_LETTERS[i]: int(count) for i, count in enumerate(level_counts) if count}
+
+        return {
+            'log_type': 'android_logcat',
+            'logcat_format': columns.log_format,
+            'total_lines': len(columns),
+            'record_count': record_count,
+            'level_counts': level_dict,
+            'top_tags': top_tags,
+            'top_pids': top_pids,
+            'time_range': time_range,
+            'fatal_exception_count': fatal_count,
+            'anr_count': anr_count,
+            'native_crash_count': native_crash_count,
+            'severity': self._calculate_severity(level_dict, record_count, fatal_count + native_crash_count, anr_count),
+            'file_size_mb': len(content) / (1024 * 1024),
+        }
+
+    def _calculate_severity(self, level_counts: Dict[str, int], record_count: int,
+                            crash_count: int, anr_count: int) -> str:
+        """計算 logcat 嚴重程度"""
+        if crash_count or anr_count or level_counts.get('F'):
+            return "critical"
+
+        errors = level_counts.get('E', 0)
+        if record_count and errors / record_count >= 0.01:
+            return "high"
+        if errors or level_counts.get('W'):
+            return "medium"
+        return "low"
+
+    def parse_content(self, content: str, file_path: str, log_info: Dict[str, Any]) -> List[Document]:
+        """解析 logcat 內容：摘要 + 依時間窗 / pid 分組的片段"""
+        columns = self._columns(content)
+        documents = [
+            self.create_document(
+                self._create_logcat_summary(log_info),
+                file_path,
+                {
+                    'chunk_method': 'logcat_summary',
+                    'chunk_type': 'summary',
+                }
+            )
+        ]
+        documents.extend(self._parse_by_groups(columns, file_path))
+
+        # 欄位只在本次解析使用，釋放整個檔案的位元組緩衝區
+        self._columns_cache = None
+        return documents
+
+    def _create_logcat_summary(self, log_info: Dict[str, Any]) -> str:
+        """創建 logcat 摘要"""
+        time_range = log_info.get('time_range')
+        level_counts = log_info.get('level_counts', {})
+
+        summary = f"""Android Logcat 分析摘要
+========================
+格式: {log_info.get('logcat_format')}
+時間範圍: {f'{time_range[0]} ~ {time_range[1]}' if time_range else 'Unknown'}
+總行數: {log_info.get('total_lines', 0)}（記錄 {log_info.get('record_count', 0)} 筆）
+嚴重程度: {log_info.get('severity', 'Unknown').upper()}
+
+等級分布:
+"""
+        for letter in reversed(LEVEL_LETTERS):
+            if level_counts.get(letter):
+                summary += f"- {letter}: {level_counts[letter]}\n"
+
+        summary += f"""
+崩潰統計:
+- Java 崩潰 (FATAL EXCEPTION): {log_info.get('fatal_exception_count', 0)}
+- ANR: {log_info.get('anr_count', 0)}
+- Native 崩潰: {log_info.get('native_crash_count', 0)}
+
+最常見的 tag:
+"""
+        for tag, count in log_info.get('top_tags', []):
+            summary += f"- {tag}: {count}\n"
+
+        summary += "\n最活躍的 pid:\n"
+        for pid, count in log_info.get('top_pids', []):
+            summary += f"- {pid}: {count}\n"
+
+        return summary
+
+    def _kept_lines(self, columns: LogcatColumns, owner):
+        """
+        嵌入前的過濾：第一筆記錄之前的行（「--------- beginning of main」等）、
+        雜訊 tag（E 以上仍保留）與低於 LOGCAT_MIN_LEVEL 的記錄
+
+        Returns:
+            保留的行號
+        """
+        has_owner = owner >= 0
+        source = np.maximum(owner, 0)
+        level = np.where(has_owner, columns.level[source], -1)
+        keep = has_owner.copy()
+
+        noisy_tags = {tag.strip() for tag in get_config("LOGCAT_NOISY_TAGS", "chatty").split(",") if tag.strip()}
+        noisy_ids = [i for i, tag in enumerate(columns.tags) if tag in noisy_tags]
+        if noisy_ids:
+            tag_id = np.where(has_owner, columns.tag_id[source], -1)
+            keep &= ~(np.isin(tag_id, noisy_ids) & (level < LEVEL_LETTERS.index('E')))
+
+        min_level = LEVEL_LETTERS.find(get_config("LOGCAT_MIN_LEVEL", "V").upper()[:1])
+        if min_level > 0:
+            keep &= level >= min_level
+
+        return np.flatnonzero(keep)
+
+    def _parse_by_groups(self, columns: LogcatColumns, file_path: str) -> List[Document]:
+        """
+        依時間窗與 pid（LOGCAT_GROUP_BY 可加上 tag）分組，組內依原始順序、依 chunk_size 切塊
+
+        延續行（堆疊追蹤等）跟隨前一筆記錄的分組。
+        """
+        if len(columns) == 0:
+            return []
+
+        owner = columns.inherit_from_records()
+        lines = self._kept_lines(columns, owner)
+        if len(lines) == 0:
+            return []
+
+        source = owner[lines]
+        window_ms = int(float(get_config("LOGCAT_WINDOW_SECONDS", "60")) * 1000)
+        time_ms = columns.time_ms[source]
+
+        group_by = {key.strip() for key in get_config("LOGCAT_GROUP_BY", "pid").split(",")}
+        keys = [np.where(time_ms >= 0, time_ms // window_ms, -1)]
+        if "pid" in group_by:
+            keys.append(columns.pid[source])
+        if "tag" in group_by:
+            keys.append(columns.tag_id[source])
+
+        # 主鍵為時間窗，其次 pid / tag，組內保持原始行順序
+        order = np.lexsort([lines] + keys[::-1])
+        lines = lines[order]
+        keys = [key[order] for key in keys]
+
+        group_start = np.zeros(len(lines), dtype=bool)
+        group_start[0] = True
+        for key in keys:
+            group_start[1:] |= key[1:] != key[:-1]
+
+        # 組內累計字元數超過 chunk_size 時切出新片段
+        lengths = columns.line_lengths(lines)
+        offsets = np.cumsum(lengths)
+        group_base = (offsets - lengths)[group_start][np.cumsum(group_start) - 1]
+        piece = (offsets - group_base - 1) // self.chunk_size
+        chunk_start = group_start.copy()
+        chunk_start[1:] |= piece[1:] != piece[:-1]
+        bounds = np.append(np.flatnonzero(chunk_start), len(lines))
+
+        texts = columns.texts(lines, bounds)
+        fields = self._record_fields(columns, lines, bounds)
+        self._add_packages(texts, fields)
+
+        documents = []
+        for index, (begin, end) in enumerate(zip(bounds[:-1].tolist(), bounds[1:].tolist())):
+            metadata = {
+                'chunk_method': 'logcat_window',
+                'chunk_type': 'logcat',
+                'line_count': end - begin,
+            }
+            if "pid" in group_by and keys[1][begin] >= 0:
+                metadata['pid'] = int(keys[1][begin])
+            if "tag" in group_by and keys[-1][begin] >= 0:
+                metadata['tag'] = columns.tags[keys[-1][begin]]
+            metadata.update(fields[index])
+            documents.append(self.create_document(texts[index], file_path, metadata))
+
+        return documents
+
+    def _record_fields(self, columns: LogcatColumns, lines, bounds) -> List[Dict[str, Any]]:
+        """
+        從欄位直接算出每個片段的結構化欄位（與 log 記錄索引的欄位一致）
+
+        所有片段一起以分段歸約（reduceat）計算，不逐片段呼叫 numpy。
+
+        Args:
+            lines: 所有片段的行號（依片段順序串接）
+            bounds: 片段在 lines 中的邊界
+
+        Returns:
+            每個片段的欄位字典（沒有任何記錄的片段為空字典）
+        """
+        chunk_count = len(bounds) - 1
+        fields: List[Dict[str, Any]] = [{} for _ in range(chunk_count)]
+        chunk_of = np.repeat(np.arange(chunk_count), np.diff(bounds))
+        is_record = columns.valid[lines]
+        records = lines[is_record]
+        record_chunk = chunk_of[is_record]
+        if len(records) == 0:
+            return fields
+
+        # 每個有記錄的片段在 records 中的起點（片段依序排列，中間沒有記錄的片段不佔位置）
+        chunks, segment_starts = np.unique(record_chunk, return_index=True)
+        times = columns.time_ms[records]
+        tod_start = np.minimum.reduceat(np.where(times >= 0, times, np.iinfo(np.int64).max), segment_starts)
+        tod_end = np.maximum.reduceat(times, segment_starts)
+        levels = columns.level[records]
+        max_level = np.maximum.reduceat(levels, segment_starts)
+        error_count = np.add.reduceat((levels >= LEVEL_LETTERS.index('E')).astype(np.int64), segment_starts)
+
+        for chunk, start, end, level, errors in zip(chunks.tolist(), tod_start.tolist(), tod_end.tolist(),
+                                                    max_level.tolist(), error_count.tolist()):
+            if end >= 0:
+                fields[chunk]['tod_start'] = start // 1000 % 86400
+                fields[chunk]['tod_end'] = end // 1000 % 86400
+            fields[chunk]['max_level'] = level
+            fields[chunk]['error_count'] = errors
+
+        for key, values, names in (('pids', columns.pid[records], None),
+                                   ('tids', columns.tid[records], None),
+                                   ('tags', columns.tag_id[records], columns.tags)):
+            present = values >= 0
+            _set_top_values(fields, key, record_chunk[present], values[present], names)
+
+        return fields
+
+    def _add_packages(self, texts: List[str], fields: List[Dict[str, Any]]):
+        """
+        補上每個片段的套件名稱（依出現次數排序，同次數依首次出現順序）
+
+        每個片段只跑一次正則；過濾與計數以不重複名稱與整批陣列完成。
+        """
+        found = [find_package_names(text) for text in texts]
+        names = [name for name in dict.fromkeys(name for chunk in found for name in chunk) if is_app_package(name)]
+        if not names:
+            return
+
+        name_ids = dict(zip(names, range(len(names))))
+        ids = np.fromiter((name_ids.get(name, -1) for chunk in found for name in chunk), dtype=np.int64)
+        chunk_of = np.repeat(np.arange(len(found)), [len(chunk) for chunk in found])
+        present = ids >= 0
+        _set_top_values(fields, 'packages', chunk_of[present], ids[present], names,
+                        tiebreak=np.flatnonzero(present))
+
+    def chunk_fields(self, doc: Document) -> Dict[str, Any]:
+        """記錄片段的欄位（含套件名稱）已在分組時算好"""
+        if doc.metadata.get('chunk_type') != 'logcat':
+            return super().chunk_fields(doc)
+        return {}
+
+
+def _set_top_values(fields: List[Dict[str, Any]], key: str, chunk, values, names=None, tiebreak=None):
+    """
+    每個片段取出現最多的前 MAX_DISTINCT_VALUES 個值，以逗號串接寫入 fields[片段][key]
+
+    Args:
+        fields: 每個片段的欄位字典
+        key: 欄位名稱
+        chunk: 每個值所屬的片段（非遞減）
+        values: 值（整數；有 names 時為 names 的索引）
+        names: 值對應的名稱，None 時直接輸出數字
+        tiebreak: 同次數時的排序鍵（取每個值最小的一個），預設為值本身
+    """
+    if len(values) == 0:
+        return
+    if tiebreak is None:
+        tiebreak = values
+
+    order = np.lexsort((tiebreak, values, chunk))
+    chunk, values, tiebreak = chunk[order], values[order], tiebreak[order]
+    run_start = np.ones(len(values), dtype=bool)
+    run_start[1:] = (chunk[1:] != chunk[:-1]) | (values[1:] != values[:-1])
+    runs = np.flatnonzero(run_start)
+    counts = np.diff(np.append(runs, len(values)))
+    chunk, values, tiebreak = chunk[runs], values[runs], tiebreak[runs]
+
+    # 片段內依次數遞減、再依 tiebreak 排名
+    ranked = np.lexsort((tiebreak, -counts, chunk))
+    chunk, values = chunk[ranked], values[ranked]
+    first = np.searchsorted(chunk, chunk)
+    keep = np.arange(len(chunk)) - first < MAX_DISTINCT_VALUES
+    chunk, values = chunk[keep], values[keep]
+
+    labels = [names[i] for i in values.tolist()] if names is not None else [str(i) for i in values.tolist()]
+    bounds = np.append(np.flatnonzero(np.diff(chunk, prepend=-1)), len(chunk)).tolist()
+    for begin, end in zip(bounds[:-1], bounds[1:]):
+        fields[int(chunk[begin])][key] = ",".join(labels[begin:end])
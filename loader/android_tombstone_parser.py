@@ -7,6 +7,7 @@ Android Tombstone 解析器
 import re
 from typing import List, Dict, Any, Optional
 from .base_log_parser import BaseLogParser
+from .crash_signature import tombstone_signature
 from langchain.schema import Document
 
 
@@ -134,6 +135,14 @@ class AndroidTombstoneParser(BaseLogParser):
             'file_size_mb': len(content) / (1024 * 1024),
         }
     
+    def split_units(self, content: str) -> List[str]:
+        """每個「*** *** ***」標頭開始一次獨立的崩潰"""
+        return self.split_on_headers(content, r'^(?:\*\*\* ){5,}\*\*\*\s*$')
+    
+    def compute_crash_signature(self, content: str, log_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """崩潰簽名：信號 + 前 N 層正規化 backtrace frame"""
+        return tombstone_signature(log_info.get('signal_name'), content)
+    
     def _determine_crash_type(self, signal_name: Optional[str], 
                              abort_message: Optional[str], 
                              content: str) -> str:
@@ -201,9 +210,6 @@ class AndroidTombstoneParser(BaseLogParser):
             {
                 'chunk_method': 'tombstone_summary',
                 'chunk_type': 'crash_summary',
-                'crash_type': log_info.get('crash_type', 'unknown'),
-                'severity': log_info.get('severity', 'unknown'),
-                **log_info
             }
         )
         documents.append(summary_doc)
@@ -292,8 +298,6 @@ Build: {log_info.get('build_fingerprint', 'Unknown')}
                 {
                     'chunk_method': 'tombstone_context',
                     'chunk_type': 'crash_context',
-                    'crash_type': log_info.get('crash_type', 'unknown'),
-                    'severity': log_info.get('severity', 'unknown'),
                 }
             )
         
@@ -361,7 +365,6 @@ Build: {log_info.get('build_fingerprint', 'Unknown')}
                     'chunk_method': 'tombstone_backtrace',
                     'chunk_type': 'backtrace',
                     'frame_count': len(backtrace_lines),
-                    'crash_type': log_info.get('crash_type', 'unknown'),
                 }
             )
             documents.append(doc)
@@ -400,7 +403,6 @@ Build: {log_info.get('build_fingerprint', 'Unknown')}
                 {
                     'chunk_method': 'tombstone_technical',
                     'chunk_type': 'technical_details',
-                    'severity': log_info.get('severity', 'unknown'),
                 }
             )
         
@@ -0,0 +1,136 @@
+"""
+壓縮檔串流讀取
+
+直接從 bugreport zip、.gz、.zst 讀出成員內容，不解壓到磁碟：
+- 逐一列舉壓縮檔成員，依路徑判斷 tombstone / ANR
+- 大型成員以單元邊界切成區段（segment）逐段讀取，不會切開 ANR 進程或 tombstone 崩潰
+"""
+
+import io
+import re
+import gzip
+import zipfile
+from pathlib import Path
+from typing import Iterator, List, Optional, Tuple, Callable, BinaryIO
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    zstandard = None
+    HAS_ZSTD = False
+
+# 支援直接讀取的壓縮格式
+ARCHIVE_EXTENSIONS = [".zip", ".gz", ".zst"]
+
+# 依成員路徑指定解析器（bugreport 的 FS/data/tombstones/*、FS/data/anr/*）
+MEMBER_ROUTES = [
+    (re.compile(r'(^|/)tombstones/'), "android_tombstone"),
+    (re.compile(r'(^|/)anr/'), "android_anr"),
+]
+
+# 不是文字 log 的成員（protobuf tombstone、巢狀壓縮檔、圖片等）
+SKIPPED_MEMBER_SUFFIXES = {".pb", ".proto", ".zip", ".gz", ".zst", ".png", ".jpg", ".jpeg", ".bin"}
+
+# 太小的成員（如 version.txt、main_entry.txt）沒有分析價值
+MIN_MEMBER_BYTES = 64
+
+
+def is_archive(file_path: str) -> bool:
+    """檢查是否為支援的壓縮檔"""
+    return Path(file_path).suffix.lower() in ARCHIVE_EXTENSIONS
+
+
+def route_member(member_name: str) -> Optional[str]:
+    """
+    依成員路徑決定 log 類型
+
+    Args:
+        member_name: 壓縮檔內的路徑
+
+    Returns:
+        log 類型（android_tombstone / android_anr），無法判斷時返回 None
+    """
+    for pattern, log_type in MEMBER_ROUTES:
+        if pattern.search(member_name):
+            return log_type
+    return None
+
+
+def iter_archive_members(file_path: str) -> Iterator[Tuple[str, Callable[[], BinaryIO]]]:
+    """
+    列舉壓縮檔中的文字成員
+
+    Args:
+        file_path: 壓縮檔路徑
+
+    Yields:
+        (成員名稱, 開啟成員串流的函數)
+    """
+    suffix = Path(file_path).suffix.lower()
+
+    if suffix == ".zip":
+        with zipfile.ZipFile(file_path) as zf:
+            for info in zf.infolist():
+                if info.is_dir() or info.file_size < MIN_MEMBER_BYTES:
+                    continue
+                if Path(info.filename).suffix.lower() in SKIPPED_MEMBER_SUFFIXES:
+                    continue
+                yield info.filename, (lambda info=info: zf.open(info))
+
+    elif suffix == ".gz":
+        yield Path(file_path).stem, (lambda: gzip.open(file_path, "rb"))
+
+    elif suffix == ".zst":
+        if not HAS_ZSTD:
+            raise ImportError("讀取 .zst 需要安裝 zstandard：pip install zstandard")
+
+        def open_zst():
+            raw = open(file_path, "rb")
+            return zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+
+        yield Path(file_path).stem, open_zst
+
+
+def iter_unit_segments(stream: BinaryIO, segment_chars: int,
+                       split_units: Callable[[str], List[str]]) -> Iterator[Tuple[str, int]]:
+    """
+    以單元邊界切分的區段逐段讀取串流
+
+    緩衝累積到 segment_chars 後以 split_units 切分，只送出完整的單元，
+    最後一個（可能還沒讀完的）單元留在緩衝中；單一單元的內容不會被切開。
+
+    Args:
+        stream: 二進位串流
+        segment_chars: 每個區段的大約字元數
+        split_units: 把內容切成獨立單元的函數（解析器的 split_units）
+
+    Yields:
+        (文字區段, 區段中的單元數)
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8", errors="ignore", newline="")
+    buffer = []
+    size = 0
+    threshold = segment_chars
+    for line in text:
+        buffer.append(line)
+        size += len(line)
+        if size < threshold:
+            continue
+        units = split_units("".join(buffer))
+        if len(units) > 1:
+            yield "".join(units[:-1]), len(units) - 1
+            buffer = [units[-1]]
+            size = len(units[-1])
+            threshold = max(segment_chars, size + segment_chars)
+        else:
+            # 目前只有一個單元，再讀一個區段的量後才重新切分
+            threshold = size + segment_chars
+    if buffer:
+        content = "".join(buffer)
+        yield content, len(split_units(content))
+
+
+def looks_binary(text: str) -> bool:
+    """開頭含有 NUL 字元的內容視為二進位"""
+    return "\x00" in text[:4096]
@@ -11,6 +11,74 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 import re
 from datetime import datetime
 import os
+import atexit
+import pickle
+import threading
+import multiprocessing
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from config import get_config
+from .file_catalog import FileCatalog, compute_file_id, get_file_catalog
+from .crash_signature import get_crash_signature_index
+from .pending_writes import PendingIndexWrites
+from .log_record_index import LogRecordIndex, extract_chunk_fields, get_log_record_index
+from .log_template_miner import LogTemplateIndex, get_log_template_index
+from .timestamp_parser import TimestampParser
+from .offset_splitter import OffsetTextSplitter
+
+
+# 嚴重程度排序（用於略過低價值單元）
+SEVERITY_RANKS = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+
+
+def _analyze_unit_in_worker(parser_class, chunk_size: int, chunk_overlap: int,
+                            content: str, source: str, file_id: str,
+                            unit_index: int, unit_count: int, skip_low_value: bool):
+    """子進程入口：建立解析器並分析單一單元"""
+    parser = parser_class(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    return parser.analyze_unit(content, source, file_id, unit_index, unit_count, skip_low_value)
+
+
+# 單元解析進程池（第一次需要時建立並在之後的檔案間重複使用，spawn 子進程只付一次模組載入成本）
+_unit_pool: Optional[ProcessPoolExecutor] = None
+_unit_pool_lock = threading.Lock()
+
+
+def get_unit_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    獲取單元解析進程池（單例模式，程式結束時關閉）
+
+    spawn：伺服器進程中有執行緒（uvicorn、查詢批次器）與已開啟的 SQLite 連線，
+    fork 會複製持有中的鎖，子進程可能死鎖。
+
+    Args:
+        workers: 進程數（只在建立時使用）
+
+    Returns:
+        ProcessPoolExecutor
+    """
+    global _unit_pool
+    with _unit_pool_lock:
+        if _unit_pool is None:
+            _unit_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+            print(f"🧵 啟動 log 單元解析進程池: {workers} 個進程")
+        return _unit_pool
+
+
+@atexit.register
+def shutdown_unit_pool(pool: Optional[ProcessPoolExecutor] = None):
+    """
+    關閉單元解析進程池
+
+    Args:
+        pool: 只在目前的進程池就是這一個時才關閉（失敗的進程池由第一個發現的呼叫丟棄）；None 表示無條件關閉
+    """
+    global _unit_pool
+    with _unit_pool_lock:
+        if _unit_pool is None or (pool is not None and _unit_pool is not pool):
+            return
+        _unit_pool, closing = None, _unit_pool
+    closing.shutdown(wait=False, cancel_futures=True)
 
 
 class BaseLogParser(ABC):
@@ -26,12 +94,21 @@ class BaseLogParser(ABC):
         """
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size,
-            chunk_overlap=chunk_overlap,
-            separators=self.get_separators(),
-            length_function=len,
-        )
+        self._timestamp_parser: Optional[TimestampParser] = None
+        if get_config("TEXT_SPLITTER", "offset") == "offset":
+            self.text_splitter = OffsetTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                unit="chars",
+                separators=self.get_separators(),
+            )
+        else:
+            self.text_splitter = RecursiveCharacterTextSplitter(
+                chunk_size=chunk_size,
+                chunk_overlap=chunk_overlap,
+                separators=self.get_separators(),
+                length_function=len,
+            )
     
     @abstractmethod
     def get_log_type(self) -> str:
@@ -61,36 +138,286 @@ class BaseLogParser(ABC):
         """返回用於分割的分隔符（可覆寫）"""
         return ["\n\n", "\n", " ", ""]
     
-    def parse_log_file(self, file_path: str) -> List[Document]:
+    def parse_log_file(self, file_path: str, dedup: bool = True,
+                       pending: Optional[PendingIndexWrites] = None,
+                       catalog: Optional[FileCatalog] = None) -> List[Document]:
         """
         解析 log 檔案的主要方法
         
         Args:
             file_path: log 檔案路徑
+            dedup: 是否依崩潰簽名去重（與已索引的崩潰相同時不產生片段）
+            pending: 延後寫入佇列（提供時崩潰出現次數等向量寫入成功後才記錄）
+            catalog: 寫入分析結果的檔案目錄（預設使用全局實例）
             
         Returns:
             Document 列表
         """
+        self.duplicate_of = None
+        
         try:
             content = self.read_file(file_path)
         except Exception as e:
             print(f"❌ 讀取檔案失敗: {e}")
             return []
         
+        return self.parse_text(content, file_path, dedup=dedup, pending=pending, catalog=catalog)
+    
+    def parse_text(self, content: str, source: str, dedup: bool = True,
+                   pending: Optional[PendingIndexWrites] = None,
+                   catalog: Optional[FileCatalog] = None,
+                   file_id: Optional[str] = None, unit_offset: int = 0,
+                   unit_total: Optional[int] = None) -> List[Document]:
+        """
+        解析已讀入記憶體的 log 內容（壓縮檔成員、分段讀取的大檔案等）
+        
+        內容包含多個獨立單元（多進程 ANR traces、多次崩潰的 tombstone）時，
+        每個單元各自分析、各自產生摘要與目錄項目；單元數量多時以多進程平行解析。
+        
+        Args:
+            content: log 內容
+            source: 來源標識（檔案路徑，或「壓縮檔!成員」）
+            dedup: 是否依崩潰簽名去重
+            pending: 延後寫入佇列（提供時崩潰出現次數、檔案目錄、模板表與記錄索引等
+                     向量寫入成功後才記錄，否則立即記錄）
+            catalog: 寫入檔案目錄、模板表與記錄索引的目錄（預設使用全局實例；
+                     臨時分析傳入 FileCatalog(":memory:")，不寫入知識庫的目錄）
+            file_id: 整個檔案的 ID（content 只是檔案的一個區段時由呼叫端提供，預設為 content 的雜湊）
+            unit_offset: content 第一個單元在整個檔案中的序號
+            unit_total: 整個檔案的單元總數（預設為 content 的單元數）
+            
+        Returns:
+            Document 列表
+        """
+        self.duplicate_of = None
+        if catalog is None:
+            catalog, template_index, record_index = get_file_catalog(), get_log_template_index(), get_log_record_index()
+        else:
+            template_index, record_index = LogTemplateIndex(catalog), LogRecordIndex(catalog)
+        catalog_source = pending.display_source(source) if pending is not None else source
+        
+        units = self.split_units(content)
+        unit_total = unit_total or len(units)
+        if unit_total > 1 and unit_offset == 0:
+            print(f"🧩 {os.path.basename(source)} 包含 {unit_total} 個獨立單元")
+        
+        file_id = file_id or compute_file_id(content)
+        results = self._analyze_units(units, source, file_id, unit_offset, unit_total)
+        
+        documents = []
+        skipped = duplicates = 0
+        for log_info, signature, unit_docs in results:
+            # 崩潰簽名：相同崩潰只嵌入一個代表檔案，其餘只累加次數
+            if unit_docs is not None and signature and dedup:
+                args = (signature, log_info['file_id'], source, self.get_log_type(), log_info.get('crash_type'))
+                if pending is not None:
+                    occurrence = get_crash_signature_index().stage(*args, pending)
+                else:
+                    occurrence = get_crash_signature_index().record(*args)
+                if occurrence['is_duplicate']:
+                    self.duplicate_of = occurrence['representative_source']
+                    duplicates += 1
+                    if pending is not None:
+                        pending.duplicates += 1
+                    print(f"♻️  與已索引的崩潰相同（第 {occurrence['occurrences']} 次，"
+                          f"代表檔案: {os.path.basename(self.duplicate_of or '')}），略過嵌入")
+                    unit_docs = []
+            elif unit_docs is None:
+                skipped += 1
+            
+            # 模板表寫入獨立的表，不放進目錄的 log_info
+            templates = log_info.pop('log_templates', None)
+            args = (catalog, template_index, record_index, catalog_source, log_info, templates, unit_docs)
+            if pending is not None:
+                # 向量寫入成功後才寫入目錄；在那之前本批次內以 claimed() 讀取
+                pending.claim(('file_info', log_info['file_id']), log_info)
+                pending.defer(self._write_catalog, *args)
+            else:
+                self._write_catalog(*args)
+            
+            documents.extend(unit_docs or [])
+        
+        if documents:
+            self.duplicate_of = None
+        if skipped:
+            print(f"⏭️  略過 {skipped} 個低價值單元")
+        
+        print(f"✅ {self.get_log_type()} 解析完成: {len(documents)} 個片段")
+        
+        return documents
+    
+    def _write_catalog(self, catalog: FileCatalog, template_index: LogTemplateIndex,
+                       record_index: LogRecordIndex, source: str, log_info: Dict[str, Any],
+                       templates: Optional[List[Dict[str, Any]]], documents: Optional[List[Document]]):
+        """
+        寫入單元的模板表、檔案目錄與記錄索引
+
+        Args:
+            catalog: 檔案目錄
+            template_index: 模板表
+            record_index: 記錄索引
+            source: 寫入目錄的來源
+            log_info: 單元的分析結果
+            templates: 模板表（沒有時為 None）
+            documents: 單元的片段（略過或重複時為 None / 空列表）
+        """
+        if templates:
+            try:
+                template_index.record(log_info['file_id'], source, templates)
+            except Exception as e:
+                print(f"⚠️ 寫入模板表失敗: {e}")
+        
+        # 檔案層級的分析結果只存一份到目錄，片段只帶 file_id
+        try:
+            catalog.put(log_info['file_id'], source, log_info)
+        except Exception as e:
+            print(f"⚠️ 寫入檔案目錄失敗: {e}")
+        
+        # 片段的結構化欄位寫入記錄索引，供查詢時前置過濾
+        if documents:
+            try:
+                record_index.add_chunks(documents, log_info)
+            except Exception as e:
+                print(f"⚠️ 寫入 log 記錄索引失敗: {e}")
+    
+    def split_units(self, content: str) -> List[str]:
+        """
+        把內容切成可獨立分析的單元（子類可覆寫，預設整個內容為一個單元）
+        
+        Args:
+            content: log 內容
+            
+        Returns:
+            單元內容列表
+        """
+        return [content]
+    
+    def split_on_headers(self, content: str, header_pattern: str) -> List[str]:
+        """
+        依標頭行切分單元，第一個標頭之前的內容併入第一個單元
+        
+        Args:
+            content: log 內容
+            header_pattern: 標頭行的正則表達式（多行模式）
+            
+        Returns:
+            單元內容列表
+        """
+        starts = [m.start() for m in re.finditer(header_pattern, content, re.MULTILINE)]
+        if len(starts) <= 1:
+            return [content]
+        
+        starts[0] = 0
+        starts.append(len(content))
+        return [content[starts[i]:starts[i + 1]] for i in range(len(starts) - 1)]
+    
+    def is_low_value_unit(self, log_info: Dict[str, Any]) -> bool:
+        """
+        判斷單元是否低價值、可略過（子類可覆寫）
+        
+        預設依 severity 與 LOG_UNIT_MIN_SEVERITY 比較。
+        
+        Args:
+            log_info: 單元的分析結果
+            
+        Returns:
+            是否可略過
+        """
+        min_rank = SEVERITY_RANKS.get(get_config("LOG_UNIT_MIN_SEVERITY", "medium"), 0)
+        return SEVERITY_RANKS.get(log_info.get('severity'), min_rank) < min_rank
+    
+    def analyze_unit(self, content: str, source: str, file_id: str,
+                     unit_index: int = 0, unit_count: int = 1,
+                     skip_low_value: bool = False) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]], Optional[List[Document]]]:
+        """
+        分析並解析單一單元（不寫入任何共享狀態，可在子進程中執行）
+        
+        Args:
+            content: 單元內容
+            source: 來源標識
+            file_id: 整個檔案的 ID
+            unit_index: 單元序號
+            unit_count: 單元總數
+            skip_low_value: 是否略過低價值單元（第一個單元永遠保留）
+            
+        Returns:
+            (log_info, 崩潰簽名, Document 列表；略過時為 None)
+        """
         # 分析 log 結構
         log_info = self.analyze_log_structure(content)
         log_info['log_type'] = self.get_log_type()
         log_info['parser_class'] = self.__class__.__name__
+        if unit_count > 1:
+            log_info['file_id'] = compute_file_id(f"{file_id}:{unit_index}")
+            log_info['unit_index'] = unit_index
+            log_info['unit_count'] = unit_count
+        else:
+            log_info['file_id'] = file_id
+        
+        signature = self.compute_crash_signature(content, log_info)
+        if signature:
+            log_info['crash_signature'] = signature['signature']
+        
+        if skip_low_value and unit_index > 0 and self.is_low_value_unit(log_info):
+            return log_info, signature, None
         
         # 執行特定的解析策略
-        documents = self.parse_content(content, file_path, log_info)
+        documents = self.parse_content(content, source, log_info)
         
         # 後處理
         documents = self.post_process_documents(documents, log_info)
         
-        print(f"✅ {self.get_log_type()} 解析完成: {len(documents)} 個片段")
+        return log_info, signature, documents
+    
+    def _analyze_units(self, units: List[str], source: str, file_id: str,
+                       unit_offset: int = 0, unit_total: Optional[int] = None) -> List[Tuple]:
+        """
+        分析所有單元，單元數量達到門檻時使用共用的進程池平行處理
+
+        units 只是檔案的一個區段時，unit_offset 與 unit_total 讓單元序號與 file_id
+        和一次解析整個檔案時相同。
+
+        門檻預設 32：進程池重複使用時，約 16～32 個單元（每個數十 KB）以上才比逐一解析快，
+        單元更少時送資料到子進程的成本大於解析本身（見 test_script/bench_log_units.py）。
+        """
+        unit_total = unit_total or len(units)
+        skip_low_value = unit_total > 1 and get_config("LOG_SKIP_LOW_VALUE_UNITS", "true").lower() == "true"
+        workers = int(get_config("LOG_PARSE_WORKERS", "4"))
+        min_units = int(get_config("LOG_PARALLEL_MIN_UNITS", "32"))
         
-        return documents
+        if workers > 1 and len(units) >= min_units:
+            pool = None
+            try:
+                pool = get_unit_pool(workers)
+                futures = [
+                    pool.submit(_analyze_unit_in_worker, type(self), self.chunk_size, self.chunk_overlap,
+                                unit, source, file_id, unit_offset + i, unit_total, skip_low_value)
+                    for i, unit in enumerate(units)
+                ]
+                return [future.result() for future in futures]
+            except (OSError, RuntimeError, CancelledError, pickle.PicklingError) as e:
+                # BrokenProcessPool 是 RuntimeError 的子類；另一個呼叫已丟棄的進程池 submit 時也是 RuntimeError
+                print(f"⚠️ 平行解析失敗，改為逐一解析: {e}")
+                if isinstance(e, BrokenProcessPool):
+                    shutdown_unit_pool(pool)
+        
+        return [
+            self.analyze_unit(unit, source, file_id, unit_offset + i, unit_total, skip_low_value)
+            for i, unit in enumerate(units)
+        ]
+    
+    def compute_crash_signature(self, content: str, log_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        計算崩潰簽名（子類可覆寫，預設不計算）
+        
+        Args:
+            content: log 內容
+            log_info: 結構分析結果
+            
+        Returns:
+            簽名資訊（signature、signal、frames），不適用時返回 None
+        """
+        return None
     
     def read_file(self, file_path: str, encoding: str = 'utf-8') -> str:
         """讀取檔案內容"""
@@ -129,6 +456,10 @@ class BaseLogParser(ABC):
         """
         後處理文檔（添加元數據等）
         
+        檔案層級的 log_info 不再複製到每個片段，只附上 file_id，
+        檢索時再由檔案目錄補回。片段自身的結構化欄位（時間範圍、等級、
+        pid/tid、tag）與 chunk_id 則直接寫入 metadata。
+        
         Args:
             documents: 原始文檔列表
             log_info: log 分析資訊
@@ -136,57 +467,74 @@ class BaseLogParser(ABC):
         Returns:
             處理後的文檔列表
         """
-        for doc in documents:
+        file_id = log_info.get('file_id')
+        for i, doc in enumerate(documents):
             # 添加通用元數據
             doc.metadata.update({
                 'log_type': self.get_log_type(),
-                'parser_class': self.__class__.__name__,
-                'file_type': 'log'
+                'file_type': 'log',
+                'file_id': file_id,
+                'chunk_id': f"{file_id}:{i}",
             })
-            
-            # 添加 log 分析資訊
-            for key, value in log_info.items():
-                if key not in doc.metadata:
-                    doc.metadata[key] = value
+            doc.metadata.update(self.chunk_fields(doc))
         
         return documents
     
-    def extract_time_range(self, content: str) -> Optional[Tuple[datetime, datetime]]:
-        """提取時間範圍（如果有時間戳）"""
-        patterns = self.get_patterns()
-        if 'timestamp' not in patterns:
+    def chunk_fields(self, doc: Document) -> Dict[str, Any]:
+        """
+        抽取片段的結構化欄位（子類可覆寫，例如已由欄位式解析得到時）
+        
+        Args:
+            doc: 片段
+            
+        Returns:
+            欄位字典（時間範圍、等級、pid/tid、tag、套件）
+        """
+        return extract_chunk_fields(doc.page_content)
+    
+    def extract_time_range(self, content: str, pattern: Optional[str] = None) -> Optional[Tuple[datetime, datetime]]:
+        """
+        提取時間範圍（如果有時間戳）
+        
+        每次呼叫（即每個檔案）重新偵測一次時間戳格式，並串流追蹤最早 / 最晚時間，
+        不保留所有 datetime。
+        
+        Args:
+            content: log 內容
+            pattern: 時間戳的正則表達式（預設使用 get_patterns()['timestamp']）
+            
+        Returns:
+            (最早, 最晚)，沒有時間戳時返回 None
+        """
+        pattern = pattern or self.get_patterns().get('timestamp')
+        if not pattern:
             return None
         
-        timestamps = []
-        for match in re.finditer(patterns['timestamp'], content):
-            try:
-                ts = self.parse_timestamp(match.group())
-                if ts:
-                    timestamps.append(ts)
-            except:
+        self._timestamp_parser = TimestampParser()
+        earliest = latest = None
+        for match in re.finditer(pattern, content):
+            ts = self.parse_timestamp(match.group())
+            if ts is None:
                 continue
+            if earliest is None or ts < earliest:
+                earliest = ts
+            if latest is None or ts > latest:
+                latest = ts
         
-        if timestamps:
-            return min(timestamps), max(timestamps)
-        return None
+        if earliest is None:
+            return None
+        return earliest, latest
     
     def parse_timestamp(self, timestamp_str: str) -> Optional[datetime]:
-        """解析時間戳字串（子類可覆寫）"""
-        # 嘗試常見格式
-        formats = [
-            '%Y-%m-%d %H:%M:%S',
-            '%Y-%m-%d %H:%M:%S.%f',
-            '%Y-%m-%dT%H:%M:%S',
-            '%Y-%m-%dT%H:%M:%S.%f',
-            '%Y-%m-%d %H:%M:%S,%f',  # Log4j format
-        ]
+        """
+        解析時間戳字串（子類可覆寫）
         
-        for fmt in formats:
-            try:
-                return datetime.strptime(timestamp_str.strip(), fmt)
-            except:
-                continue
-        return None
+        支援 ISO / Log4j / logcat（MM-DD HH:MM:SS.mmm）/ epoch 格式；
+        格式只在第一個時間戳偵測一次，之後以固定位置切片解析。
+        """
+        if self._timestamp_parser is None:
+            self._timestamp_parser = TimestampParser()
+        return self._timestamp_parser.parse(timestamp_str)
     
     def create_document(self, content: str, file_path: str, metadata: Dict[str, Any]) -> Document:
         """創建文檔的輔助方法"""
@@ -232,5 +580,4 @@ class BaseLogParser(ABC):
             return [chunk for chunk in chunks if chunk.strip()]
         else:
             # 使用標準文字分割器
-            doc = Document(page_content=content, metadata={})
-            return [d.page_content for d in self.text_splitter.split_documents([doc])]
\ No newline at end of file
+            return self.text_splitter.split_text(content)
\ No newline at end of file
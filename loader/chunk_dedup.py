@@ -0,0 +1,275 @@
+"""
+近似重複片段去重（MinHash LSH）
+
+重疊的錯誤上下文視窗、重複的 ANR 執行緒堆疊、PDF 每頁相同的頁首頁尾...
+會產生大量幾乎相同的片段，每個都要嵌入，檢索時也會擠滿 top-k。
+此模組在嵌入前：
+- 以位元組 shingle 計算每個片段的 MinHash 簽名
+- 以 LSH 分段（band）找出候選，再以簽名估計的 Jaccard 相似度確認
+- 簽名保存在檔案目錄的 SQLite 中，跨檔案、跨次匯入的重複片段也會略過
+- 略過的 log 片段從記錄索引（log_chunks）移除，前置過濾不會選到沒有嵌入的 chunk_id
+"""
+
+import hashlib
+import math
+from typing import List, Dict, Any, Optional, Tuple, Iterable
+
+import numpy as np
+from langchain.schema import Document
+
+from config import get_config
+from .file_catalog import FileCatalog, get_file_catalog
+from .pending_writes import PendingIndexWrites
+from .log_record_index import LogRecordIndex, get_log_record_index
+
+NUM_PERM = 128
+BANDS = 32
+ROWS = NUM_PERM // BANDS
+SHINGLE_BYTES = 8
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_HASH_MULTIPLIER = np.uint64(1099511628211)
+_random = np.random.RandomState(20240115)
+_PERM_A = _random.randint(1, 1 << 31, size=(NUM_PERM, 1)).astype(np.uint64)
+_PERM_B = _random.randint(0, 1 << 31, size=(NUM_PERM, 1)).astype(np.uint64)
+
+# 檔案摘要以固定格式產生，不同檔案之間也很相似，不參與去重
+_EXEMPT_CHUNK_TYPES = ('summary', 'crash_summary')
+
+
+def _shingle_hashes(text: str) -> np.ndarray:
+    """把正規化後的內容切成位元組 shingle，返回不重複的 32 位元雜湊"""
+    data = np.frombuffer(" ".join(text.split()).encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if len(data) < SHINGLE_BYTES:
+        data = np.pad(data, (0, SHINGLE_BYTES - len(data)))
+
+    count = len(data) - SHINGLE_BYTES + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for offset in range(SHINGLE_BYTES):
+        hashes = hashes * _HASH_MULTIPLIER + data[offset:offset + count]
+    return np.unique((hashes ^ (hashes >> np.uint64(32))) & np.uint64(0xFFFFFFFF))
+
+
+def minhash_signature(text: str) -> np.ndarray:
+    """
+    計算 MinHash 簽名
+
+    Args:
+        text: 片段內容
+
+    Returns:
+        長度 NUM_PERM 的 uint64 陣列
+    """
+    shingles = _shingle_hashes(text)
+    return ((_PERM_A * shingles + _PERM_B) % _MERSENNE_PRIME).min(axis=1)
+
+
+def band_keys(signature: np.ndarray) -> List[int]:
+    """LSH 分段鍵（每段 ROWS 個值，連同段號雜湊成 64 位元整數）"""
+    keys = []
+    for band in range(BANDS):
+        digest = hashlib.blake2b(signature[band * ROWS:(band + 1) * ROWS].tobytes(),
+                                 digest_size=8, salt=band.to_bytes(2, "little")).digest()
+        keys.append(int.from_bytes(digest, "little", signed=True))
+    return keys
+
+
+def estimate_similarity(a: np.ndarray, b: np.ndarray) -> float:
+    """以簽名中相同值的比例估計 Jaccard 相似度"""
+    return float(np.count_nonzero(a == b)) / NUM_PERM
+
+
+def embedding_batch_size() -> int:
+    """嵌入模型每次呼叫處理的片段數（OpenAI 每次請求 1000 筆，本地模型每批 EMBEDDING_BATCH_SIZE 筆）"""
+    if get_config("EMBEDDING_PROVIDER", "huggingface") == "openai":
+        return 1000
+    return int(get_config("EMBEDDING_BATCH_SIZE", "32"))
+
+
+class ChunkSignatureStore:
+    """已嵌入片段的 MinHash 簽名（存放在檔案目錄的 SQLite 中）"""
+
+    def __init__(self, catalog: Optional[FileCatalog] = None):
+        """
+        初始化簽名庫
+
+        Args:
+            catalog: 檔案目錄（預設使用全局實例）
+        """
+        self._catalog = catalog
+        self._schema_conn = None
+
+    @property
+    def catalog(self) -> FileCatalog:
+        return self._catalog or get_file_catalog()
+
+    def _ensure_schema(self, conn):
+        if self._schema_conn is conn:
+            return
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_signatures (
+                signature_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source       TEXT,
+                chunk_id     TEXT,
+                signature    BLOB NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS chunk_signature_bands (
+                band_key     INTEGER NOT NULL,
+                signature_id INTEGER NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_chunk_signature_bands ON chunk_signature_bands(band_key)")
+        self._schema_conn = conn
+
+    def find_similar(self, signature: np.ndarray, keys: List[int],
+                     threshold: float) -> Optional[Dict[str, Any]]:
+        """
+        查找相似度達門檻的已保存片段
+
+        Args:
+            signature: MinHash 簽名
+            keys: 簽名的 LSH 分段鍵
+            threshold: 相似度門檻
+
+        Returns:
+            {'source', 'chunk_id', 'similarity'}，沒有時返回 None
+        """
+        placeholders = ",".join("?" * len(keys))
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            rows = conn.execute(
+                f"SELECT source, chunk_id, signature FROM chunk_signatures WHERE signature_id IN ("
+                f"SELECT DISTINCT signature_id FROM chunk_signature_bands WHERE band_key IN ({placeholders}))",
+                keys
+            ).fetchall()
+
+        for source, chunk_id, blob in rows:
+            similarity = estimate_similarity(signature, np.frombuffer(blob, dtype=np.uint64))
+            if similarity >= threshold:
+                return {'source': source, 'chunk_id': chunk_id, 'similarity': similarity}
+        return None
+
+    def add(self, entries: Iterable[Tuple[Optional[str], Optional[str], np.ndarray, List[int]]]):
+        """
+        保存片段簽名
+
+        Args:
+            entries: (來源, chunk_id, 簽名, 分段鍵) 的序列
+        """
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            for source, chunk_id, signature, keys in entries:
+                cursor = conn.execute(
+                    "INSERT INTO chunk_signatures (source, chunk_id, signature) VALUES (?, ?, ?)",
+                    (source, chunk_id, signature.tobytes())
+                )
+                conn.executemany(
+                    "INSERT INTO chunk_signature_bands (band_key, signature_id) VALUES (?, ?)",
+                    [(key, cursor.lastrowid) for key in keys]
+                )
+
+
+def deduplicate_chunks(documents: List[Document], persistent: bool = True,
+                       threshold: Optional[float] = None,
+                       store: Optional[ChunkSignatureStore] = None,
+                       pending: Optional[PendingIndexWrites] = None,
+                       record_index: Optional[LogRecordIndex] = None) -> Tuple[List[Document], Dict[str, int]]:
+    """
+    去除近似重複的片段
+
+    Args:
+        documents: 片段列表
+        persistent: 是否比對並保存到簽名庫（跨檔案、跨次匯入去重；臨時分析時應關閉）
+        threshold: 相似度門檻（預設讀取 DEDUP_SIMILARITY_THRESHOLD）
+        store: 簽名庫（預設使用全局實例）
+        pending: 延後寫入佇列（提供時簽名等向量寫入成功、佇列 commit 後才保存；否則立即保存）
+        record_index: 略過的 log 片段要移除的記錄索引（預設使用全局實例）
+
+    Returns:
+        (保留的片段, 統計：total / kept / batch_duplicates / stored_duplicates / embedding_calls_saved)
+    """
+    threshold = threshold or float(get_config("DEDUP_SIMILARITY_THRESHOLD", "0.9"))
+    store = store or get_chunk_signature_store()
+
+    kept: List[Document] = []
+    new_entries = []
+    batch_buckets: Dict[int, List[np.ndarray]] = {}
+    batch_duplicates = stored_duplicates = 0
+    dropped_chunk_ids = []
+
+    for doc in documents:
+        if doc.metadata.get('chunk_type') in _EXEMPT_CHUNK_TYPES or not doc.page_content.strip():
+            kept.append(doc)
+            continue
+
+        signature = minhash_signature(doc.page_content)
+        keys = band_keys(signature)
+
+        candidates = {id(c): c for key in keys for c in batch_buckets.get(key, ())}
+        chunk_id = doc.metadata.get('chunk_id')
+        if any(estimate_similarity(signature, c) >= threshold for c in candidates.values()):
+            batch_duplicates += 1
+            if chunk_id:
+                dropped_chunk_ids.append(chunk_id)
+            continue
+        match = store.find_similar(signature, keys, threshold) if persistent else None
+        if match:
+            stored_duplicates += 1
+            # 同一個片段重新匯入時，記錄索引中的列屬於已嵌入的片段，不刪除
+            if chunk_id and match['chunk_id'] != chunk_id:
+                dropped_chunk_ids.append(chunk_id)
+            continue
+
+        for key in keys:
+            batch_buckets.setdefault(key, []).append(signature)
+        new_entries.append((doc.metadata.get('source'), chunk_id, signature, keys))
+        kept.append(doc)
+
+    if persistent and new_entries:
+        if pending is not None:
+            pending.defer(store.add, [(pending.display_source(source), chunk_id, signature, keys)
+                                      for source, chunk_id, signature, keys in new_entries])
+        else:
+            store.add(new_entries)
+    if dropped_chunk_ids:
+        # 記錄索引在解析時已寫入（或已排入佇列）；佇列依加入順序執行，刪除排在寫入之後
+        record_index = record_index or get_log_record_index()
+        if pending is not None:
+            pending.defer(record_index.remove_chunks, dropped_chunk_ids)
+        else:
+            record_index.remove_chunks(dropped_chunk_ids)
+    if pending is not None:
+        pending.duplicates += stored_duplicates
+
+    batch_size = embedding_batch_size()
+    stats = {
+        'total': len(documents),
+        'kept': len(kept),
+        'batch_duplicates': batch_duplicates,
+        'stored_duplicates': stored_duplicates,
+        'embedding_calls_saved': math.ceil(len(documents) / batch_size) - math.ceil(len(kept) / batch_size),
+    }
+    removed = batch_duplicates + stored_duplicates
+    if removed:
+        print(f"🧹 近似重複去重: 略過 {removed}/{len(documents)} 個片段"
+              f"（本次重複 {batch_duplicates}，已索引過 {stored_duplicates}），"
+              f"節省約 {stats['embedding_calls_saved']} 次嵌入呼叫")
+    return kept, stats
+
+
+# 全局實例
+_signature_store: Optional[ChunkSignatureStore] = None
+
+
+def get_chunk_signature_store() -> ChunkSignatureStore:
+    """獲取片段簽名庫實例（單例模式）"""
+    global _signature_store
+    if _signature_store is None:
+        _signature_store = ChunkSignatureStore()
+    return _signature_store
@@ -0,0 +1,391 @@
+"""
+崩潰簽名（Crash Signature）
+
+大量 tombstone / ANR 其實是同一個崩潰：相同信號、相同的前幾層 frame。
+此模組在解析時計算正規化的崩潰簽名，並在檔案目錄中維護簽名索引：
+- 每個簽名只保留一個代表檔案進行嵌入，其餘只累加出現次數
+- 檢索時可直接從索引回答「發生過幾次」，不需要更多向量
+"""
+
+import re
+import time
+import hashlib
+import sqlite3
+from typing import List, Dict, Any, Optional, Iterable
+
+from config import get_config
+from .file_catalog import FileCatalog, get_file_catalog
+from .pending_writes import PendingIndexWrites
+
+# backtrace 行：#00 pc 000000000004c0a0  /system/lib64/libc.so (strlen+16) (BuildId: ...)
+_NATIVE_FRAME = re.compile(r'^\s*#\d+\s+pc\s+[0-9a-fA-F]+\s+(\S+)(.*)$')
+_PAREN_GROUP = re.compile(r'\(([^()]*)\)')
+_SYMBOL_OFFSET = re.compile(r'\+(?:0x)?[0-9a-fA-F]+$')
+# Java frame：at com.example.Foo.bar(Foo.java:123)
+_JAVA_FRAME = re.compile(r'^\s*at\s+([\w$.<>]+)\(([^:)]*)(?::\d+)?\)')
+_WAITING_LOCK = re.compile(r'^\s*- (?:waiting (?:on|to lock)|locked|sleeping on)\s+<[^>]*>\s+\(a ([\w$.]+)\)')
+_MAIN_THREAD_BLOCK = re.compile(r'^"main".*?(?=^"|\Z)', re.MULTILINE | re.DOTALL)
+
+
+def _default_top_frames() -> int:
+    return int(get_config("CRASH_SIGNATURE_FRAMES", "5"))
+
+
+def _digest(parts: List[str]) -> str:
+    return hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:16]
+
+
+def normalize_native_frame(line: str) -> Optional[str]:
+    """
+    正規化 native backtrace 行
+
+    去掉 pc 位址、符號偏移與 BuildId，函式庫只保留檔名
+    （/data/app/<pkg>-<亂數>/ 之類的路徑因此不影響簽名）。
+
+    Args:
+        line: backtrace 行
+
+    Returns:
+        「函式庫!符號」，不是 backtrace 行時返回 None
+    """
+    match = _NATIVE_FRAME.match(line)
+    if not match:
+        return None
+
+    library = match.group(1).rsplit('/', 1)[-1]
+    symbol = ""
+    for group in _PAREN_GROUP.findall(match.group(2)):
+        if not group.startswith("BuildId"):
+            symbol = _SYMBOL_OFFSET.sub("", group.strip())
+            break
+    return f"{library}!{symbol or '?'}"
+
+
+def normalize_java_frame(line: str) -> Optional[str]:
+    """正規化 Java 堆疊行（去掉行號）"""
+    match = _JAVA_FRAME.match(line)
+    if not match:
+        return None
+    return match.group(1)
+
+
+def tombstone_signature(signal_name: Optional[str], content: str,
+                        top_n: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    計算 tombstone 的崩潰簽名（信號 + 前 N 層正規化 frame）
+
+    Args:
+        signal_name: 信號名稱（如 SIGSEGV）
+        content: tombstone 內容
+        top_n: 取前幾層 frame
+
+    Returns:
+        {'signature', 'frames', 'signal'}；沒有 backtrace 時返回 None
+    """
+    top_n = top_n or _default_top_frames()
+    start = content.find('backtrace:')
+    if start == -1:
+        return None
+
+    frames = []
+    for line in content[start:].split('\n')[1:]:
+        if not line.strip():
+            if frames:
+                break
+            continue
+        frame = normalize_native_frame(line)
+        if frame is None:
+            if frames:
+                break
+            continue
+        frames.append(frame)
+        if len(frames) >= top_n:
+            break
+
+    if not frames:
+        return None
+
+    signal = signal_name or "UNKNOWN"
+    return {
+        'signature': _digest(["tombstone", signal] + frames),
+        'signal': signal,
+        'frames': frames,
+    }
+
+
+def anr_signature(content: str, top_n: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    計算 ANR 的崩潰簽名（主線程阻塞堆疊）
+
+    取主線程等待的鎖類型與前 N 層 Java / native frame，去掉位址、行號與 tid。
+
+    Args:
+        content: ANR trace 內容
+        top_n: 取前幾層 frame
+
+    Returns:
+        {'signature', 'frames', 'signal'}；找不到主線程時返回 None
+    """
+    top_n = top_n or _default_top_frames()
+    match = _MAIN_THREAD_BLOCK.search(content)
+    if not match:
+        return None
+
+    frames = []
+    blocking = []
+    for line in match.group(0).split('\n')[1:]:
+        lock_match = _WAITING_LOCK.match(line)
+        if lock_match and not blocking:
+            blocking.append(f"lock:{lock_match.group(1)}")
+            continue
+        frame = normalize_java_frame(line) or normalize_native_frame(line)
+        if frame and len(frames) < top_n:
+            frames.append(frame)
+
+    if not frames:
+        return None
+
+    return {
+        'signature': _digest(["anr"] + blocking + frames),
+        'signal': "ANR",
+        'frames': blocking + frames,
+    }
+
+
+class CrashSignatureIndex:
+    """崩潰簽名索引（存放在檔案目錄的 SQLite 中）"""
+
+    def __init__(self, catalog: Optional[FileCatalog] = None):
+        """
+        初始化索引
+
+        Args:
+            catalog: 檔案目錄（預設使用全局實例）
+        """
+        self._catalog = catalog
+        self._schema_conn = None
+
+    @property
+    def catalog(self) -> FileCatalog:
+        return self._catalog or get_file_catalog()
+
+    def _ensure_schema(self, conn: sqlite3.Connection):
+        if self._schema_conn is conn:
+            return
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crash_signatures (
+                signature              TEXT PRIMARY KEY,
+                log_type               TEXT,
+                crash_type             TEXT,
+                signal                 TEXT,
+                frames                 TEXT,
+                representative_file_id TEXT,
+                representative_source  TEXT,
+                occurrences            INTEGER NOT NULL DEFAULT 0,
+                first_seen             REAL,
+                last_seen              REAL
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS crash_occurrences (
+                signature TEXT NOT NULL,
+                file_id   TEXT NOT NULL,
+                source    TEXT,
+                seen_at   REAL,
+                PRIMARY KEY (signature, file_id)
+            )
+            """
+        )
+        self._schema_conn = conn
+
+    def record(self, signature: Dict[str, Any], file_id: str, source: str,
+               log_type: str, crash_type: Optional[str] = None) -> Dict[str, Any]:
+        """
+        記錄一次崩潰出現
+
+        同一個檔案（相同 file_id）重複索引只計一次。
+
+        Args:
+            signature: tombstone_signature / anr_signature 的結果
+            file_id: 檔案 ID
+            source: 檔案路徑
+            log_type: log 類型
+            crash_type: 崩潰類型
+
+        Returns:
+            {'signature', 'occurrences', 'is_duplicate', 'representative_source'}
+        """
+        sig = signature['signature']
+        now = time.time()
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            row = conn.execute(
+                "SELECT representative_file_id, representative_source FROM crash_signatures WHERE signature = ?",
+                (sig,)
+            ).fetchone()
+
+            if row is None:
+                conn.execute(
+                    "INSERT INTO crash_signatures (signature, log_type, crash_type, signal, frames, "
+                    "representative_file_id, representative_source, occurrences, first_seen, last_seen) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?, ?)",
+                    (sig, log_type, crash_type, signature.get('signal'),
+                     "\n".join(signature.get('frames', [])), file_id, source, now, now)
+                )
+                representative_file_id, representative_source = file_id, source
+            else:
+                representative_file_id, representative_source = row
+
+            inserted = conn.execute(
+                "INSERT OR IGNORE INTO crash_occurrences (signature, file_id, source, seen_at) VALUES (?, ?, ?, ?)",
+                (sig, file_id, source, now)
+            ).rowcount
+            if inserted:
+                conn.execute(
+                    "UPDATE crash_signatures SET occurrences = occurrences + 1, last_seen = ? WHERE signature = ?",
+                    (now, sig)
+                )
+            occurrences = conn.execute(
+                "SELECT occurrences FROM crash_signatures WHERE signature = ?", (sig,)
+            ).fetchone()[0]
+
+        return {
+            'signature': sig,
+            'occurrences': occurrences,
+            'is_duplicate': representative_file_id != file_id,
+            'representative_source': representative_source,
+        }
+
+    def lookup(self, signature: Dict[str, Any], file_id: str) -> Dict[str, Any]:
+        """
+        不寫入索引，返回 record() 會得到的結果
+
+        Args:
+            signature: tombstone_signature / anr_signature 的結果
+            file_id: 檔案 ID
+
+        Returns:
+            {'signature', 'occurrences', 'is_duplicate', 'representative_source'}
+        """
+        sig = signature['signature']
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            row = conn.execute(
+                "SELECT representative_file_id, representative_source, occurrences FROM crash_signatures "
+                "WHERE signature = ?", (sig,)
+            ).fetchone()
+            counted = conn.execute(
+                "SELECT 1 FROM crash_occurrences WHERE signature = ? AND file_id = ?", (sig, file_id)
+            ).fetchone()
+
+        if row is None:
+            return {'signature': sig, 'occurrences': 1, 'is_duplicate': False, 'representative_source': None}
+        representative_file_id, representative_source, occurrences = row
+        return {
+            'signature': sig,
+            'occurrences': occurrences + (0 if counted else 1),
+            'is_duplicate': representative_file_id != file_id,
+            'representative_source': representative_source,
+        }
+
+    def stage(self, signature: Dict[str, Any], file_id: str, source: str, log_type: str,
+              crash_type: Optional[str], pending: PendingIndexWrites) -> Dict[str, Any]:
+        """
+        判斷是否為重複崩潰，出現記錄放進延後寫入佇列（向量寫入成功後才累加次數）
+
+        索引中還沒有的簽名，本批次中第一個出現的檔案為代表檔案。
+
+        Args:
+            signature: tombstone_signature / anr_signature 的結果
+            file_id: 檔案 ID
+            source: 來源（暫存路徑會換成上傳檔名）
+            log_type: log 類型
+            crash_type: 崩潰類型
+            pending: 延後寫入佇列
+
+        Returns:
+            {'signature', 'occurrences', 'is_duplicate', 'representative_source'}
+        """
+        source = pending.display_source(source)
+        occurrence = self.lookup(signature, file_id)
+        if not occurrence['is_duplicate']:
+            first_file_id, first_source = pending.claim(('crash_signature', occurrence['signature']),
+                                                        (file_id, source))
+            if first_file_id != file_id:
+                occurrence.update(is_duplicate=True, representative_source=first_source)
+        pending.defer(self.record, signature, file_id, source, log_type, crash_type)
+        return occurrence
+
+    def get_counts(self, signatures: Iterable[str]) -> Dict[str, int]:
+        """
+        批次查詢簽名的出現次數
+
+        Args:
+            signatures: 簽名列表
+
+        Returns:
+            簽名 -> 出現次數
+        """
+        sigs = list({s for s in signatures if s})
+        if not sigs:
+            return {}
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            placeholders = ",".join("?" * len(sigs))
+            rows = conn.execute(
+                f"SELECT signature, occurrences FROM crash_signatures WHERE signature IN ({placeholders})", sigs
+            ).fetchall()
+        return dict(rows)
+
+    def top_signatures(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """返回出現次數最多的簽名"""
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            rows = conn.execute(
+                "SELECT signature, log_type, crash_type, signal, frames, representative_source, occurrences "
+                "FROM crash_signatures ORDER BY occurrences DESC LIMIT ?", (limit,)
+            ).fetchall()
+        keys = ['signature', 'log_type', 'crash_type', 'signal', 'frames', 'representative_source', 'occurrences']
+        return [dict(zip(keys, row)) for row in rows]
+
+
+# 全局實例
+_signature_index: Optional[CrashSignatureIndex] = None
+
+
+def get_crash_signature_index() -> CrashSignatureIndex:
+    """獲取崩潰簽名索引實例（單例模式）"""
+    global _signature_index
+    if _signature_index is None:
+        _signature_index = CrashSignatureIndex()
+    return _signature_index
+
+
+def attach_crash_occurrences(docs: List[Any]) -> List[Any]:
+    """
+    為帶有崩潰簽名的片段補上目前的出現次數（metadata['crash_occurrences']）
+
+    Args:
+        docs: Document 列表
+
+    Returns:
+        同一份 Document 列表
+    """
+    signatures = [doc.metadata.get('crash_signature') for doc in docs]
+    if not any(signatures):
+        return docs
+
+    try:
+        counts = get_crash_signature_index().get_counts(signatures)
+    except sqlite3.Error as e:
+        print(f"⚠️ 讀取崩潰簽名索引失敗: {e}")
+        return docs
+
+    for doc in docs:
+        count = counts.get(doc.metadata.get('crash_signature'))
+        if count:
+            doc.metadata['crash_occurrences'] = count
+    return docs
@@ -3,10 +3,17 @@ from pathlib import Path
 
 from langchain_community.document_loaders import (
     PyPDFLoader, UnstructuredWordDocumentLoader, UnstructuredExcelLoader,
-    UnstructuredMarkdownLoader, UnstructuredHTMLLoader, JSONLoader, TextLoader
+    UnstructuredMarkdownLoader, UnstructuredHTMLLoader, TextLoader
 )
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from config import get_config
+from .file_catalog import get_file_catalog
+from .archive_reader import ARCHIVE_EXTENSIONS
+from .chunk_dedup import deduplicate_chunks
+from .log_record_index import LogRecordIndex
+from .pdf_loader import load_pdf
+from .tabular_loader import load_csv, load_excel, load_json
+from .offset_splitter import OffsetTextSplitter
 
 # 導入 log 解析器管理器
 try:
@@ -18,12 +25,41 @@ except ImportError:
     print("⚠️  Log 解析器未安裝，將使用標準文字處理")
 
 
-def load_and_split_documents(file_paths):
+def get_text_splitter():
+    """
+    建立文字分割器
+    
+    TEXT_SPLITTER=offset（預設）時使用以嵌入模型 token 計算長度的位移分割器
+    （CHUNK_TOKENS / CHUNK_OVERLAP_TOKENS，CHUNK_TOKENS 預設為模型的 max_seq_length 減 2），
+    此時 CHUNK_SIZE / CHUNK_OVERLAP 不影響文件片段；TEXT_SPLITTER=recursive 時使用
+    RecursiveCharacterTextSplitter（CHUNK_SIZE / CHUNK_OVERLAP 字元）。
+    """
+    if get_config("TEXT_SPLITTER", "offset") == "offset":
+        return OffsetTextSplitter()
+    
+    chunk_size = int(get_config("CHUNK_SIZE", "1000"))
+    chunk_overlap = int(get_config("CHUNK_OVERLAP", "100"))
+    
+    return RecursiveCharacterTextSplitter(
+        chunk_size=chunk_size, 
+        chunk_overlap=chunk_overlap,
+        length_function=len,
+        separators=["\n\n", "\n", "。", "！", "？", ".", "!", "?", " ", ""]
+    )
+
+
+def load_and_split_documents(file_paths, dedup=True, pending=None, catalog=None):
     """
     載入並分割文件
     
     Args:
         file_paths: 檔案路徑列表
+        dedup: 是否依崩潰簽名去重 tombstone / ANR，並與已索引的片段比對近似重複
+               （臨時分析時應關閉）
+        pending: PendingIndexWrites，提供時去重狀態與 log 的檔案目錄等到呼叫端寫入向量庫成功、
+                 commit() 後才保存（匯入知識庫時應提供）
+        catalog: log 分析結果（檔案目錄、模板表、記錄索引）寫入的 FileCatalog；
+                 預設使用全局實例，臨時分析應傳入 FileCatalog(":memory:")
         
     Returns:
         分割後的文件列表
@@ -45,44 +81,63 @@ def load_and_split_documents(file_paths):
             if ext == ".log" or (ext == ".txt" and "log" in Path(path).stem.lower()):
                 if HAS_LOG_PARSER and log_parser_manager:
                     print(f"📊 使用專門的 Log 解析器處理...")
-                    loaded_docs = log_parser_manager.parse_log_file(path)
+                    loaded_docs = log_parser_manager.parse_log_file(path, dedup=dedup, pending=pending, catalog=catalog)
                     
                     # 如果是大型 log 檔案，顯示分析結果
                     if file_size_mb > 1:
                         print(f"   ✅ Log 檔案分析完成：{len(loaded_docs)} 個片段")
                         
-                        # 顯示分析統計
+                        # 顯示分析統計（檔案層級的欄位在檔案目錄中）
                         if loaded_docs:
                             log_types = set(doc.metadata.get('log_type', 'unknown') for doc in loaded_docs)
                             print(f"   📋 Log 類型: {', '.join(log_types)}")
                             
+                            # 匯入知識庫時目錄在向量寫入後才寫入，本批次的分析結果從 pending 讀取
+                            file_ids = {doc.metadata.get('file_id') for doc in loaded_docs}
+                            file_infos = (catalog or get_file_catalog()).get_many(file_ids)
+                            if pending is not None:
+                                staged = {file_id: pending.claimed(('file_info', file_id)) for file_id in file_ids}
+                                file_infos.update((file_id, info) for file_id, info in staged.items() if info)
+                            file_infos = file_infos.values()
+                            
                             # 如果有錯誤統計
-                            error_docs = [doc for doc in loaded_docs if doc.metadata.get('error_count', 0) > 0]
-                            if error_docs:
-                                total_errors = sum(doc.metadata.get('error_count', 0) for doc in error_docs)
+                            total_errors = sum(info.get('error_count', 0) for info in file_infos)
+                            if total_errors:
                                 print(f"   🔍 發現 {total_errors} 個錯誤相關條目")
                             
                             # 如果有崩潰資訊
-                            crash_docs = [doc for doc in loaded_docs if doc.metadata.get('crash_type')]
-                            if crash_docs:
-                                crash_types = set(doc.metadata.get('crash_type', 'unknown') for doc in crash_docs)
+                            crash_types = set(info['crash_type'] for info in file_infos if info.get('crash_type'))
+                            if crash_types:
                                 print(f"   💥 崩潰類型: {', '.join(crash_types)}")
                 else:
                     # 降級到文字載入器
                     loader = TextLoader(path, encoding='utf-8')
                     loaded_docs = loader.load()
                     
+            elif ext in ARCHIVE_EXTENSIONS:
+                # bugreport zip / 壓縮 log：串流讀取成員，不解壓到磁碟
+                if not (HAS_LOG_PARSER and log_parser_manager):
+                    print(f"⚠️  Log 解析器不可用，無法處理壓縮檔: {ext}")
+                    continue
+                loaded_docs = log_parser_manager.parse_archive(path, dedup=dedup, pending=pending, catalog=catalog)
+                
             elif ext == ".pdf":
-                loader = PyPDFLoader(path)
-                loaded_docs = loader.load()
+                # 逐頁平行抽取、抽出即分割；pypdf 無法開啟時退回 PyPDFLoader
+                loaded_docs = load_pdf(path, get_text_splitter(), dedup=dedup, pending=pending)
+                if loaded_docs is None:
+                    loader = PyPDFLoader(path)
+                    loaded_docs = loader.load()
                 
             elif ext in [".doc", ".docx"]:
                 loader = UnstructuredWordDocumentLoader(path)
                 loaded_docs = loader.load()
                 
             elif ext in [".xls", ".xlsx"]:
-                loader = UnstructuredExcelLoader(path)
-                loaded_docs = loader.load()
+                # .xlsx 以 openpyxl 唯讀模式逐列讀取；.xls 或無法開啟時退回 UnstructuredExcelLoader
+                loaded_docs = load_excel(path) if ext == ".xlsx" else None
+                if loaded_docs is None:
+                    loader = UnstructuredExcelLoader(path)
+                    loaded_docs = loader.load()
                 
             elif ext == ".md":
                 loader = UnstructuredMarkdownLoader(path)
@@ -93,10 +148,14 @@ def load_and_split_documents(file_paths):
                 loaded_docs = loader.load()
                 
             elif ext == ".json":
-                loader = JSONLoader(path, jq_schema=".", text_content=False)
-                loaded_docs = loader.load()
+                # 增量解析，每筆記錄保持完整
+                loaded_docs = load_json(path)
+                
+            elif ext == ".csv":
+                # 逐列讀取，每個片段重複表頭
+                loaded_docs = load_csv(path)
                 
-            elif ext in [".txt", ".csv"]:
+            elif ext == ".txt":
                 # 一般文字檔案
                 loader = TextLoader(path, encoding='utf-8')
                 loaded_docs = loader.load()
@@ -105,10 +164,12 @@ def load_and_split_documents(file_paths):
                 print(f"⚠️  不支援的檔案格式: {ext}")
                 continue
 
-            # 為所有文檔添加檔案大小元數據
+            # 為所有文檔添加檔案大小元數據（已登記到檔案目錄的 log 片段除外）
             for doc in loaded_docs:
-                doc.metadata['file_size_mb'] = file_size_mb
-                doc.metadata['file_type'] = ext[1:]  # 移除點號
+                if 'file_id' not in doc.metadata:
+                    doc.metadata['file_size_mb'] = file_size_mb
+                if ext not in ARCHIVE_EXTENSIONS:
+                    doc.metadata['file_type'] = ext[1:]  # 移除點號
                 
             docs.extend(loaded_docs)
             print(f"✅ 成功載入: {Path(path).name} ({len(loaded_docs)} 個文件)")
@@ -127,18 +188,8 @@ def load_and_split_documents(file_paths):
     need_split_docs = [doc for doc in docs if not doc.metadata.get('chunk_method')]
     
     if need_split_docs:
-        # 使用配置中的 chunk_size 和 chunk_overlap
-        chunk_size = int(get_config("CHUNK_SIZE", "1000"))
-        chunk_overlap = int(get_config("CHUNK_OVERLAP", "100"))
-        
-        print(f"📄 開始分割 {len(need_split_docs)} 個文件 (chunk_size={chunk_size}, overlap={chunk_overlap})...")
-        
-        splitter = RecursiveCharacterTextSplitter(
-            chunk_size=chunk_size, 
-            chunk_overlap=chunk_overlap,
-            length_function=len,
-            separators=["\n\n", "\n", "。", "！", "？", ".", "!", "?", " ", ""]
-        )
+        print(f"📄 開始分割 {len(need_split_docs)} 個文件...")
+        splitter = get_text_splitter()
         
         split_docs = splitter.split_documents(need_split_docs)
         print(f"✅ 文件分割完成，新增 {len(split_docs)} 個片段")
@@ -148,6 +199,15 @@ def load_and_split_documents(file_paths):
     else:
         all_docs = already_split_docs
     
+    # 嵌入前去除近似重複的片段（跨檔案、跨次匯入的比對只在建立知識庫時進行）
+    if get_config("CHUNK_DEDUP", "true").lower() == "true":
+        try:
+            record_index = LogRecordIndex(catalog) if catalog is not None else None
+            all_docs, _ = deduplicate_chunks(all_docs, persistent=dedup, pending=pending,
+                                             record_index=record_index)
+        except Exception as e:
+            print(f"⚠️ 片段去重失敗，保留所有片段: {e}")
+    
     print(f"📚 總共處理完成 {len(all_docs)} 個文檔片段")
     
     # 顯示處理統計
@@ -0,0 +1,219 @@
+"""
+檔案目錄（File Catalog）
+
+每個檔案的結構分析結果（log_info）只存一份在 SQLite 側表中，以內容雜湊的
+file_id 為鍵；片段（chunk）的 metadata 只保留 file_id 與片段本身的欄位，
+檢索後再透過 attach_file_metadata 把檔案層級的欄位補回來。
+"""
+
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+
+from config import get_config
+
+
+def compute_file_id(content: str) -> str:
+    """
+    計算檔案 ID（內容的 SHA-1 雜湊，前 16 碼）
+
+    內容相同的檔案得到相同的 ID，因此重複上傳不會產生重複的目錄項目。
+
+    Args:
+        content: 檔案內容
+
+    Returns:
+        檔案 ID
+    """
+    return hashlib.sha1(content.encode("utf-8", errors="ignore")).hexdigest()[:16]
+
+
+class FileCatalog:
+    """以 SQLite 保存每個檔案的分析結果"""
+
+    def __init__(self, db_path: Optional[str] = None):
+        """
+        初始化目錄
+
+        Args:
+            db_path: SQLite 檔案路徑（預設讀取 FILE_CATALOG_PATH）
+        """
+        self.db_path = db_path or get_config("FILE_CATALOG_PATH", "vector_db/catalog.sqlite3")
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.db_path != ":memory:":
+                Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS files (
+                    file_id    TEXT PRIMARY KEY,
+                    source     TEXT,
+                    sources    TEXT,
+                    log_type   TEXT,
+                    info       TEXT NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            # 舊版目錄沒有 sources 欄位
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(files)")}
+            if "sources" not in columns:
+                self._conn.execute("ALTER TABLE files ADD COLUMN sources TEXT")
+            self._conn.commit()
+        return self._conn
+
+    @contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """
+        取得連線並在區塊結束時提交（同一個目錄的其他側表也透過這裡存取）
+
+        Yields:
+            sqlite3 連線
+        """
+        with self._lock:
+            conn = self._connect()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def put(self, file_id: str, source: str, info: Dict[str, Any]):
+        """
+        寫入（或覆寫）檔案的分析結果
+
+        相同內容（相同 file_id）從不同路徑匯入時，source 保留第一次的路徑，
+        所有路徑累積在 sources 中。
+
+        Args:
+            file_id: 檔案 ID
+            source: 檔案路徑
+            info: 檔案層級的分析結果
+        """
+        with self.transaction() as conn:
+            row = conn.execute("SELECT source, sources FROM files WHERE file_id = ?", (file_id,)).fetchone()
+            sources = []
+            if row is not None:
+                sources = json.loads(row[1]) if row[1] else [row[0]]
+            if source not in sources:
+                sources.append(source)
+            conn.execute(
+                "INSERT OR REPLACE INTO files (file_id, source, sources, log_type, info, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (file_id, sources[0], json.dumps(sources, ensure_ascii=False), info.get("log_type"),
+                 json.dumps(info, ensure_ascii=False, default=str), time.time()),
+            )
+
+    def get(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """讀取單一檔案的分析結果"""
+        return self.get_many([file_id]).get(file_id)
+
+    def get_many(self, file_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        批次讀取多個檔案的分析結果
+
+        Args:
+            file_ids: 檔案 ID 列表
+
+        Returns:
+            file_id -> 分析結果（含 sources：匯入過這份內容的所有路徑）
+        """
+        ids = list({fid for fid in file_ids if fid})
+        if not ids:
+            return {}
+
+        result = {}
+        with self.transaction() as conn:
+            # SQLite 參數上限為 999，分批查詢
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT file_id, info, source, sources FROM files WHERE file_id IN ({placeholders})", batch
+                ).fetchall()
+                for file_id, info, source, sources in rows:
+                    result[file_id] = json.loads(info)
+                    result[file_id]['sources'] = json.loads(sources) if sources else [source]
+        return result
+
+    def clear(self):
+        """清空目錄中的所有表"""
+        with self.transaction() as conn:
+            tables = [row[0] for row in conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+            )]
+            for table in tables:
+                conn.execute(f"DELETE FROM {table}")
+
+    def close(self):
+        """關閉連線"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 全局實例
+_catalog: Optional[FileCatalog] = None
+_catalog_lock = threading.Lock()
+
+
+def get_file_catalog() -> FileCatalog:
+    """獲取檔案目錄實例（單例模式）"""
+    global _catalog
+    with _catalog_lock:
+        if _catalog is None:
+            _catalog = FileCatalog()
+        return _catalog
+
+
+def attach_file_metadata(docs: List[Any], catalog: Optional[FileCatalog] = None) -> List[Any]:
+    """
+    把檔案層級的欄位補回檢索到的片段
+
+    片段自身已有的欄位優先，不會被檔案層級的值覆蓋。
+
+    Args:
+        docs: Document 列表（metadata 中帶有 file_id）
+        catalog: 檔案目錄（預設使用全局實例；臨時分析傳入該次的記憶體目錄）
+
+    Returns:
+        同一份 Document 列表
+    """
+    file_ids = [doc.metadata.get("file_id") for doc in docs]
+    if not any(file_ids):
+        return docs
+
+    try:
+        infos = (catalog or get_file_catalog()).get_many(file_ids)
+    except sqlite3.Error as e:
+        print(f"⚠️ 讀取檔案目錄失敗: {e}")
+        return docs
+
+    for doc in docs:
+        info = infos.get(doc.metadata.get("file_id"))
+        if not info:
+            continue
+        for key, value in info.items():
+            doc.metadata.setdefault(key, value)
+    return docs
+
+
+def clear_catalog():
+    """清空檔案目錄"""
+    try:
+        get_file_catalog().clear()
+        print("✅ 已清空檔案目錄")
+    except sqlite3.Error as e:
+        print(f"⚠️ 清空檔案目錄失敗: {e}")
@@ -6,7 +6,9 @@
 
 from typing import List, Dict, Any
 import re
+from config import get_config
 from .base_log_parser import BaseLogParser
+from .log_template_miner import collapse_repetitive_lines
 from langchain.schema import Document
 
 
@@ -33,6 +35,8 @@ class GeneralLogParser(BaseLogParser):
         return {
             'timestamp': r'\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}',
             'iso_timestamp': r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}',
+            # 時間範圍：ISO / Log4j（含小數秒）與 logcat（MM-DD HH:MM:SS.mmm）
+            'time_range': r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}(?:[.,]\d+)?|(?<![\d-])\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:\.\d+)?',
             'level': r'\b(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL|FATAL|TRACE)\b',
             'ip': r'\b\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}\b',
             'error_keywords': r'(error|exception|failed|failure|critical|fatal|panic|crash)',
@@ -66,7 +70,7 @@ class GeneralLogParser(BaseLogParser):
         python_traces = len(re.findall(patterns['python_trace'], content, re.MULTILINE))
         
         # 提取時間範圍
-        time_range = self.extract_time_range(content)
+        time_range = self.extract_time_range(content, patterns['time_range'])
         
         return {
             'total_lines': total_lines,
@@ -105,6 +109,10 @@ class GeneralLogParser(BaseLogParser):
         """解析一般 log 內容"""
         documents = []
         
+        # 嵌入前以模板挖掘收斂連續重複的行，模板表留在 log_info 供寫入索引
+        if get_config("LOG_TEMPLATE_MINING", "true").lower() == "true":
+            content = self._collapse_templates(content, log_info)
+        
         # 根據嚴重程度選擇解析策略
         severity_score = log_info.get('severity_score', 0)
         
@@ -123,6 +131,28 @@ class GeneralLogParser(BaseLogParser):
         
         return documents
     
+    def _collapse_templates(self, content: str, log_info: Dict[str, Any]) -> str:
+        """
+        收斂連續出現的同一模板
+        
+        Args:
+            content: log 內容
+            log_info: 結構分析結果（寫入模板統計與模板表）
+            
+        Returns:
+            收斂後的內容
+        """
+        collapsed_content, miner, collapsed = collapse_repetitive_lines(content)
+        table_size = int(get_config("LOG_TEMPLATE_TABLE_SIZE", "100"))
+        
+        log_info['template_count'] = len(miner.clusters)
+        log_info['collapsed_lines'] = collapsed
+        log_info['log_templates'] = miner.template_table(table_size)
+        
+        if collapsed:
+            print(f"🧬 模板挖掘: {len(miner.clusters)} 個模板，收斂 {collapsed} 行重複內容")
+        return collapsed_content
+    
     def _parse_by_errors(self, content: str, file_path: str, log_info: Dict[str, Any]) -> List[Document]:
         """按錯誤分組解析"""
         documents = []
@@ -4,12 +4,18 @@ Log 解析器管理器
 自動識別和分配適當的 log 解析器
 """
 
-from typing import List, Optional, Type
+import hashlib
+from typing import List, Optional, Type, Tuple, Callable
 from pathlib import Path
+from config import get_config
 from .base_log_parser import BaseLogParser
+from .file_catalog import FileCatalog
+from .pending_writes import PendingIndexWrites
 from .general_log_parser import GeneralLogParser
 from .android_anr_parser import AndroidANRParser
 from .android_tombstone_parser import AndroidTombstoneParser
+from .android_logcat_parser import AndroidLogcatParser
+from .archive_reader import iter_archive_members, iter_unit_segments, route_member, looks_binary
 
 
 class LogParserManager:
@@ -19,17 +25,23 @@ class LogParserManager:
         """初始化管理器"""
         # 註冊所有可用的解析器（優先順序由高到低）
         self.parsers: List[Type[BaseLogParser]] = [
+            AndroidLogcatParser,     # Android Logcat（多數行符合 logcat 格式才會選用）
             AndroidANRParser,        # Android ANR
             AndroidTombstoneParser,  # Android Tombstone
             GeneralLogParser,        # 通用 log（放最後作為 fallback）
         ]
     
-    def parse_log_file(self, file_path: str) -> List:
+    def parse_log_file(self, file_path: str, dedup: bool = True,
+                       pending: Optional[PendingIndexWrites] = None,
+                       catalog: Optional[FileCatalog] = None) -> List:
         """
         自動識別並解析 log 檔案
         
         Args:
             file_path: log 檔案路徑
+            dedup: 是否依崩潰簽名去重
+            pending: 延後寫入佇列（崩潰出現次數等向量寫入成功後才記錄）
+            catalog: 寫入分析結果的檔案目錄（預設使用全局實例）
             
         Returns:
             Document 列表
@@ -43,29 +55,189 @@ class LogParserManager:
             print(f"❌ 無法讀取檔案 {file_path}: {e}")
             return []
         
+        documents, _ = self._parse_with_registry(
+            file_path, content_sample,
+            lambda parser: parser.parse_log_file(file_path, dedup=dedup, pending=pending, catalog=catalog)
+        )
+        return documents
+    
+    def parse_text(self, content: str, source: str, dedup: bool = True,
+                   log_type: Optional[str] = None,
+                   pending: Optional[PendingIndexWrites] = None,
+                   catalog: Optional[FileCatalog] = None,
+                   file_id: Optional[str] = None, unit_offset: int = 0,
+                   unit_total: Optional[int] = None) -> Tuple[List, BaseLogParser]:
+        """
+        自動識別並解析已讀入記憶體的 log 內容
+        
+        Args:
+            content: log 內容
+            source: 來源標識
+            dedup: 是否依崩潰簽名去重
+            log_type: 指定的 log 類型（略過自動識別）
+            pending: 延後寫入佇列（崩潰出現次數等向量寫入成功後才記錄）
+            catalog: 寫入分析結果的檔案目錄（預設使用全局實例）
+            file_id: 整個檔案的 ID（content 只是檔案的一個區段時提供）
+            unit_offset: content 第一個單元在整個檔案中的序號
+            unit_total: 整個檔案的單元總數
+            
+        Returns:
+            (Document 列表, 實際使用的解析器)
+        """
+        return self._parse_with_registry(
+            source, content[:5000],
+            lambda parser: parser.parse_text(content, source, dedup=dedup, pending=pending, catalog=catalog,
+                                             file_id=file_id, unit_offset=unit_offset, unit_total=unit_total),
+            log_type
+        )
+    
+    def parse_archive(self, archive_path: str, dedup: bool = True,
+                      pending: Optional[PendingIndexWrites] = None,
+                      catalog: Optional[FileCatalog] = None) -> List:
+        """
+        直接串流解析壓縮檔（bugreport zip、.gz、.zst），不解壓到磁碟
+        
+        FS/data/tombstones/* 與 anr/* 成員依路徑指定解析器，其餘成員依開頭內容識別。
+        大型成員只在單元邊界（ANR 進程、tombstone 崩潰）切成區段逐段解析，
+        各區段共用成員的 file_id 與單元序號，結果與一次解析整個成員相同。
+        
+        Args:
+            archive_path: 壓縮檔路徑
+            dedup: 是否依崩潰簽名去重
+            pending: 延後寫入佇列（崩潰出現次數等向量寫入成功後才記錄）
+            catalog: 寫入分析結果的檔案目錄（預設使用全局實例）
+            
+        Returns:
+            Document 列表
+        """
+        segment_chars = int(float(get_config("ARCHIVE_SEGMENT_MB", "8")) * 1024 * 1024)
+        archive_name = Path(archive_path).name
+        documents = []
+        member_count = 0
+        
+        for member_name, open_member in iter_archive_members(archive_path):
+            source = f"{archive_path}!{member_name}"
+            
+            try:
+                with open_member() as stream:
+                    sample = stream.read(5000).decode("utf-8", errors="ignore")
+                if looks_binary(sample):
+                    continue
+                member_count += 1
+                print(f"📦 {archive_name} → {member_name}")
+                
+                log_type = route_member(member_name) or self.detect_log_type(source, sample)
+                split_units = self._parser_class(log_type)().split_units
+                
+                # 第一遍：計算整個成員的 file_id 與單元總數；只有一個區段時直接解析，不再讀第二遍
+                digest = hashlib.sha1()
+                segment_count = unit_total = 0
+                first_segment = None
+                with open_member() as stream:
+                    for segment, unit_count in iter_unit_segments(stream, segment_chars, split_units):
+                        digest.update(segment.encode("utf-8", errors="ignore"))
+                        first_segment = segment if segment_count == 0 else None
+                        segment_count += 1
+                        unit_total += unit_count
+                
+                if segment_count <= 1:
+                    if first_segment:
+                        member_docs, _ = self.parse_text(
+                            first_segment, source, dedup=dedup, log_type=log_type, pending=pending, catalog=catalog
+                        )
+                        documents.extend(member_docs)
+                    continue
+                
+                file_id = digest.hexdigest()[:16]
+                unit_offset = 0
+                with open_member() as stream:
+                    for index, (segment, unit_count) in enumerate(
+                            iter_unit_segments(stream, segment_chars, split_units)):
+                        segment_docs, _ = self.parse_text(
+                            segment, source, dedup=dedup, log_type=log_type, pending=pending, catalog=catalog,
+                            file_id=file_id, unit_offset=unit_offset, unit_total=unit_total
+                        )
+                        unit_offset += unit_count
+                        for doc in segment_docs:
+                            doc.metadata['archive_segment'] = index
+                        documents.extend(segment_docs)
+            except Exception as e:
+                print(f"⚠️ 讀取壓縮檔成員失敗 {member_name}: {e}")
+                continue
+        
+        print(f"✅ 壓縮檔解析完成: {archive_name}（{member_count} 個成員，{len(documents)} 個片段）")
+        return documents
+    
+    def detect_log_type(self, source: str, content_sample: str) -> str:
+        """
+        依註冊順序識別 log 類型（不解析）
+        
+        Args:
+            source: 來源標識
+            content_sample: 內容樣本
+            
+        Returns:
+            第一個符合的解析器的 log 類型，都不符合時為通用 log
+        """
+        for parser_class in self.parsers:
+            parser = parser_class()
+            if parser.can_parse(source, content_sample):
+                return parser.get_log_type()
+        return GeneralLogParser().get_log_type()
+    
+    def _parser_class(self, log_type: str) -> Type[BaseLogParser]:
+        """依 log 類型找到註冊的解析器類（找不到時為通用解析器）"""
+        for parser_class in self.parsers:
+            if parser_class().get_log_type() == log_type:
+                return parser_class
+        return GeneralLogParser
+    
+    def _parse_with_registry(self, source: str, content_sample: str,
+                             parse: Callable[[BaseLogParser], List],
+                             log_type: Optional[str] = None) -> Tuple[List, BaseLogParser]:
+        """
+        依註冊順序挑選解析器並執行解析
+        
+        Args:
+            source: 來源標識（用於識別與輸出）
+            content_sample: 內容樣本
+            parse: 以解析器執行解析的函數
+            log_type: 指定的 log 類型（略過 can_parse 檢查）
+            
+        Returns:
+            (Document 列表, 實際使用的解析器)
+        """
         # 嘗試每個解析器
         for parser_class in self.parsers:
             parser = parser_class()
             
             # 檢查是否能解析
-            if parser.can_parse(file_path, content_sample):
-                print(f"🔍 使用 {parser.get_log_type()} 解析器處理: {Path(file_path).name}")
+            if log_type:
+                matched = parser.get_log_type() == log_type
+            else:
+                matched = parser.can_parse(source, content_sample)
+            
+            if matched:
+                print(f"🔍 使用 {parser.get_log_type()} 解析器處理: {Path(source).name}")
                 
                 # 執行解析
                 try:
-                    documents = parser.parse_log_file(file_path)
-                    if documents:
-                        print(f"✅ 成功解析為 {len(documents)} 個片段")
-                        return documents
+                    documents = parse(parser)
                 except Exception as e:
                     print(f"⚠️ {parser.get_log_type()} 解析失敗: {e}")
                     # 繼續嘗試下一個解析器
                     continue
+                
+                # 解析成功（即使沒有片段）就停止：目錄、崩潰次數與記錄索引已由這個解析器寫入，
+                # 再交給其他解析器會以另一個解析器重複寫入同一份內容
+                if documents:
+                    print(f"✅ 成功解析為 {len(documents)} 個片段")
+                return documents, parser
         
         # 如果沒有解析器能處理，使用通用解析器作為最後手段
         print(f"⚠️ 無特定解析器匹配，使用通用解析器")
         general_parser = GeneralLogParser()
-        return general_parser.parse_log_file(file_path)
+        return parse(general_parser), general_parser
     
     def get_available_parsers(self) -> List[str]:
         """獲取所有可用的解析器類型"""
@@ -0,0 +1,494 @@
+"""
+Log 記錄索引
+
+解析時為每個 log 片段抽取結構化欄位（時間範圍、等級、pid/tid、tag），
+連同檔案層級的 package / crash_type / severity 寫入檔案目錄中的側表。
+查詢時以規則從問題中解析條件（時間、等級、package、pid...），先在索引中
+篩出候選片段，再把 chunk_id 清單當作向量搜尋的前置過濾條件。
+"""
+
+import re
+import calendar
+from collections import Counter
+from typing import List, Dict, Any, Optional, Iterable
+
+from config import get_config
+from .file_catalog import FileCatalog, get_file_catalog
+
+# 等級排序（數字越大越嚴重）
+LEVEL_RANKS = {
+    'V': 0, 'VERBOSE': 0, 'TRACE': 0,
+    'D': 1, 'DEBUG': 1,
+    'I': 2, 'INFO': 2,
+    'W': 3, 'WARN': 3, 'WARNING': 3,
+    'E': 4, 'ERROR': 4,
+    'F': 5, 'A': 5, 'FATAL': 5, 'CRITICAL': 5,
+}
+
+# 沒有等級字樣的片段（tombstone、ANR traces）依檔案嚴重程度推定等級
+SEVERITY_LEVELS = {'critical': 5, 'high': 5, 'medium': 4, 'low': 3}
+
+# 片段中最多記錄幾個不同的 pid / tid / tag
+MAX_DISTINCT_VALUES = 20
+
+_ISO_TIMESTAMP = re.compile(r'(\d{4})-(\d{2})-(\d{2})[ T](\d{2}):(\d{2}):(\d{2})')
+_LOGCAT_TIMESTAMP = re.compile(r'(?<![\d-])(\d{2})-(\d{2}) (\d{2}):(\d{2}):(\d{2})')
+_WORD_LEVEL = re.compile(r'\b(VERBOSE|TRACE|DEBUG|INFO|WARNING|WARN|ERROR|FATAL|CRITICAL)\b')
+# logcat threadtime：01-15 10:30:45.123  1234  1250 E Tag: message
+_THREADTIME = re.compile(r'^\d{2}-\d{2} [\d:.]+\s+(\d+)\s+(\d+) ([VDIWEFA]) ([^:]*?)\s*: ', re.MULTILINE)
+# logcat brief：E/Tag( 1234): message
+_BRIEF = re.compile(r'^([VDIWEFA])/([^(]+?)\(\s*(\d+)\): ', re.MULTILINE)
+_PID_TID = re.compile(r'pid: (\d+), tid: (\d+)')
+_ANR_PID = re.compile(r'----- pid (\d+) at')
+# 摘要片段與 Java 崩潰：PID/TID: 1234/1250、Process: com.foo, PID: 1234
+_SUMMARY_PID = re.compile(r'\bPID(?:/TID)?: (\d+)(?:/(\d+))?')
+# 套件名稱（com.example.app；類別名稱 com.example.app.MainActivity 只取到套件部分）
+_PACKAGE = re.compile(r'(?<![\w.])([a-z][a-z0-9_]*(?:\.[a-z][a-z0-9_]*)+)\b(?!\()')
+# JDK / 執行環境的命名空間不是應用程式套件
+_RUNTIME_PREFIXES = ('java.', 'javax.', 'kotlin.', 'kotlinx.', 'dalvik.', 'libcore.', 'sun.', 'jdk.')
+_FILE_SUFFIXES = ('.log', '.txt', '.zip', '.gz', '.zst', '.json', '.md', '.pdf', '.html', '.csv', '.so', '.java')
+
+
+def _seconds_of_day(hour: str, minute: str, second: str) -> int:
+    return int(hour) * 3600 + int(minute) * 60 + int(second)
+
+
+def _join_values(values: Counter) -> Optional[str]:
+    if not values:
+        return None
+    return ",".join(str(v) for v, _ in values.most_common(MAX_DISTINCT_VALUES))
+
+
+def find_package_names(text: str) -> List[str]:
+    """依出現順序列出看起來像套件名稱的字串（未過濾，需再以 is_app_package 判斷）"""
+    return _PACKAGE.findall(text)
+
+
+def is_app_package(name: str) -> bool:
+    """排除檔名與 JDK / 執行環境的命名空間"""
+    return not name.endswith(_FILE_SUFFIXES) and not name.startswith(_RUNTIME_PREFIXES)
+
+
+def _package_counts(text: str) -> Counter:
+    return Counter(name for name in _PACKAGE.findall(text) if is_app_package(name))
+
+
+def extract_packages(text: str) -> Optional[str]:
+    """
+    抽取片段中出現的套件名稱
+
+    Args:
+        text: 片段內容
+
+    Returns:
+        逗號分隔的套件名稱（依出現次數排序），沒有時返回 None
+    """
+    return _join_values(_package_counts(text))
+
+
+def extract_chunk_fields(text: str) -> Dict[str, Any]:
+    """
+    從片段內容抽取結構化欄位
+
+    Args:
+        text: 片段內容
+
+    Returns:
+        欄位字典（只包含找得到的欄位）：
+        time_start / time_end（epoch 秒，需有年份）、tod_start / tod_end（當日秒數）、
+        max_level（等級排序）、pids / tids / tags / packages（逗號分隔）
+    """
+    fields: Dict[str, Any] = {}
+    epochs = []
+    tods = []
+
+    for m in _ISO_TIMESTAMP.finditer(text):
+        year, month, day, hour, minute, second = m.groups()
+        try:
+            epochs.append(calendar.timegm((int(year), int(month), int(day),
+                                           int(hour), int(minute), int(second))))
+        except (ValueError, OverflowError):
+            continue
+        tods.append(_seconds_of_day(hour, minute, second))
+
+    for m in _LOGCAT_TIMESTAMP.finditer(text):
+        tods.append(_seconds_of_day(m.group(3), m.group(4), m.group(5)))
+
+    if epochs:
+        fields['time_start'] = min(epochs)
+        fields['time_end'] = max(epochs)
+    if tods:
+        fields['tod_start'] = min(tods)
+        fields['tod_end'] = max(tods)
+
+    levels = set(_WORD_LEVEL.findall(text))
+    pids, tids, tags = Counter(), Counter(), Counter()
+
+    for pid, tid, level, tag in _THREADTIME.findall(text):
+        pids[int(pid)] += 1
+        tids[int(tid)] += 1
+        levels.add(level)
+        if tag.strip():
+            tags[tag.strip()] += 1
+
+    for level, tag, pid in _BRIEF.findall(text):
+        pids[int(pid)] += 1
+        levels.add(level)
+        tags[tag.strip()] += 1
+
+    for pid, tid in _PID_TID.findall(text):
+        pids[int(pid)] += 1
+        tids[int(tid)] += 1
+
+    for pid in _ANR_PID.findall(text):
+        pids[int(pid)] += 1
+
+    for pid, tid in _SUMMARY_PID.findall(text):
+        pids[int(pid)] += 1
+        if tid:
+            tids[int(tid)] += 1
+
+    packages = _package_counts(text)
+
+    if levels:
+        fields['max_level'] = max(LEVEL_RANKS[level] for level in levels)
+    for key, values in (('pids', pids), ('tids', tids), ('tags', tags), ('packages', packages)):
+        joined = _join_values(values)
+        if joined:
+            fields[key] = joined
+
+    return fields
+
+
+class LogRecordIndex:
+    """log 片段的結構化索引（存放在檔案目錄的 SQLite 中）"""
+
+    def __init__(self, catalog: Optional[FileCatalog] = None):
+        """
+        初始化索引
+
+        Args:
+            catalog: 檔案目錄（預設使用全局實例）
+        """
+        self._catalog = catalog
+        self._schema_conn = None
+
+    @property
+    def catalog(self) -> FileCatalog:
+        return self._catalog or get_file_catalog()
+
+    def _ensure_schema(self, conn):
+        if self._schema_conn is conn:
+            return
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS log_chunks (
+                chunk_id   TEXT PRIMARY KEY,
+                file_id    TEXT,
+                log_type   TEXT,
+                time_start REAL,
+                time_end   REAL,
+                tod_start  INTEGER,
+                tod_end    INTEGER,
+                max_level  INTEGER,
+                pids       TEXT,
+                tids       TEXT,
+                tags       TEXT,
+                packages   TEXT,
+                crash_type TEXT,
+                severity   TEXT
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_log_chunks_time ON log_chunks (time_start, time_end)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_log_chunks_tod ON log_chunks (tod_start, tod_end)")
+        self._schema_conn = conn
+
+    def add_chunks(self, documents: List[Any], log_info: Dict[str, Any]):
+        """
+        寫入片段的結構化欄位
+
+        片段自身沒有時間、pid 或等級時，沿用檔案層級的時間戳、pid/tid 與嚴重程度
+        （如 ANR / tombstone 的 backtrace、線程片段）。
+
+        Args:
+            documents: 帶有 chunk_id 的 Document 列表
+            log_info: 檔案（或單元）層級的分析結果
+        """
+        file_fields = extract_chunk_fields(str(log_info.get('timestamp') or ''))
+        package = log_info.get('package_name') or log_info.get('process_name')
+        severity_level = SEVERITY_LEVELS.get(log_info.get('severity'))
+        file_pid = str(log_info['pid']) if log_info.get('pid') is not None else None
+        file_tid = str(log_info['tid']) if log_info.get('tid') is not None else None
+        rows = []
+        for doc in documents:
+            meta = doc.metadata
+            if not meta.get('chunk_id'):
+                continue
+            packages = meta.get('packages')
+            if package and package not in (packages or '').split(','):
+                packages = f"{package},{packages}" if packages else package
+            rows.append((
+                meta['chunk_id'], meta.get('file_id'), meta.get('log_type'),
+                meta.get('time_start', file_fields.get('time_start')),
+                meta.get('time_end', file_fields.get('time_end')),
+                meta.get('tod_start', file_fields.get('tod_start')),
+                meta.get('tod_end', file_fields.get('tod_end')),
+                meta.get('max_level', severity_level),
+                _wrap(meta.get('pids', file_pid)), _wrap(meta.get('tids', file_tid)), _wrap(meta.get('tags')),
+                _wrap(packages), meta.get('crash_type', log_info.get('crash_type')),
+                meta.get('severity', log_info.get('severity')),
+            ))
+        if not rows:
+            return
+
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            conn.executemany(
+                "INSERT OR REPLACE INTO log_chunks (chunk_id, file_id, log_type, time_start, time_end, "
+                "tod_start, tod_end, max_level, pids, tids, tags, packages, crash_type, severity) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+
+    def remove_chunks(self, chunk_ids: Iterable[str]):
+        """
+        刪除片段的結構化欄位（片段在嵌入前被去重略過時使用）
+
+        Args:
+            chunk_ids: chunk_id 列表
+        """
+        chunk_ids = list(chunk_ids)
+        if not chunk_ids:
+            return
+
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            conn.executemany("DELETE FROM log_chunks WHERE chunk_id = ?", [(chunk_id,) for chunk_id in chunk_ids])
+
+    def query_chunk_ids(self, constraints: Dict[str, Any], limit: Optional[int] = None) -> List[str]:
+        """
+        依條件篩選片段
+
+        Args:
+            constraints: parse_query_constraints 的結果
+            limit: 最多返回幾個 chunk_id
+
+        Returns:
+            符合條件的 chunk_id 列表
+        """
+        where = []
+        params: List[Any] = []
+
+        if 'time_start' in constraints or 'time_end' in constraints:
+            # 與查詢時間區間有重疊的片段
+            if 'time_end' in constraints:
+                where.append("time_start <= ?")
+                params.append(constraints['time_end'])
+            if 'time_start' in constraints:
+                where.append("time_end >= ?")
+                params.append(constraints['time_start'])
+        if 'tod_start' in constraints or 'tod_end' in constraints:
+            if 'tod_end' in constraints:
+                where.append("tod_start <= ?")
+                params.append(constraints['tod_end'])
+            if 'tod_start' in constraints:
+                where.append("tod_end >= ?")
+                params.append(constraints['tod_start'])
+        if 'min_level' in constraints:
+            where.append("max_level >= ?")
+            params.append(constraints['min_level'])
+        if 'package' in constraints:
+            # 前綴比對：com.foo 也符合 com.foo.bar
+            where.append("(packages LIKE ? OR packages LIKE ?)")
+            params.extend([f"%,{constraints['package']},%", f"%,{constraints['package']}.%"])
+        for key, column in (('pid', 'pids'), ('tid', 'tids'), ('tag', 'tags')):
+            if key in constraints:
+                where.append(f"{column} LIKE ?")
+                params.append(f"%,{constraints[key]},%")
+        if 'crash_type' in constraints:
+            where.append("crash_type = ?")
+            params.append(constraints['crash_type'])
+        if 'severity' in constraints:
+            where.append("severity IN (%s)" % ",".join("?" * len(constraints['severity'])))
+            params.extend(constraints['severity'])
+
+        if not where:
+            return []
+
+        sql = "SELECT chunk_id FROM log_chunks WHERE " + " AND ".join(where)
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            return [row[0] for row in conn.execute(sql, params)]
+
+
+def _wrap(values: Optional[str]) -> Optional[str]:
+    """前後加上逗號，方便以 LIKE '%,值,%' 精確比對"""
+    return f",{values}," if values else None
+
+
+# 全局實例
+_record_index: Optional[LogRecordIndex] = None
+
+
+def get_log_record_index() -> LogRecordIndex:
+    """獲取 log 記錄索引實例（單例模式）"""
+    global _record_index
+    if _record_index is None:
+        _record_index = LogRecordIndex()
+    return _record_index
+
+
+# ===== 查詢條件解析（規則式） =====
+
+_TIME = r'(\d{1,2}):(\d{2})(?::(\d{2}))?'
+_DATE = r'(\d{4})-(\d{2})-(\d{2})'
+_TIME_RANGE = re.compile(
+    rf'(?:between|from|從|在)?\s*(?:{_DATE}\s+)?{_TIME}\s*(?:and|to|until|-|~|到|至)\s*(?:{_DATE}\s+)?{_TIME}',
+    re.IGNORECASE
+)
+_TIME_AFTER = re.compile(rf'(?:after|since)\s+(?:{_DATE}\s+)?{_TIME}|(?:{_DATE}\s+)?{_TIME}\s*(?:之後|以後)', re.IGNORECASE)
+_TIME_BEFORE = re.compile(rf'before\s+(?:{_DATE}\s+)?{_TIME}|(?:{_DATE}\s+)?{_TIME}\s*(?:之前|以前)', re.IGNORECASE)
+_PID = re.compile(r'\bpid\s*[:=]?\s*(\d+)', re.IGNORECASE)
+_TID = re.compile(r'\btid\s*[:=]?\s*(\d+)', re.IGNORECASE)
+_TAG = re.compile(r'\btag\s*[:=]?\s*([\w.$-]+)', re.IGNORECASE)
+
+_LEVEL_WORDS = [
+    (re.compile(r'\b(fatal|crash(?:es|ed)?)\b(?!\.)|致命|崩潰', re.IGNORECASE), 5),
+    (re.compile(r'\b(errors?|exceptions?|failures?|failed)\b|錯誤|異常|失敗', re.IGNORECASE), 4),
+    (re.compile(r'\b(warn(?:ing)?s?)\b|警告', re.IGNORECASE), 3),
+]
+_CRASH_TYPE_WORDS = [
+    (re.compile(r'null pointer|\bnpe\b|空指針|空指標', re.IGNORECASE), 'null_pointer_dereference'),
+    (re.compile(r'segfault|segmentation fault', re.IGNORECASE), 'segmentation_fault'),
+    (re.compile(r'assertion|斷言', re.IGNORECASE), 'assertion_failure'),
+    (re.compile(r'heap corruption|堆損壞', re.IGNORECASE), 'heap_corruption'),
+    (re.compile(r'stack corruption|堆疊損壞', re.IGNORECASE), 'stack_corruption'),
+]
+# 明確指向 log 的結構化條件；只有等級 / 崩潰類型 / 嚴重程度用詞（error、警告…）時不過濾，
+# 否則一般文件的問題也會被限制在 log 片段中
+_ANCHOR_KEYS = ('time_start', 'time_end', 'tod_start', 'tod_end', 'pid', 'tid', 'package', 'tag')
+
+_SEVERITY_WORDS = [
+    (re.compile(r'\bcritical\b|嚴重', re.IGNORECASE), ['critical']),
+    (re.compile(r'\bhigh severity\b|高嚴重', re.IGNORECASE), ['critical', 'high']),
+]
+
+
+def _bound(groups, offset: int) -> Dict[str, int]:
+    """把 (年, 月, 日, 時, 分, 秒) 的 regex 群組轉成 epoch 或當日秒數"""
+    year, month, day, hour, minute, second = groups[offset:offset + 6]
+    tod = _seconds_of_day(hour, minute, second or 0)
+    if year:
+        epoch = calendar.timegm((int(year), int(month), int(day), int(hour), int(minute), int(second or 0)))
+        return {'epoch': epoch, 'tod': tod}
+    return {'tod': tod}
+
+
+def _set_time(constraints: Dict[str, Any], side: str, bound: Dict[str, int], inclusive_minute: bool):
+    tod = bound['tod'] + (59 if inclusive_minute else 0)
+    if 'epoch' in bound:
+        constraints[f'time_{side}'] = bound['epoch'] + (59 if inclusive_minute else 0)
+    else:
+        constraints[f'tod_{side}'] = tod
+
+
+def parse_query_constraints(query: str) -> Dict[str, Any]:
+    """
+    以規則從問題中解析結構化條件
+
+    例如「errors from com.foo between 10:02 and 10:05」會得到
+    {'min_level': 4, 'package': 'com.foo', 'tod_start': 36120, 'tod_end': 36359}。
+
+    Args:
+        query: 使用者問題
+
+    Returns:
+        條件字典（沒有任何條件時為空字典）
+    """
+    constraints: Dict[str, Any] = {}
+
+    match = _TIME_RANGE.search(query)
+    if match:
+        groups = match.groups()
+        _set_time(constraints, 'start', _bound(groups, 0), False)
+        # 只寫到分鐘時，區間包含結束那一分鐘
+        _set_time(constraints, 'end', _bound(groups, 6), groups[11] is None)
+    else:
+        after = _TIME_AFTER.search(query)
+        if after:
+            groups = after.groups()
+            offset = 0 if any(groups[:6]) else 6
+            _set_time(constraints, 'start', _bound(groups, offset), False)
+        before = _TIME_BEFORE.search(query)
+        if before:
+            groups = before.groups()
+            offset = 0 if any(groups[:6]) else 6
+            _set_time(constraints, 'end', _bound(groups, offset), False)
+
+    for pattern, rank in _LEVEL_WORDS:
+        if pattern.search(query):
+            constraints['min_level'] = rank
+            break
+
+    for candidate in _PACKAGE.findall(query):
+        if not candidate.lower().endswith(_FILE_SUFFIXES):
+            constraints['package'] = candidate
+            break
+
+    for key, pattern in (('pid', _PID), ('tid', _TID)):
+        found = pattern.search(query)
+        if found:
+            constraints[key] = int(found.group(1))
+    tag = _TAG.search(query)
+    if tag:
+        constraints['tag'] = tag.group(1)
+
+    for pattern, crash_type in _CRASH_TYPE_WORDS:
+        if pattern.search(query):
+            constraints['crash_type'] = crash_type
+            break
+    for pattern, severities in _SEVERITY_WORDS:
+        if pattern.search(query):
+            constraints['severity'] = severities
+            break
+
+    return constraints
+
+
+def build_search_filter(query: str, index: Optional[LogRecordIndex] = None) -> Optional[Dict[str, Any]]:
+    """
+    依問題建立向量搜尋的前置過濾條件
+
+    Args:
+        query: 使用者問題
+        index: 記錄索引（預設使用全局實例；臨時分析傳入該次記憶體目錄上的索引）
+
+    Returns:
+        Chroma 過濾條件（{"chunk_id": {"$in": [...]}}），問題沒有時間 / pid / tid /
+        package / tag 條件、索引中沒有符合的片段或候選集合太大時返回 None
+        （等級等用詞只在有上述條件時一併套用）
+    """
+    constraints = parse_query_constraints(query)
+    if not any(key in constraints for key in _ANCHOR_KEYS):
+        return None
+
+    max_ids = int(get_config("LOG_FILTER_MAX_IDS", "5000"))
+    try:
+        chunk_ids = (index or get_log_record_index()).query_chunk_ids(constraints, limit=max_ids + 1)
+    except Exception as e:
+        print(f"⚠️ 查詢 log 記錄索引失敗: {e}")
+        return None
+
+    if not chunk_ids:
+        print(f"🔎 查詢條件 {constraints} 沒有符合的 log 片段，改用不過濾的搜尋")
+        return None
+    if len(chunk_ids) > max_ids:
+        print(f"🔎 查詢條件 {constraints} 符合的片段過多，略過前置過濾")
+        return None
+
+    print(f"🔎 查詢條件 {constraints} → {len(chunk_ids)} 個候選片段")
+    return {"chunk_id": {"$in": chunk_ids}}
@@ -0,0 +1,320 @@
+"""
+Log 模板挖掘（Drain）
+
+大量重複的 log 行（「GC freed N objects」、心跳訊息...）只有參數不同。
+此模組以 Drain 演算法線上歸納每一行的模板，在嵌入前：
+- 把連續出現的同一模板收斂成一行，加上重複次數與參數範例
+- 為每個檔案保留模板表（存放在檔案目錄的 SQLite 中），可查詢各模板的出現次數
+
+參考：He et al., "Drain: An Online Log Parsing Approach with Fixed Depth Tree", ICWS 2017
+"""
+
+import re
+import json
+from typing import List, Dict, Any, Optional, Tuple
+
+from config import get_config
+from .file_catalog import FileCatalog, get_file_catalog
+
+WILDCARD = "<*>"
+
+# 時間類參數（每一行都不同，不作為參數範例）
+_TIME_TOKEN = re.compile(r'^\[?(\d{2,4}[-/]\d{2}[-/]\d{2}(T[\d:.,]+)?|\d{2}:\d{2}:\d{2}([.,]\d+)?)\]?,?$')
+
+# WARN 以上的行（含 logcat 的 W / E / F 欄位）：每一行都可能是不同的問題，不收斂
+_SEVERE_LINE = re.compile(
+    r'\b(WARN(?:ING)?|ERROR|FATAL|CRITICAL|SEVERE|PANIC)\b|\s\d+\s+\d+\s+[WEF]\s|^[WEF]/'
+)
+
+
+def _has_digit(token: str) -> bool:
+    return any(ch.isdigit() for ch in token)
+
+
+class LogCluster:
+    """一個模板（同一模板的所有行）"""
+
+    __slots__ = ("cluster_id", "template", "size", "samples")
+
+    def __init__(self, cluster_id: int, tokens: List[str]):
+        self.cluster_id = cluster_id
+        self.template = tokens
+        self.size = 0
+        self.samples: List[List[str]] = []
+
+    def template_text(self) -> str:
+        return " ".join(self.template)
+
+
+class _Node:
+    __slots__ = ("children", "clusters")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.clusters: List[LogCluster] = []
+
+
+class TemplateMiner:
+    """Drain 線上模板挖掘器"""
+
+    def __init__(self, depth: Optional[int] = None, similarity: Optional[float] = None,
+                 max_children: int = 100, max_samples: int = 3):
+        """
+        初始化挖掘器
+
+        Args:
+            depth: 前綴樹深度（含長度層與葉節點，至少 3）
+            similarity: 歸入同一模板的最低相似度
+            max_children: 每個節點最多的子節點數（超過時歸入萬用節點）
+            max_samples: 每個模板保留的參數範例數
+        """
+        self.depth = max(3, depth or int(get_config("LOG_TEMPLATE_DEPTH", "4")))
+        self.similarity = similarity or float(get_config("LOG_TEMPLATE_SIMILARITY", "0.7"))
+        self.max_children = max_children
+        self.max_samples = max_samples
+        self.root = _Node()
+        self.clusters: List[LogCluster] = []
+
+    def add_line(self, line: str) -> Tuple[LogCluster, List[str]]:
+        """
+        歸納一行 log 的模板
+
+        Args:
+            line: log 行
+
+        Returns:
+            (所屬模板, 這一行在萬用位置上的參數)
+        """
+        tokens = line.split()
+        cluster = self._search(tokens)
+        if cluster is None:
+            cluster = LogCluster(len(self.clusters), [WILDCARD if _has_digit(t) else t for t in tokens])
+            self.clusters.append(cluster)
+            self._insert(cluster)
+        else:
+            cluster.template = [
+                t if t == tokens[i] else WILDCARD for i, t in enumerate(cluster.template)
+            ]
+
+        cluster.size += 1
+        params = [tokens[i] for i, t in enumerate(cluster.template)
+                  if t == WILDCARD and not _TIME_TOKEN.match(tokens[i])]
+        if params and len(cluster.samples) < self.max_samples and params not in cluster.samples:
+            cluster.samples.append(params)
+        return cluster, params
+
+    def _path(self, tokens: List[str]) -> List[str]:
+        return [WILDCARD if _has_digit(t) else t for t in tokens[:self.depth - 2]]
+
+    def _search(self, tokens: List[str]) -> Optional[LogCluster]:
+        node = self.root.children.get(str(len(tokens)))
+        if node is None:
+            return None
+        for key in self._path(tokens):
+            node = node.children.get(key) or node.children.get(WILDCARD)
+            if node is None:
+                return None
+
+        best, best_similarity, best_params = None, -1.0, -1
+        for cluster in node.clusters:
+            same = params = 0
+            for template_token, token in zip(cluster.template, tokens):
+                if template_token == WILDCARD:
+                    # 含數字的參數視同遮罩後的 <*>（Drain 的前處理）
+                    params += 1
+                    same += _has_digit(token)
+                elif template_token == token:
+                    same += 1
+            similarity = same / len(tokens) if tokens else 1.0
+            if similarity > best_similarity or (similarity == best_similarity and params > best_params):
+                best, best_similarity, best_params = cluster, similarity, params
+
+        return best if best is not None and best_similarity >= self.similarity else None
+
+    def _insert(self, cluster: LogCluster):
+        length_key = str(len(cluster.template))
+        node = self.root.children.setdefault(length_key, _Node())
+        for key in self._path(cluster.template):
+            if key in node.children:
+                node = node.children[key]
+            elif len(node.children) < self.max_children:
+                node = node.children.setdefault(key, _Node())
+            else:
+                node = node.children.setdefault(WILDCARD, _Node())
+        node.clusters.append(cluster)
+
+    def template_table(self, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        模板表（依出現次數排序）
+
+        Args:
+            limit: 最多返回幾個模板
+
+        Returns:
+            [{'template_id', 'template', 'count', 'samples'}]
+        """
+        clusters = sorted(self.clusters, key=lambda c: c.size, reverse=True)[:limit]
+        return [
+            {'template_id': c.cluster_id, 'template': c.template_text(), 'count': c.size, 'samples': c.samples}
+            for c in clusters
+        ]
+
+
+def collapse_repetitive_lines(content: str, miner: Optional[TemplateMiner] = None,
+                              min_run: Optional[int] = None) -> Tuple[str, TemplateMiner, int]:
+    """
+    把連續出現的同一模板收斂成一行（第一行後面附上次數、模板與參數範例）
+
+    WARN 以上的行仍計入模板表，但一律原樣保留，不會被收斂掉。
+
+    Args:
+        content: log 內容
+        miner: 模板挖掘器（預設新建）
+        min_run: 連續幾行以上才收斂
+
+    Returns:
+        (收斂後的內容, 模板挖掘器, 被收斂掉的行數)
+    """
+    miner = miner or TemplateMiner()
+    min_run = min_run or int(get_config("LOG_TEMPLATE_MIN_RUN", "3"))
+
+    output: List[str] = []
+    collapsed = 0
+    run_cluster = None
+    run_first = None
+    run_count = 0
+    run_samples: List[str] = []
+
+    def flush():
+        nonlocal collapsed
+        if run_cluster is None:
+            return
+        if run_count >= min_run:
+            samples = "、".join(run_samples) if run_samples else "無"
+            output.append(f"{run_first}  [同一模板連續 {run_count} 次，模板: {run_cluster.template_text()}；參數範例: {samples}]")
+            collapsed += run_count - 1
+        else:
+            output.extend(run_lines)
+
+    run_lines: List[str] = []
+    for line in content.split('\n'):
+        if not line.strip():
+            flush()
+            run_cluster, run_lines, run_count = None, [], 0
+            output.append(line)
+            continue
+
+        cluster, params = miner.add_line(line)
+        if _SEVERE_LINE.search(line):
+            flush()
+            run_cluster, run_lines, run_count = None, [], 0
+            output.append(line)
+            continue
+        if cluster is run_cluster:
+            run_count += 1
+            if run_count <= min_run:
+                run_lines.append(line)
+            if params and len(run_samples) < miner.max_samples:
+                sample = " ".join(params)
+                if sample not in run_samples:
+                    run_samples.append(sample)
+            continue
+
+        flush()
+        run_cluster, run_first, run_count = cluster, line, 1
+        run_lines = [line]
+        run_samples = [" ".join(params)] if params else []
+
+    flush()
+    return "\n".join(output), miner, collapsed
+
+
+class LogTemplateIndex:
+    """每個檔案的模板表（存放在檔案目錄的 SQLite 中）"""
+
+    def __init__(self, catalog: Optional[FileCatalog] = None):
+        """
+        初始化索引
+
+        Args:
+            catalog: 檔案目錄（預設使用全局實例）
+        """
+        self._catalog = catalog
+        self._schema_conn = None
+
+    @property
+    def catalog(self) -> FileCatalog:
+        return self._catalog or get_file_catalog()
+
+    def _ensure_schema(self, conn):
+        if self._schema_conn is conn:
+            return
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS log_templates (
+                file_id     TEXT NOT NULL,
+                template_id INTEGER NOT NULL,
+                source      TEXT,
+                template    TEXT,
+                count       INTEGER,
+                samples     TEXT,
+                PRIMARY KEY (file_id, template_id)
+            )
+            """
+        )
+        self._schema_conn = conn
+
+    def record(self, file_id: str, source: str, templates: List[Dict[str, Any]]):
+        """
+        寫入檔案的模板表（重新索引時覆蓋）
+
+        Args:
+            file_id: 檔案 ID
+            source: 檔案路徑
+            templates: TemplateMiner.template_table() 的結果
+        """
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            conn.execute("DELETE FROM log_templates WHERE file_id = ?", (file_id,))
+            conn.executemany(
+                "INSERT INTO log_templates (file_id, template_id, source, template, count, samples) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(file_id, t['template_id'], source, t['template'], t['count'],
+                  json.dumps(t['samples'], ensure_ascii=False)) for t in templates]
+            )
+
+    def get_templates(self, file_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """返回檔案中出現次數最多的模板"""
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            rows = conn.execute(
+                "SELECT template_id, template, count, samples FROM log_templates "
+                "WHERE file_id = ? ORDER BY count DESC LIMIT ?", (file_id, limit)
+            ).fetchall()
+        return [
+            {'template_id': row[0], 'template': row[1], 'count': row[2], 'samples': json.loads(row[3] or "[]")}
+            for row in rows
+        ]
+
+    def search_templates(self, keyword: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """依關鍵字搜尋所有檔案的模板（依出現次數排序）"""
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            rows = conn.execute(
+                "SELECT file_id, source, template, count FROM log_templates "
+                "WHERE template LIKE ? ORDER BY count DESC LIMIT ?", (f"%{keyword}%", limit)
+            ).fetchall()
+        keys = ['file_id', 'source', 'template', 'count']
+        return [dict(zip(keys, row)) for row in rows]
+
+
+# 全局實例
+_template_index: Optional[LogTemplateIndex] = None
+
+
+def get_log_template_index() -> LogTemplateIndex:
+    """獲取模板索引實例（單例模式）"""
+    global _template_index
+    if _template_index is None:
+        _template_index = LogTemplateIndex()
+    return _template_index
@@ -0,0 +1,371 @@
+"""
+Logcat 欄位式（columnar）解析
+
+把 `adb logcat` 輸出一次轉成 numpy 陣列欄位（時間、pid、tid、等級、tag），
+以固定大小的區段逐段編碼成位元組並向量化解析，不為每一行建立 Python 物件，
+也不保留整個檔案的位元組副本；每行只記錄在原始字串中的位置，產生片段時才取出。
+
+支援格式：
+- threadtime：01-15 10:30:45.123  1234  1250 E Tag: message
+- brief：E/Tag( 1234): message
+"""
+
+import re
+from typing import List, Optional, Tuple
+
+try:
+    import numpy as np
+    HAS_NUMPY = True
+except ImportError:
+    np = None
+    HAS_NUMPY = False
+
+THREADTIME = "threadtime"
+BRIEF = "brief"
+
+LEVEL_LETTERS = "VDIWEF"
+
+# tag 最多保留的位元組數（Android tag 通常不超過 23 字元）
+TAG_WIDTH = 32
+
+# pid / tid / 等級所在區域的寬度（pid 最多 7 位數）
+_FIELD_WIDTH = 24
+
+# 每批向量化處理的字元數（區段在換行處切齊）
+BLOCK_CHARS = 1 << 22
+
+if HAS_NUMPY:
+    _POWERS_OF_TEN = 10 ** np.arange(10, dtype=np.int64)
+    # tag 雜湊：每 8 個位元組乘上固定的奇數權重後相加（溢位自然取模）
+    _TAG_HASH_WEIGHTS = np.array([0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F,
+                                  0x165667B19E3779F9, 0xD6E8FEB86659FD93], dtype=np.uint64)
+
+_THREADTIME_LINE = re.compile(r'^\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3}\s+\d+\s+\d+ [VDIWEFA] ', re.MULTILINE)
+_BRIEF_LINE = re.compile(r'^[VDIWEFA]/[^(\n]+\(\s*\d+\): ', re.MULTILINE)
+
+# 每月之前的累計天數（不分閏年，只用於排序與時間窗）
+_CUMULATIVE_DAYS = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+
+
+def detect_logcat_format(sample: str) -> Optional[str]:
+    """
+    偵測 logcat 輸出格式
+
+    Args:
+        sample: 內容樣本
+
+    Returns:
+        threadtime / brief；符合的行數不到樣本的一半時返回 None
+    """
+    lines = [line for line in sample.split('\n')[:200] if line.strip()]
+    if len(lines) < 3:
+        return None
+
+    threadtime = len(_THREADTIME_LINE.findall(sample))
+    brief = len(_BRIEF_LINE.findall(sample))
+    best, count = (THREADTIME, threadtime) if threadtime >= brief else (BRIEF, brief)
+    return best if count * 2 >= min(len(lines), 200) else None
+
+
+def format_time_ms(time_ms: int) -> str:
+    """把年內毫秒轉回 logcat 的「MM-DD HH:MM:SS.mmm」格式"""
+    seconds, millis = divmod(int(time_ms), 1000)
+    day_of_year, seconds = divmod(seconds, 86400)
+    month = max(m for m in range(12) if _CUMULATIVE_DAYS[m] <= day_of_year)
+    day = day_of_year - _CUMULATIVE_DAYS[month] + 1
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{month + 1:02d}-{day:02d} {hours:02d}:{minutes:02d}:{seconds:02d}.{millis:03d}"
+
+
+class LogcatColumns:
+    """logcat 的欄位式記錄（每個陣列的第 i 個元素對應第 i 行）"""
+
+    def __init__(self, log_format, content, starts, ends, valid, time_ms, pid, tid, level, tag_id, tags):
+        self.log_format = log_format
+        self.content = content  # str：原始內容
+        self.starts = starts    # int64：行起點（字元位置）
+        self.ends = ends        # int64：行終點（不含換行）
+        self.valid = valid      # bool：是否為可解析的記錄行（其餘為延續行）
+        self.time_ms = time_ms  # int64：年內毫秒（brief 格式為 -1）
+        self.pid = pid          # int64
+        self.tid = tid          # int64（brief 格式為 -1）
+        self.level = level      # int8：0-5 對應 V D I W E F，延續行為 -1
+        self.tag_id = tag_id    # int32：對應 tags 的索引，延續行為 -1
+        self.tags = tags        # List[str]：不重複的 tag 名稱
+
+    def __len__(self):
+        return len(self.starts)
+
+    def inherit_from_records(self):
+        """
+        延續行（堆疊追蹤等沒有標頭的行）沿用前一筆記錄的欄位
+
+        Returns:
+            每行所屬記錄的行號（第一筆記錄之前的行為 -1）
+        """
+        owner = np.where(self.valid, np.arange(len(self)), -1)
+        return np.maximum.accumulate(owner) if len(owner) else owner
+
+    def line_lengths(self, lines):
+        """指定行含換行的字元數"""
+        return np.minimum(self.ends[lines] + 1, len(self.content)) - self.starts[lines]
+
+    def text(self, lines) -> str:
+        """取出指定行（依給定順序）的原始內容"""
+        return self.texts(np.asarray(lines, dtype=np.int64), np.array([0, len(lines)]))[0]
+
+    def texts(self, lines, bounds) -> List[str]:
+        """
+        一次取出多個片段的內容
+
+        原始內容中連續的行合併成一次切片，片段內容只在這裡建立一次。
+
+        Args:
+            lines: 所有片段的行號（依片段順序串接）
+            bounds: 片段在 lines 中的邊界（長度為片段數 + 1）
+
+        Returns:
+            各片段的內容
+        """
+        if len(lines) == 0:
+            return [""] * (len(bounds) - 1)
+        starts = self.starts[lines]
+        stops = starts + self.line_lengths(lines)
+        run_start = np.ones(len(lines), dtype=bool)
+        run_start[1:] = starts[1:] != stops[:-1]
+        run_start[bounds[:-1]] = True
+        runs = np.flatnonzero(run_start)
+        run_stops = stops[np.append(runs[1:], len(lines)) - 1]
+        pieces = [self.content[a:b] for a, b in zip(starts[runs].tolist(), run_stops.tolist())]
+        run_bounds = np.searchsorted(runs, bounds).tolist()
+        return ["".join(pieces[a:b]) for a, b in zip(run_bounds[:-1], run_bounds[1:])]
+
+
+def _line_bounds(buffer):
+    newlines = np.flatnonzero(buffer == 10)
+    starts = np.concatenate(([0], newlines + 1)).astype(np.int64)
+    ends = np.concatenate((newlines, [len(buffer)])).astype(np.int64)
+    if len(starts) and starts[-1] >= len(buffer):
+        starts, ends = starts[:-1], ends[:-1]
+    return starts, ends
+
+
+def _window(buffer, positions, width: int):
+    """取每個位置之後 width 個位元組（超出緩衝區的部分以最後一個位元組填充）"""
+    index_type = np.int32 if len(buffer) < 2 ** 31 - width else np.int64
+    index = positions.astype(index_type)[:, None] + np.arange(width, dtype=index_type)
+    np.minimum(index, len(buffer) - 1, out=index)
+    return buffer[index]
+
+
+def _scan_numbers(window, count: int):
+    """
+    從每列的位元組中讀出前 count 個十進位數字
+
+    Returns:
+        (數值陣列 shape=(count, n), 各位置所在的數字序號, 是否為數字)
+    """
+    is_digit = (window - 48) <= 9
+    run_start = is_digit.copy()
+    run_start[:, 1:] &= ~is_digit[:, :-1]
+    run_number = np.cumsum(run_start, axis=1, dtype=np.int8)
+    digits = (window - 48).astype(np.int64)
+
+    values = np.zeros((count, window.shape[0]), dtype=np.int64)
+    for r in range(count):
+        in_run = is_digit & (run_number == r + 1)
+        # 每個數字位數 = 同一串中位於其右側的數字個數
+        place = np.cumsum(in_run[:, ::-1], axis=1, dtype=np.int8)[:, ::-1] - 1
+        values[r] = (digits * _POWERS_OF_TEN[np.maximum(place, 0)] * in_run).sum(axis=1)
+    return values, run_number, is_digit
+
+
+def _next_occurrence(positions, after, default):
+    """每個 after 位置之後第一個 positions 中的位置（找不到時為 default）"""
+    if len(positions) == 0:
+        return default.copy(), np.zeros(len(after), dtype=bool)
+    index = np.searchsorted(positions, after)
+    found = index < len(positions)
+    return np.where(found, positions[np.minimum(index, len(positions) - 1)], default), found
+
+
+def _level_ranks(level_bytes):
+    table = np.full(256, -1, dtype=np.int8)
+    for rank, letter in enumerate(LEVEL_LETTERS):
+        table[ord(letter)] = rank
+    table[ord('A')] = 5
+    return table[level_bytes]
+
+
+def _tag_keys(buffer, tag_start, tag_end):
+    """
+    把 tag 轉成 64 位元雜湊鍵（超過 TAG_WIDTH 的部分截斷）
+
+    Returns:
+        (雜湊鍵, 固定寬度的原始位元組)
+    """
+    widths = np.clip(tag_end - tag_start, 0, TAG_WIDTH)
+    raw = _window(buffer, tag_start, TAG_WIDTH)
+    raw[np.arange(TAG_WIDTH)[None, :] >= widths[:, None]] = 0
+    words = np.ascontiguousarray(raw).view(np.uint64)
+    keys = (words * _TAG_HASH_WEIGHTS).sum(axis=1, dtype=np.uint64)
+    return keys, raw
+
+
+def _tag_ids(keys, raw, valid) -> Tuple["np.ndarray", List[str]]:
+    """為 tag 鍵編號，回傳 tag 索引與不重複的 tag 名稱"""
+    tag_id = np.full(len(keys), -1, dtype=np.int32)
+    if not valid.any():
+        return tag_id, []
+
+    valid_rows = np.flatnonzero(valid)
+    _, first, inverse = np.unique(keys[valid_rows], return_index=True, return_inverse=True)
+    rows_raw = raw[valid_rows]
+    if (rows_raw != rows_raw[first][inverse.ravel()]).any():
+        # 雜湊碰撞：改以固定寬度的原始位元組去重，避免不同 tag 被合併
+        rows_raw = np.ascontiguousarray(rows_raw).view(np.dtype((np.void, rows_raw.shape[1]))).ravel()
+        _, first, inverse = np.unique(rows_raw, return_index=True, return_inverse=True)
+    # 補齊用的空白（"Tag     : msg"）在去重後才去除，並合併成同一個 tag
+    names = [raw[row].tobytes().rstrip(b"\0").decode('utf-8', errors='ignore').strip()
+             for row in valid_rows[first]]
+    canonical = {}
+    remap = np.array([canonical.setdefault(name, len(canonical)) for name in names], dtype=np.int32)
+    tag_id[valid_rows] = remap[inverse.ravel()]
+    return tag_id, list(canonical)
+
+
+def _parse_threadtime_block(buffer, starts, ends, separators):
+    lengths = ends - starts
+    head = _window(buffer, starts, 33)
+    digits = head - 48  # uint8：非數字會溢位成大於 9 的值
+    is_digit = digits <= 9
+    stamp_digits = [0, 1, 3, 4, 6, 7, 9, 10, 12, 13, 15, 16, 17]
+    valid = (
+        (lengths >= 33)
+        & (head[:, 2] == ord('-')) & (head[:, 5] == ord(' '))
+        & (head[:, 8] == ord(':')) & (head[:, 11] == ord(':')) & (head[:, 14] == ord('.'))
+        & is_digit[:, stamp_digits].all(axis=1)
+    )
+    stamp = digits[:, :18].astype(np.int64)
+    month = stamp[:, 0] * 10 + stamp[:, 1]
+    day = stamp[:, 3] * 10 + stamp[:, 4]
+    seconds = ((stamp[:, 6] * 10 + stamp[:, 7]) * 3600
+               + (stamp[:, 9] * 10 + stamp[:, 10]) * 60
+               + stamp[:, 12] * 10 + stamp[:, 13])
+    millis = stamp[:, 15] * 100 + stamp[:, 16] * 10 + stamp[:, 17]
+    day_of_year = np.asarray(_CUMULATIVE_DAYS)[np.clip(month - 1, 0, 11)] + day - 1
+    time_ms = (day_of_year * 86400 + seconds) * 1000 + millis
+
+    # 標準寬度「%5d %5d %c 」：pid / tid / 等級在固定位置，直接切片
+    padded = is_digit | (head == ord(' '))
+    fixed = (
+        (head[:, 18] == ord(' ')) & (head[:, 24] == ord(' '))
+        & (head[:, 30] == ord(' ')) & (head[:, 32] == ord(' '))
+        & padded[:, 19:24].all(axis=1) & padded[:, 25:30].all(axis=1)
+        & is_digit[:, 23] & is_digit[:, 29]
+    )
+    place = _POWERS_OF_TEN[4::-1]
+    pid = (np.where(is_digit[:, 19:24], digits[:, 19:24], 0).astype(np.int64) * place).sum(axis=1)
+    tid = (np.where(is_digit[:, 25:30], digits[:, 25:30], 0).astype(np.int64) * place).sum(axis=1)
+    level = _level_ranks(head[:, 31])
+    tag_start = starts + 33
+
+    # pid 超過 5 位數等非標準寬度的行：逐位掃描數字
+    irregular = np.flatnonzero(valid & ~fixed)
+    if len(irregular):
+        fields = _window(buffer, starts[irregular] + 18, _FIELD_WIDTH)
+        (pid[irregular], tid[irregular]), run_number, field_digits = _scan_numbers(fields, 2)
+        candidates = (run_number >= 2) & ~field_digits & (fields != ord(' '))
+        level_column = candidates.argmax(axis=1)
+        level[irregular] = np.where(candidates.any(axis=1),
+                                    _level_ranks(fields[np.arange(len(irregular)), level_column]), -1)
+        tag_start[irregular] = starts[irregular] + 18 + level_column + 2
+    valid &= level >= 0
+
+    # tag 以第一個 ": " 結束
+    tag_end, found = _next_occurrence(separators, tag_start, ends)
+    valid &= found & (tag_end <= ends)
+    return (valid, time_ms, pid, tid, level) + _tag_keys(buffer, tag_start, tag_end)
+
+
+def _parse_brief_block(buffer, starts, ends, parens):
+    lengths = ends - starts
+    head = _window(buffer, starts, 2)
+    level = _level_ranks(head[:, 0])
+    valid = (lengths >= 6) & (head[:, 1] == ord('/')) & (level >= 0)
+    tag_start = starts + 2
+
+    # tag 以「(」結束，括號內是 pid
+    tag_end, found = _next_occurrence(parens, tag_start, ends)
+    valid &= found & (tag_end < ends)
+    (pid,), _, _ = _scan_numbers(_window(buffer, tag_end + 1, 12), 1)
+    missing = np.full(len(starts), -1, dtype=np.int64)
+    return (valid, missing, pid, missing, level) + _tag_keys(buffer, tag_start, tag_end)
+
+
+def _parse_block(text: str, offset: int, log_format: str):
+    """
+    編碼並解析一個區段
+
+    Returns:
+        (行起點, 行終點（皆為整個內容中的字元位置）, valid, time_ms, pid, tid, level, tag 鍵, tag 原始位元組)
+    """
+    data = text.encode('utf-8', errors='surrogatepass')
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    starts, ends = _line_bounds(buffer)
+
+    if log_format == THREADTIME:
+        delimiters = np.flatnonzero((buffer[:-1] == ord(':')) & (buffer[1:] == ord(' ')))
+        fields = _parse_threadtime_block(buffer, starts, ends, delimiters)
+    else:
+        fields = _parse_brief_block(buffer, starts, ends, np.flatnonzero(buffer == ord('(')))
+
+    # 位元組位置換回字元位置：扣掉之前的 UTF-8 延續位元組數
+    if len(data) != len(text):
+        continuation = np.concatenate(([0], np.cumsum((buffer & 0xC0) == 0x80)))
+        starts, ends = starts - continuation[starts], ends - continuation[ends]
+    return (starts + offset, ends + offset) + fields
+
+
+def parse_logcat_columns(content, log_format: str) -> LogcatColumns:
+    """
+    把 logcat 內容解析成欄位
+
+    內容以每 BLOCK_CHARS 個字元（在換行處切齊）為一段，逐段編碼後向量化處理，
+    暫存的位元組與陣列大小與區段成正比，不與整個檔案成正比。
+
+    Args:
+        content: 檔案內容（str；bytes 會先以 UTF-8 解碼）
+        log_format: threadtime / brief
+
+    Returns:
+        LogcatColumns
+    """
+    if isinstance(content, bytes):
+        content = content.decode('utf-8', errors='ignore')
+
+    blocks = []
+    begin = 0
+    while begin < len(content):
+        newline = content.find('\n', begin + BLOCK_CHARS)
+        end = len(content) if newline == -1 else newline + 1
+        blocks.append(_parse_block(content[begin:end], begin, log_format))
+        begin = end
+
+    if not blocks:
+        empty = np.zeros(0, dtype=np.int64)
+        return LogcatColumns(log_format, content, empty, empty, np.zeros(0, dtype=bool), empty, empty, empty,
+                             np.zeros(0, dtype=np.int8), np.zeros(0, dtype=np.int32), [])
+
+    starts, ends, valid, time_ms, pid, tid, level, tag_keys, tag_raw = (
+        np.concatenate(column) for column in zip(*blocks)
+    )
+
+    tag_id, tags = _tag_ids(tag_keys, tag_raw, valid)
+    time_ms = np.where(valid, time_ms, -1)
+    level = np.where(valid, level, -1).astype(np.int8)
+    pid = np.where(valid, pid, -1)
+    tid = np.where(valid, tid, -1)
+
+    return LogcatColumns(log_format, content, starts, ends, valid, time_ms, pid, tid, level, tag_id, tags)
@@ -0,0 +1,308 @@
+"""
+以位移（offset）為基礎的文字分割器
+
+RecursiveCharacterTextSplitter 依分隔符號逐層遞迴切割，每一層都會產生中間字串
+再合併；片段大小也是以字元計算，與嵌入模型實際看到的 token 數不一致。
+此分割器：
+- 整份文字只做一次斷詞（嵌入模型的 tokenizer），得到每個 token 的起始位移
+- 由前往後單次掃描：以 token 數決定片段上限，在上限之前的後半段以 str.rfind
+  依優先順序（段落、換行、句號、空白）找切點，不建立任何中間字串
+- 每個片段帶有在原文中的起訖字元位移（start_offset / end_offset）
+"""
+
+import copy
+import json
+from pathlib import Path
+from typing import List, Tuple, Optional, Iterable
+
+import numpy as np
+from langchain.schema import Document
+
+from config import get_config
+
+# 切點的優先順序（與原本 RecursiveCharacterTextSplitter 的分隔符號清單相同）
+BREAK_LEVELS = [
+    ("\n\n",),
+    ("\n",),
+    ("。", "！", "？", ". ", "! ", "? "),
+    (" ", "\t"),
+]
+
+# tokenizer 無法載入時的近似斷詞：英文每 6 個字母、數字每 4 位算一個 token，
+# 其餘非空白字元（CJK、標點）每字一個 token
+_APPROX_LETTERS_PER_TOKEN = 6
+_APPROX_DIGITS_PER_TOKEN = 4
+_SPACE, _LETTER, _DIGIT, _OTHER = 0, 1, 2, 3
+_ASCII_CLASSES = np.full(128, _OTHER, dtype=np.uint8)
+_ASCII_CLASSES[[ord(c) for c in " \t\n\r\f\v"]] = _SPACE
+_ASCII_CLASSES[ord("a"):ord("z") + 1] = _LETTER
+_ASCII_CLASSES[ord("A"):ord("Z") + 1] = _LETTER
+_ASCII_CLASSES[ord("0"):ord("9") + 1] = _DIGIT
+
+
+class TokenCounter:
+    """以嵌入模型的 tokenizer 計算每個 token 在原文中的起始位移"""
+
+    def __init__(self, name: str, starts, max_length: Optional[int] = None):
+        """
+        初始化
+
+        Args:
+            name: tokenizer 名稱
+            starts: 函數，輸入文字，返回每個 token 的起始字元位移
+            max_length: 嵌入模型一次能看到的 token 數（含 [CLS]/[SEP] 等特殊 token），未知時為 None
+        """
+        self.name = name
+        self._starts = starts
+        self.max_length = max_length
+
+    def token_starts(self, text: str) -> np.ndarray:
+        """返回每個 token 的起始字元位移（遞增）"""
+        return np.asarray(self._starts(text), dtype=np.int64)
+
+    def count(self, text: str) -> int:
+        """計算 token 數"""
+        return len(self.token_starts(text))
+
+
+def _tiktoken_counter() -> TokenCounter:
+    import tiktoken
+    encoding = tiktoken.get_encoding("cl100k_base")
+
+    def starts(text):
+        _, offsets = encoding.decode_with_offsets(encoding.encode(text, disallowed_special=()))
+        return offsets
+
+    return TokenCounter("tiktoken:cl100k_base", starts)
+
+
+def _max_seq_length(model_name: str, tokenizer) -> Optional[int]:
+    """
+    讀取嵌入模型的輸入長度上限
+
+    sentence-transformers 模型以 sentence_bert_config.json 的 max_seq_length 截斷
+    （例如 all-MiniLM-L6-v2 為 256，小於 tokenizer 的 512）；沒有這個檔案時使用 tokenizer 的
+    model_max_length（未設定時 transformers 會給一個極大的值，視為未知）。
+    """
+    try:
+        path = Path(model_name) / "sentence_bert_config.json"
+        if not path.is_file():
+            from huggingface_hub import hf_hub_download
+            path = hf_hub_download(model_name, "sentence_bert_config.json")
+        with open(path, encoding="utf-8") as f:
+            return int(json.load(f)["max_seq_length"])
+    except Exception:
+        max_length = getattr(tokenizer, "model_max_length", None)
+        return int(max_length) if max_length and max_length < 100000 else None
+
+
+def _huggingface_counter(model_name: str) -> TokenCounter:
+    from transformers import AutoTokenizer
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+
+    def starts(text):
+        encoded = tokenizer(text, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+        return [start for start, _ in encoded["offset_mapping"]]
+
+    return TokenCounter(model_name, starts, _max_seq_length(model_name, tokenizer))
+
+
+def _approximate_starts(text: str) -> np.ndarray:
+    """以字元類別向量化計算近似 token 的起始位移"""
+    codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    classes = np.full(len(codes), _OTHER, dtype=np.uint8)
+    ascii_mask = codes < 128
+    classes[ascii_mask] = _ASCII_CLASSES[codes[ascii_mask]]
+    classes[(codes == 0x3000) | (codes == 0xA0)] = _SPACE
+
+    run_start = np.ones(len(codes), dtype=bool)
+    run_start[1:] = classes[1:] != classes[:-1]
+    run_begin = np.flatnonzero(run_start)
+    position_in_run = np.arange(len(codes)) - run_begin[np.cumsum(run_start) - 1]
+
+    is_start = ((classes == _OTHER)
+                | ((classes == _LETTER) & (position_in_run % _APPROX_LETTERS_PER_TOKEN == 0))
+                | ((classes == _DIGIT) & (position_in_run % _APPROX_DIGITS_PER_TOKEN == 0)))
+    return np.flatnonzero(is_start)
+
+
+def approximate_counter() -> TokenCounter:
+    """近似的 token 計數（不需要下載 tokenizer）"""
+    return TokenCounter("approximate", _approximate_starts)
+
+
+# 嵌入模型的輸入長度未知時（OpenAI、近似計數）的片段 token 數
+DEFAULT_CHUNK_TOKENS = 256
+# [CLS] 與 [SEP]：片段本身不含，嵌入時由 tokenizer 加上
+SPECIAL_TOKENS = 2
+
+_token_counter: Optional[TokenCounter] = None
+
+
+def get_token_counter() -> TokenCounter:
+    """
+    獲取目前嵌入模型的 token 計數器（單例模式）
+
+    OpenAI 使用 tiktoken（cl100k_base），HuggingFace 使用模型本身的 tokenizer；
+    無法載入時使用近似計數。
+
+    Returns:
+        TokenCounter
+    """
+    global _token_counter
+    if _token_counter is None:
+        try:
+            if get_config("EMBEDDING_PROVIDER", "huggingface") == "openai":
+                _token_counter = _tiktoken_counter()
+            else:
+                _token_counter = _huggingface_counter(
+                    get_config("HUGGINGFACE_MODEL", "sentence-transformers/all-MiniLM-L6-v2"))
+        except Exception as e:
+            print(f"⚠️ 無法載入嵌入模型的 tokenizer，使用近似 token 計數: {e}")
+            _token_counter = approximate_counter()
+    return _token_counter
+
+
+def default_chunk_tokens(counter: TokenCounter) -> int:
+    """
+    片段 token 數的預設值
+
+    Args:
+        counter: token 計數器
+
+    Returns:
+        嵌入模型的輸入上限減去特殊 token；上限未知時為 DEFAULT_CHUNK_TOKENS
+    """
+    if counter.max_length and counter.max_length > SPECIAL_TOKENS:
+        return counter.max_length - SPECIAL_TOKENS
+    return DEFAULT_CHUNK_TOKENS
+
+
+class OffsetTextSplitter:
+    """單次掃描、以位移表示片段的分割器"""
+
+    def __init__(self, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None,
+                 counter: Optional[TokenCounter] = None, unit: str = "tokens",
+                 separators: Optional[List[str]] = None):
+        """
+        初始化分割器
+
+        Args:
+            chunk_size: 片段上限（預設讀取 CHUNK_TOKENS；未設定時為嵌入模型的
+                        max_seq_length 減去 [CLS]/[SEP]，使片段不會在嵌入時被截斷）
+            chunk_overlap: 相鄰片段重疊量（預設讀取 CHUNK_OVERLAP_TOKENS）
+            counter: token 計數器（預設為目前嵌入模型的 tokenizer）
+            unit: "tokens" 以 token 計算長度，"chars" 以字元計算（log 解析器使用）
+            separators: 切點分隔符號（依優先順序，每個一層；預設為 BREAK_LEVELS）
+        """
+        self.unit = unit
+        self.break_levels = [(sep,) for sep in separators if sep] if separators else BREAK_LEVELS
+        if unit == "chars":
+            self.chunk_size = chunk_size or int(get_config("CHUNK_SIZE", "1000"))
+            self.chunk_overlap = chunk_overlap if chunk_overlap is not None else int(get_config("CHUNK_OVERLAP", "100"))
+            self.counter = None
+        else:
+            self.counter = counter or get_token_counter()
+            self.chunk_size = chunk_size or int(get_config("CHUNK_TOKENS", str(default_chunk_tokens(self.counter))))
+            self.chunk_overlap = chunk_overlap if chunk_overlap is not None else int(get_config("CHUNK_OVERLAP_TOKENS", "32"))
+        self.chunk_overlap = min(self.chunk_overlap, self.chunk_size // 2)
+
+    def split_offsets(self, text: str) -> List[Tuple[int, int]]:
+        """
+        計算片段的起訖位移
+
+        Args:
+            text: 原文
+
+        Returns:
+            [(start, end)]，text[start:end] 即為片段（已去除前後空白）
+        """
+        length = len(text)
+        if self.counter is not None:
+            starts = self.counter.token_starts(text)
+
+            def char_at(token: int) -> int:
+                return int(starts[token]) if token < len(starts) else length
+
+            def token_at(position: int) -> int:
+                return int(starts.searchsorted(position))
+        else:
+            def char_at(token: int) -> int:
+                return min(token, length)
+
+            def token_at(position: int) -> int:
+                return position
+
+        spans = []
+        position = _skip_space(text, 0, length)
+        while position < length:
+            first_token = token_at(position)
+            limit = char_at(first_token + self.chunk_size)
+            end = length if limit >= length else _find_break(text, position, limit, self.break_levels)
+
+            trimmed = end
+            while trimmed > position and text[trimmed - 1].isspace():
+                trimmed -= 1
+            if trimmed > position:
+                spans.append((position, trimmed))
+            if end >= length:
+                break
+
+            following = end
+            if self.chunk_overlap:
+                following = char_at(max(token_at(end) - self.chunk_overlap, first_token + 1))
+                if following < end:
+                    following = _next_word(text, following, end)
+            position = _skip_space(text, max(following, position + 1), length)
+
+        return spans
+
+    def split_text(self, text: str) -> List[str]:
+        """分割文字"""
+        return [text[start:end] for start, end in self.split_offsets(text)]
+
+    def split_documents(self, documents: Iterable[Document]) -> List[Document]:
+        """
+        分割文件，片段 metadata 帶有 start_offset / end_offset
+
+        Args:
+            documents: 文件列表
+
+        Returns:
+            片段列表
+        """
+        chunks = []
+        for doc in documents:
+            text = doc.page_content
+            for start, end in self.split_offsets(text):
+                metadata = copy.deepcopy(doc.metadata)
+                metadata['start_offset'] = start
+                metadata['end_offset'] = end
+                chunks.append(Document(page_content=text[start:end], metadata=metadata))
+        return chunks
+
+
+def _skip_space(text: str, position: int, length: int) -> int:
+    while position < length and text[position].isspace():
+        position += 1
+    return position
+
+
+def _find_break(text: str, start: int, limit: int, break_levels) -> int:
+    """在 (start, limit] 中依優先順序找切點：先找後半段，找不到再放寬到整個範圍，仍找不到時硬切"""
+    for lower in (start + (limit - start) // 2, start + 1):
+        for separators in break_levels:
+            best = -1
+            for separator in separators:
+                found = text.rfind(separator, lower, limit)
+                if found >= 0:
+                    best = max(best, found + len(separator))
+            if best > start:
+                return best
+    return limit
+
+
+def _next_word(text: str, position: int, end: int) -> int:
+    """重疊區的起點移到下一個空白之後，避免從單字中間開始"""
+    candidates = [found for found in (text.find(" ", position, end), text.find("\n", position, end)) if found >= 0]
+    return min(candidates) + 1 if candidates else position
@@ -0,0 +1,231 @@
+"""
+PDF 逐頁串流載入
+
+PyPDFLoader.load() 在單一核心上一次抽取所有頁面的文字，數千頁的手冊要等
+全部抽完才開始分割。此模組：
+- 以頁面範圍為單位在多個進程中平行抽取文字，依頁序逐頁輸出（在途批次有上限）
+- 每頁抽出後立即送進分割器，不等整份 PDF
+- 頁面內容雜湊已索引過（或同一份 PDF 內重複）的頁面直接略過
+"""
+
+import os
+import time
+import pickle
+import multiprocessing
+from itertools import chain
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Iterator, List, Tuple, Optional, Iterable
+
+from langchain.schema import Document
+
+from config import get_config
+from .file_catalog import FileCatalog, get_file_catalog, compute_file_id
+from .pending_writes import PendingIndexWrites
+
+try:
+    from pypdf import PdfReader
+    HAS_PYPDF = True
+except ImportError:
+    PdfReader = None
+    HAS_PYPDF = False
+
+
+# 子進程中開啟的 PDF（每個進程只開啟一次，展開頁面樹的成本與總頁數成正比）
+_worker_reader = None
+
+
+def _open_worker_reader(path: str):
+    global _worker_reader
+    _worker_reader = PdfReader(path)
+
+
+def _extract_page_range(start: int, end: int) -> List[Tuple[int, str]]:
+    """在子進程中抽取 [start, end) 頁的文字"""
+    return [(i, _worker_reader.pages[i].extract_text() or "") for i in range(start, end)]
+
+
+def iter_pdf_pages(path: str, workers: Optional[int] = None,
+                   batch_pages: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """
+    依頁序逐頁產生 PDF 文字
+
+    頁數達到 PDF_PARALLEL_MIN_PAGES 時以多進程抽取，同時在途的批次最多為
+    進程數的兩倍，記憶體用量與總頁數無關。
+
+    Args:
+        path: PDF 路徑
+        workers: 進程數（預設讀取 PDF_PARSE_WORKERS，不超過 CPU 核心數）
+        batch_pages: 每個批次的頁數（預設讀取 PDF_PAGE_BATCH）
+
+    Yields:
+        (頁碼（從 0 開始）, 頁面文字)
+    """
+    workers = min(workers or int(get_config("PDF_PARSE_WORKERS", "4")), os.cpu_count() or 1)
+    batch_pages = batch_pages or int(get_config("PDF_PAGE_BATCH", "16"))
+    min_pages = int(get_config("PDF_PARALLEL_MIN_PAGES", "64"))
+
+    reader = PdfReader(path)
+    page_count = len(reader.pages)
+    next_page = 0
+
+    if workers > 1 and page_count >= min_pages:
+        ranges = iter([(start, min(start + batch_pages, page_count))
+                       for start in range(0, page_count, batch_pages)])
+        try:
+            # spawn：伺服器進程中有執行緒與已開啟的 SQLite 連線，fork 出的子進程可能死鎖
+            with ProcessPoolExecutor(max_workers=workers,
+                                     mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_open_worker_reader, initargs=(path,)) as pool:
+                pending = deque()
+                for start, end in ranges:
+                    pending.append(pool.submit(_extract_page_range, start, end))
+                    if len(pending) >= workers * 2:
+                        break
+                while pending:
+                    pages = pending.popleft().result()
+                    following = next(ranges, None)
+                    if following:
+                        pending.append(pool.submit(_extract_page_range, *following))
+                    for page_number, text in pages:
+                        yield page_number, text
+                        next_page = page_number + 1
+            return
+        except (OSError, BrokenProcessPool, pickle.PicklingError) as e:
+            print(f"⚠️ 平行抽取 PDF 失敗，從第 {next_page + 1} 頁起改為逐頁抽取: {e}")
+
+    for page_number in range(next_page, page_count):
+        yield page_number, reader.pages[page_number].extract_text() or ""
+
+
+class PdfPageIndex:
+    """已索引 PDF 頁面的內容雜湊（存放在檔案目錄的 SQLite 中）"""
+
+    def __init__(self, catalog: Optional[FileCatalog] = None):
+        """
+        初始化索引
+
+        Args:
+            catalog: 檔案目錄（預設使用全局實例）
+        """
+        self._catalog = catalog
+        self._schema_conn = None
+
+    @property
+    def catalog(self) -> FileCatalog:
+        return self._catalog or get_file_catalog()
+
+    def _ensure_schema(self, conn):
+        if self._schema_conn is conn:
+            return
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS pdf_pages (
+                page_hash TEXT PRIMARY KEY,
+                source    TEXT,
+                page      INTEGER
+            )
+            """
+        )
+        self._schema_conn = conn
+
+    def is_indexed(self, page_hash: str) -> bool:
+        """頁面內容是否已索引過"""
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            row = conn.execute("SELECT 1 FROM pdf_pages WHERE page_hash = ?", (page_hash,)).fetchone()
+        return row is not None
+
+    def add(self, pages: Iterable[Tuple[str, str, int]]):
+        """
+        記錄已索引的頁面
+
+        Args:
+            pages: (內容雜湊, 來源, 頁碼) 的序列
+        """
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            conn.executemany(
+                "INSERT OR IGNORE INTO pdf_pages (page_hash, source, page) VALUES (?, ?, ?)", pages
+            )
+
+
+def load_pdf(path: str, splitter, dedup: bool = True,
+             pending: Optional[PendingIndexWrites] = None) -> Optional[List[Document]]:
+    """
+    逐頁抽取並分割 PDF
+
+    Args:
+        path: PDF 路徑
+        splitter: 文字分割器（每頁抽出後立即分割）
+        dedup: 是否略過已索引過的頁面並記錄本次的頁面（臨時分析時應關閉）
+        pending: 延後寫入佇列（提供時頁面雜湊等向量寫入成功、佇列 commit 後才記錄；否則立即記錄）
+
+    Returns:
+        分割後的片段（已標記 chunk_method，不再重複分割）；無法以 pypdf 開啟時返回 None
+    """
+    if not HAS_PYPDF:
+        return None
+
+    begin = time.perf_counter()
+    try:
+        pages = iter_pdf_pages(path)
+        first = next(pages, None)
+    except Exception as e:
+        print(f"⚠️ pypdf 無法開啟 {path}，改用 PyPDFLoader: {e}")
+        return None
+
+    index = get_pdf_page_index()
+    documents = []
+    seen = set()
+    new_pages = []
+    page_count = skipped = indexed = empty = 0
+
+    for page_number, text in chain([first] if first else [], pages):
+        page_count += 1
+        if not text.strip():
+            empty += 1
+            continue
+
+        page_hash = compute_file_id(text)
+        if page_hash in seen:
+            skipped += 1
+            continue
+        if dedup and index.is_indexed(page_hash):
+            skipped += 1
+            indexed += 1
+            continue
+        seen.add(page_hash)
+        new_pages.append((page_hash, path, page_number))
+
+        page_doc = Document(page_content=text, metadata={'source': path, 'page': page_number})
+        for chunk in splitter.split_documents([page_doc]):
+            chunk.metadata['chunk_method'] = 'pdf_page'
+            documents.append(chunk)
+
+    if dedup and new_pages:
+        if pending is not None:
+            pending.defer(index.add, [(page_hash, pending.display_source(source), page)
+                                      for page_hash, source, page in new_pages])
+        else:
+            index.add(new_pages)
+    if pending is not None:
+        pending.duplicates += indexed
+
+    elapsed = time.perf_counter() - begin
+    print(f"📑 PDF 逐頁抽取: {page_count} 頁，{page_count / max(elapsed, 1e-6):.1f} 頁/秒"
+          f"（略過重複 {skipped} 頁、空白 {empty} 頁）")
+    return documents
+
+
+# 全局實例
+_page_index: Optional[PdfPageIndex] = None
+
+
+def get_pdf_page_index() -> PdfPageIndex:
+    """獲取 PDF 頁面索引實例（單例模式）"""
+    global _page_index
+    if _page_index is None:
+        _page_index = PdfPageIndex()
+    return _page_index
@@ -0,0 +1,101 @@
+"""
+延後寫入的索引狀態
+
+片段簽名、PDF 頁面雜湊、崩潰次數等去重狀態，以及 log 的檔案目錄、模板表與記錄索引，
+都必須在片段真正寫進向量庫之後才保存，
+否則嵌入或寫入失敗時，下次重新匯入會被誤判為「已索引過」而整份略過。
+載入時把這些寫入放進佇列，呼叫端在向量寫入成功後再 commit()。
+"""
+
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+
+class PendingIndexWrites:
+    """向量寫入成功後才執行的索引寫入佇列"""
+
+    def __init__(self, source_names: Optional[Dict[str, str]] = None):
+        """
+        初始化佇列（duplicates 累計載入時因已索引過而略過的片段數）
+
+        Args:
+            source_names: 暫存路徑 -> 使用者上傳的檔名（寫入索引的來源改用上傳檔名，暫存檔會被刪除）
+        """
+        self.source_names = source_names or {}
+        self.duplicates = 0
+        self._writes: List[Tuple[Callable, tuple]] = []
+        self._claims: Dict[Hashable, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self._writes)
+
+    def defer(self, write: Callable, *args):
+        """
+        加入一筆延後的寫入
+
+        Args:
+            write: 寫入函數
+            args: 寫入函數的參數
+        """
+        self._writes.append((write, args))
+
+    def claim(self, key: Hashable, value: Any) -> Any:
+        """
+        在本批次內登記一個鍵（例如崩潰簽名的代表檔案），已被登記時返回先登記的值
+
+        Args:
+            key: 鍵
+            value: 本次要登記的值
+
+        Returns:
+            該鍵在本批次中第一次登記的值
+        """
+        return self._claims.setdefault(key, value)
+
+    def claimed(self, key: Hashable, default: Any = None) -> Any:
+        """
+        讀取本批次內已登記的值（不登記）
+
+        Args:
+            key: 鍵
+            default: 尚未登記時的返回值
+
+        Returns:
+            登記的值或 default
+        """
+        return self._claims.get(key, default)
+
+    def display_source(self, source: Optional[str]) -> Optional[str]:
+        """
+        把暫存路徑換成上傳檔名（壓縮檔成員「路徑!成員」只替換路徑部分）
+
+        Args:
+            source: 來源標識
+
+        Returns:
+            寫入索引的來源
+        """
+        path, sep, member = (source or "").partition("!")
+        name = self.source_names.get(path)
+        return f"{name}{sep}{member}" if name else source
+
+    def commit(self):
+        """
+        依加入順序執行所有寫入並清空佇列
+
+        向量已經寫入，某一筆寫入失敗時仍繼續執行其餘寫入（目錄、簽名表才能與向量庫一致），
+        全部執行完後再拋出第一個錯誤。
+        """
+        writes, self._writes = self._writes, []
+        first_error = None
+        try:
+            for write, args in writes:
+                try:
+                    write(*args)
+                except Exception as e:
+                    print(f"⚠️ 延後的索引寫入失敗: {e}")
+                    if first_error is None:
+                        first_error = e
+        finally:
+            self._claims.clear()
+        if first_error is not None:
+            raise first_error
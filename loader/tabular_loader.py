@@ -0,0 +1,299 @@
+"""
+表格與 JSON 串流載入
+
+Excel / CSV / JSON 原本整份讀進記憶體成為一個文件再按字元切割，片段會切斷
+資料列，也看不到欄位名稱。此模組逐列（逐筆記錄）讀取：
+- Excel 使用 openpyxl 唯讀模式逐列讀取每個工作表
+- CSV 使用 csv 模組逐列讀取（自動判斷分隔符號）
+- JSON 以 raw_decode 增量解析頂層陣列的元素（或 JSON Lines 的每一行）
+並以多列為一個片段輸出，每個片段都重複欄位名稱，片段不會切斷資料列；過大的 JSON
+記錄依鍵展開成多行。
+"""
+
+import csv
+import json
+from itertools import chain
+from typing import Iterator, Iterable, List, Tuple, Optional, Any, Dict
+
+from langchain.schema import Document
+
+from config import get_config
+
+try:
+    import openpyxl
+    HAS_OPENPYXL = True
+except ImportError:
+    openpyxl = None
+    HAS_OPENPYXL = False
+
+CELL_SEPARATOR = " | "
+
+
+def _cell_text(value: Any) -> str:
+    """儲存格內容轉為單行文字"""
+    if value is None:
+        return ""
+    return " ".join(str(value).split())
+
+
+def iter_csv_rows(path: str, encoding: str = 'utf-8') -> Iterator[List[str]]:
+    """
+    逐列讀取 CSV
+
+    Args:
+        path: 檔案路徑
+        encoding: 編碼
+
+    Yields:
+        欄位值列表
+    """
+    with open(path, newline='', encoding=encoding, errors='ignore') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=",;\t|")
+        except csv.Error:
+            dialect = csv.excel
+        for row in csv.reader(f, dialect):
+            yield [_cell_text(value) for value in row]
+
+
+def iter_excel_sheets(path: str) -> Iterator[Tuple[str, Iterator[List[str]]]]:
+    """
+    以唯讀模式逐個工作表、逐列讀取 Excel
+
+    Args:
+        path: .xlsx 路徑
+
+    Yields:
+        (工作表名稱, 逐列產生欄位值列表的迭代器)
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            yield sheet.title, ([_cell_text(value) for value in row]
+                                for row in sheet.iter_rows(values_only=True))
+    finally:
+        workbook.close()
+
+
+def iter_json_records(path: str, read_size: int = 1 << 16) -> Iterator[Any]:
+    """
+    增量解析 JSON：頂層為單一陣列時逐一產生元素，否則逐一產生頂層值（JSON Lines，每行可為陣列）
+
+    Args:
+        path: 檔案路徑
+        read_size: 每次讀取的字元數
+
+    Yields:
+        JSON 值
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding='utf-8', errors='ignore') as f:
+        buffer = f.read(read_size).lstrip('\ufeff')
+        eof = not buffer
+        pos = len(buffer) - len(buffer.lstrip())
+        in_array = buffer[pos:pos + 1] == '['
+        if in_array:
+            # 第一個值在首個緩衝區內就能解析完時，之後若還有資料表示是每行一個陣列的 JSON Lines
+            try:
+                end = decoder.raw_decode(buffer, pos)[1]
+                while not eof and not buffer[end:].strip():
+                    more = f.read(read_size)
+                    eof = not more
+                    buffer += more
+                in_array = not buffer[end:].strip()
+            except json.JSONDecodeError:
+                pass  # 第一個陣列超過緩衝區，先視為單一頂層陣列逐一串流
+        if in_array:
+            pos += 1
+        array_closed = False
+
+        while True:
+            # 跳過空白（陣列中再跳過逗號）
+            while pos < len(buffer) and (buffer[pos].isspace() or (in_array and buffer[pos] == ',')):
+                pos += 1
+            if pos >= len(buffer):
+                if eof:
+                    return
+                buffer, pos = f.read(read_size), 0
+                eof = not buffer
+                continue
+            if in_array and buffer[pos] == ']':
+                # 陣列結束後若還有資料，其餘部分改為逐一解析頂層值（JSON Lines）
+                in_array, array_closed = False, True
+                pos += 1
+                continue
+            if array_closed:
+                print(f"⚠️ {path} 的頂層陣列之後還有資料，改以 JSON Lines 解析其餘內容")
+                array_closed = False
+
+            try:
+                value, end = decoder.raw_decode(buffer, pos)
+                # 值剛好到緩衝區結尾時（如數字）可能還沒讀完
+                complete = end < len(buffer) or eof
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                complete = False
+
+            if not complete:
+                # 每次至少讀入與目前未解析部分等量的內容，大型值的重複解析總量維持線性
+                more = f.read(max(read_size, len(buffer) - pos))
+                eof = not more
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+
+            yield value
+            pos = end
+            if pos >= read_size:
+                buffer, pos = buffer[pos:], 0
+
+
+def batch_rows(rows: Iterable[Tuple[int, str]], header: str,
+               max_chars: Optional[int] = None, max_rows: Optional[int] = None) -> Iterator[Tuple[int, int, str]]:
+    """
+    把多列組成片段，每個片段開頭重複表頭；單列超過上限時自成一個片段
+
+    Args:
+        rows: (列號, 文字) 序列
+        header: 每個片段開頭的表頭（空字串表示沒有）
+        max_chars: 片段字元上限（預設讀取 CHUNK_SIZE）
+        max_rows: 片段列數上限（預設讀取 TABLE_ROWS_PER_CHUNK）
+
+    Yields:
+        (第一列列號, 最後一列列號, 片段文字)
+    """
+    max_chars = max_chars or int(get_config("CHUNK_SIZE", "1000"))
+    max_rows = max_rows or int(get_config("TABLE_ROWS_PER_CHUNK", "50"))
+
+    batch: List[str] = []
+    first = last = 0
+    size = len(header)
+    for number, text in rows:
+        if batch and (size + len(text) + 1 > max_chars or len(batch) >= max_rows):
+            yield first, last, "\n".join([header] + batch if header else batch)
+            batch, size = [], len(header)
+        if not batch:
+            first = number
+        batch.append(text)
+        last = number
+        size += len(text) + 1
+
+    if batch:
+        yield first, last, "\n".join([header] + batch if header else batch)
+
+
+def _table_documents(rows: Iterator[List[str]], source: str,
+                     metadata: Dict[str, Any], title: str = "") -> Iterator[Document]:
+    """
+    第一個非空列作為表頭，其餘非空列依 batch_rows 組成片段（列號與試算表一致，從 1 開始）
+
+    超過 CHUNK_SIZE 的片段（單列過長）不標記 chunk_method，交給文字分割器再切分。
+    """
+    numbered = ((number, row) for number, row in enumerate(rows, start=1) if any(row))
+    first = next(numbered, None)
+    if first is None:
+        return
+
+    header = CELL_SEPARATOR.join(first[1])
+    if title:
+        header = f"[{title}]\n{header}"
+    lines = ((number, CELL_SEPARATOR.join(row)) for number, row in numbered)
+
+    max_chars = int(get_config("CHUNK_SIZE", "1000"))
+    for row_start, row_end, text in batch_rows(lines, header, max_chars=max_chars):
+        chunk_metadata = {**metadata, 'source': source, 'row_start': row_start, 'row_end': row_end}
+        if len(text) <= max_chars:
+            chunk_metadata['chunk_method'] = 'table_rows'
+        yield Document(page_content=text, metadata=chunk_metadata)
+
+
+def load_csv(path: str) -> List[Document]:
+    """
+    逐列載入 CSV
+
+    Args:
+        path: 檔案路徑
+
+    Returns:
+        片段列表（每個片段都帶表頭）
+    """
+    return list(_table_documents(iter_csv_rows(path), path, {}))
+
+
+def load_excel(path: str) -> Optional[List[Document]]:
+    """
+    逐個工作表、逐列載入 Excel
+
+    Args:
+        path: .xlsx 路徑
+
+    Returns:
+        片段列表（每個片段都帶工作表名稱與表頭）；openpyxl 不可用或無法開啟時返回 None
+    """
+    if not HAS_OPENPYXL:
+        return None
+
+    try:
+        sheets = iter_excel_sheets(path)
+        first = next(sheets, None)
+    except Exception as e:
+        print(f"⚠️ openpyxl 無法開啟 {path}，改用 UnstructuredExcelLoader: {e}")
+        return None
+
+    documents = []
+    for name, rows in chain([first] if first else [], sheets):
+        documents.extend(_table_documents(rows, path, {'sheet': name}, title=name))
+    return documents
+
+
+def _record_lines(value: Any, max_chars: int, path: str = "") -> Iterator[str]:
+    """
+    把一筆 JSON 記錄轉成文字行；超過字元上限的物件 / 陣列依鍵（索引）展開成多行
+
+    Args:
+        value: JSON 值
+        max_chars: 每行字元上限
+        path: 目前值在記錄中的路徑（如 items[3].name）
+
+    Yields:
+        「路徑: JSON」或整筆記錄的 JSON 文字（無法再展開的過長純量自成一行）
+    """
+    text = json.dumps(value, ensure_ascii=False)
+    if len(text) > max_chars and isinstance(value, dict) and value:
+        for key, item in value.items():
+            yield from _record_lines(item, max_chars, f"{path}.{key}" if path else str(key))
+    elif len(text) > max_chars and isinstance(value, list) and value:
+        for index, item in enumerate(value):
+            yield from _record_lines(item, max_chars, f"{path}[{index}]")
+    else:
+        yield f"{path}: {text}" if path else text
+
+
+def load_json(path: str) -> List[Document]:
+    """
+    增量載入 JSON，每筆記錄保持完整（一行一筆，多筆組成一個片段）
+
+    超過 CHUNK_SIZE 的記錄（例如頂層為單一物件的檔案）依第二層以下的鍵展開成多行；
+    展開後仍過長的單一值交給文字分割器。
+
+    Args:
+        path: 檔案路徑
+
+    Returns:
+        片段列表
+    """
+    max_chars = int(get_config("CHUNK_SIZE", "1000"))
+    lines = (
+        (index, line)
+        for index, record in enumerate(iter_json_records(path))
+        for line in _record_lines(record, max_chars)
+    )
+    documents = []
+    for start, end, text in batch_rows(lines, "", max_chars=max_chars):
+        metadata = {'source': path, 'record_start': start, 'record_end': end}
+        if len(text) <= max_chars:
+            metadata['chunk_method'] = 'json_records'
+        documents.append(Document(page_content=text, metadata=metadata))
+    return documents
@@ -0,0 +1,123 @@
+"""
+快速時間戳解析
+
+log 檔案中的時間戳格式在同一個檔案內幾乎不會改變。此模組每個檔案只偵測
+一次格式，之後以固定位置切片直接組出 datetime，不再對每個時間戳逐一嘗試
+datetime.strptime（strptime 本身慢，失敗時拋出的例外更慢）。
+
+支援格式：
+- iso：2024-01-15 10:30:45、2024-01-15T10:30:45.123、2024-01-15 10:30:45,123（Log4j）
+- logcat：01-15 10:30:45.123（沒有年份，使用預設年份）
+- epoch：1705314645、1705314645.123、1705314645123（毫秒）
+"""
+
+import re
+from datetime import datetime, timedelta
+from typing import Optional, Callable, Dict
+
+EPOCH = datetime(1970, 1, 1)
+
+# 大於此值的整數 epoch 視為毫秒
+_EPOCH_MILLIS_THRESHOLD = 10 ** 11
+
+# 格式偵測（只在每個檔案的第一個時間戳，或格式改變時執行）
+_FORMAT_DETECTORS = [
+    ("iso", re.compile(r'\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}:\d{2}')),
+    ("logcat", re.compile(r'\d{2}-\d{2} \d{2}:\d{2}:\d{2}')),
+    ("epoch", re.compile(r'\d{10}(?:\d{3})?(?:\.\d+)?$')),
+]
+
+
+def _fraction_micros(s: str, start: int) -> int:
+    """讀取小數秒（最多 6 位）並轉成微秒"""
+    end = start
+    length = len(s)
+    while end < length and end - start < 6 and s[end].isdigit():
+        end += 1
+    digits = s[start:end]
+    if not digits:
+        return 0
+    return int(digits) * 10 ** (6 - len(digits))
+
+
+def _parse_iso(s: str, default_year: int) -> datetime:
+    micros = _fraction_micros(s, 20) if len(s) > 20 and s[19] in '.,' else 0
+    return datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                    int(s[11:13]), int(s[14:16]), int(s[17:19]), micros)
+
+
+def _parse_logcat(s: str, default_year: int) -> datetime:
+    micros = _fraction_micros(s, 15) if len(s) > 15 and s[14] == '.' else 0
+    return datetime(default_year, int(s[0:2]), int(s[3:5]),
+                    int(s[6:8]), int(s[9:11]), int(s[12:14]), micros)
+
+
+def _parse_epoch(s: str, default_year: int) -> datetime:
+    value = float(s)
+    if value >= _EPOCH_MILLIS_THRESHOLD:
+        value /= 1000.0
+    return EPOCH + timedelta(seconds=value)
+
+
+_FORMAT_PARSERS: Dict[str, Callable[[str, int], datetime]] = {
+    "iso": _parse_iso,
+    "logcat": _parse_logcat,
+    "epoch": _parse_epoch,
+}
+
+
+def detect_timestamp_format(timestamp_str: str) -> Optional[str]:
+    """
+    偵測時間戳格式
+
+    Args:
+        timestamp_str: 時間戳字串（已去除前後空白）
+
+    Returns:
+        格式名稱（iso / logcat / epoch），無法辨識時返回 None
+    """
+    for name, detector in _FORMAT_DETECTORS:
+        if detector.match(timestamp_str):
+            return name
+    return None
+
+
+class TimestampParser:
+    """每個檔案偵測一次格式的時間戳解析器"""
+
+    def __init__(self, default_year: Optional[int] = None):
+        """
+        初始化解析器
+
+        Args:
+            default_year: 沒有年份的格式（logcat）使用的年份，預設為今年
+        """
+        self.default_year = default_year or datetime.now().year
+        self.format: Optional[str] = None
+
+    def parse(self, timestamp_str: str) -> Optional[datetime]:
+        """
+        解析時間戳
+
+        Args:
+            timestamp_str: 時間戳字串
+
+        Returns:
+            datetime（epoch 格式為 UTC 的 naive datetime），無法解析時返回 None
+        """
+        s = timestamp_str.strip()
+        if self.format is not None:
+            try:
+                return _FORMAT_PARSERS[self.format](s, self.default_year)
+            except (ValueError, IndexError, OverflowError):
+                pass
+
+        # 第一個時間戳，或檔案中途換了格式：重新偵測
+        detected = detect_timestamp_format(s)
+        if detected is None or detected == self.format:
+            return None
+        self.format = detected
+        try:
+            return _FORMAT_PARSERS[detected](s, self.default_year)
+        except (ValueError, IndexError, OverflowError):
+            return None
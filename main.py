@@ -16,7 +16,7 @@ def main():
         print("\n📋 當前配置:")
         print(f"  LLM Provider: {get_config('LLM_PROVIDER')}")
         print(f"  Vector DB: {get_config('VECTOR_DB')}")
-        print(f"  Embed Provider: {get_config('EMBED_PROVIDER')}")
+        print(f"  Embed Provider: {get_config('EMBEDDING_PROVIDER')}")
         
     except ValueError as e:
         print(f"❌ 配置錯誤: {e}")
@@ -2,10 +2,17 @@
 import os
 import shutil
 from loader.doc_parser import load_and_split_documents
+from loader.file_catalog import FileCatalog, attach_file_metadata
+from loader.log_record_index import LogRecordIndex, build_search_filter
+from loader.crash_signature import attach_crash_occurrences
 from vectorstore.index_manager import get_vectorstore
-from llm.provider_selector import get_llm
+from vectorstore.query_batcher import get_query_embeddings
+from vectorstore.parent_store import (
+    ParentStore, split_into_children, expand_to_parents, small_to_big_enabled
+)
+from llm.provider_selector import get_shared_llm
 from utils.highlighter import highlight_chunks
-from db.sql_executor import query_database
+from db.sql_executor import query_database, summarize_sql_result, QueryFailure
 from config import get_config
 import tempfile
 from typing import List, Dict, Any, Optional, Tuple
@@ -33,7 +40,7 @@ class RAGChain:
     def _init_llm(self):
         """初始化 LLM"""
         llm_provider = get_config("LLM_PROVIDER")
-        self.llm = get_llm(provider=llm_provider)
+        self.llm = get_shared_llm(provider=llm_provider)
     
     def add_to_memory(self, human_input: str, ai_output: str):
         """添加對話到記憶"""
@@ -79,7 +86,7 @@ class RAGChain:
             enhanced_query = query
         
         if "docs" in sources:
-            doc_results = self._query_documents(enhanced_query, files)
+            doc_results = self._query_documents(enhanced_query, files, constraint_query=query)
             if doc_results:
                 results.extend(doc_results)
         
@@ -96,9 +103,29 @@ class RAGChain:
         
         return results
     
-    def _query_documents(self, query: str, files: Optional[List[str]] = None) -> List[Tuple[str, str, Any]]:
-        """查詢文件"""
+    def _query_documents(self, query: str, files: Optional[List[str]] = None,
+                         constraint_query: Optional[str] = None) -> List[Tuple[str, str, Any]]:
+        """
+        查詢文件
+        
+        問題中若帶有時間、等級、package、pid 等條件，先在 log 記錄索引中
+        篩出候選片段，再把候選 chunk_id 當作向量搜尋的過濾條件。
+        
+        Args:
+            query: 搜尋用的問題（可能已附加對話上下文）
+            files: 臨時分析的檔案列表
+            constraint_query: 用來解析結構化條件的原始問題（預設同 query）
+        """
         try:
+            # 小片段檢索時多取一些子片段，換回父片段後同一父片段的子片段會合併
+            search_k = int(get_config("SEARCH_K", "5"))
+            fetch_k = search_k
+            if small_to_big_enabled():
+                fetch_k = search_k * int(get_config("SMALL_TO_BIG_FETCH_FACTOR", "4"))
+            
+            # 臨時分析的檔案目錄、模板表、記錄索引與父片段只存在這次查詢的記憶體目錄中
+            catalog = None
+            
             # 判斷是臨時分析還是知識庫查詢
             if files:
                 # 臨時檔案分析模式
@@ -109,28 +136,31 @@ class RAGChain:
                 temp_vectorstore_path = os.path.join(temp_dir, "temp_chroma")
                 
                 try:
-                    # 載入文檔
-                    docs = load_and_split_documents(files)
+                    # 載入文檔（臨時分析需要完整內容，不做崩潰去重，也不寫入知識庫的檔案目錄）
+                    catalog = FileCatalog(":memory:")
+                    docs = load_and_split_documents(files, dedup=False, catalog=catalog)
                     if not docs:
                         return [("docs", "無法載入檔案內容", None)]
                     
                     # 創建臨時向量資料庫
                     from langchain_community.vectorstores import Chroma
-                    from vectorstore.index_manager import get_embeddings
                     
-                    embeddings = get_embeddings()
+                    embeddings = get_query_embeddings()
                     temp_vs = Chroma(
                         embedding_function=embeddings,
                         persist_directory=temp_vectorstore_path
                     )
                     
                     # 添加文檔到臨時資料庫
+                    parent_store = ParentStore(catalog)
+                    docs = split_into_children(docs, store=parent_store)
                     temp_vs.add_documents(docs)
                     print(f"✅ 已將 {len(docs)} 個文檔片段加入臨時資料庫")
                     
                     # 使用臨時資料庫進行查詢
-                    search_k = int(get_config("SEARCH_K", "5"))
-                    rel_docs = temp_vs.similarity_search(query, k=search_k)
+                    search_filter = build_search_filter(constraint_query or query, index=LogRecordIndex(catalog))
+                    rel_docs = temp_vs.similarity_search(query, k=fetch_k, filter=search_filter)
+                    rel_docs = expand_to_parents(rel_docs, store=parent_store, limit=search_k)
                     
                 finally:
                     # 清理臨時向量資料庫
@@ -142,14 +172,14 @@ class RAGChain:
                 # 知識庫查詢模式
                 print("📚 知識庫查詢模式")
                 
-                # 獲取持久化向量資料庫
-                vs = get_vectorstore()
+                # 獲取持久化向量資料庫（查詢嵌入經過共用的微批次器）
+                vs = get_vectorstore(embeddings=get_query_embeddings())
                 
                 # 從向量資料庫搜尋
-                search_k = int(get_config("SEARCH_K", "5"))
-                
                 try:
-                    rel_docs = vs.similarity_search(query, k=search_k)
+                    search_filter = build_search_filter(constraint_query or query)
+                    rel_docs = vs.similarity_search(query, k=fetch_k, filter=search_filter)
+                    rel_docs = expand_to_parents(rel_docs, limit=search_k)
                 except Exception as e:
                     if "collection" in str(e).lower() and "does not exist" in str(e).lower():
                         return [("docs", "知識庫為空，請先建立知識庫", None)]
@@ -165,9 +195,16 @@ class RAGChain:
             
             print(f"🔍 找到 {len(rel_docs)} 個相關文檔片段")
             
-            # 構建上下文
+            # 從檔案目錄補回檔案層級的欄位（severity、crash_type 等）
+            rel_docs = attach_file_metadata(rel_docs, catalog=catalog)
+            rel_docs = attach_crash_occurrences(rel_docs)
+            
+            # 構建上下文（相同崩潰只嵌入一份，出現次數來自簽名索引）
             context = "\n\n---\n\n".join([
-                f"文檔 {i+1}:\n{doc.page_content}" 
+                f"文檔 {i+1}"
+                + (f"（同一崩潰共出現 {doc.metadata['crash_occurrences']} 次）"
+                   if doc.metadata.get('crash_occurrences') else "")
+                + f":\n{doc.page_content}"
                 for i, doc in enumerate(rel_docs)
             ])
             
@@ -220,7 +257,12 @@ class RAGChain:
         """查詢資料庫"""
         try:
             sql_result = query_database(query)
-            return [("db", f"查詢結果：{sql_result}", sql_result)]
+            if isinstance(sql_result, QueryFailure):
+                return [("db", sql_result.error, None)]
+            
+            # 只把截斷後的摘要放進回答，避免把整個結果轉成字串
+            max_rows = int(get_config("SQL_ANSWER_MAX_ROWS", "20"))
+            return [("db", summarize_sql_result(sql_result, max_rows=max_rows), sql_result)]
         except Exception as e:
             return [("db", f"資料庫查詢失敗：{str(e)}", None)]
     
@@ -303,6 +345,8 @@ Log 內容：
                     doc_info['error_count'] = doc.metadata['error_count']
                 if doc.metadata.get('crash_type'):
                     doc_info['crash_type'] = doc.metadata['crash_type']
+                if doc.metadata.get('crash_occurrences'):
+                    doc_info['crash_occurrences'] = doc.metadata['crash_occurrences']
             
             highlighted.append(doc_info)
         
@@ -208,6 +208,19 @@ fi
 # 8. 啟動 API 服務
 echo -e "\n${BLUE}8. 啟動 FastAPI 應用${NC}"
 cd "$PROJECT_ROOT"
+
+# 設定 EMBEDDING_SERVICE_SOCKET 時先啟動共用的嵌入服務（各進程不再各自載入模型）
+if [ -n "$EMBEDDING_SERVICE_SOCKET" ]; then
+    start_service "embedding_service" "python3 -m vectorstore.embedding_service"
+    for i in {1..60}; do
+        if [ -S "$EMBEDDING_SERVICE_SOCKET" ]; then
+            echo -e "${GREEN}✓ 嵌入服務已就緒${NC}"
+            break
+        fi
+        sleep 1
+    done
+fi
+
 start_service "api_server" "python3 api_server.py"
 
 # 9. 顯示狀態
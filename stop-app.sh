@@ -153,6 +153,7 @@ echo "================================"
 echo -e "\n${BLUE}1. 停止 API Server${NC}"
 stop_service "api_server"
 stop_by_name "api_server.py" "API Server"
+stop_service "embedding_service"
 
 # 2. 停止 Ollama（如果有）
 if [ "$LLM_PROVIDER" == "ollama" ] || [ -f "$PID_DIR/ollama.pid" ]; then
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+嵌入模型效能測試
+比較 PyTorch（HuggingFaceEmbeddings）與 ONNX Runtime int8 量化（OnnxEmbeddings）：
+- 一致性：同一批句子兩者輸出的餘弦相似度（最小值 / 平均值）
+- 吞吐量：每秒處理的句子數（docs/knowledge.* 切成的片段，重複到指定句數）
+模型讀取 HUGGINGFACE_MODEL（與 get_embeddings() 相同）。
+需要 sentence-transformers、onnxruntime、onnx 與模型檔（HuggingFace Hub 或本機快取）；
+第一次執行會匯出並量化模型。
+直接運行: python test_script/bench_embeddings.py [句數] [執行緒數]
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from langchain_community.embeddings import HuggingFaceEmbeddings
+from config import get_config
+from vectorstore.onnx_embeddings import OnnxEmbeddings, cosine_parity, DEFAULT_MODEL
+
+PARITY_SENTENCES = 200
+MIN_COSINE = 0.98
+
+
+def load_sentences(count):
+    """從 docs/knowledge.* 取得句子，不足時重複"""
+    sentences = []
+    for path in sorted((ROOT / "docs").glob("knowledge.*")):
+        if path.suffix == ".xlsx":
+            continue
+        text = path.read_text(encoding="utf-8", errors="ignore")
+        sentences.extend(line.strip() for line in text.splitlines() if len(line.strip()) > 10)
+    if not sentences:
+        sentences = ["系統在啟動時讀取設定檔並初始化向量資料庫。", "The service restarts after an ANR in the main thread."]
+    return [sentences[i % len(sentences)] for i in range(count)]
+
+
+def throughput(embeddings, sentences):
+    """返回每秒處理的句子數"""
+    embeddings.embed_documents(sentences[:8])  # 暖機
+    begin = time.perf_counter()
+    embeddings.embed_documents(sentences)
+    return len(sentences) / (time.perf_counter() - begin)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    model_name = get_config("HUGGINGFACE_MODEL", DEFAULT_MODEL)
+    sentences = load_sentences(count)
+
+    print("=" * 60)
+    print(f"🧮 嵌入模型效能測試（{model_name}，{count} 句，{threads} 執行緒）")
+    print("=" * 60)
+
+    try:
+        torch_embeddings = HuggingFaceEmbeddings(
+            model_name=model_name,
+            model_kwargs={'device': 'cpu'},
+            encode_kwargs={'normalize_embeddings': True, 'batch_size': 32},
+        )
+        onnx_embeddings = OnnxEmbeddings(model_name=model_name, threads=threads, batch_size=32)
+        onnx_embeddings.embed_query("warm up")
+    except Exception as e:
+        print(f"❌ 無法載入模型（需要 torch、onnxruntime 與模型檔）: {e}")
+        return False
+
+    parity = cosine_parity(onnx_embeddings, torch_embeddings, sentences[:PARITY_SENTENCES])
+    print(f"\n🎯 一致性（{PARITY_SENTENCES} 句）: 最小餘弦 {parity['min']:.4f}，平均 {parity['mean']:.4f}")
+
+    torch_rate = throughput(torch_embeddings, sentences)
+    onnx_rate = throughput(onnx_embeddings, sentences)
+    print(f"\n{'後端':<28}{'句/秒':>10}")
+    print(f"{'PyTorch（fp32）':<28}{torch_rate:>10.1f}")
+    print(f"{'ONNX Runtime（int8）':<28}{onnx_rate:>10.1f}")
+    print(f"   ONNX 相對 PyTorch: {onnx_rate / torch_rate:.1f}x")
+
+    if parity['min'] < MIN_COSINE:
+        print(f"❌ 最小餘弦相似度低於 {MIN_COSINE}")
+        return False
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+log 單元平行解析成本測試
+量測多進程 ANR traces（每個「----- pid N at ... -----」區段一個單元）在不同單元數下：
+- 原進程逐一解析的時間
+- 第一次使用 spawn 進程池（含子進程載入 langchain 與解析器模組）的時間
+- 進程池重複使用時的時間（LOG_PARALLEL_MIN_UNITS 依這個與逐一解析的交叉點設定）
+直接運行: python test_script/bench_log_units.py [進程數] [每個進程的線程數]
+"""
+
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import loader.base_log_parser as base_log_parser
+from loader.android_anr_parser import AndroidANRParser
+
+UNIT_COUNTS = [4, 8, 16, 32, 64, 128]
+
+
+def make_process(pid, threads, blocked):
+    """產生一個進程的 traces 區段（每個線程約 15 層 frame）"""
+    lines = [f"----- pid {pid} at 2024-01-15 10:31:00 -----", f"Cmd line: com.example.app{pid}", "",
+             f"DALVIK THREADS ({threads}):"]
+    for tid in range(1, threads + 1):
+        state = "Blocked" if blocked and tid == 1 else "Waiting"
+        name = "main" if tid == 1 else f"worker-{tid}"
+        lines += [f'"{name}" prio=5 tid={tid} {state}',
+                  '  | group="main" sCount=1 dsCount=0 flags=1 obj=0x12c00000 self=0x7f0000',
+                  f"  | sysTid={pid + tid} nice=0 cgrp=default sched=0/0 handle=0x7f0000",
+                  "  | state=S schedstat=( 0 0 0 ) utm=0 stm=0 core=0 HZ=100"]
+        if blocked and tid == 1:
+            lines.append("  - waiting to lock <0x0abc1234> (a java.lang.Object) held by thread 12")
+        lines += [f"  at com.example.app{pid}.module{depth}.Worker.step(Worker.java:{depth})" for depth in range(15)]
+        lines.append("")
+    lines += [f"----- end {pid} -----", ""]
+    return "\n".join(lines)
+
+
+def make_traces(processes, threads):
+    """每 4 個進程中有 1 個主線程被阻塞（其餘為閒置進程，可被略過）"""
+    return "".join(make_process(1000 + i, threads, blocked=i % 4 == 0) for i in range(processes))
+
+
+def run(parser, units):
+    begin = time.perf_counter()
+    parser._analyze_units(units, "traces.txt", "bench")
+    return time.perf_counter() - begin
+
+
+def main():
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+    counts = [int(sys.argv[1])] if len(sys.argv) > 1 else UNIT_COUNTS
+    workers = int(os.environ.get("LOG_PARSE_WORKERS", "4"))
+    parser = AndroidANRParser()
+
+    print("=" * 72)
+    print(f"🧵 log 單元平行解析成本測試（每個進程 {threads} 個線程，{workers} 個解析進程，{os.cpu_count()} 核心）")
+    print("=" * 72)
+
+    units = parser.split_units(make_traces(2, threads))
+    os.environ["LOG_PARSE_WORKERS"] = str(workers)
+    os.environ["LOG_PARALLEL_MIN_UNITS"] = "1"
+    cold = run(parser, units)
+    print(f"第一次使用進程池（spawn + 載入模組）: {cold:.2f} 秒")
+    print(f"   每個單元約 {len(units[0]) / 1024:.0f} KB")
+
+    print(f"\n{'單元數':>8}{'逐一解析 秒':>14}{'進程池 秒':>12}{'每單元 ms':>12}")
+    try:
+        for count in counts:
+            units = parser.split_units(make_traces(count, threads))
+            os.environ["LOG_PARSE_WORKERS"] = "1"
+            serial = run(parser, units)
+            os.environ["LOG_PARSE_WORKERS"] = str(workers)
+            pooled = run(parser, units)
+            print(f"{count:>8}{serial:>14.3f}{pooled:>12.3f}{serial / count * 1000:>12.2f}")
+    finally:
+        base_log_parser.shutdown_unit_pool()
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Android logcat 解析吞吐量測試
+以合成的 threadtime 格式 logcat（含 E 級記錄的堆疊延續行）量測各階段的 MB/s：
+- 欄位解析（parse_logcat_columns）
+- 分組切塊與片段欄位（時間、等級、pid/tid/tag 前幾名）
+- 套件名稱抽取（每個片段跑一次正則，通常是剩下最慢的一段）
+- 端到端（parse_text，使用記憶體中的檔案目錄，不寫入全域索引）
+直接運行: python test_script/bench_logcat.py [記錄數]
+"""
+
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loader.android_logcat_parser import AndroidLogcatParser
+from loader.file_catalog import FileCatalog
+from loader.log_record_index import find_package_names
+from loader.logcat_columns import THREADTIME, parse_logcat_columns
+
+TAGS = ["ActivityManager", "chatty", "WindowManager", "AudioFlinger", "PackageManager",
+        "InputDispatcher", "com.example.app", "OkHttp", "SurfaceFlinger", "BluetoothAdapter"]
+LEVELS = "VDIWEF"
+LEVEL_WEIGHTS = [5, 30, 40, 15, 9, 1]
+
+
+def make_logcat(count):
+    """產生 count 筆 threadtime 記錄（約兩成 E 級記錄後面帶 8 行堆疊）"""
+    rng = random.Random(0)
+    lines = []
+    elapsed_ms = 0
+    for i in range(count):
+        elapsed_ms += rng.randint(0, 40)
+        seconds, ms = divmod(elapsed_ms, 1000)
+        pid = rng.choice([1234, 567, 8901, 4321, 1000])
+        tid = pid + rng.randint(0, 30)
+        level = rng.choices(LEVELS, LEVEL_WEIGHTS)[0]
+        lines.append(f"01-15 {10 + seconds // 3600 % 10:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}.{ms:03d} "
+                     f"{pid:5d} {tid:5d} {level} {rng.choice(TAGS)}: message number {i} "
+                     f"package com.example.app value={rng.random():.5f}")
+        if level == "E" and rng.random() < 0.2:
+            lines.extend(f"\tat com.example.app.Worker.step{j}(Worker.java:{j})" for j in range(8))
+    return "\n".join(lines) + "\n"
+
+
+def timed(fn, *args, **kwargs):
+    begin = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - begin
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 400000
+    content = make_logcat(count)
+    size_mb = len(content.encode("utf-8")) / 2 ** 20
+
+    print("=" * 64)
+    print(f"📱 logcat 解析吞吐量測試（{count} 筆記錄，{size_mb:.1f} MB）")
+    print("=" * 64)
+
+    columns, column_seconds = timed(parse_logcat_columns, content, THREADTIME)
+    parser = AndroidLogcatParser()
+    docs, chunk_seconds = timed(parser._parse_by_groups, columns, "bench.log")
+    _, package_seconds = timed(lambda: [find_package_names(doc.page_content) for doc in docs])
+    _, total_seconds = timed(AndroidLogcatParser().parse_text, content, "bench.log",
+                             dedup=False, catalog=FileCatalog(":memory:"))
+
+    print(f"{'階段':<20}{'秒':>10}{'MB/s':>12}")
+    for name, seconds in (("欄位解析", column_seconds),
+                          ("分組切塊 + 片段欄位", chunk_seconds),
+                          ("其中：套件名稱正則", package_seconds),
+                          ("端到端 parse_text", total_seconds)):
+        print(f"{name:<20}{seconds:>10.2f}{size_mb / seconds:>12.1f}")
+    print(f"   {len(columns)} 行，{len(docs)} 個片段")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
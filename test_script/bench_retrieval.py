@@ -0,0 +1,490 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+檢索品質 / 延遲基準測試
+以正式的匯入與查詢路徑（load_and_split_documents → split_into_children → 向量資料庫 →
+build_search_filter → expand_to_parents）索引 docs/knowledge.* 與合成的 ANR、tombstone、
+一般 log，再執行標註查詢集（test_script/retrieval_queries.json），報告：
+- recall@k（前 k 筆中的相關片段數 / min(k, 相關片段總數)）與 MRR
+- 查詢嵌入與搜尋延遲的 p50 / p95（毫秒）
+- 匯入吞吐量（MB/秒、片段/秒）與索引大小
+結果寫成 JSON（--output），可用 --compare 與先前的結果比較。向量資料庫、嵌入模型、
+CHUNK_SIZE、SEARCH_K 等設定沿用環境變數；所有檔案寫在臨時目錄，不影響現有的知識庫。
+沒有嵌入模型時可用 --embeddings hashing（詞彙雜湊基準）檢查流程。
+直接運行: python test_script/bench_retrieval.py [--log-mb 2] [--output retrieval_benchmark.json] [--compare 舊結果.json]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import zlib
+import shutil
+import random
+import argparse
+import tempfile
+import subprocess
+from pathlib import Path
+from datetime import datetime
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from langchain_core.embeddings import Embeddings
+
+QUERY_FILE = Path(__file__).resolve().parent / "retrieval_queries.json"
+COLLECTION = "retrieval_bench"
+# 結果中記錄的設定（比較兩次執行時才知道差在哪裡）
+CONFIG_KEYS = [
+    "VECTOR_DB", "EMBEDDING_PROVIDER", "TEXT_SPLITTER", "CHUNK_SIZE", "CHUNK_OVERLAP", "CHUNK_TOKENS",
+    "CHUNK_OVERLAP_TOKENS", "SEARCH_K", "SMALL_TO_BIG", "SMALL_TO_BIG_FETCH_FACTOR", "CHILD_CHUNK_TOKENS",
+    "LOCAL_VECTOR_DTYPE", "LOCAL_BINARY_PREFILTER", "LOCAL_HNSW_MIN_ROWS", "LOG_FILTER_MAX_IDS",
+]
+# --compare 時列出差異的指標
+HEADLINE_METRICS = ["mrr", "recall@1", "recall@5", "recall@10", "search_p50_ms", "search_p95_ms",
+                    "ingest_mb_per_s", "index_mb"]
+
+
+class HashingEmbeddings(Embeddings):
+    """不需要模型的詞彙雜湊基準：英數詞與中文字二元組雜湊到固定維度"""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _vector(self, text):
+        text = text.lower()
+        tokens = re.findall(r"[a-z_][a-z0-9_]+|\d+", text)
+        cjk = re.findall(r"[一-鿿]", text)
+        tokens += [a + b for a, b in zip(cjk, cjk[1:])]
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for token in tokens:
+            code = zlib.crc32(token.encode("utf-8"))
+            vector[code % self.dim] += 1.0 if code & 0x80000000 else -1.0
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts):
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self._vector(text)
+
+
+# ---- 合成 log ----
+
+ANR_TEMPLATE = """----- pid {pid} at 2024-01-15 {time} -----
+Cmd line: {package}
+Build fingerprint: 'google/sdk/generic:13/TQ3A/9876:userdebug/test-keys'
+Reason: Input dispatching timed out ({package}/.MainActivity, Waiting because no window has focus)
+
+DALVIK THREADS ({threads}):
+"main" prio=5 tid=1 {state}
+  | group="main" sCount=1 dsCount=0
+  | state=S schedstat=( 0 0 0 ) utm=120 stm=40 core=2 HZ=100
+{main_stack}
+  at android.os.Handler.dispatchMessage(Handler.java:106)
+  at android.os.Looper.loopOnce(Looper.java:201)
+  at android.app.ActivityThread.main(ActivityThread.java:8177)
+
+{other_threads}
+"Signal Catcher" daemon prio=5 tid=3 Runnable
+  | state=R schedstat=( 0 0 0 ) utm=0 stm=0 core=0 HZ=100
+"""
+
+TOMBSTONE_TEMPLATE = """*** *** *** *** *** *** *** *** *** *** *** *** *** *** *** ***
+Build fingerprint: 'google/sdk/generic:13/TQ3A/9876:userdebug/test-keys'
+Revision: '0'
+Timestamp: 2024-01-15 {time}+0800
+pid: {pid}, tid: {tid}, name: {thread}  >>> {process} <<<
+signal {signal}, fault addr {fault}
+{cause}
+backtrace:
+{frames}
+"""
+
+# 標註查詢要找的 ANR：套件 → (主執行緒狀態, 主執行緒堆疊, 其他執行緒)
+LABELED_ANRS = {
+    "com.example.music": ("Blocked", [
+        "at com.example.music.MusicService.onPause(MusicService.java:214)",
+        "- waiting to lock <0x0c1d2e3f> (a com.example.music.AudioFocusManager) held by thread 23",
+        "at com.example.music.PlayerActivity.onPause(PlayerActivity.java:88)",
+    ], '"AudioFocusWorker" prio=5 tid=23 Sleeping\n'
+       "  at java.lang.Thread.sleep(Native method)\n"
+       "  at com.example.music.AudioFocusManager.releaseFocus(AudioFocusManager.java:131)\n"
+       "  - locked <0x0c1d2e3f> (a com.example.music.AudioFocusManager)\n"),
+    "com.example.gallery": ("Native", [
+        "at android.os.BinderProxy.transactNative(Native method)",
+        "at android.os.BinderProxy.transact(BinderProxy.java:584)",
+        "at android.content.ContentProviderProxy.query(ContentProviderNative.java:472)",
+        "at com.example.gallery.ThumbnailLoader.loadFromProvider(ThumbnailLoader.java:57)",
+        "at com.example.gallery.GridAdapter.onBindViewHolder(GridAdapter.java:142)",
+    ], ""),
+    "com.example.mail": ("Runnable", [
+        "at android.database.sqlite.SQLiteConnection.nativeExecute(Native method)",
+        "at android.database.sqlite.SQLiteDatabase.executeSql(SQLiteDatabase.java:2081)",
+        "at com.example.mail.sync.MailSyncAdapter.commitBatch(MailSyncAdapter.java:311)",
+        "at com.example.mail.sync.MailSyncAdapter.onSyncFinished(MailSyncAdapter.java:276)",
+    ], ""),
+}
+
+# 標註查詢要找的 tombstone：檔名 → 欄位
+LABELED_TOMBSTONES = {
+    "com.example.camera": dict(
+        process="com.example.camera", thread="CameraHandler", signal="11 (SIGSEGV), code 1 (SEGV_MAPERR)",
+        fault="0x0", cause="Cause: null pointer dereference",
+        frames=["/vendor/lib64/libcamera_hal.so (CameraDevice::configureStreams(StreamConfig const&)+212)",
+                "/vendor/lib64/libcamera_hal.so (CameraDevice::createSession()+96)",
+                "/system/lib64/libcameraservice.so (android::Camera3Device::configureStreamsLocked()+1024)"]),
+    "mediaserver": dict(
+        process="/system/bin/mediaserver", thread="MediaCodec_loop", signal="6 (SIGABRT), code -1 (SI_QUEUE)",
+        fault="--------",
+        cause="Abort message: 'FORTIFY: pthread_mutex_lock called on a destroyed mutex (0x7b2c4d1e80)'",
+        frames=["/apex/com.android.runtime/lib64/bionic/libc.so (abort+164)",
+                "/apex/com.android.runtime/lib64/bionic/libc.so (__fortify_fatal(char const*, ...)+124)",
+                "/system/lib64/libmedia_codec.so (CodecLooper::drainOutput()+88)"]),
+    "com.example.game": dict(
+        process="com.example.game", thread="PhysicsWorker", signal="7 (SIGBUS), code 1 (BUS_ADRALN)",
+        fault="0x7a1c3e5f01", cause="Cause: misaligned memory access (bus error)",
+        frames=["/data/app/com.example.game/lib/arm64/libphysics.so (RigidBody::integrate(float)+72)",
+                "/data/app/com.example.game/lib/arm64/libphysics.so (World::step(float)+340)"]),
+}
+
+NOISE_PACKAGES = ["com.example.weather", "com.example.notes", "com.example.maps", "com.example.calendar",
+                  "com.example.chat", "com.example.browser", "com.example.clock", "com.example.store"]
+
+# 一般 log 中的事件：(佔全檔的位置, 等級, 服務, 訊息)
+LOG_INCIDENTS = [
+    (0.12, "ERROR", "auth-service", "JWT signature verification failed for user_id=8842: token expired at 10:08:51"),
+    (0.35, "ERROR", "payment-service", "HikariPool-1 - Connection is not available, request timed out after "
+                                       "30000ms (database connection pool exhausted, active=50 idle=0 waiting=212)"),
+    (0.46, "WARN", "orders-consumer", "consumer group orders-cg rebalance triggered, partition lag on topic orders "
+                                      "reached 48211 messages"),
+    (0.54, "ERROR", "disk-monitor", "/var/lib/data usage 97% exceeds threshold 90%, compaction postponed"),
+    (0.75, "FATAL", "scheduler", "java.lang.OutOfMemoryError: Java heap space while building report nightly-sales"),
+]
+
+
+def anr_text(pid, package, state, main_stack, other_threads, minute):
+    return ANR_TEMPLATE.format(
+        pid=pid, time=f"10:{minute:02d}:00", package=package, state=state,
+        threads=3 if other_threads else 2,
+        main_stack="\n".join(f"  {line}" for line in main_stack),
+        other_threads=other_threads,
+    )
+
+
+def tombstone_text(pid, minute, process, thread, signal, fault, cause, frames):
+    return TOMBSTONE_TEMPLATE.format(
+        pid=pid, tid=pid + 17, time=f"11:{minute:02d}:30", process=process, thread=thread,
+        signal=signal, fault=fault, cause=cause,
+        frames="\n".join(f"      #{i:02d} pc {0x4c0a0 + i * 0x1f0:016x}  {frame}" for i, frame in enumerate(frames)),
+    )
+
+
+def general_log_text(size_mb):
+    """產生合成的服務 log（10:00–12:00），依比例插入 LOG_INCIDENTS 中的事件"""
+    rng = random.Random(0)
+    services = ["api-gateway", "order-service", "inventory", "payment-service", "auth-service", "search"]
+    levels = ["INFO"] * 12 + ["DEBUG"] * 4 + ["WARN", "ERROR"]
+    line_count = max(2000, int(size_mb * 1024 * 1024 / 110))
+    incidents = {int(position * line_count): incident for position, *incident in LOG_INCIDENTS}
+    lines = []
+    for i in range(line_count):
+        seconds = 36000 + i * 7200 // line_count
+        stamp = f"2024-01-15 {seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}.{i % 1000:03d}"
+        if i in incidents:
+            level, service, message = incidents[i]
+            lines.append(f"{stamp} {level} [{service}] {message}")
+            continue
+        level = rng.choice(levels)
+        service = rng.choice(services)
+        if level == "ERROR":
+            message = f"upstream call to {rng.choice(services)} failed: timeout after {rng.randint(1, 9)}000ms"
+        elif level == "WARN":
+            message = f"slow request {i} took {rng.randint(900, 4000)}ms"
+        else:
+            message = f"request {i} handled in {rng.randint(1, 900)}ms status={rng.choice([200, 200, 201, 404])}"
+        lines.append(f"{stamp} {level} [{service}] {message}")
+    return "\n".join(lines) + "\n"
+
+
+def build_corpus(corpus_dir, log_mb):
+    """把 docs/knowledge.*（支援的格式）複製到 corpus_dir 並寫入合成 log，返回檔案路徑列表"""
+    from loader import is_supported_file
+
+    paths = []
+    for path in sorted((ROOT / "docs").glob("knowledge.*")):
+        if not is_supported_file(path.name):
+            continue
+        target = corpus_dir / path.name
+        shutil.copyfile(path, target)
+        paths.append(target)
+
+    files = {}
+    for number, (package, (state, stack, others)) in enumerate(LABELED_ANRS.items()):
+        files[f"anr_{package}.log"] = anr_text(4000 + number, package, state, stack, others, 10 + number)
+    for number, package in enumerate(NOISE_PACKAGES):
+        stack = [f"at android.os.MessageQueue.nativePollOnce(Native method)",
+                 f"at {package}.ui.HomeFragment.refresh(HomeFragment.java:{40 + number})"]
+        files[f"anr_{package}.log"] = anr_text(5000 + number, package, "Native", stack, "", 20 + number)
+    for number, (name, fields) in enumerate(LABELED_TOMBSTONES.items()):
+        files[f"tombstone_{name}.log"] = tombstone_text(6000 + number, 10 + number, **fields)
+    for number, package in enumerate(NOISE_PACKAGES):
+        files[f"tombstone_{package}.log"] = tombstone_text(
+            7000 + number, 20 + number, process=package, thread="RenderThread",
+            signal="11 (SIGSEGV), code 2 (SEGV_ACCERR)", fault=f"0x{0x7f00 + number:x}", cause="",
+            frames=["/apex/com.android.runtime/lib64/bionic/libc.so (memcpy+112)",
+                    "/system/lib64/libhwui.so (android::uirenderer::RenderThread::threadLoop()+304)"])
+    files["server.log"] = general_log_text(log_mb)
+
+    for name, text in files.items():
+        target = corpus_dir / name
+        target.write_text(text, encoding="utf-8")
+        paths.append(target)
+    return [str(path) for path in paths]
+
+
+# ---- 評估 ----
+
+def source_name(doc):
+    """片段來源的檔名（壓縮檔成員取 ! 之後的部分）"""
+    return Path(str(doc.metadata.get("source", "")).split("!")[-1]).name
+
+
+def is_relevant(doc, label):
+    if source_name(doc) not in label["sources"]:
+        return False
+    contains = label.get("contains")
+    if not contains:
+        return True
+    content = doc.page_content.lower()
+    return any(text.lower() in content for text in contains)
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)), 3) if values else None
+
+
+def directory_size(path):
+    path = Path(path)
+    if path.is_file():
+        return path.stat().st_size
+    if not path.exists():
+        return 0
+    return sum(item.stat().st_size for item in path.rglob("*") if item.is_file())
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def evaluate(labels, docs, ranked, ks):
+    """
+    計算 recall@k 與 MRR
+
+    Args:
+        labels: 標註查詢
+        docs: 索引的片段（計算每個查詢的相關片段總數）
+        ranked: 每個查詢的檢索結果
+        ks: 要報告的 k
+
+    Returns:
+        (整體指標, 每個查詢的明細)
+    """
+    details = []
+    for label, results in zip(labels, ranked):
+        relevant_total = sum(1 for doc in docs if is_relevant(doc, label))
+        flags = [is_relevant(doc, label) for doc in results]
+        first = next((rank for rank, flag in enumerate(flags, 1) if flag), None)
+        detail = {
+            "query": label["query"],
+            "category": label.get("category", ""),
+            "relevant_total": relevant_total,
+            "first_relevant_rank": first,
+            "reciprocal_rank": 1.0 / first if first else 0.0,
+            "top_sources": [source_name(doc) for doc in results[:3]],
+        }
+        for k in ks:
+            detail[f"recall@{k}"] = sum(flags[:k]) / min(k, relevant_total) if relevant_total else 0.0
+        details.append(detail)
+
+    def summarize(rows):
+        summary = {"queries": len(rows), "mrr": round(float(np.mean([row["reciprocal_rank"] for row in rows])), 4)}
+        for k in ks:
+            summary[f"recall@{k}"] = round(float(np.mean([row[f"recall@{k}"] for row in rows])), 4)
+        summary["unlabeled"] = sum(1 for row in rows if not row["relevant_total"])
+        return summary
+
+    metrics = summarize(details)
+    metrics["by_category"] = {
+        category: summarize([row for row in details if row["category"] == category])
+        for category in sorted({row["category"] for row in details})
+    }
+    return metrics, details
+
+
+def compare(result, baseline_path):
+    """列出與先前結果的指標差異"""
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    print(f"\n📊 與 {baseline_path}（{baseline.get('git_commit')}）比較")
+    print(f"{'指標':<18}{'先前':>12}{'本次':>12}{'差異':>12}")
+    for name in HEADLINE_METRICS:
+        old, new = baseline.get("summary", {}).get(name), result["summary"].get(name)
+        if old is None or new is None:
+            continue
+        print(f"{name:<18}{old:>12.4f}{new:>12.4f}{new - old:>+12.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="檢索品質 / 延遲基準測試")
+    parser.add_argument("--queries", default=str(QUERY_FILE), help="標註查詢集 JSON")
+    parser.add_argument("--log-mb", type=float, default=2.0, help="合成一般 log 的大小（MB）")
+    parser.add_argument("--k", default="1,3,5,10", help="要報告的 recall@k")
+    parser.add_argument("--rounds", type=int, default=5, help="每個查詢重複搜尋的次數（計算延遲）")
+    parser.add_argument("--embeddings", choices=["config", "hashing"], default="config",
+                        help="config：依環境變數的嵌入模型；hashing：不需要模型的詞彙雜湊基準")
+    parser.add_argument("--output", default="retrieval_benchmark.json", help="結果 JSON 路徑")
+    parser.add_argument("--compare", help="與先前的結果 JSON 比較")
+    parser.add_argument("--keep", action="store_true", help="保留臨時目錄（索引與語料）")
+    args = parser.parse_args()
+    ks = sorted({int(k) for k in args.k.split(",")})
+
+    with open(args.queries, encoding="utf-8") as f:
+        labels = json.load(f)["queries"]
+
+    # 所有索引與 SQLite 側表都寫在臨時目錄
+    workspace = Path(tempfile.mkdtemp(prefix="rag-bench-"))
+    corpus_dir = workspace / "corpus"
+    corpus_dir.mkdir()
+    os.environ["FILE_CATALOG_PATH"] = str(workspace / "catalog.sqlite3")
+    os.environ["CHROMA_PERSIST_DIR"] = str(workspace / "chroma")
+    os.environ["LOCAL_VECTOR_DIR"] = str(workspace / "local")
+
+    from config import get_config
+    from loader.doc_parser import load_and_split_documents
+    from loader.log_record_index import build_search_filter
+    from vectorstore.index_manager import get_vectorstore, get_embeddings, add_documents_bulk
+    from vectorstore.parent_store import split_into_children, expand_to_parents, small_to_big_enabled
+
+    try:
+        paths = build_corpus(corpus_dir, args.log_mb)
+        input_bytes = sum(os.path.getsize(path) for path in paths)
+
+        print("=" * 72)
+        print(f"🎯 檢索基準測試（{len(paths)} 個檔案，{input_bytes / 2 ** 20:.2f} MB，{len(labels)} 個查詢，"
+              f"VECTOR_DB={get_config('VECTOR_DB', 'chroma')}）")
+        print("=" * 72)
+
+        # 匯入（與 api_server 相同的路徑；hashing 基準直接寫入向量資料庫）
+        begin = time.perf_counter()
+        docs = load_and_split_documents(paths, dedup=False)
+        parse_seconds = time.perf_counter() - begin
+        children = split_into_children(docs)
+        if args.embeddings == "hashing":
+            embeddings = HashingEmbeddings()
+            get_vectorstore(COLLECTION, embeddings=embeddings).add_documents(children)
+        else:
+            embeddings = get_embeddings()
+            add_documents_bulk(children, collection_name=COLLECTION)
+        ingest_seconds = time.perf_counter() - begin
+
+        vector_dir = (workspace / "local" / COLLECTION if get_config("VECTOR_DB", "chroma") == "local"
+                      else workspace / "chroma")
+        index_bytes = directory_size(vector_dir)
+        catalog_bytes = sum(directory_size(path) for path in workspace.glob("catalog.sqlite3*"))
+
+        # 查詢（與 rag_chain 相同：前置過濾 → 取 fetch_k 個子片段 → 換回父片段）
+        search_k = max(ks)
+        fetch_k = search_k
+        if small_to_big_enabled():
+            fetch_k = search_k * int(get_config("SMALL_TO_BIG_FETCH_FACTOR", "4"))
+        vs = get_vectorstore(COLLECTION, embeddings=embeddings)
+
+        embed_ms, search_ms, ranked = [], [], []
+        for label in labels:
+            for _ in range(args.rounds):
+                begin = time.perf_counter()
+                vector = embeddings.embed_query(label["query"])
+                embed_ms.append((time.perf_counter() - begin) * 1000)
+            for round_number in range(args.rounds):
+                begin = time.perf_counter()
+                search_filter = build_search_filter(label["query"])
+                results = vs.similarity_search_by_vector(vector, k=fetch_k, filter=search_filter)
+                results = expand_to_parents(results, limit=search_k)
+                search_ms.append((time.perf_counter() - begin) * 1000)
+                if round_number == 0:
+                    ranked.append(results)
+
+        metrics, details = evaluate(labels, docs, ranked, ks)
+        result = {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_commit": git_commit(),
+            "embeddings": args.embeddings,
+            "config": {key: get_config(key, "") for key in CONFIG_KEYS},
+            "corpus": {"files": len(paths), "input_bytes": input_bytes, "log_mb": args.log_mb,
+                       "chunks": len(docs), "indexed_chunks": len(children)},
+            "ingestion": {
+                "parse_seconds": round(parse_seconds, 3),
+                "total_seconds": round(ingest_seconds, 3),
+                "mb_per_s": round(input_bytes / 2 ** 20 / ingest_seconds, 3),
+                "chunks_per_s": round(len(children) / ingest_seconds, 1),
+            },
+            "index": {"vector_bytes": index_bytes, "catalog_bytes": catalog_bytes},
+            "latency_ms": {
+                "embed_query": {"p50": percentile(embed_ms, 50), "p95": percentile(embed_ms, 95)},
+                "search": {"p50": percentile(search_ms, 50), "p95": percentile(search_ms, 95),
+                           "rounds": args.rounds},
+            },
+            "retrieval": metrics,
+            "queries": details,
+        }
+        result["summary"] = {
+            "mrr": metrics["mrr"],
+            **{f"recall@{k}": metrics[f"recall@{k}"] for k in ks},
+            "search_p50_ms": result["latency_ms"]["search"]["p50"],
+            "search_p95_ms": result["latency_ms"]["search"]["p95"],
+            "ingest_mb_per_s": result["ingestion"]["mb_per_s"],
+            "index_mb": round(index_bytes / 2 ** 20, 3),
+        }
+
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+        print(f"\n{'類別':<12}{'查詢數':>8}{'MRR':>8}" + "".join(f"{f'R@{k}':>8}" for k in ks))
+        for category, summary in [("全部", metrics), *metrics["by_category"].items()]:
+            print(f"{category:<12}{summary['queries']:>8}{summary['mrr']:>8.3f}"
+                  + "".join(f"{summary[f'recall@{k}']:>8.3f}" for k in ks))
+        print(f"\n⏱️ 搜尋延遲 p50 {result['latency_ms']['search']['p50']:.2f} ms，"
+              f"p95 {result['latency_ms']['search']['p95']:.2f} ms；"
+              f"查詢嵌入 p50 {result['latency_ms']['embed_query']['p50']:.2f} ms")
+        print(f"📥 匯入 {len(children)} 個片段：{ingest_seconds:.2f} 秒（{result['ingestion']['mb_per_s']:.2f} MB/秒，"
+              f"{result['ingestion']['chunks_per_s']:.0f} 片段/秒）")
+        print(f"💾 向量索引 {index_bytes / 2 ** 20:.2f} MB，檔案目錄 {catalog_bytes / 2 ** 20:.2f} MB")
+        missing = [row["query"] for row in details if not row["relevant_total"]]
+        if missing:
+            print(f"⚠️ {len(missing)} 個查詢在索引中沒有相關片段（來源檔案可能無法載入）: {missing}")
+        print(f"📝 結果已寫入 {args.output}")
+
+        if args.compare:
+            compare(result, args.compare)
+    finally:
+        if get_config("VECTOR_DB", "chroma") == "local":
+            from vectorstore.local_store import close_local_indexes
+            close_local_indexes()
+        if args.keep:
+            print(f"📁 保留臨時目錄: {workspace}")
+        else:
+            shutil.rmtree(workspace, ignore_errors=True)
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+文字分割器效能測試
+比較 RecursiveCharacterTextSplitter 與單次掃描的 OffsetTextSplitter：
+- docs/knowledge.*（文件路徑；檔案很小，重複到約 2 MB）：原本以字元計算的設定、
+  以 token 計算長度的 Recursive（length_function），以及以 token 計算的 Offset
+- 合成的大型 log（log 解析器路徑，以字元計算長度）
+直接運行: python test_script/bench_splitter.py [log 大小 MB]
+"""
+
+import sys
+import time
+import random
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from loader.offset_splitter import OffsetTextSplitter, get_token_counter
+
+DOC_SEPARATORS = ["\n\n", "\n", "。", "！", "？", ".", "!", "?", " ", ""]
+LOG_SEPARATORS = ["\n\n", "\n", " ", ""]
+DOC_TARGET_CHARS = 2_000_000
+
+
+def make_log(size_mb):
+    """產生合成的 log 內容"""
+    random.seed(0)
+    levels = ["INFO"] * 8 + ["WARN", "ERROR"]
+    lines = []
+    size = 0
+    i = 0
+    while size < size_mb * 1024 * 1024:
+        line = (f"2024-01-15 10:{i // 6000 % 60:02d}:{i // 100 % 60:02d}.{i % 1000:03d} "
+                f"{random.choice(levels)} [worker-{i % 16}] com.example.Service - "
+                f"request {i} handled in {random.randint(1, 900)}ms status={random.choice([200, 200, 404, 500])}")
+        lines.append(line)
+        size += len(line) + 1
+        i += 1
+    return "\n".join(lines)
+
+
+def run(name, split, text, counter):
+    """執行一次分割，返回 (耗時, 片段數, 最大 token 數)"""
+    begin = time.perf_counter()
+    chunks = split(text)
+    elapsed = time.perf_counter() - begin
+    max_tokens = max(counter.count(chunk) for chunk in chunks[:2000]) if chunks else 0
+    return elapsed, len(chunks), max_tokens
+
+
+def report(label, text, splitters, counter):
+    print(f"\n📄 {label}（{len(text) / 1024 / 1024:.2f} MB）")
+    print(f"{'分割器':<34}{'耗時 (秒)':>10}{'MB/秒':>10}{'片段數':>10}{'最大 token':>12}")
+    times = {}
+    for name, split in splitters:
+        elapsed, count, max_tokens = run(name, split, text, counter)
+        times[name] = elapsed
+        print(f"{name:<34}{elapsed:>10.3f}{len(text) / 1024 / 1024 / elapsed:>10.1f}{count:>10}{max_tokens:>12}")
+    names = [name for name, _ in splitters]
+    for name in names[:-1]:
+        print(f"   Offset 相對 {name}: {times[name] / times[names[-1]]:.1f}x")
+
+
+def main():
+    log_mb = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    counter = get_token_counter()
+
+    print("=" * 60)
+    print(f"✂️  文字分割器效能測試（token 計數: {counter.name}）")
+    print("=" * 60)
+
+    recursive_doc = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100,
+                                                   length_function=len, separators=DOC_SEPARATORS)
+    recursive_tokens = RecursiveCharacterTextSplitter(chunk_size=256, chunk_overlap=32,
+                                                      length_function=counter.count, separators=DOC_SEPARATORS)
+    offset_doc = OffsetTextSplitter(chunk_size=256, chunk_overlap=32, counter=counter)
+    for path in sorted((ROOT / "docs").glob("knowledge.*")):
+        if path.suffix == ".xlsx":
+            continue
+        sample = path.read_text(encoding="utf-8", errors="ignore")
+        text = "\n\n".join([sample] * (DOC_TARGET_CHARS // max(len(sample), 1) + 1))
+        report(path.name, text, [
+            ("Recursive（1000 字元）", recursive_doc.split_text),
+            ("Recursive（256 token）", recursive_tokens.split_text),
+            ("Offset（256 token）", offset_doc.split_text),
+        ], counter)
+
+    log = make_log(log_mb)
+    recursive_log = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200,
+                                                   length_function=len, separators=LOG_SEPARATORS)
+    offset_log = OffsetTextSplitter(chunk_size=2000, chunk_overlap=200, unit="chars", separators=LOG_SEPARATORS)
+    report("合成 log", log, [
+        ("Recursive（2000 字元）", recursive_log.split_text),
+        ("Offset（2000 字元）", offset_log.split_text),
+    ], counter)
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+時間戳解析吞吐量測試
+比較逐一嘗試 strptime 的舊作法與每檔偵測一次格式的快速解析器
+直接運行: python test_script/bench_timestamp.py [筆數]
+"""
+
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from loader.timestamp_parser import TimestampParser
+
+# 舊版 BaseLogParser.parse_timestamp 依序嘗試的格式
+STRPTIME_FORMATS = [
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S,%f',
+]
+
+
+def strptime_parse(timestamp_str):
+    """舊作法：每個時間戳都逐一嘗試所有格式"""
+    for fmt in STRPTIME_FORMATS:
+        try:
+            return datetime.strptime(timestamp_str.strip(), fmt)
+        except:
+            continue
+    return None
+
+
+def strptime_logcat(timestamp_str):
+    """logcat 沒有年份，strptime 需補上年份再解析"""
+    try:
+        return datetime.strptime(f"2024-{timestamp_str.strip()}", '%Y-%m-%d %H:%M:%S.%f')
+    except ValueError:
+        return None
+
+
+def strptime_epoch(timestamp_str):
+    """舊作法不支援 epoch，以標準函式庫的 fromtimestamp 作為對照"""
+    return datetime.fromtimestamp(float(timestamp_str), timezone.utc).replace(tzinfo=None)
+
+
+def make_samples(count):
+    """產生各格式的時間戳字串"""
+    start = datetime(2024, 1, 15, 10, 0, 0)
+    stamps = [start + timedelta(milliseconds=37 * i) for i in range(count)]
+    return {
+        "iso": [ts.strftime('%Y-%m-%d %H:%M:%S') for ts in stamps],
+        "iso_fraction": [ts.strftime('%Y-%m-%dT%H:%M:%S.%f')[:-3] for ts in stamps],
+        "log4j": [ts.strftime('%Y-%m-%d %H:%M:%S,%f')[:-3] for ts in stamps],
+        "logcat": [ts.strftime('%m-%d %H:%M:%S.%f')[:-3] for ts in stamps],
+        "epoch": [f"{(ts - datetime(1970, 1, 1)).total_seconds():.3f}" for ts in stamps],
+    }
+
+
+def time_range(parse, samples):
+    """以串流方式計算 min / max，回傳耗時與結果"""
+    begin = time.perf_counter()
+    earliest = latest = None
+    for s in samples:
+        ts = parse(s)
+        if ts is None:
+            continue
+        if earliest is None or ts < earliest:
+            earliest = ts
+        if latest is None or ts > latest:
+            latest = ts
+    return time.perf_counter() - begin, (earliest, latest)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print("=" * 60)
+    print(f"⏱️  時間戳解析吞吐量測試（每種格式 {count:,} 筆）")
+    print("=" * 60)
+
+    samples = make_samples(count)
+    baselines = {"logcat": strptime_logcat, "epoch": strptime_epoch}
+
+    print(f"{'格式':<14}{'strptime (筆/秒)':>20}{'快速解析 (筆/秒)':>20}{'加速':>8}")
+    for name, values in samples.items():
+        slow_parse = baselines.get(name, strptime_parse)
+        slow_time, slow_range = time_range(slow_parse, values)
+        fast_time, fast_range = time_range(TimestampParser(default_year=2024).parse, values)
+
+        if slow_range != fast_range:
+            print(f"❌ {name}: 結果不一致 {slow_range} != {fast_range}")
+            return False
+
+        print(f"{name:<14}{count / slow_time:>20,.0f}{count / fast_time:>20,.0f}{slow_time / fast_time:>7.1f}x")
+
+    print("\n✅ 所有格式的時間範圍結果一致")
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
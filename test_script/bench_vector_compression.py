@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量壓縮效能測試
+比較本機向量庫（VECTOR_DB=local）各種儲存型別的記憶體與召回率：
+- float32 / float16 / int8，以及加上 1-bit 二元簽名預篩後重算分數
+- 每筆向量的 bytes、索引總大小（含 HNSW 圖）、recall@k（以 float32 精確搜尋為標準答案）、平均搜尋延遲
+- 已安裝 hnswlib 時另外測試建立 HNSW 圖的情況：hnswlib 在圖中保存每筆向量的 float32
+  副本且整個載入記憶體，壓縮儲存在這個模式下幾乎不減少記憶體
+向量來自 docs/knowledge.* 的片段經 get_embeddings() 計算；嵌入模型無法載入時改用
+有群聚結構的合成向量（--synthetic 可直接指定）。
+直接運行: python test_script/bench_vector_compression.py [向量數] [--synthetic]
+"""
+
+import os
+import sys
+import time
+import shutil
+import tempfile
+from pathlib import Path
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from vectorstore.local_store import LocalVectorIndex, HAS_HNSWLIB, HNSW_FILE
+
+QUERIES = 200
+TOP_K = 10
+# (儲存型別, 二元簽名預篩, HNSW 圖)
+CONFIGS = [
+    ("float32", False, False),
+    ("float16", False, False),
+    ("int8", False, False),
+    ("float16", True, False),
+    ("int8", True, False),
+    ("float32", False, True),
+    ("int8", False, True),
+]
+
+
+def corpus_vectors(count):
+    """以嵌入模型計算 docs/knowledge.* 片段的向量，不足時重複並加上微小擾動"""
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    from vectorstore.index_manager import get_embeddings
+
+    texts = []
+    for path in sorted((ROOT / "docs").glob("knowledge.*")):
+        if path.suffix == ".xlsx":
+            continue
+        text = path.read_text(encoding="utf-8", errors="ignore")
+        texts.extend(RecursiveCharacterTextSplitter(chunk_size=300, chunk_overlap=30).split_text(text))
+    vectors = np.asarray(get_embeddings().embed_documents(texts), dtype=np.float32)
+    rng = np.random.default_rng(0)
+    repeated = vectors[np.arange(count) % len(vectors)]
+    return repeated + rng.normal(scale=0.02, size=repeated.shape).astype(np.float32)
+
+
+def synthetic_vectors(count, dim=384, clusters=64):
+    """有群聚結構的合成向量（接近真實嵌入：同主題的片段彼此接近）"""
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=count)
+    return centers[labels] + rng.normal(scale=0.8, size=(count, dim)).astype(np.float32)
+
+
+def normalize(vectors):
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def run_config(root, dtype, binary, hnsw, vectors, queries, truth):
+    """建立一個索引並返回 (每筆 bytes, 索引大小, HNSW 圖大小, recall@k, 平均延遲毫秒)"""
+    path = os.path.join(root, f"{dtype}-{'binary' if binary else 'plain'}-{'hnsw' if hnsw else 'flat'}")
+    index = LocalVectorIndex(path, dtype=dtype, binary=binary)
+    index.hnsw_min_rows = 1 if hnsw else 10 ** 12
+    ids = [str(i) for i in range(len(vectors))]
+    for start in range(0, len(vectors), 5000):
+        end = start + 5000
+        index.upsert(ids[start:end], vectors[start:end], [""] * len(ids[start:end]), [{}] * len(ids[start:end]))
+
+    hits = 0
+    begin = time.perf_counter()
+    for query, expected in zip(queries, truth):
+        rows = {row for row, _ in index.search(query, TOP_K)}
+        hits += len(rows & set(expected))
+    latency = (time.perf_counter() - begin) / len(queries) * 1000
+
+    vector_bytes = os.path.getsize(os.path.join(path, "vectors.bin"))
+    signs_path = os.path.join(path, "signs.bin")
+    if os.path.exists(signs_path):
+        vector_bytes += os.path.getsize(signs_path)
+    hnsw_path = os.path.join(path, HNSW_FILE)
+    graph_bytes = os.path.getsize(hnsw_path) if os.path.exists(hnsw_path) else 0
+    size = index.size_bytes()
+    index.close()
+    return vector_bytes / len(vectors), size, graph_bytes, hits / (len(queries) * TOP_K), latency
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    count = int(args[0]) if args else 20000
+    vectors = None
+    if "--synthetic" not in sys.argv:
+        try:
+            vectors = corpus_vectors(count)
+            source = "docs/knowledge.*"
+        except Exception as e:
+            print(f"⚠️ 無法以嵌入模型計算向量，改用合成向量: {e}")
+    if vectors is None:
+        vectors = synthetic_vectors(count)
+        source = "合成向量"
+
+    vectors = normalize(vectors)
+    rng = np.random.default_rng(1)
+    picks = rng.choice(len(vectors), size=QUERIES, replace=False)
+    queries = normalize(vectors[picks] + rng.normal(scale=0.05, size=(QUERIES, vectors.shape[1])).astype(np.float32))
+    truth = [np.argsort(-(vectors @ query))[:TOP_K] for query in queries]
+
+    print("=" * 86)
+    print(f"🗜️ 向量壓縮效能測試（{source}，{len(vectors)} 筆 × {vectors.shape[1]} 維，{QUERIES} 個查詢）")
+    print("=" * 86)
+    print(f"{'儲存方式':<24}{'bytes/向量':>12}{'總大小 MB':>12}{'圖 MB':>10}{f'recall@{TOP_K}':>12}{'延遲 ms':>10}")
+
+    root = tempfile.mkdtemp()
+    try:
+        for dtype, binary, hnsw in CONFIGS:
+            if hnsw and not HAS_HNSWLIB:
+                continue
+            per_vector, size, graph, recall, latency = run_config(root, dtype, binary, hnsw, vectors, queries, truth)
+            name = f"{dtype}{' + 二元預篩' if binary else ''}{' + HNSW' if hnsw else ''}"
+            print(f"{name:<24}{per_vector:>12.0f}{size / 2 ** 20:>12.1f}{graph / 2 ** 20:>10.1f}"
+                  f"{recall:>12.3f}{latency:>10.2f}")
+        if HAS_HNSWLIB:
+            print("   HNSW 圖整個載入記憶體且保存 float32 向量副本；向量檔與簽名檔為記憶體映射")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+    return True
+
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
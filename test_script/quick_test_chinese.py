@@ -107,7 +107,7 @@ def test_rag_integration():
     try:
         # 設定環境變數
         import os
-        os.environ['EMBED_PROVIDER'] = 'huggingface'
+        os.environ['EMBEDDING_PROVIDER'] = 'huggingface'
         os.environ['HUGGINGFACE_MODEL'] = 'shibing624/text2vec-base-chinese'
         
         # 測試載入
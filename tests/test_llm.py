@@ -10,7 +10,7 @@ LLM 提供者測試
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 import os
-from llm.provider_selector import get_llm
+from llm.provider_selector import get_llm, get_shared_llm, warmup_llm, clear_llm_registry
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
 from langchain_community.llms import Ollama
@@ -156,6 +156,63 @@ class TestLLMFunctionality:
         mock_instance.predict.assert_called_once_with("測試問題")
 
 
+class TestSharedLLMRegistry:
+    """共用 LLM 註冊表測試"""
+    
+    def setup_method(self):
+        """每個測試前清空註冊表"""
+        self.original_env = os.environ.copy()
+        clear_llm_registry()
+    
+    def teardown_method(self):
+        """每個測試後恢復環境並清空註冊表"""
+        os.environ.clear()
+        os.environ.update(self.original_env)
+        clear_llm_registry()
+    
+    @patch('llm.provider_selector.SimpleOllama')
+    def test_shared_llm_is_reused(self, mock_ollama):
+        """測試相同鍵只建立一次實例"""
+        os.environ["LLM_PROVIDER"] = "ollama"
+        
+        first = get_shared_llm()
+        second = get_shared_llm(provider="ollama")
+        
+        assert first is second
+        mock_ollama.assert_called_once()
+    
+    @patch('llm.provider_selector.SimpleOllama')
+    def test_shared_llm_keyed_by_temperature_and_model(self, mock_ollama):
+        """測試不同溫度或模型各自建立實例"""
+        mock_ollama.side_effect = lambda **kwargs: Mock(**kwargs)
+        
+        default = get_shared_llm(provider="ollama")
+        precise = get_shared_llm(provider="ollama", temperature=0)
+        other = get_shared_llm(provider="ollama", model="qwen2")
+        
+        assert len({id(default), id(precise), id(other)}) == 3
+        assert mock_ollama.call_count == 3
+    
+    @patch('llm.provider_selector.SimpleOllama')
+    def test_shared_llm_thread_safe(self, mock_ollama):
+        """測試併發取用時只建立一次"""
+        from concurrent.futures import ThreadPoolExecutor
+        
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: get_shared_llm(provider="ollama"), range(32)))
+        
+        assert all(r is results[0] for r in results)
+        mock_ollama.assert_called_once()
+    
+    @patch('llm.provider_selector.SimpleOllama')
+    def test_warmup_runs_health_check(self, mock_ollama):
+        """測試預熱會執行健康檢查"""
+        mock_ollama.return_value.health_check.return_value = True
+        
+        assert warmup_llm(provider="ollama") is True
+        mock_ollama.return_value.health_check.assert_called_once()
+
+
 class TestLLMIntegration:
     """LLM 整合測試"""
     
@@ -12,6 +12,7 @@
 
 import pytest
 import os
+import json
 import tempfile
 from pathlib import Path
 from unittest.mock import Mock, patch, MagicMock
@@ -19,6 +20,16 @@ from loader.doc_parser import load_and_split_documents
 from langchain.schema import Document
 
 
+@pytest.fixture(autouse=True)
+def isolated_catalog(tmp_path):
+    """所有測試使用臨時檔案目錄（片段簽名等不寫入 vector_db，也不跨次測試累積）"""
+    import loader.file_catalog as file_catalog
+    catalog = file_catalog.FileCatalog(str(tmp_path / "catalog.sqlite3"))
+    with patch.object(file_catalog, "_catalog", catalog):
+        yield catalog
+    catalog.close()
+
+
 class TestDocumentLoader:
     """文件載入器測試"""
     
@@ -143,16 +154,8 @@ class TestDocumentLoader:
         assert len(docs) > 0
         mock_html_loader.assert_called_once_with(html_path)
     
-    @patch('loader.doc_parser.JSONLoader')
-    def test_load_json(self, mock_json_loader):
-        """測試載入 JSON 檔案"""
-        # 設置 mock
-        mock_loader_instance = Mock()
-        mock_loader_instance.load.return_value = [
-            Document(page_content='{"key": "value"}', metadata={"source": "test.json"})
-        ]
-        mock_json_loader.return_value = mock_loader_instance
-        
+    def test_load_json(self):
+        """測試載入 JSON 檔案（每筆記錄保持完整）"""
         # 創建測試檔案
         json_content = '{"test": "data", "array": [1, 2, 3]}'
         json_path = self.create_test_file("test.json", json_content)
@@ -161,8 +164,9 @@ class TestDocumentLoader:
         docs = load_and_split_documents([json_path])
         
         # 驗證
-        assert len(docs) > 0
-        mock_json_loader.assert_called_once()
+        assert len(docs) == 1
+        assert docs[0].page_content == json_content
+        assert docs[0].metadata["chunk_method"] == "json_records"
     
     def test_load_unsupported_format(self):
         """測試載入不支援的檔案格式"""
@@ -276,6 +280,947 @@ class TestDocumentMetadata:
             assert "source" in doc.metadata
 
 
+SAMPLE_TOMBSTONE = """*** *** *** *** *** *** *** *** *** *** *** *** *** *** *** ***
+Build fingerprint: 'google/sdk/generic:11/RSR1/1234:userdebug/test-keys'
+Revision: '0'
+Timestamp: 2024-01-15 10:30:45+0800
+pid: 1234, tid: 1250, name: RenderThread  >>> com.example.app <<<
+signal 11 (SIGSEGV), code 1 (SEGV_MAPERR), fault addr 0x0
+Cause: null pointer dereference
+
+backtrace:
+      #00 pc 000000000004c0a0  /system/lib64/libc.so (strlen+16)
+      #01 pc 0000000000012345  /data/app/com.example.app/lib/arm64/libnative.so (render+40)
+"""
+
+
+class CatalogTestBase:
+    """使用臨時檔案目錄的測試基類"""
+    
+    def setup_method(self):
+        import loader.file_catalog as file_catalog
+        self.temp_dir = tempfile.mkdtemp()
+        self.catalog = file_catalog.FileCatalog(os.path.join(self.temp_dir, "catalog.sqlite3"))
+        self._patcher = patch.object(file_catalog, "_catalog", self.catalog)
+        self._patcher.start()
+    
+    def teardown_method(self):
+        import shutil
+        self._patcher.stop()
+        self.catalog.close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+    
+    def write_log(self, filename, content):
+        path = os.path.join(self.temp_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+        return path
+
+
+class TestFileCatalog(CatalogTestBase):
+    """檔案目錄測試"""
+    
+    def test_log_chunks_carry_only_file_id(self):
+        """測試 log 片段只帶 file_id，檔案層級欄位存在目錄中"""
+        from loader.file_catalog import attach_file_metadata
+        
+        docs = load_and_split_documents([self.write_log("tombstone_00.log", SAMPLE_TOMBSTONE)])
+        
+        assert docs
+        file_ids = {doc.metadata["file_id"] for doc in docs}
+        assert len(file_ids) == 1
+        for doc in docs:
+            assert "parser_class" not in doc.metadata
+            assert "file_size_mb" not in doc.metadata
+        
+        info = self.catalog.get(file_ids.pop())
+        assert info["parser_class"].endswith("Parser")
+        assert info["log_type"] == docs[0].metadata["log_type"]
+        
+        # 檢索後補回檔案層級欄位
+        attach_file_metadata(docs)
+        assert all(doc.metadata["parser_class"] == info["parser_class"] for doc in docs)
+        assert all(doc.metadata["file_size_mb"] == info["file_size_mb"] for doc in docs)
+    
+    def test_attach_keeps_chunk_fields(self):
+        """測試補回欄位時不覆蓋片段自身的欄位"""
+        from loader.file_catalog import attach_file_metadata
+        
+        self.catalog.put("f1", "a.log", {"severity": "low", "pid": 42})
+        docs = [
+            Document(page_content="x", metadata={"file_id": "f1", "severity": "critical"}),
+            Document(page_content="y", metadata={"source": "doc.md"}),
+        ]
+        
+        attach_file_metadata(docs)
+        
+        assert docs[0].metadata["severity"] == "critical"
+        assert docs[0].metadata["pid"] == 42
+        assert docs[1].metadata == {"source": "doc.md"}
+    
+    def test_clear_catalog(self):
+        """測試清空目錄"""
+        from loader.file_catalog import clear_catalog
+        
+        self.catalog.put("f1", "a.log", {"log_type": "general"})
+        clear_catalog()
+
+        assert self.catalog.get("f1") is None
+
+    def test_same_content_keeps_all_sources(self):
+        """測試相同內容從不同路徑匯入時保留所有路徑"""
+        self.catalog.put("f1", "device_a/main.log", {"log_type": "general"})
+        self.catalog.put("f1", "device_b/main.log", {"log_type": "general"})
+        self.catalog.put("f1", "device_a/main.log", {"log_type": "general"})
+
+        assert self.catalog.get("f1")["sources"] == ["device_a/main.log", "device_b/main.log"]
+
+    def test_catalog_written_after_commit(self):
+        """測試匯入知識庫時目錄、模板表與記錄索引在 commit（向量寫入成功）後才寫入"""
+        from loader.pending_writes import PendingIndexWrites
+
+        content = "\n".join(f"2024-01-15 10:0{i % 10}:00 ERROR [pid 42] Failed to connect db-{i}" for i in range(30))
+        path = self.write_log("server.log", content)
+        pending = PendingIndexWrites({path: "uploaded_server.log"})
+        docs = load_and_split_documents([path], pending=pending)
+        file_id = docs[0].metadata["file_id"]
+
+        def row_counts():
+            with self.catalog.transaction() as conn:
+                tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+                return {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] for table in tables}
+
+        assert not any(row_counts().values())
+        assert pending.claimed(("file_info", file_id))["log_type"] == "general"
+
+        pending.commit()
+        counts = row_counts()
+        assert counts["files"] == 1 and counts["log_chunks"] > 0 and counts["log_templates"] > 0
+        assert self.catalog.get(file_id)["sources"] == ["uploaded_server.log"]
+        assert pending.claimed(("file_info", file_id)) is None
+
+    def test_commit_runs_remaining_writes_after_failure(self):
+        """測試某筆延後寫入失敗時仍執行其餘寫入，最後拋出第一個錯誤並清空登記"""
+        from loader.pending_writes import PendingIndexWrites
+
+        pending = PendingIndexWrites()
+        done = []
+        pending.claim("key", "value")
+        pending.defer(done.append, 1)
+        pending.defer(Mock(side_effect=RuntimeError("first")))
+        pending.defer(Mock(side_effect=ValueError("second")))
+        pending.defer(done.append, 2)
+
+        with pytest.raises(RuntimeError, match="first"):
+            pending.commit()
+        assert done == [1, 2]
+        assert len(pending) == 0 and pending.claimed("key") is None
+
+    def test_empty_result_not_reparsed_by_other_parsers(self):
+        """測試符合的解析器沒有產生片段時不再交給其他解析器，目錄只寫入一次"""
+        from loader.log_parser_manager import LogParserManager
+        from loader.pending_writes import PendingIndexWrites
+
+        manager = LogParserManager()
+        pending = PendingIndexWrites()
+        with patch("loader.android_tombstone_parser.AndroidTombstoneParser.parse_content", return_value=[]):
+            docs, parser = manager.parse_text(SAMPLE_TOMBSTONE, "tombstone_00", pending=pending)
+
+        assert docs == []
+        assert parser.get_log_type() == "android_tombstone"
+        pending.commit()
+        with self.catalog.transaction() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 1
+
+    def test_temp_analysis_uses_given_catalog(self):
+        """測試臨時分析傳入記憶體目錄時不寫入全局目錄、模板表與記錄索引"""
+        from loader.file_catalog import FileCatalog, attach_file_metadata
+        from loader.log_record_index import LogRecordIndex, build_search_filter
+
+        content = "\n".join(f"2024-01-15 10:0{i % 10}:00 ERROR [pid 42] Failed to connect db-{i}" for i in range(30))
+        temp_catalog = FileCatalog(":memory:")
+        docs = load_and_split_documents([self.write_log("server.log", content)], dedup=False, catalog=temp_catalog)
+
+        assert docs
+        with self.catalog.transaction() as conn:
+            tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+            assert all(conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] == 0 for table in tables)
+
+        attach_file_metadata(docs, catalog=temp_catalog)
+        assert docs[0].metadata["log_type"] == "general"
+        search_filter = build_search_filter("errors between 10:02 and 10:05", index=LogRecordIndex(temp_catalog))
+        assert search_filter and search_filter["chunk_id"]["$in"]
+
+
+class TestCrashSignature(CatalogTestBase):
+    """崩潰簽名與去重測試"""
+    
+    def test_signature_ignores_addresses_and_paths(self):
+        """測試簽名不受 pc 位址、符號偏移與 app 路徑影響"""
+        from loader.crash_signature import tombstone_signature
+        
+        other = (SAMPLE_TOMBSTONE
+                 .replace("000000000004c0a0", "000000000004d111")
+                 .replace("strlen+16", "strlen+20")
+                 .replace("com.example.app/lib", "com.example.app-Xy9Q==/lib"))
+        
+        first = tombstone_signature("SIGSEGV", SAMPLE_TOMBSTONE)
+        assert first["frames"][0] == "libc.so!strlen"
+        assert first["signature"] == tombstone_signature("SIGSEGV", other)["signature"]
+        assert first["signature"] != tombstone_signature("SIGABRT", SAMPLE_TOMBSTONE)["signature"]
+    
+    def test_duplicate_crash_embedded_once(self):
+        """測試相同崩潰只嵌入一次並累加出現次數"""
+        from loader.crash_signature import get_crash_signature_index, attach_crash_occurrences
+        from loader.file_catalog import attach_file_metadata
+        
+        first = self.write_log("tombstone_00.log", SAMPLE_TOMBSTONE)
+        second = self.write_log("tombstone_01.log", SAMPLE_TOMBSTONE.replace("10:30:45", "11:02:13"))
+        
+        docs = load_and_split_documents([first])
+        assert docs
+        assert load_and_split_documents([second]) == []
+        # 同一個檔案重新索引不重複計數
+        assert load_and_split_documents([first])
+        
+        attach_crash_occurrences(attach_file_metadata(docs))
+        assert all(doc.metadata["crash_occurrences"] == 2 for doc in docs)
+        assert get_crash_signature_index().top_signatures(1)[0]["occurrences"] == 2
+
+    def test_crash_occurrences_recorded_after_commit(self):
+        """測試延後寫入時同批次的相同崩潰仍只嵌入一次，commit 後才記錄並保存上傳檔名"""
+        from loader.crash_signature import get_crash_signature_index
+        from loader.pending_writes import PendingIndexWrites
+
+        first = self.write_log("tombstone_00.log", SAMPLE_TOMBSTONE)
+        second = self.write_log("tombstone_01.log", SAMPLE_TOMBSTONE.replace("10:30:45", "11:02:13"))
+        pending = PendingIndexWrites({first: "device_a_tombstone.log"})
+
+        docs = load_and_split_documents([first, second], pending=pending)
+        assert {doc.metadata["source"] for doc in docs} == {first}
+        assert pending.duplicates == 1
+        assert get_crash_signature_index().top_signatures(1) == []
+
+        pending.commit()
+        top = get_crash_signature_index().top_signatures(1)[0]
+        assert top["occurrences"] == 2 and top["representative_source"] == "device_a_tombstone.log"
+
+    def test_dedup_disabled_for_temp_analysis(self):
+        """測試關閉去重時仍返回完整內容"""
+        first = self.write_log("tombstone_00.log", SAMPLE_TOMBSTONE)
+        second = self.write_log("tombstone_01.log", SAMPLE_TOMBSTONE.replace("10:30:45", "11:02:13"))
+        
+        load_and_split_documents([first])
+        
+        assert load_and_split_documents([second], dedup=False)
+
+
+SAMPLE_ANR = """----- pid 4321 at 2024-01-15 10:31:00 -----
+Cmd line: com.example.app
+Build fingerprint: 'google/sdk/generic:11/RSR1/1234:userdebug/test-keys'
+
+DALVIK THREADS (2):
+"main" prio=5 tid=1 Blocked
+  | group="main" sCount=1 dsCount=0
+  | state=S schedstat=( 0 0 0 ) utm=0 stm=0 core=0 HZ=100
+  at com.example.app.MainActivity.onClick(MainActivity.java:42)
+  - waiting to lock <0x0abc1234> (a java.lang.Object) held by thread 12
+  at android.view.View.performClick(View.java:7448)
+
+"Signal Catcher" daemon prio=5 tid=3 Runnable
+  | state=R schedstat=( 0 0 0 ) utm=0 stm=0 core=0 HZ=100
+"""
+
+SAMPLE_GENERAL_LOG = "".join(
+    f"2024-01-15 10:{i // 60:02d}:{i % 60:02d} INFO worker-{i % 4} processed batch {i}\n"
+    for i in range(200)
+)
+
+
+IDLE_ANR_PROCESS = """----- pid 900 at 2024-01-15 10:31:01 -----
+Cmd line: com.android.systemui
+
+"main" prio=5 tid=1 Native
+  | state=S schedstat=( 0 0 0 ) utm=0 stm=0 core=0 HZ=100
+  at android.os.MessageQueue.nativePollOnce(Native method)
+
+----- end 900 -----
+"""
+
+
+class TestArchiveIngestion(CatalogTestBase):
+    """壓縮檔串流解析測試"""
+    
+    def test_bugreport_zip_routes_members(self):
+        """測試 bugreport zip 成員依路徑交給對應解析器"""
+        import zipfile
+        
+        zip_path = os.path.join(self.temp_dir, "bugreport-sdk-2024.zip")
+        with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr("bugreport-sdk-2024.txt", SAMPLE_GENERAL_LOG)
+            zf.writestr("FS/data/tombstones/tombstone_00", SAMPLE_TOMBSTONE)
+            zf.writestr("FS/data/tombstones/tombstone_00.pb", b"\x08\x01\x00" * 100)
+            zf.writestr("FS/data/anr/anr_2024-01-15-10-31-00", SAMPLE_ANR)
+            zf.writestr("version.txt", "2.0")
+        
+        docs = load_and_split_documents([zip_path])
+        
+        log_types = {doc.metadata["source"].split("!")[1]: doc.metadata["log_type"] for doc in docs}
+        assert log_types["FS/data/tombstones/tombstone_00"] == "android_tombstone"
+        assert log_types["FS/data/anr/anr_2024-01-15-10-31-00"] == "android_anr"
+        assert log_types["bugreport-sdk-2024.txt"] == "general"
+        assert len(log_types) == 3
+        assert all(doc.metadata["file_type"] == "log" for doc in docs)
+        # 沒有解壓到磁碟
+        assert {name for name in os.listdir(self.temp_dir) if not name.startswith("catalog.sqlite3")} == \
+            {"bugreport-sdk-2024.zip"}
+    
+    def test_large_gz_member_cut_at_unit_boundaries(self):
+        """測試大型壓縮 log 只在單元邊界切段，結果與解析整個檔案相同"""
+        import gzip
+        
+        blocked = SAMPLE_ANR.replace("pid 4321", "pid 1000").replace("com.example.app", "com.example.other")
+        traces = SAMPLE_ANR + IDLE_ANR_PROCESS + blocked + IDLE_ANR_PROCESS.replace("pid 900", "pid 901")
+        gz_path = os.path.join(self.temp_dir, "traces.txt.gz")
+        with gzip.open(gz_path, "wt", encoding="utf-8") as f:
+            f.write(traces)
+        
+        with patch.dict(os.environ, {"ARCHIVE_SEGMENT_MB": str(200 / (1024 * 1024)), "LOG_PARSE_WORKERS": "1"}):
+            docs = load_and_split_documents([gz_path], dedup=False)
+            plain = load_and_split_documents([self.write_log("traces.txt.log", traces)], dedup=False)
+        
+        assert len({doc.metadata["archive_segment"] for doc in docs}) > 1
+        assert all(doc.metadata["source"].endswith("!traces.txt") for doc in docs)
+        assert [doc.page_content for doc in docs] == [doc.page_content for doc in plain]
+        assert [doc.metadata["file_id"] for doc in docs] == [doc.metadata["file_id"] for doc in plain]
+        infos = self.catalog.get_many(doc.metadata["file_id"] for doc in docs)
+        assert sorted(info["pid"] for info in infos.values()) == [1000, 4321]
+        assert all(info["unit_count"] == 4 for info in infos.values())
+    
+    def test_single_unit_member_not_segmented(self):
+        """測試沒有單元邊界的 log 不會被切成多個區段"""
+        import gzip
+        
+        gz_path = os.path.join(self.temp_dir, "system.log.gz")
+        with gzip.open(gz_path, "wt", encoding="utf-8") as f:
+            f.write(SAMPLE_GENERAL_LOG)
+        
+        with patch.dict(os.environ, {"ARCHIVE_SEGMENT_MB": str(4096 / (1024 * 1024))}):
+            docs = load_and_split_documents([gz_path])
+        
+        assert docs
+        assert len({doc.metadata["file_id"] for doc in docs}) == 1
+        with self.catalog.transaction() as conn:
+            assert conn.execute("SELECT COUNT(*) FROM files").fetchone()[0] == 1
+    
+    def test_zst_stream(self):
+        """測試 .zst 壓縮 log"""
+        zstandard = pytest.importorskip("zstandard")
+        
+        zst_path = os.path.join(self.temp_dir, "anr_trace.zst")
+        with open(zst_path, "wb") as f:
+            f.write(zstandard.ZstdCompressor().compress(SAMPLE_ANR.encode("utf-8")))
+        
+        docs = load_and_split_documents([zst_path])
+        
+        assert docs
+        assert docs[0].metadata["log_type"] == "android_anr"
+
+
+class TestLogUnits(CatalogTestBase):
+    """多進程 ANR / 多次崩潰 tombstone 單元切分測試"""
+    
+    def multi_process_traces(self):
+        blocked = SAMPLE_ANR.replace("pid 4321", "pid 1000").replace("com.example.app", "com.example.other")
+        return SAMPLE_ANR + IDLE_ANR_PROCESS + blocked + IDLE_ANR_PROCESS.replace("pid 900", "pid 901")
+    
+    def test_anr_traces_split_per_process(self):
+        """測試每個進程區段獨立分析，閒置進程被略過"""
+        path = self.write_log("traces.txt.log", self.multi_process_traces())
+        
+        with patch.dict(os.environ, {"LOG_PARSE_WORKERS": "1"}):
+            docs = load_and_split_documents([path], dedup=False)
+        
+        summaries = [doc for doc in docs if doc.metadata.get("chunk_type") == "summary"]
+        assert len(summaries) == 2
+        assert "com.example.app" in summaries[0].page_content
+        assert "com.example.other" in summaries[1].page_content
+        
+        infos = self.catalog.get_many(doc.metadata["file_id"] for doc in docs)
+        assert sorted(info["pid"] for info in infos.values()) == [1000, 4321]
+        assert all(info["unit_count"] == 4 for info in infos.values())
+    
+    def test_parallel_matches_serial(self):
+        """測試多進程平行解析與逐一解析結果相同"""
+        path = self.write_log("traces.txt.log", self.multi_process_traces())
+        
+        with patch.dict(os.environ, {"LOG_PARSE_WORKERS": "1"}):
+            serial = load_and_split_documents([path], dedup=False)
+        import loader.base_log_parser as base_log_parser
+        try:
+            with patch.dict(os.environ, {"LOG_PARSE_WORKERS": "2", "LOG_PARALLEL_MIN_UNITS": "2"}):
+                parallel = load_and_split_documents([path], dedup=False)
+                pool = base_log_parser._unit_pool
+                again = load_and_split_documents([path], dedup=False)
+                # 進程池在檔案之間重複使用
+                assert pool is not None and base_log_parser._unit_pool is pool
+        finally:
+            base_log_parser.shutdown_unit_pool()
+        
+        assert [d.page_content for d in parallel] == [d.page_content for d in serial]
+        assert [d.page_content for d in again] == [d.page_content for d in serial]
+        assert [d.metadata["file_id"] for d in parallel] == [d.metadata["file_id"] for d in serial]
+    
+    def test_tombstone_with_multiple_crashes(self):
+        """測試一個檔案中的多次崩潰各自成為單元"""
+        second = SAMPLE_TOMBSTONE.replace("signal 11 (SIGSEGV)", "signal 6 (SIGABRT)")
+        path = self.write_log("tombstone_multi.log", SAMPLE_TOMBSTONE + "\n" + second)
+        
+        docs = load_and_split_documents([path])
+        
+        summaries = [doc for doc in docs if doc.metadata.get("chunk_type") == "crash_summary"]
+        assert len(summaries) == 2
+        assert "SIGSEGV" in summaries[0].page_content
+        assert "SIGABRT" in summaries[1].page_content
+
+
+LOGCAT_WINDOW = "".join(
+    f"01-15 10:{minute:02d}:{second:02d}.000  {pid}  {pid + 1} {level} {tag}: {package} event {minute}-{second}\n"
+    for minute in range(0, 10)
+    for second in range(0, 60, 4)
+    for pid, level, tag, package in [(2000, "I", "Foo", "com.foo"), (3000, "E", "Bar", "com.bar")]
+)
+
+
+class TestLogRecordIndex(CatalogTestBase):
+    """log 記錄索引與查詢條件前置過濾測試"""
+    
+    def test_parse_query_constraints(self):
+        """測試以規則解析問題中的條件"""
+        from loader.log_record_index import parse_query_constraints
+        
+        constraints = parse_query_constraints("errors from com.foo between 10:02 and 10:05")
+        assert constraints == {
+            "min_level": 4, "package": "com.foo",
+            "tod_start": 10 * 3600 + 2 * 60, "tod_end": 10 * 3600 + 5 * 60 + 59,
+        }
+        assert parse_query_constraints("pid 1234 在 2024-01-15 10:30 之後")["pid"] == 1234
+        assert parse_query_constraints("這份文件的架構是什麼") == {}
+    
+    def test_chunks_carry_structured_fields(self):
+        """測試 log 片段帶有 chunk_id 與時間 / 等級 / pid 欄位"""
+        path = self.write_log("tombstone_01.log", SAMPLE_TOMBSTONE)
+        
+        docs = load_and_split_documents([path])
+        
+        assert len({doc.metadata["chunk_id"] for doc in docs}) == len(docs)
+        summary = next(doc for doc in docs if doc.metadata.get("chunk_type") == "crash_summary")
+        assert summary.metadata["pids"] == "1234"
+    
+    def test_filter_narrows_candidates(self):
+        """測試條件只留下符合時間、等級與套件的片段"""
+        from loader.log_record_index import build_search_filter
+        path = self.write_log("logcat.log", LOGCAT_WINDOW)
+        
+        docs = load_and_split_documents([path])
+        search_filter = build_search_filter("errors from com.bar between 10:02 and 10:05")
+        
+        candidates = set(search_filter["chunk_id"]["$in"])
+        assert 0 < len(candidates) < len(docs)
+        for doc in docs:
+            if doc.metadata["chunk_id"] in candidates:
+                assert doc.metadata["tod_start"] <= 10 * 3600 + 5 * 60 + 59
+                assert doc.metadata["tod_end"] >= 10 * 3600 + 2 * 60
+        
+        assert build_search_filter("errors from com.nothing") is None
+        # 只有等級用詞的一般問題不限制在 log 片段
+        assert build_search_filter("errors between 10:02 and 10:05") is not None
+        assert build_search_filter("設計文件中列出的錯誤處理與 exception 類型") is None
+
+
+class TestTimestampParser:
+    """快速時間戳解析測試"""
+    
+    def test_formats(self):
+        """測試 ISO / Log4j / logcat / epoch 格式"""
+        from datetime import datetime
+        from loader.timestamp_parser import TimestampParser
+        
+        expected = datetime(2024, 1, 15, 10, 30, 45, 123000)
+        for value in ["2024-01-15T10:30:45.123", "2024-01-15 10:30:45,123",
+                      "01-15 10:30:45.123", "1705314645.123", "1705314645123"]:
+            assert TimestampParser(default_year=2024).parse(value) == expected
+        assert TimestampParser().parse("not a timestamp") is None
+    
+    def test_format_detected_once_and_redetected_on_change(self):
+        """測試格式只偵測一次，中途換格式時重新偵測"""
+        import loader.timestamp_parser as timestamp_parser
+        
+        parser = timestamp_parser.TimestampParser(default_year=2024)
+        with patch.object(timestamp_parser, "detect_timestamp_format",
+                          wraps=timestamp_parser.detect_timestamp_format) as detect:
+            for second in range(10):
+                parser.parse(f"2024-01-15 10:30:{second:02d}")
+            assert detect.call_count == 1
+            assert parser.parse("01-15 10:31:00.000").minute == 31
+            assert parser.format == "logcat"
+    
+    def test_general_log_time_range(self):
+        """測試一般 log 的時間範圍（含 logcat 時間戳）"""
+        from loader.general_log_parser import GeneralLogParser
+        
+        content = "01-15 10:05:00.000 E Foo: b\n01-15 10:00:00.500 I Foo: a\n01-15 10:09:59.999 W Foo: c\n"
+        earliest, latest = GeneralLogParser().extract_time_range(
+            content, GeneralLogParser().get_patterns()['time_range'])
+        
+        assert (earliest.minute, earliest.microsecond) == (0, 500000)
+        assert (latest.minute, latest.second) == (9, 59)
+
+
+SAMPLE_LOGCAT = """--------- beginning of main
+01-15 10:30:45.100  1234  1250 I ActivityManager: Start proc 1234:com.example.app/u0a12
+01-15 10:30:45.200   900   901 D chatty  : uid=1000 expire 3 lines
+01-15 10:30:45.300  1234  1250 E AndroidRuntime: FATAL EXCEPTION: main
+01-15 10:30:45.301  1234  1250 E AndroidRuntime: java.lang.NullPointerException
+\tat com.example.app.MainActivity.onCreate(MainActivity.java:42)
+01-15 10:30:46.000 123456 123457 W BinderProxy: slow transaction
+01-15 10:32:10.000  1234  1251 I Choreographer: Skipped 30 frames
+"""
+
+
+class TestAndroidLogcatParser(CatalogTestBase):
+    """adb logcat 欄位式解析測試"""
+    
+    def test_columns(self):
+        """測試欄位解析（含 7 位數 pid 與延續行）"""
+        from loader.logcat_columns import parse_logcat_columns, THREADTIME, BRIEF
+        
+        columns = parse_logcat_columns(SAMPLE_LOGCAT.encode(), THREADTIME)
+        assert columns.valid.tolist() == [False, True, True, True, True, False, True, True]
+        assert columns.pid[1:5].tolist() == [1234, 900, 1234, 1234]
+        assert (columns.pid[6], columns.tid[6]) == (123456, 123457)
+        assert columns.level[1:5].tolist() == [2, 1, 4, 4]
+        assert columns.tags[columns.tag_id[2]] == "chatty"
+        assert columns.inherit_from_records()[5] == 4
+        assert columns.text([3, 5]).splitlines()[1].startswith("\tat com.example.app")
+        
+        brief = parse_logcat_columns(b"E/AndroidRuntime( 1234): FATAL\nI/Foo     (  77): hi\n", BRIEF)
+        assert brief.pid.tolist() == [1234, 77]
+        assert [brief.tags[i] for i in brief.tag_id] == ["AndroidRuntime", "Foo"]
+
+    def test_colliding_tag_keys_not_merged(self):
+        """測試 tag 雜湊鍵碰撞時仍以原始位元組區分不同 tag"""
+        import numpy as np
+        import loader.logcat_columns as logcat_columns
+
+        whole = logcat_columns.parse_logcat_columns(SAMPLE_LOGCAT, logcat_columns.THREADTIME)
+        with patch.object(logcat_columns, "_TAG_HASH_WEIGHTS", np.zeros(4, dtype=np.uint64)):
+            collided = logcat_columns.parse_logcat_columns(SAMPLE_LOGCAT, logcat_columns.THREADTIME)
+
+        assert len(collided.tags) == len(whole.tags) > 1
+        assert [collided.tags[i] for i in collided.tag_id[collided.valid]] == \
+            [whole.tags[i] for i in whole.tag_id[whole.valid]]
+
+    def test_columns_split_into_blocks(self):
+        """測試分段解析（含多位元組字元）與整段解析的欄位、行位置一致"""
+        import numpy as np
+        import loader.logcat_columns as logcat_columns
+
+        content = SAMPLE_LOGCAT.replace("slow transaction", "交易緩慢 ünïcode") * 3
+        whole = logcat_columns.parse_logcat_columns(content, logcat_columns.THREADTIME)
+        with patch.object(logcat_columns, "BLOCK_CHARS", 100):
+            blocks = logcat_columns.parse_logcat_columns(content, logcat_columns.THREADTIME)
+
+        for field in ("starts", "ends", "valid", "time_ms", "pid", "tid", "level"):
+            assert getattr(blocks, field).tolist() == getattr(whole, field).tolist()
+        assert [blocks.tags[i] for i in blocks.tag_id] == [whole.tags[i] for i in whole.tag_id]
+        assert blocks.text([6]) == "01-15 10:30:46.000 123456 123457 W BinderProxy: 交易緩慢 ünïcode\n"
+        assert blocks.texts(np.array([1, 2, 4, 9]), np.array([0, 2, 4])) == [
+            content.split("\n", 3)[1] + "\n" + content.split("\n", 3)[2] + "\n",
+            whole.text([4]) + whole.text([9]),
+        ]
+
+    def test_chunks_grouped_by_pid_and_window(self):
+        """測試片段依 pid / 時間窗分組，雜訊 tag 被過濾，延續行跟隨前一筆記錄"""
+        path = self.write_log("logcat.log", SAMPLE_LOGCAT)
+        
+        docs = load_and_split_documents([path])
+        
+        assert docs[0].metadata["chunk_type"] == "summary"
+        assert "FATAL EXCEPTION" in docs[0].page_content
+        chunks = docs[1:]
+        assert all(doc.metadata["log_type"] == "android_logcat" for doc in chunks)
+        assert [doc.metadata["pid"] for doc in chunks] == [1234, 123456, 1234]
+        assert "chatty" not in "".join(doc.page_content for doc in chunks)
+        assert "MainActivity.java:42" in chunks[0].page_content
+        assert chunks[0].metadata["max_level"] == 4
+        assert chunks[0].metadata["packages"] == "com.example.app"
+        
+        info = self.catalog.get(chunks[0].metadata["file_id"])
+        assert info["severity"] == "critical"
+        assert info["time_range"] == ["01-15 10:30:45.100", "01-15 10:32:10.000"]
+
+
+class TestLogTemplateMiner(CatalogTestBase):
+    """Drain 模板挖掘與重複行收斂測試"""
+
+    def test_templates(self):
+        """測試參數不同的行歸入同一模板"""
+        from loader.log_template_miner import TemplateMiner
+
+        miner = TemplateMiner(depth=4, similarity=0.4)
+        first, _ = miner.add_line("GC freed 1024 objects in 12ms")
+        second, params = miner.add_line("GC freed 2048 objects in 30ms")
+        other, _ = miner.add_line("Connection to db-01 closed by peer")
+
+        assert first is second and first is not other
+        assert first.template_text() == "GC freed <*> objects in <*>"
+        assert params == ["2048", "30ms"]
+        assert [t["count"] for t in miner.template_table()] == [2, 1]
+
+    def test_repeated_lines_collapsed(self):
+        """測試連續重複的模板收斂成一行，模板表可依檔案查詢"""
+        from loader.log_template_miner import get_log_template_index
+        lines = ["2024-01-15 10:00:00 INFO Application started"]
+        lines += [f"2024-01-15 10:00:{i % 60:02d} INFO Heartbeat seq={i} latency={i % 7}ms" for i in range(200)]
+        lines += ["2024-01-15 10:05:00 INFO Application stopped"]
+        path = self.write_log("app.log", "\n".join(lines))
+
+        docs = load_and_split_documents([path])
+
+        text = "\n".join(doc.page_content for doc in docs)
+        assert text.count("Heartbeat") == 2
+        assert "同一模板連續 200 次" in text
+        assert "Application stopped" in text
+
+        file_id = docs[0].metadata["file_id"]
+        templates = get_log_template_index().get_templates(file_id)
+        assert templates[0]["count"] == 200
+        assert "Heartbeat" in templates[0]["template"]
+        assert "log_templates" not in self.catalog.get(file_id)
+        assert get_log_template_index().search_templates("Heartbeat")[0]["file_id"] == file_id
+
+    def test_error_lines_never_collapsed(self):
+        """測試不同的 ERROR 訊息不會被收斂成一行"""
+        from loader.log_template_miner import collapse_repetitive_lines
+        targets = ["connect to server alpha", "write into file beta", "parse config section gamma",
+                   "load user profile delta", "open socket for epsilon"]
+        content = "\n".join(f"2024-01-15 10:00:0{i} ERROR Failed to {target}" for i, target in enumerate(targets))
+        content += "\n" + "\n".join(f"2024-01-15 10:01:{i:02d} INFO Heartbeat seq={i}" for i in range(10))
+
+        collapsed_content, _, collapsed = collapse_repetitive_lines(content)
+
+        assert all(f"Failed to {target}" in collapsed_content for target in targets)
+        assert collapsed == 9
+
+
+class TestChunkDedup(CatalogTestBase):
+    """MinHash LSH 近似重複片段去重測試"""
+
+    def make_docs(self, source):
+        stack = "\n".join(f"    at com.example.Worker.step{i}(Worker.java:{i})" for i in range(40))
+        return [
+            Document(page_content=f"Thread-1 blocked\n{stack}", metadata={"source": source}),
+            Document(page_content=f"Thread-2 blocked\n{stack}", metadata={"source": source}),
+            Document(page_content="完全不同的內容：使用手冊第一章", metadata={"source": source}),
+        ]
+
+    def test_near_duplicates_in_batch(self):
+        """測試同一批中近似重複的片段只保留第一個"""
+        from loader.chunk_dedup import deduplicate_chunks
+
+        kept, stats = deduplicate_chunks(self.make_docs("a.txt"), persistent=False, threshold=0.9)
+
+        assert [doc.page_content[:8] for doc in kept] == ["Thread-1", "完全不同的內容："]
+        assert stats["batch_duplicates"] == 1 and stats["stored_duplicates"] == 0
+
+    def test_duplicates_across_runs(self):
+        """測試已索引過的片段在下次匯入時略過，臨時分析不寫入簽名庫"""
+        from loader.chunk_dedup import deduplicate_chunks
+
+        deduplicate_chunks(self.make_docs("tmp.txt"), persistent=False)
+        kept, _ = deduplicate_chunks(self.make_docs("a.txt"))
+        assert len(kept) == 2
+
+        kept, stats = deduplicate_chunks(self.make_docs("b.txt"))
+        assert kept == [] and stats["stored_duplicates"] == 3
+
+    def test_signatures_saved_after_commit(self):
+        """測試提供延後寫入佇列時，簽名等 commit（向量寫入成功）後才保存"""
+        from loader.chunk_dedup import deduplicate_chunks
+        from loader.pending_writes import PendingIndexWrites
+
+        pending = PendingIndexWrites()
+        deduplicate_chunks(self.make_docs("a.txt"), pending=pending)
+        kept, _ = deduplicate_chunks(self.make_docs("a.txt"))
+        assert len(kept) == 2
+
+        pending = PendingIndexWrites()
+        kept, _ = deduplicate_chunks(self.make_docs("b.txt"), pending=pending)
+        pending.commit()
+        assert kept == [] and pending.duplicates == 3
+
+    def test_dropped_chunks_removed_from_record_index(self):
+        """測試略過的 log 片段在 commit 後從記錄索引移除，重新匯入的同一片段保留"""
+        from loader.chunk_dedup import deduplicate_chunks
+        from loader.log_record_index import get_log_record_index
+        from loader.pending_writes import PendingIndexWrites
+
+        def indexed_ids(docs):
+            with self.catalog.transaction() as conn:
+                return {row[0] for row in conn.execute("SELECT chunk_id FROM log_chunks")} & \
+                    {doc.metadata["chunk_id"] for doc in docs}
+
+        docs = self.make_docs("a.log")
+        for i, doc in enumerate(docs):
+            doc.metadata["chunk_id"] = f"f1:{i}"
+        get_log_record_index().add_chunks(docs, {"severity": "high"})
+
+        pending = PendingIndexWrites()
+        kept, _ = deduplicate_chunks(docs, pending=pending)
+        assert indexed_ids(docs) == {"f1:0", "f1:1", "f1:2"}
+        pending.commit()
+        assert indexed_ids(docs) == {"f1:0", "f1:2"}
+
+        kept, stats = deduplicate_chunks(docs)
+        assert kept == [] and stats["stored_duplicates"] == 3
+        assert indexed_ids(docs) == {"f1:0", "f1:2"}
+
+
+def build_pdf(page_texts):
+    """產生每頁一行文字的最小 PDF"""
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    kids = []
+    for text in page_texts:
+        stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    pdf = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    pdf += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return pdf.encode("latin-1")
+
+
+class TestPdfLoader(CatalogTestBase):
+    """PDF 逐頁平行抽取測試"""
+
+    def write_pdf(self, filename, page_texts):
+        path = os.path.join(self.temp_dir, filename)
+        with open(path, "wb") as f:
+            f.write(build_pdf(page_texts))
+        return path
+
+    def test_pages_extracted_in_order_across_processes(self):
+        """測試多進程抽取時仍依頁序輸出"""
+        pytest.importorskip("pypdf")
+        from loader.pdf_loader import iter_pdf_pages
+        path = self.write_pdf("manual.pdf", [f"Page {i} content" for i in range(7)])
+
+        with patch.dict(os.environ, {"PDF_PARALLEL_MIN_PAGES": "1"}), \
+             patch("loader.pdf_loader.os.cpu_count", return_value=2):
+            pages = list(iter_pdf_pages(path, workers=2, batch_pages=2))
+
+        assert [number for number, _ in pages] == list(range(7))
+        assert pages[5][1].strip() == "Page 5 content"
+
+    def test_indexed_pages_skipped(self):
+        """測試重複頁面與已索引過的頁面被略過"""
+        pytest.importorskip("pypdf")
+        path = self.write_pdf("manual.pdf", ["Safety notice", "Chapter 1 install", "Safety notice"])
+
+        docs = load_and_split_documents([path])
+        assert [doc.metadata["page"] for doc in docs] == [0, 1]
+        assert all(doc.metadata["chunk_method"] == "pdf_page" for doc in docs)
+
+        other = self.write_pdf("manual_v2.pdf", ["Safety notice", "Chapter 2 usage"])
+        docs = load_and_split_documents([other])
+        assert [doc.page_content.strip() for doc in docs] == ["Chapter 2 usage"]
+
+    def test_page_hashes_saved_after_commit(self):
+        """測試向量寫入前（佇列未 commit）失敗時，重新匯入不會略過頁面"""
+        pytest.importorskip("pypdf")
+        from loader.pending_writes import PendingIndexWrites
+        path = self.write_pdf("manual.pdf", ["Safety notice", "Chapter 1 install"])
+
+        load_and_split_documents([path], pending=PendingIndexWrites())
+        pending = PendingIndexWrites()
+        assert len(load_and_split_documents([path], pending=pending)) == 2
+
+        pending.commit()
+        pending = PendingIndexWrites()
+        assert load_and_split_documents([path], pending=pending) == []
+        assert pending.duplicates == 2
+
+
+class TestTabularLoader:
+    """Excel / CSV / JSON 逐列串流載入測試"""
+
+    def setup_method(self):
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        import shutil
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_csv_chunks_repeat_header(self):
+        """測試 CSV 依列組成片段，每個片段都有表頭且不切斷資料列"""
+        path = os.path.join(self.temp_dir, "devices.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("device,model,firmware\n")
+            f.writelines(f"dev-{i},Pixel {i % 8},\"v1.{i}, beta\"\n" for i in range(120))
+
+        with patch.dict(os.environ, {"TABLE_ROWS_PER_CHUNK": "50", "CHUNK_SIZE": "4000"}):
+            docs = load_and_split_documents([path])
+
+        assert [(doc.metadata["row_start"], doc.metadata["row_end"]) for doc in docs] == [(2, 51), (52, 101), (102, 121)]
+        assert all(doc.page_content.startswith("device | model | firmware\n") for doc in docs)
+        assert "dev-119 | Pixel 7 | v1.119, beta" in docs[-1].page_content
+
+    def test_oversized_csv_row_left_to_splitter(self):
+        """測試單列超過 CHUNK_SIZE 時不標記 chunk_method，交給文字分割器"""
+        from loader.tabular_loader import load_csv
+        path = os.path.join(self.temp_dir, "notes.csv")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("device,note\n")
+            f.write("dev-1,ok\n")
+            f.write("dev-2,\"" + "重啟後恢復正常。" * 400 + "\"\n")
+            f.write("dev-3,ok\n")
+
+        with patch.dict(os.environ, {"CHUNK_SIZE": "1000"}):
+            docs = load_csv(path)
+
+        assert [doc.metadata["row_start"] for doc in docs] == [2, 3, 4]
+        assert [doc.metadata.get("chunk_method") for doc in docs] == ["table_rows", None, "table_rows"]
+
+    def test_excel_sheets_read_only(self):
+        """測試 Excel 逐個工作表讀取，略過空白列"""
+        openpyxl = pytest.importorskip("openpyxl")
+        path = os.path.join(self.temp_dir, "report.xlsx")
+        workbook = openpyxl.Workbook(write_only=True)
+        for name in ("Crashes", "ANR"):
+            sheet = workbook.create_sheet(name)
+            sheet.append(["package", "count"])
+            sheet.append([f"com.{name.lower()}.app", 3])
+            sheet.append([None, None])
+            sheet.append(["com.other.app", 1])
+        workbook.save(path)
+
+        docs = load_and_split_documents([path])
+
+        assert [doc.metadata["sheet"] for doc in docs] == ["Crashes", "ANR"]
+        assert docs[1].page_content == "[ANR]\npackage | count\ncom.anr.app | 3\ncom.other.app | 1"
+        assert docs[1].metadata["row_end"] == 4
+
+    def test_json_records_streamed(self):
+        """測試以小緩衝區增量解析 JSON 陣列與 JSON Lines"""
+        from loader.tabular_loader import iter_json_records
+        records = [{"id": i, "msg": "錯誤 " * (i % 5), "tags": ["a", "b"]} for i in range(200)] + [12345]
+        path = os.path.join(self.temp_dir, "events.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False, indent=2)
+        assert list(iter_json_records(path, read_size=64)) == records
+
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(json.dumps(r) for r in records[:3]) + "\n12345")
+        assert list(iter_json_records(path, read_size=7)) == records[:3] + [12345]
+
+    def test_json_lines_of_arrays(self):
+        """測試每行一個陣列的 JSON Lines 不會在第一個 ] 之後停止"""
+        from loader.tabular_loader import iter_json_records, load_json
+        path = os.path.join(self.temp_dir, "rows.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('["a", 1]\n["b", 2]\n["c", 3]\n')
+
+        assert list(iter_json_records(path)) == [["a", 1], ["b", 2], ["c", 3]]
+        assert len(load_json(path)[0].page_content.splitlines()) == 3
+
+        # 第一行超過緩衝區、無法事先判斷時，其餘各行仍會逐一解析
+        assert list(iter_json_records(path, read_size=4)) == ["a", 1, ["b", 2], ["c", 3]]
+
+    def test_large_json_object_expanded_by_keys(self):
+        """測試頂層為單一大型物件時依鍵展開成多個片段，過長的單一值交給文字分割器"""
+        from loader.tabular_loader import load_json
+        document = {
+            "devices": {f"dev-{i}": {"model": f"Pixel {i % 8}", "firmware": f"v1.{i}"} for i in range(200)},
+            "notes": "重啟後恢復正常。" * 400,
+        }
+        path = os.path.join(self.temp_dir, "inventory.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f, ensure_ascii=False)
+
+        with patch.dict(os.environ, {"CHUNK_SIZE": "1000"}):
+            docs = load_json(path)
+
+        records = [doc for doc in docs if doc.metadata.get("chunk_method") == "json_records"]
+        assert len(records) > 1 and all(len(doc.page_content) <= 1000 for doc in records)
+        assert 'devices.dev-137: {"model": "Pixel 1", "firmware": "v1.137"}' in "\n".join(
+            doc.page_content for doc in records)
+        oversized = [doc for doc in docs if "chunk_method" not in doc.metadata]
+        assert len(oversized) == 1 and oversized[0].page_content.startswith("notes: ")
+
+
+class TestOffsetTextSplitter:
+    """單次掃描位移分割器測試"""
+
+    def test_chunks_respect_token_limit_and_offsets(self):
+        """測試片段不超過 token 上限、在句號處切開，且位移對應原文"""
+        from loader.offset_splitter import OffsetTextSplitter, approximate_counter
+        counter = approximate_counter()
+        text = "RAG 系統會先檢索相關內容。再交給語言模型生成回答！" * 40 + "\n\n最後一段。"
+        splitter = OffsetTextSplitter(chunk_size=50, chunk_overlap=10, counter=counter)
+
+        docs = splitter.split_documents([Document(page_content=text, metadata={"source": "a.txt"})])
+
+        assert len(docs) > 1
+        for doc in docs:
+            start, end = doc.metadata["start_offset"], doc.metadata["end_offset"]
+            assert text[start:end] == doc.page_content
+            assert counter.count(doc.page_content) <= 50
+            assert doc.metadata["source"] == "a.txt"
+        assert all(doc.page_content[-1] in "。！" for doc in docs)
+        assert docs[1].metadata["start_offset"] < docs[0].metadata["end_offset"]
+        assert docs[-1].page_content.endswith("最後一段。")
+
+    def test_char_mode_for_logs(self):
+        """測試以字元計算時在換行處切開"""
+        from loader.offset_splitter import OffsetTextSplitter
+        lines = [f"2024-01-15 10:00:{i % 60:02d} INFO request {i} done" for i in range(300)]
+        text = "\n".join(lines)
+        splitter = OffsetTextSplitter(chunk_size=500, chunk_overlap=0, unit="chars", separators=["\n", " ", ""])
+
+        chunks = splitter.split_text(text)
+
+        assert all(len(chunk) <= 500 for chunk in chunks)
+        assert "\n".join(chunks) == text
+
+    def test_default_chunk_tokens_from_model(self, tmp_path):
+        """測試 CHUNK_TOKENS 未設定時為模型的 max_seq_length 減去 [CLS]/[SEP]"""
+        from loader.offset_splitter import (
+            OffsetTextSplitter, TokenCounter, _approximate_starts, _max_seq_length)
+        (tmp_path / "sentence_bert_config.json").write_text('{"max_seq_length": 256, "do_lower_case": false}')
+        tokenizer = Mock(model_max_length=512)
+        assert _max_seq_length(str(tmp_path), tokenizer) == 256
+
+        counter = TokenCounter("minilm", _approximate_starts, max_length=256)
+        env = {k: v for k, v in os.environ.items() if k != "CHUNK_TOKENS"}
+        with patch.dict(os.environ, env, clear=True):
+            assert OffsetTextSplitter(counter=counter).chunk_size == 254
+            assert OffsetTextSplitter(counter=TokenCounter("openai", _approximate_starts)).chunk_size == 256
+        with patch.dict(os.environ, {"CHUNK_TOKENS": "128"}):
+            assert OffsetTextSplitter(counter=counter).chunk_size == 128
+
+
 # 測試 fixtures
 @pytest.fixture
 def sample_documents():
@@ -0,0 +1,196 @@
+"""
+對話 Session 存放測試
+測試記憶體後備、長度限制，以及 Redis 列表的交易寫入（以假的 Redis 客戶端模擬）
+"""
+
+import json
+import asyncio
+import pytest
+
+from utils.session_store import SessionStore
+
+WatchError = pytest.importorskip("redis.exceptions").WatchError
+
+
+class FakePipeline:
+    """模擬 redis.asyncio 的交易 pipeline（WATCH 後立即執行，MULTI 後排入佇列）"""
+
+    def __init__(self, client):
+        self.client = client
+        self.watched = {}
+        self.queued = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def watch(self, *keys):
+        self.watched = {key: self.client.versions.get(key, 0) for key in keys}
+        for hook in self.client.on_watch:
+            hook()
+        self.client.on_watch = []
+
+    async def exists(self, key):
+        return await self.client.exists(key)
+
+    async def get(self, key):
+        return await self.client.get(key)
+
+    def multi(self):
+        self.queued = []
+
+    def __getattr__(self, name):
+        def queue(*args):
+            self.queued.append((name, args))
+        return queue
+
+    async def execute(self):
+        queued, self.queued = self.queued, None
+        if any(self.client.versions.get(key, 0) != version for key, version in self.watched.items()):
+            self.watched = {}
+            raise WatchError("watched key changed")
+        self.watched = {}
+        self.client.transactions += 1
+        return [getattr(self.client, f"_{name}")(*args) for name, args in queued]
+
+
+class FakeRedis:
+    """只實作 SessionStore 用到的指令"""
+
+    def __init__(self):
+        self.data = {}
+        self.versions = {}
+        self.ttls = {}
+        self.on_watch = []
+        self.transactions = 0
+
+    def _touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def _rpush(self, key, *values):
+        self.data.setdefault(key, []).extend(values)
+        self._touch(key)
+        return len(self.data[key])
+
+    def _ltrim(self, key, start, end):
+        if key in self.data:
+            items = self.data[key]
+            self.data[key] = items[start:] if end == -1 else items[start:end + 1]
+            self._touch(key)
+
+    def _expire(self, key, seconds):
+        self.ttls[key] = seconds
+
+    def _delete(self, *keys):
+        for key in keys:
+            if self.data.pop(key, None) is not None:
+                self._touch(key)
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+    async def exists(self, key):
+        return int(key in self.data)
+
+    async def get(self, key):
+        value = self.data.get(key)
+        return value if isinstance(value, str) else None
+
+    async def lrange(self, key, start, end):
+        return list(self.data.get(key, []))[start:]
+
+    async def delete(self, *keys):
+        self._delete(*keys)
+
+
+def message(role, content):
+    return {"role": role, "content": content}
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+class TestMemoryBackend:
+    """Redis 不可用時的記憶體後備"""
+
+    def test_history_seeds_new_session_only(self):
+        """測試前端歷史只在 session 不存在時補種"""
+        store = SessionStore(reconnect_interval=3600)
+        store._last_connect_attempt = float("inf")
+        history = [message("user", "q0"), message("assistant", "a0")]
+
+        run(store.append_messages("s1", [message("user", "q1")], history=history))
+        run(store.append_messages("s1", [message("user", "q2")], history=history))
+
+        contents = [m["content"] for m in run(store.get_messages("s1"))]
+        assert store.backend == "memory"
+        assert contents == ["q0", "a0", "q1", "q2"]
+
+    def test_max_messages_and_limit(self):
+        """測試超過上限時只保留最後幾筆，limit 只取最後幾筆"""
+        store = SessionStore(max_messages=3, reconnect_interval=3600)
+        store._last_connect_attempt = float("inf")
+        for i in range(5):
+            run(store.append_messages("s1", [message("user", f"q{i}")]))
+
+        assert [m["content"] for m in run(store.get_messages("s1"))] == ["q2", "q3", "q4"]
+        assert [m["content"] for m in run(store.get_messages("s1", limit=2))] == ["q3", "q4"]
+
+    def test_oldest_session_evicted(self):
+        """測試記憶體模式下超過 session 數上限時淘汰最久未使用的"""
+        store = SessionStore(max_memory_sessions=2, reconnect_interval=3600)
+        store._last_connect_attempt = float("inf")
+        for session_id in ("a", "b", "c"):
+            run(store.append_messages(session_id, [message("user", session_id)]))
+
+        assert run(store.get_messages("a")) == []
+        assert run(store.get_messages("c"))[0]["content"] == "c"
+
+
+class TestRedisBackend:
+    """以假的 Redis 客戶端測試列表寫入"""
+
+    def make_store(self, **kwargs):
+        store = SessionStore(**kwargs)
+        store._redis = FakeRedis()
+        return store, store._redis
+
+    def test_append_trim_and_expire_in_one_transaction(self):
+        """測試每輪只追加新訊息，並在同一個交易中裁剪長度、設定過期時間"""
+        store, redis = self.make_store(max_messages=3, ttl_seconds=60)
+        history = [message("user", "q0"), message("assistant", "a0")]
+
+        run(store.append_messages("s1", [message("user", "q1")], history=history))
+        run(store.append_messages("s1", [message("assistant", "a1")], history=history))
+
+        key = "rag_session_messages:s1"
+        assert [json.loads(item)["content"] for item in redis.data[key]] == ["a0", "q1", "a1"]
+        assert redis.ttls[key] == 60 and redis.transactions == 2
+        assert [m["content"] for m in run(store.get_messages("s1", limit=2))] == ["q1", "a1"]
+
+    def test_concurrent_seed_written_once(self):
+        """測試兩個請求同時補種同一個 session 時，歷史只寫入一次"""
+        store, redis = self.make_store()
+        history = [message("user", "q0"), message("assistant", "a0")]
+        key = "rag_session_messages:s1"
+        # 第一次 WATCH 之後，另一個請求先完成了補種
+        redis.on_watch.append(lambda: redis._rpush(key, *[json.dumps(m) for m in history + [message("user", "q1")]]))
+
+        run(store.append_messages("s1", [message("user", "q2")], history=history))
+
+        assert [json.loads(item)["content"] for item in redis.data[key]] == ["q0", "a0", "q1", "q2"]
+
+    def test_legacy_session_migrated(self):
+        """測試舊版 rag_session:<id> 的整段 JSON 在下一次追加時搬進列表並刪除"""
+        store, redis = self.make_store()
+        redis.data["rag_session:s1"] = json.dumps({"messages": [message("user", "old")], "last_update": "x"})
+
+        assert [m["content"] for m in run(store.get_messages("s1"))] == ["old"]
+
+        run(store.append_messages("s1", [message("user", "new")], history=[message("user", "client")]))
+
+        assert "rag_session:s1" not in redis.data
+        assert [m["content"] for m in run(store.get_messages("s1"))] == ["old", "new"]
@@ -11,6 +11,7 @@ import pytest
 import os
 import tempfile
 import shutil
+from types import SimpleNamespace
 from unittest.mock import Mock, patch, MagicMock
 from vectorstore.index_manager import get_vectorstore, get_embeddings
 from langchain.schema import Document
@@ -32,7 +33,7 @@ class TestEmbeddings:
     @patch('vectorstore.index_manager.OpenAIEmbeddings')
     def test_get_openai_embeddings(self, mock_openai_embeddings):
         """測試獲取 OpenAI 嵌入模型"""
-        os.environ["EMBED_PROVIDER"] = "openai"
+        os.environ["EMBEDDING_PROVIDER"] = "openai"
         os.environ["OPENAI_API_KEY"] = "test-key"
         
         embeddings = get_embeddings()
@@ -42,7 +43,7 @@ class TestEmbeddings:
     @patch('vectorstore.index_manager.HuggingFaceEmbeddings')
     def test_get_huggingface_embeddings(self, mock_hf_embeddings):
         """測試獲取 HuggingFace 嵌入模型"""
-        os.environ["EMBED_PROVIDER"] = "huggingface"
+        os.environ["EMBEDDING_PROVIDER"] = "huggingface"
         
         embeddings = get_embeddings()
         
@@ -51,6 +52,622 @@ class TestEmbeddings:
         )
 
 
+class TestOnnxEmbeddings:
+    """ONNX Runtime 量化嵌入模型測試（以假的 session / tokenizer 驗證批次與 pooling）"""
+
+    class FakeTokenizer:
+        """輸出順序與 BERT tokenizer 相同：input_ids, token_type_ids, attention_mask"""
+
+        def __init__(self, token_types=True):
+            self.token_types = token_types
+
+        def __call__(self, texts, padding, truncation, max_length, return_tensors):
+            lengths = [min(len(text.split()), max_length) for text in texts]
+            width = max(lengths)
+            ids = np.zeros((len(texts), width), dtype=np.int64)
+            mask = np.zeros((len(texts), width), dtype=np.int64)
+            for row, length in enumerate(lengths):
+                ids[row, :length] = np.arange(1, length + 1)
+                mask[row, :length] = 1
+            if self.token_types:
+                return {"input_ids": ids, "token_type_ids": np.zeros_like(ids), "attention_mask": mask}
+            return {"input_ids": ids, "attention_mask": mask}
+
+    class FakeSession:
+        def __init__(self, input_names=("input_ids", "token_type_ids", "attention_mask")):
+            self.batches = []
+            self.input_names = input_names
+
+        def get_inputs(self):
+            return [SimpleNamespace(name=name) for name in self.input_names]
+
+        def run(self, outputs, feeds):
+            # 依名稱餵入：mask 必須對應非填充的 token，segment id 必須全為 0
+            assert (feeds["attention_mask"] == (feeds["input_ids"] > 0)).all()
+            assert not feeds["token_type_ids"].any()
+            self.batches.append({name: value.shape for name, value in feeds.items()})
+            ids = feeds["input_ids"].astype(np.float32)
+            # 填充位置輸出很大的值，驗證 pooling 有依 mask 排除
+            hidden = np.stack([ids, np.ones_like(ids)], axis=-1)
+            hidden[feeds["attention_mask"] == 0] = 1000.0
+            return [hidden]
+
+    def test_batches_and_mean_pooling(self):
+        """測試依批次大小呼叫 session、補上 token_type_ids，並以 mask 做 mean pooling 與正規化"""
+        from vectorstore.onnx_embeddings import OnnxEmbeddings
+        session = self.FakeSession()
+        embeddings = OnnxEmbeddings(model_name="test", batch_size=2, session=session,
+                                    tokenizer=self.FakeTokenizer(token_types=False))
+
+        vectors = embeddings.embed_documents(["a b c", "a", "a b c d e"])
+
+        assert len(session.batches) == 2
+        assert session.batches[0]["token_type_ids"] == session.batches[0]["input_ids"]
+        expected = np.array([2.0, 1.0]) / np.linalg.norm([2.0, 1.0])
+        assert np.allclose(vectors[0], expected)
+        assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+        assert np.allclose(embeddings.embed_query("a b c"), vectors[0])
+
+    def test_inputs_fed_by_name(self):
+        """測試 tokenizer 與模型的輸入順序不同時，仍依名稱餵入"""
+        from vectorstore.onnx_embeddings import OnnxEmbeddings
+        session = self.FakeSession(("input_ids", "attention_mask", "token_type_ids"))
+        embeddings = OnnxEmbeddings(model_name="test", session=session, tokenizer=self.FakeTokenizer())
+
+        embeddings.embed_documents(["a b c", "a"])
+
+        assert len(session.batches) == 1
+
+    def test_export_input_names_checked_against_forward(self):
+        """測試匯出的輸入名稱必須是 forward 的參數，且以名稱（不是位置）傳給模型"""
+        from vectorstore.onnx_embeddings import export_input_names, named_inputs_module
+
+        class Model:
+            def forward(self, input_ids=None, attention_mask=None, token_type_ids=None, position_ids=None):
+                pass
+
+        names = export_input_names(Model(), ["input_ids", "token_type_ids", "attention_mask"])
+        assert names == ["input_ids", "token_type_ids", "attention_mask"]
+        with pytest.raises(ValueError):
+            export_input_names(Model(), ["input_ids", "pixel_values"])
+
+        torch = pytest.importorskip("torch")
+        transformers = pytest.importorskip("transformers")
+        config = transformers.BertConfig(vocab_size=16, hidden_size=8, num_hidden_layers=1,
+                                         num_attention_heads=2, intermediate_size=16)
+        bert = transformers.BertModel(config).eval()
+        names = export_input_names(bert, ["input_ids", "token_type_ids", "attention_mask"])
+
+        ids = torch.tensor([[2, 5, 6, 3, 0]])
+        mask = torch.tensor([[1, 1, 1, 1, 0]])
+        types = torch.zeros_like(ids)
+        with torch.no_grad():
+            expected = bert(input_ids=ids, attention_mask=mask, token_type_ids=types).last_hidden_state
+            wrapped = named_inputs_module(bert, names)(ids, types, mask)
+        assert torch.allclose(wrapped, expected)
+
+    def test_exported_model_matches_torch(self, tmp_path):
+        """測試實際匯出並量化的模型與 PyTorch 的 mean pooling 輸出一致"""
+        torch = pytest.importorskip("torch")
+        transformers = pytest.importorskip("transformers")
+        pytest.importorskip("onnx")
+        pytest.importorskip("onnxruntime")
+        from vectorstore.onnx_embeddings import OnnxEmbeddings, export_quantized_model, mean_pooling
+
+        words = ["log", "error", "crash", "service", "restart", "main", "thread", "anr", "config", "load"]
+        (tmp_path / "vocab.txt").write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + words))
+        model_dir = tmp_path / "model"
+        transformers.BertTokenizer(str(tmp_path / "vocab.txt")).save_pretrained(str(model_dir))
+        torch.manual_seed(0)
+        config = transformers.BertConfig(vocab_size=len(words) + 5, hidden_size=32, num_hidden_layers=2,
+                                         num_attention_heads=4, intermediate_size=64)
+        transformers.BertModel(config).save_pretrained(str(model_dir))
+
+        path = export_quantized_model(str(model_dir), str(tmp_path / "onnx"))
+        embeddings = OnnxEmbeddings(model_name=str(model_dir), model_path=path, threads=1)
+        texts = ["service restart", "main thread anr error crash log", "config load error"]
+        vectors = np.asarray(embeddings.embed_documents(texts))
+
+        tokenizer = transformers.AutoTokenizer.from_pretrained(str(model_dir))
+        model = transformers.AutoModel.from_pretrained(str(model_dir)).eval()
+        encoded = tokenizer(texts, padding=True, return_tensors="pt")
+        with torch.no_grad():
+            hidden = model(**encoded).last_hidden_state.numpy()
+        expected = mean_pooling(hidden, encoded["attention_mask"].numpy())
+        assert (vectors * expected).sum(axis=1).min() > 0.99
+
+    def test_cosine_parity(self):
+        """測試一致性檢查返回最小與平均餘弦相似度"""
+        from vectorstore.onnx_embeddings import cosine_parity
+        reference = Mock()
+        reference.embed_documents = lambda texts: [[1.0, 0.0], [0.0, 1.0]]
+        candidate = Mock()
+        candidate.embed_documents = lambda texts: [[2.0, 0.0], [1.0, 1.0]]
+
+        parity = cosine_parity(candidate, reference, ["x", "y"])
+
+        assert parity["min"] == pytest.approx(np.sqrt(0.5))
+        assert parity["mean"] == pytest.approx((1 + np.sqrt(0.5)) / 2)
+
+    @patch('vectorstore.onnx_embeddings.OnnxEmbeddings')
+    def test_get_onnx_embeddings(self, mock_onnx_embeddings):
+        """測試 EMBEDDING_PROVIDER=onnx 時使用 ONNX 嵌入模型"""
+        with patch.dict(os.environ, {"EMBEDDING_PROVIDER": "onnx"}):
+            get_embeddings()
+
+        mock_onnx_embeddings.assert_called_once()
+
+
+class TestParallelEmbeddings:
+    """多進程批次嵌入測試（以執行緒池代替進程池驗證分批與順序）"""
+
+    class LengthEmbeddings:
+        def __init__(self):
+            self.calls = []
+
+        def embed_documents(self, texts):
+            self.calls.append(list(texts))
+            return [[float(len(text)), 1.0] for text in texts]
+
+        def embed_query(self, text):
+            return [float(len(text)), 1.0]
+
+    def make_embeddings(self):
+        from vectorstore.bulk_embedder import ParallelEmbeddings
+        embeddings = ParallelEmbeddings(workers=2, batch_size=3, min_texts=4)
+        embeddings.workers = 2  # 測試環境可能只有單核心
+        embeddings._local = self.LengthEmbeddings()
+        return embeddings
+
+    def test_batches_sorted_by_length(self):
+        """測試依長度排序後分批"""
+        from vectorstore.bulk_embedder import length_sorted_batches
+        texts = ["aaaa", "a", "aaaaaa", "aa", "aaaaa", "aaa"]
+
+        batches = length_sorted_batches(texts, 2)
+
+        assert [[texts[i] for i in batch] for batch in batches] == [["a", "aa"], ["aaa", "aaaa"], ["aaaaa", "aaaaaa"]]
+
+    def test_results_in_original_order(self):
+        """測試分散計算後依原始順序返回，同一批長度相近"""
+        from concurrent.futures import ThreadPoolExecutor
+        import vectorstore.bulk_embedder as bulk_embedder
+        worker = self.LengthEmbeddings()
+        embeddings = self.make_embeddings()
+        texts = ["x" * n for n in (7, 2, 9, 1, 5, 3, 8)]
+
+        with ThreadPoolExecutor(max_workers=2) as pool, \
+                patch.object(bulk_embedder, "_worker_embeddings", worker), \
+                patch.object(embeddings, "_get_pool", return_value=pool):
+            vectors = embeddings.embed_documents(texts)
+
+        assert [vector[0] for vector in vectors] == [7, 2, 9, 1, 5, 3, 8]
+        assert sorted(len(call) for call in worker.calls) == [1, 3, 3]
+        assert [len(text) for text in worker.calls[0]] == [1, 2, 3]
+        assert embeddings._local.calls == []
+
+    def test_falls_back_to_local_model(self):
+        """測試少量文字在本進程計算，進程池失敗時剩餘批次改在本進程計算"""
+        from concurrent.futures.process import BrokenProcessPool
+        embeddings = self.make_embeddings()
+
+        assert embeddings.embed_documents(["a", "bb"]) == [[1.0, 1.0], [2.0, 1.0]]
+
+        broken = Mock()
+        broken.submit.side_effect = BrokenProcessPool("worker died")
+        with patch.object(embeddings, "_get_pool", return_value=broken):
+            vectors = embeddings.embed_documents(["aaa", "a", "aa", "aaaa"])
+
+        assert [vector[0] for vector in vectors] == [3, 1, 2, 4]
+
+    def test_failure_keeps_pool_for_other_callers(self):
+        """測試進程池失敗時不取消其他呼叫的批次，由最後一個結束的呼叫關閉；取消的批次改在本進程計算"""
+        from concurrent.futures import CancelledError
+        embeddings = self.make_embeddings()
+        cancelled = Mock()
+        cancelled.result.side_effect = CancelledError()
+        pool = embeddings._pool = Mock()
+        pool.submit.return_value = cancelled
+        embeddings._active = 1  # 另一個匯入仍在使用進程池
+
+        vectors = embeddings.embed_documents(["aaa", "a", "aa", "aaaa"])
+
+        assert [vector[0] for vector in vectors] == [3, 1, 2, 4]
+        pool.shutdown.assert_not_called()
+        embeddings._release_pool()
+        pool.shutdown.assert_called_once()
+        assert embeddings._pool is None
+
+    def test_concurrent_calls_share_one_pool(self):
+        """測試同時開始的匯入只建立一個進程池"""
+        import threading
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        import vectorstore.bulk_embedder as bulk_embedder
+        embeddings = self.make_embeddings()
+        embeddings.idle_seconds = 0
+        created = []
+
+        def slow_pool(*args, **kwargs):
+            time.sleep(0.05)
+            pool = ThreadPoolExecutor(max_workers=2)
+            created.append(pool)
+            return pool
+
+        def ingest():
+            embeddings.embed_documents(["aaa", "a", "aa", "aaaa"])
+
+        with patch.object(bulk_embedder, "ProcessPoolExecutor", side_effect=slow_pool), \
+                patch.object(bulk_embedder, "_worker_embeddings", self.LengthEmbeddings()):
+            threads = [threading.Thread(target=ingest) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        assert len(created) == 1
+        assert embeddings._pool is None
+
+    def test_local_model_shared_with_queries(self):
+        """測試本進程的模型與查詢共用，建立時不載入"""
+        from vectorstore.bulk_embedder import ParallelEmbeddings
+        shared = self.LengthEmbeddings()
+        with patch("vectorstore.query_batcher.get_query_embeddings", return_value=shared) as get_shared, \
+                patch("vectorstore.index_manager.create_local_embeddings") as create_local:
+            embeddings = ParallelEmbeddings(workers=2, min_texts=4)
+            get_shared.assert_not_called()
+
+            assert embeddings.embed_documents(["a"]) == [[1.0, 1.0]]
+
+        assert embeddings.local is shared
+        create_local.assert_not_called()
+
+    def test_pool_closed_when_idle(self):
+        """測試進程池在閒置逾時後關閉，逾時前的新計算會延後關閉"""
+        import time
+        from concurrent.futures import ThreadPoolExecutor
+        import vectorstore.bulk_embedder as bulk_embedder
+        embeddings = self.make_embeddings()
+        embeddings.idle_seconds = 0.2
+        pool = embeddings._pool = ThreadPoolExecutor(max_workers=2)
+
+        with patch.object(bulk_embedder, "_worker_embeddings", self.LengthEmbeddings()):
+            embeddings.embed_documents(["aaa", "a", "aa", "aaaa"])
+            time.sleep(0.1)
+            embeddings.embed_documents(["aaa", "a", "aa", "aaaa"])
+            time.sleep(0.15)
+            assert embeddings._pool is pool
+
+            deadline = time.time() + 5
+            while embeddings._pool is not None and time.time() < deadline:
+                time.sleep(0.02)
+
+        assert embeddings._pool is None
+        with pytest.raises(RuntimeError):
+            pool.submit(len, "closed")
+
+
+class TestQueryBatcher:
+    """查詢嵌入微批次測試"""
+
+    class RecordingEmbeddings:
+        def __init__(self):
+            self.batches = []
+
+        def embed_documents(self, texts):
+            raise AssertionError("查詢不應使用文件嵌入")
+
+        def embed_queries(self, texts):
+            self.batches.append(list(texts))
+            if "boom" in texts:
+                raise RuntimeError("model failed")
+            return [[float(len(text))] for text in texts]
+
+    class InstructEmbeddings:
+        """查詢與文件使用不同指令前綴、沒有批次查詢 API 的模型"""
+
+        def embed_documents(self, texts):
+            return [[0.0, float(len(text))] for text in texts]
+
+        def embed_query(self, text):
+            return [1.0, float(len(text))]
+
+    def test_concurrent_queries_share_batches(self):
+        """測試並行查詢合併成批次，各自拿回自己的向量，並記錄批次大小分布"""
+        from concurrent.futures import ThreadPoolExecutor
+        from vectorstore.query_batcher import QueryBatcher
+        model = self.RecordingEmbeddings()
+        batcher = QueryBatcher(model, max_wait_ms=200, max_batch=4)
+        texts = ["q" * n for n in range(1, 9)]
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            vectors = list(pool.map(batcher.embed_query, texts))
+
+        assert vectors == [[float(n)] for n in range(1, 9)]
+        assert all(len(batch) <= 4 for batch in model.batches)
+        assert len(model.batches) < len(texts)
+        stats = batcher.stats()
+        assert stats["queries"] == 8
+        assert stats["batches"] == len(model.batches)
+        assert sum(size * count for size, count in stats["histogram"].items()) == 8
+
+    def test_errors_reach_waiters(self):
+        """測試模型錯誤會拋給等待中的呼叫者，批次器仍可繼續使用"""
+        from vectorstore.query_batcher import QueryBatcher
+        batcher = QueryBatcher(self.RecordingEmbeddings(), max_wait_ms=0, max_batch=4)
+
+        with pytest.raises(RuntimeError):
+            batcher.embed_query("boom")
+        assert batcher.embed_query("ok") == [2.0]
+
+    def test_queries_use_query_path(self):
+        """測試沒有批次查詢 API 的模型逐筆走 embed_query，對稱模型以 embed_documents 整批計算"""
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        from vectorstore.query_batcher import QueryBatcher, embed_queries
+        batcher = QueryBatcher(self.InstructEmbeddings(), max_wait_ms=0, max_batch=4)
+
+        assert batcher.embed_query("abc") == [1.0, 3.0]
+        assert embed_queries(self.InstructEmbeddings(), ["a", "bb"]) == [[1.0, 1.0], [1.0, 2.0]]
+
+        model = HuggingFaceEmbeddings.model_construct()
+        with patch.object(HuggingFaceEmbeddings, "embed_documents",
+                          return_value=[[1.0], [2.0]]) as embed_documents:
+            assert embed_queries(model, ["a", "bb"]) == [[1.0], [2.0]]
+        embed_documents.assert_called_once_with(["a", "bb"])
+
+
+class TestEmbeddingService:
+    """Unix socket 嵌入服務測試"""
+
+    class LengthEmbeddings:
+        def embed_documents(self, texts):
+            return [[float(len(text)), 1.0] for text in texts]
+
+        def embed_query(self, text):
+            return [float(len(text)), 1.0]
+
+    def setup_method(self):
+        import threading
+        from vectorstore.embedding_service import EmbeddingServer
+        self.temp_dir = tempfile.mkdtemp()
+        self.socket_path = os.path.join(self.temp_dir, "embed.sock")
+        self.server = EmbeddingServer(self.socket_path, self.LengthEmbeddings())
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def teardown_method(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def test_remote_embeddings(self):
+        """測試透過 socket 取得向量，大量文字分成多個請求且保持順序"""
+        from vectorstore.embedding_service import RemoteEmbeddings, MAX_TEXTS_PER_REQUEST
+        fallback = Mock()
+        client = RemoteEmbeddings(self.socket_path, fallback=fallback)
+        texts = ["x" * (i % 7 + 1) for i in range(MAX_TEXTS_PER_REQUEST + 10)]
+
+        vectors = client.embed_documents(texts)
+
+        assert [vector[0] for vector in vectors] == [float(len(text)) for text in texts]
+        assert client.embed_query("中文查詢") == [4.0, 1.0]
+        fallback.embed_documents.assert_not_called()
+
+    def test_falls_back_when_service_is_down(self):
+        """測試服務停止時改用進程內的模型，並在重試間隔內不再嘗試連線"""
+        from vectorstore.embedding_service import RemoteEmbeddings
+        fallback = Mock()
+        fallback.embed_query.return_value = [0.5]
+        client = RemoteEmbeddings(os.path.join(self.temp_dir, "missing.sock"),
+                                  retry_seconds=60, fallback=fallback)
+
+        assert client.embed_query("hello") == [0.5]
+        assert client.embed_query("again") == [0.5]
+        assert fallback.embed_query.call_count == 2
+
+    def test_falls_back_when_service_returns_error(self):
+        """測試服務回應 ok:false（服務端的模型失敗）時改用進程內的模型"""
+        import threading
+        from vectorstore.embedding_service import EmbeddingServer, RemoteEmbeddings
+        failing = Mock()
+        failing.embed_documents.side_effect = MemoryError("CUDA out of memory")
+        socket_path = os.path.join(self.temp_dir, "failing.sock")
+        server = EmbeddingServer(socket_path, failing)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        fallback = Mock()
+        fallback.embed_documents.return_value = [[0.5]]
+        try:
+            client = RemoteEmbeddings(socket_path, retry_seconds=60, fallback=fallback)
+
+            assert client.embed_documents(["a"]) == [[0.5]]
+            assert client.embed_documents(["b"]) == [[0.5]]
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        assert failing.embed_documents.call_count == 1
+        assert fallback.embed_documents.call_count == 2
+
+    def test_get_embeddings_uses_running_service(self):
+        """測試設定 EMBEDDING_SERVICE_SOCKET 且服務已啟動時 get_embeddings 返回用戶端"""
+        from vectorstore.embedding_service import RemoteEmbeddings
+        with patch.dict(os.environ, {"EMBEDDING_SERVICE_SOCKET": self.socket_path}):
+            embeddings = get_embeddings()
+
+        assert isinstance(embeddings, RemoteEmbeddings)
+        assert embeddings.embed_query("abc") == [3.0, 1.0]
+
+
+class TestLocalVectorStore:
+    """本機記憶體映射向量庫測試"""
+
+    class HashEmbeddings:
+        """相同文字得到相同向量，不同文字近似正交"""
+
+        def _vector(self, text):
+            rng = np.random.default_rng(sum(ord(c) * (i + 1) for i, c in enumerate(text)))
+            return rng.normal(size=32).tolist()
+
+        def embed_documents(self, texts):
+            return [self._vector(text) for text in texts]
+
+        def embed_query(self, text):
+            return self._vector(text)
+
+    def setup_method(self):
+        from vectorstore.local_store import close_local_indexes
+        close_local_indexes()
+        self.temp_dir = tempfile.mkdtemp()
+
+    def teardown_method(self):
+        from vectorstore.local_store import close_local_indexes
+        close_local_indexes()
+        shutil.rmtree(self.temp_dir, ignore_errors=True)
+
+    def make_store(self, **kwargs):
+        from vectorstore.local_store import LocalVectorStore
+        return LocalVectorStore(self.HashEmbeddings(), persist_directory=self.temp_dir, **kwargs)
+
+    def test_search_filter_and_upsert(self):
+        """測試搜尋、metadata 過濾，以及同 ID 重新寫入時取代舊內容"""
+        store = self.make_store()
+        texts = [f"文件 {i}" for i in range(40)]
+        store.add_texts(texts, [{"chunk_id": f"c{i}", "group": i % 4} for i in range(40)],
+                        ids=[f"id{i}" for i in range(40)])
+
+        assert store.similarity_search("文件 7", k=1)[0].page_content == "文件 7"
+        filtered = store.similarity_search("文件 7", k=3, filter={"chunk_id": {"$in": ["c3", "c9"]}})
+        assert sorted(doc.metadata["chunk_id"] for doc in filtered) == ["c3", "c9"]
+        assert all(doc.metadata["group"] == 1 for doc in store.similarity_search("文件 7", k=5, filter={"group": 1}))
+
+        store.add_texts(["更新後的文件"], [{"chunk_id": "c7"}], ids=["id7"])
+        assert store.index.count() == 40
+        top = store.similarity_search("文件 7", k=40)
+        assert "文件 7" not in [doc.page_content for doc in top]
+        assert store.similarity_search("更新後的文件", k=1)[0].metadata["chunk_id"] == "c7"
+
+    def test_chunk_id_filter_uses_index(self):
+        """測試 chunk_id 過濾以有索引的欄位查詢，不掃描整個表"""
+        from vectorstore.local_store import filter_to_sql
+        store = self.make_store()
+        store.add_texts(["alpha", "beta"], [{"chunk_id": "f1:0"}, {"chunk_id": "f1:1"}])
+
+        sql, params = filter_to_sql({"chunk_id": {"$in": ["f1:1"]}})
+        plan = " ".join(str(row) for row in store.index._conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT row FROM chunks WHERE deleted = 0 AND ({sql})", params))
+        assert "chunks_chunk_id" in plan
+        assert [doc.page_content for doc in store.similarity_search("alpha", k=2, filter={"chunk_id": "f1:1"})] == ["beta"]
+
+    def test_other_reader_sees_new_writes(self):
+        """測試另一個索引實例（其他進程）在索引不存在時返回空結果，並看到後續的寫入與刪除"""
+        from vectorstore.local_store import LocalVectorIndex
+        path = os.path.join(self.temp_dir, "rag_docs")
+        reader = LocalVectorIndex(path)
+        assert reader.search(np.ones(32), 3) == []
+
+        store = self.make_store()
+        store.add_texts(["alpha", "beta"], ids=["a", "b"])
+        assert reader.search(np.asarray(self.HashEmbeddings().embed_query("beta")), 1)[0][0] == 1
+
+        store.delete(["b"])
+        assert [row for row, _ in reader.search(np.asarray(self.HashEmbeddings().embed_query("beta")), 2)] == [0]
+        reader.close()
+
+    def test_reindex_replaces_chunks_by_chunk_id(self):
+        """測試沒有指定 ID 時以 chunk_id 為 ID，重新匯入同一個檔案不會新增重複的向量"""
+        from langchain.schema import Document
+        store = self.make_store()
+        docs = [Document(page_content=f"片段 {i}", metadata={"chunk_id": f"f1:{i}"}) for i in range(3)]
+        docs.append(Document(page_content="沒有 chunk_id 的文件", metadata={}))
+
+        assert store.add_documents(docs)[:3] == ["f1:0", "f1:1", "f1:2"]
+        store.add_documents(docs[:3])
+
+        assert store.index.count() == 4
+        assert len(store.similarity_search("片段 1", k=10)) == 4
+
+    def test_child_chunks_get_distinct_ids(self):
+        """測試共用 chunk_id 的子片段各有自己的 ID，刪除其中一個不影響其他子片段"""
+        from langchain.schema import Document
+        store = self.make_store()
+        docs = [Document(page_content=f"子片段 {i}", metadata={"chunk_id": "f1:0", "child_start": i * 10})
+                for i in range(3)]
+
+        ids = store.add_documents(docs)
+        assert ids == ["f1:0#0", "f1:0#10", "f1:0#20"]
+
+        store.delete([ids[0]])
+        assert store.index.count() == 2
+        assert len(store.similarity_search("子片段", k=10, filter={"chunk_id": "f1:0"})) == 2
+
+    def test_hnsw_graph_search(self):
+        """測試列數達門檻後建立 HNSW 圖，並以圖搜尋（含過濾條件）"""
+        pytest.importorskip("hnswlib")
+        with patch.dict(os.environ, {"LOCAL_HNSW_MIN_ROWS": "50", "LOCAL_FLAT_MAX_CANDIDATES": "0"}):
+            store = self.make_store()
+            store.add_texts([f"log line {i}" for i in range(60)], [{"n": i} for i in range(60)])
+            assert store.index._refresh() and store.index._hnsw is not None
+
+            assert store.similarity_search("log line 42", k=1)[0].metadata["n"] == 42
+            assert store.similarity_search("log line 42", k=2, filter={"n": {"$gte": 50}})[0].metadata["n"] >= 50
+            assert len(store.similarity_search("log line 1", k=10)) == 10
+
+    def test_hnsw_graph_kept_in_memory_until_close(self):
+        """測試寫入者把 HNSW 圖留在記憶體中逐批加入，關閉時才寫回檔案"""
+        pytest.importorskip("hnswlib")
+        from vectorstore.local_store import LocalVectorIndex
+        path = os.path.join(self.temp_dir, "graph")
+        embeddings = self.HashEmbeddings()
+        with patch.dict(os.environ, {"LOCAL_HNSW_MIN_ROWS": "50", "LOCAL_FLAT_MAX_CANDIDATES": "0"}):
+            writer = LocalVectorIndex(path)
+            for batch in range(4):
+                texts = [f"log line {batch * 20 + i}" for i in range(20)]
+                with patch("hnswlib.Index.save_index") as save_index:
+                    writer.upsert(texts, np.asarray(embeddings.embed_documents(texts)), texts, [{}] * 20)
+                save_index.assert_not_called()
+            graph = writer._hnsw
+            assert graph is not None and graph.element_count == 80
+
+            # 其他進程：圖尚未保存，全部以精確計算搜尋
+            reader = LocalVectorIndex(path)
+            query = np.asarray(embeddings.embed_query("log line 65"))
+            assert reader.search(query, 1)[0][0] == 65
+            assert reader._hnsw is None
+            reader.close()
+
+            writer.close()
+            assert os.path.exists(os.path.join(path, "hnsw.bin"))
+            reopened = LocalVectorIndex(path)
+            assert reopened.search(query, 1)[0][0] == 65
+            assert reopened._hnsw is not None and reopened._hnsw_rows == 80
+            reopened.close()
+
+    def test_int8_codec_round_trip(self):
+        """測試 int8 量化還原後與原向量的 cosine 相似度"""
+        from vectorstore.vector_codec import VectorCodec
+        vectors = np.random.default_rng(0).normal(size=(100, 384)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        codec = VectorCodec("int8", 384)
+        decoded = codec.decode(codec.encode(vectors))
+
+        assert codec.row_bytes == 388
+        assert (decoded * vectors).sum(axis=1).min() > 0.99
+
+    def test_int8_binary_prefilter_search(self):
+        """測試 int8 儲存加上二元簽名預篩：搜尋、過濾與刪除後仍正確"""
+        from vectorstore.local_store import LocalVectorIndex
+        index = LocalVectorIndex(os.path.join(self.temp_dir, "compressed"), dtype="int8", binary=True)
+        vectors = np.asarray(self.HashEmbeddings().embed_documents([f"trace {i}" for i in range(200)]))
+        index.upsert([f"id{i}" for i in range(200)], vectors, [f"trace {i}" for i in range(200)],
+                     [{"n": i} for i in range(200)])
+        assert index.size_bytes() > 0 and os.path.exists(os.path.join(index.path, "signs.bin"))
+
+        assert index.search(vectors[123], 1)[0][0] == 123
+        assert index.search(vectors[123], 1, where={"n": {"$lt": 100}})[0][0] < 100
+        index.delete(["id123"])
+        assert 123 not in [row for row, _ in index.search(vectors[123], 5)]
+        index.close()
+
+
 class TestVectorStores:
     """向量資料庫測試"""
     
@@ -222,6 +839,64 @@ class TestVectorStoreOperations:
         assert results[1][1] == 0.85
 
 
+class TestParentStore:
+    """小片段檢索、大片段回傳測試"""
+
+    def setup_method(self):
+        from loader.file_catalog import FileCatalog
+        from loader.offset_splitter import OffsetTextSplitter, approximate_counter
+        from vectorstore.parent_store import ParentStore
+        self.store = ParentStore(FileCatalog(":memory:"))
+        self.splitter = OffsetTextSplitter(chunk_size=20, chunk_overlap=0, counter=approximate_counter())
+
+    def test_children_link_to_parent(self):
+        """測試子片段帶有 parent_id 與位移，短片段原樣保留，換回時只返回一次父片段"""
+        from vectorstore.parent_store import split_into_children, expand_to_parents
+        text = "第一句話說明系統架構。" * 10
+        docs = [
+            Document(page_content=text, metadata={"source": "a.txt", "chunk_id": "c1"}),
+            Document(page_content="短片段", metadata={"source": "b.txt"}),
+        ]
+
+        with patch.dict(os.environ, {"SMALL_TO_BIG": "true"}):
+            children = split_into_children(docs, store=self.store, splitter=self.splitter)
+
+        linked = [doc for doc in children if "parent_id" in doc.metadata]
+        assert len(linked) > 1
+        assert children[-1].page_content == "短片段"
+        for child in linked:
+            assert text[child.metadata["child_start"]:child.metadata["child_end"]] == child.page_content
+            assert child.metadata["chunk_id"] == "c1"
+
+        windows = expand_to_parents([linked[1], children[-1], linked[0]], store=self.store)
+        assert [doc.page_content for doc in windows] == [text, "短片段"]
+        assert windows[0].metadata["matched_children"] == 2
+
+    def test_overlapping_parents_merge(self):
+        """測試同一來源中重疊的父片段合併成一個視窗"""
+        from vectorstore.parent_store import split_into_children, expand_to_parents
+        source = "".join(f"段落{i}的內容。" for i in range(60))
+        parents = [
+            Document(page_content=source[0:200], metadata={"source": "a.txt", "start_offset": 0, "end_offset": 200}),
+            Document(page_content=source[150:350], metadata={"source": "a.txt", "start_offset": 150, "end_offset": 350}),
+            Document(page_content=source[150:350], metadata={"source": "b.txt", "start_offset": 150, "end_offset": 350}),
+        ]
+
+        with patch.dict(os.environ, {"SMALL_TO_BIG": "true"}):
+            children = split_into_children(parents, store=self.store, splitter=self.splitter)
+        hits = [next(c for c in children if c.metadata["source"] == "a.txt" and c.metadata["start_offset"] == 150),
+                next(c for c in children if c.metadata["source"] == "b.txt"),
+                next(c for c in children if c.metadata["start_offset"] == 0)]
+
+        windows = expand_to_parents(hits, store=self.store)
+
+        assert len(windows) == 2
+        assert windows[0].page_content == source[0:350]
+        assert (windows[0].metadata["start_offset"], windows[0].metadata["end_offset"]) == (0, 350)
+        assert windows[1].metadata["source"] == "b.txt"
+        assert expand_to_parents(hits, store=self.store, limit=1)[0].page_content == source[0:350]
+
+
 class TestVectorStoreIntegration:
     """向量資料庫整合測試"""
     
@@ -243,7 +918,7 @@ class TestVectorStoreIntegration:
         """測試真實的 Chroma 操作"""
         # 使用本地嵌入模型以避免 API 調用
         os.environ["VECTOR_DB"] = "chroma"
-        os.environ["EMBED_PROVIDER"] = "huggingface"
+        os.environ["EMBEDDING_PROVIDER"] = "huggingface"
         
         # 獲取向量資料庫
         vectorstore = get_vectorstore()
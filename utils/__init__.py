@@ -4,12 +4,14 @@
 提供各種輔助功能：
 - 文字高亮
 - 日誌記錄
+- 對話記錄存放
 - 檔案處理
 - 錯誤處理
 """
 
 from .highlighter import highlight_chunks
 from .logger import logger
+from .session_store import SessionStore
 
 import os
 import hashlib
@@ -117,6 +119,7 @@ def sanitize_filename(filename: str) -> str:
 __all__ = [
     "highlight_chunks",
     "logger",
+    "SessionStore",
     "calculate_file_hash",
     "ensure_directory",
     "clean_temp_files",
@@ -0,0 +1,245 @@
+"""
+對話 Session 存放模組
+
+以 Redis 列表保存對話記錄（append-only）：
+- 每輪只 RPUSH 新訊息，再以 LTRIM / EXPIRE 控制長度與過期時間
+- 使用 redis.asyncio 連接池，並以 pipeline 一次送出
+- Redis 不可用時自動退回行程內記憶體存放，並定期嘗試重新連線
+
+鍵名：rag_session_messages:<session_id>（Redis 列表，每個元素一則訊息的 JSON）。
+舊版以 rag_session:<session_id> 保存整段對話的 JSON 字串；該 session 下一次追加訊息時
+會把舊版訊息搬進列表並刪除舊鍵，列表還不存在時讀取也會退回舊鍵。
+"""
+
+import json
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+
+from config import get_config
+
+try:
+    import redis.asyncio as aioredis
+    from redis.exceptions import RedisError, WatchError
+    HAS_REDIS = True
+except ImportError:
+    aioredis = None
+    RedisError = Exception
+    WatchError = None
+    HAS_REDIS = False
+
+# 舊版整段 JSON 字串的鍵前綴
+LEGACY_KEY_PREFIX = "rag_session:"
+
+
+class SessionStore:
+    """對話 Session 存放區"""
+
+    def __init__(self,
+                 key_prefix: str = "rag_session_messages:",
+                 max_messages: Optional[int] = None,
+                 ttl_seconds: Optional[int] = None,
+                 max_memory_sessions: int = 1000,
+                 reconnect_interval: float = 30.0):
+        """
+        初始化存放區
+
+        Args:
+            key_prefix: Redis 鍵前綴
+            max_messages: 每個 session 最多保留的訊息數
+            ttl_seconds: session 過期時間（秒）
+            max_memory_sessions: 記憶體模式下最多保留的 session 數
+            reconnect_interval: Redis 斷線後重試連線的間隔（秒）
+        """
+        self.key_prefix = key_prefix
+        self.max_messages = max_messages or int(get_config("SESSION_MAX_MESSAGES", "200"))
+        self.ttl_seconds = ttl_seconds or int(get_config("SESSION_TTL_SECONDS", "86400"))
+        self.max_memory_sessions = max_memory_sessions
+        self.reconnect_interval = reconnect_interval
+
+        self._redis = None
+        self._pool = None
+        self._last_connect_attempt = 0.0
+        # 記憶體後備：session_id -> (過期時間, deque[訊息])
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+
+    @property
+    def backend(self) -> str:
+        """目前使用的存放後端"""
+        return "redis" if self._redis is not None else "memory"
+
+    async def connect(self) -> bool:
+        """
+        建立 Redis 連接池並測試連線
+
+        Returns:
+            是否成功連上 Redis
+        """
+        self._last_connect_attempt = time.monotonic()
+        if not HAS_REDIS:
+            print("警告：未安裝 redis 套件，對話記錄只保存在記憶體")
+            return False
+
+        try:
+            self._pool = aioredis.ConnectionPool(
+                host=get_config("REDIS_HOST", "localhost"),
+                port=int(get_config("REDIS_PORT", "6379")),
+                max_connections=int(get_config("REDIS_MAX_CONNECTIONS", "20")),
+                decode_responses=True,
+            )
+            client = aioredis.Redis(connection_pool=self._pool)
+            await client.ping()
+            self._redis = client
+            print("✅ Redis 連接池已建立，對話記錄將保存到 Redis")
+            return True
+        except (RedisError, OSError) as e:
+            print(f"警告：Redis 連接失敗，對話記錄改存記憶體: {e}")
+            await self._drop_redis()
+            return False
+
+    async def close(self):
+        """關閉連接池"""
+        await self._drop_redis()
+
+    async def _drop_redis(self):
+        """放棄目前的 Redis 連線，之後改用記憶體"""
+        client, pool = self._redis, self._pool
+        self._redis = None
+        self._pool = None
+        try:
+            if client is not None:
+                await client.aclose()
+            if pool is not None:
+                await pool.disconnect()
+        except Exception:
+            pass
+
+    async def _ensure_redis(self):
+        """記憶體模式下，每隔一段時間嘗試重新連上 Redis"""
+        if self._redis is None and time.monotonic() - self._last_connect_attempt >= self.reconnect_interval:
+            await self.connect()
+        return self._redis
+
+    def _key(self, session_id: str) -> str:
+        return f"{self.key_prefix}{session_id}"
+
+    @staticmethod
+    def _legacy_key(session_id: str) -> str:
+        return f"{LEGACY_KEY_PREFIX}{session_id}"
+
+    @staticmethod
+    def _legacy_messages(raw: Optional[str]) -> List[Dict[str, Any]]:
+        """解析舊版 session 字串（{"messages": [...], "last_update": ...}）"""
+        if not raw:
+            return []
+        try:
+            return list(json.loads(raw).get("messages") or [])
+        except (ValueError, AttributeError):
+            return []
+
+    async def append_messages(self, session_id: str, messages: List[Dict[str, Any]],
+                              history: Optional[List[Dict[str, Any]]] = None):
+        """
+        追加本輪新訊息
+
+        Args:
+            session_id: Session ID
+            messages: 本輪新增的訊息
+            history: 前端帶來的歷史訊息，只在 session 尚不存在時用來補種
+        """
+        redis_client = await self._ensure_redis()
+        if redis_client is not None:
+            try:
+                await self._append_redis(redis_client, session_id, messages, history)
+                return
+            except (RedisError, OSError) as e:
+                print(f"⚠️ 寫入 Redis 失敗，改存記憶體: {e}")
+                await self._drop_redis()
+
+        self._append_memory(session_id, messages, history)
+
+    async def _append_redis(self, redis_client, session_id: str, messages: List[Dict[str, Any]],
+                            history: Optional[List[Dict[str, Any]]]):
+        """
+        以 WATCH / MULTI 追加訊息：列表不存在時補種（舊版鍵優先，其次前端歷史）與追加在同一個交易中，
+        同一 session 的兩個請求同時補種時，後執行的交易會失敗並重試，歷史不會被寫入兩次
+        """
+        key, legacy_key = self._key(session_id), self._legacy_key(session_id)
+        async with redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    await pipe.watch(key, legacy_key)
+                    seed = []
+                    exists = await pipe.exists(key)
+                    if not exists:
+                        seed = self._legacy_messages(await pipe.get(legacy_key)) or list(history or [])
+
+                    pipe.multi()
+                    to_push = seed + list(messages)
+                    if to_push:
+                        pipe.rpush(key, *[json.dumps(m, ensure_ascii=False) for m in to_push])
+                    pipe.ltrim(key, -self.max_messages, -1)
+                    pipe.expire(key, self.ttl_seconds)
+                    if not exists:
+                        pipe.delete(legacy_key)
+                    await pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    async def get_messages(self, session_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        讀取 session 的訊息
+
+        Args:
+            session_id: Session ID
+            limit: 只取最後幾筆（None 表示全部）
+
+        Returns:
+            訊息列表
+        """
+        start = -limit if limit else 0
+        redis_client = await self._ensure_redis()
+        if redis_client is not None:
+            try:
+                raw = await redis_client.lrange(self._key(session_id), start, -1)
+                if not raw:
+                    legacy = self._legacy_messages(await redis_client.get(self._legacy_key(session_id)))
+                    return legacy[start:] if limit else legacy
+                return [json.loads(item) for item in raw]
+            except (RedisError, OSError) as e:
+                print(f"⚠️ 讀取 Redis 失敗，改用記憶體: {e}")
+                await self._drop_redis()
+
+        entry = self._memory.get(session_id)
+        if entry is None or entry[0] < time.monotonic():
+            return []
+        messages = list(entry[1])
+        return messages[start:] if limit else messages
+
+    async def delete_session(self, session_id: str):
+        """刪除 session"""
+        self._memory.pop(session_id, None)
+        redis_client = await self._ensure_redis()
+        if redis_client is not None:
+            try:
+                await redis_client.delete(self._key(session_id), self._legacy_key(session_id))
+            except (RedisError, OSError) as e:
+                print(f"⚠️ 刪除 Redis session 失敗: {e}")
+                await self._drop_redis()
+
+    def _append_memory(self, session_id: str, messages: List[Dict[str, Any]],
+                       history: Optional[List[Dict[str, Any]]]):
+        """記憶體後備的追加邏輯（語意與 Redis 列表相同）"""
+        now = time.monotonic()
+        entry = self._memory.get(session_id)
+        if entry is None or entry[0] < now:
+            buffer = deque(history or [], maxlen=self.max_messages)
+        else:
+            buffer = entry[1]
+        buffer.extend(messages)
+
+        self._memory[session_id] = (now + self.ttl_seconds, buffer)
+        self._memory.move_to_end(session_id)
+        while len(self._memory) > self.max_memory_sessions:
+            self._memory.popitem(last=False)
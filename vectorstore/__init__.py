@@ -5,19 +5,32 @@
 - Chroma (預設)
 - Redis
 - Qdrant
+- local（本機記憶體映射向量檔 + SQLite metadata + 選用的 HNSW 圖）
 
 支援的嵌入模型：
 - OpenAI Embeddings
 - HuggingFace Embeddings
+- ONNX Runtime int8 量化（同一個 HuggingFace 模型，CPU 較快）
+
+小片段檢索、大片段回傳：向量資料庫只放子片段，父片段存放在檔案目錄
 """
 
-from .index_manager import get_vectorstore, get_embeddings
+from .index_manager import get_vectorstore, get_embeddings, add_documents_bulk
+from .bulk_embedder import ParallelEmbeddings, get_bulk_embeddings
+from .query_batcher import QueryBatcher, get_query_embeddings, get_query_batch_stats
+from .embedding_service import EmbeddingServer, EmbeddingServiceError, RemoteEmbeddings
+from .local_store import LocalVectorStore, LocalVectorIndex
+from .vector_codec import VectorCodec, binary_signatures, hamming_shortlist
+from .onnx_embeddings import OnnxEmbeddings, cosine_parity
+from .parent_store import (
+    ParentStore, get_parent_store, split_into_children, expand_to_parents, small_to_big_enabled
+)
 
 # 支援的向量資料庫
-SUPPORTED_VECTOR_DBS = ["chroma", "redis", "qdrant"]
+SUPPORTED_VECTOR_DBS = ["chroma", "redis", "qdrant", "local"]
 
 # 支援的嵌入提供者
-SUPPORTED_EMBED_PROVIDERS = ["openai", "huggingface"]
+SUPPORTED_EMBED_PROVIDERS = ["openai", "huggingface", "onnx"]
 
 # 預設配置
 DEFAULT_VECTOR_DB = "chroma"
@@ -36,6 +49,10 @@ VECTOR_DB_CONFIGS = {
         "collection_name": "rag_data",
         "location": "http://localhost:6333",
     },
+    "local": {
+        "persist_directory": "vector_db/local",
+        "dtype": "float16",
+    },
 }
 
 # 嵌入模型配置
@@ -46,12 +63,37 @@ EMBEDDING_CONFIGS = {
     "huggingface": {
         "model_name": "sentence-transformers/all-MiniLM-L6-v2",
     },
+    "onnx": {
+        "model_name": "sentence-transformers/all-MiniLM-L6-v2",
+        "quantization": "int8",
+    },
 }
 
 # 匯出的公開 API
 __all__ = [
     "get_vectorstore",
     "get_embeddings",
+    "add_documents_bulk",
+    "ParallelEmbeddings",
+    "get_bulk_embeddings",
+    "QueryBatcher",
+    "get_query_embeddings",
+    "get_query_batch_stats",
+    "EmbeddingServer",
+    "RemoteEmbeddings",
+    "EmbeddingServiceError",
+    "LocalVectorStore",
+    "LocalVectorIndex",
+    "VectorCodec",
+    "binary_signatures",
+    "hamming_shortlist",
+    "OnnxEmbeddings",
+    "cosine_parity",
+    "ParentStore",
+    "get_parent_store",
+    "split_into_children",
+    "expand_to_parents",
+    "small_to_big_enabled",
     "SUPPORTED_VECTOR_DBS",
     "SUPPORTED_EMBED_PROVIDERS",
     "DEFAULT_VECTOR_DB",
@@ -0,0 +1,228 @@
+"""
+多進程批次嵌入
+
+匯入數萬個片段時，vs.add_documents() 只用一個進程裡的一個 HuggingFaceEmbeddings
+計算所有向量。此模組提供大量嵌入的路徑：
+- 進程池中的每個子進程只載入一次嵌入模型，批次分散到各進程計算
+- 片段先依長度排序再分批，同一批的長度相近，減少 padding 浪費
+- 結果依原始順序返回，可直接交給向量資料庫
+- 進程池閒置 EMBED_POOL_IDLE_SECONDS 秒後關閉，匯入結束後不長期佔用多份模型的記憶體
+OpenAI 嵌入受網路限制、嵌入服務已集中持有模型，這兩種情況不使用進程池。
+"""
+
+import os
+import pickle
+import threading
+import multiprocessing
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+
+from config import get_config
+
+# 子進程中載入的嵌入模型（每個進程只載入一次）
+_worker_embeddings: Optional[Embeddings] = None
+
+
+def _init_worker(threads: int):
+    """子進程初始化：限制每個進程的運算執行緒數後載入嵌入模型"""
+    global _worker_embeddings
+    os.environ["OMP_NUM_THREADS"] = str(threads)
+    os.environ["ONNX_INTRA_OP_THREADS"] = str(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    from vectorstore.index_manager import create_local_embeddings
+    _worker_embeddings = create_local_embeddings()
+
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    return _worker_embeddings.embed_documents(texts)
+
+
+def length_sorted_batches(texts: List[str], batch_size: int) -> List[List[int]]:
+    """
+    依文字長度排序後分批
+
+    Args:
+        texts: 文字列表
+        batch_size: 每批筆數
+
+    Returns:
+        每批的原始索引列表
+    """
+    order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+    return [order[i:i + batch_size] for i in range(0, len(order), batch_size)]
+
+
+class ParallelEmbeddings(Embeddings):
+    """把 embed_documents 分散到多個進程計算的嵌入模型（查詢仍在本進程計算）"""
+
+    def __init__(self, workers: Optional[int] = None, batch_size: Optional[int] = None,
+                 min_texts: Optional[int] = None, idle_seconds: Optional[float] = None):
+        """
+        初始化
+
+        Args:
+            workers: 進程數（預設讀取 EMBED_WORKERS，不超過 CPU 核心數）
+            batch_size: 每批筆數（預設讀取 EMBEDDING_BATCH_SIZE）
+            min_texts: 筆數達到此數量才使用進程池（預設讀取 EMBED_PARALLEL_MIN_TEXTS）
+            idle_seconds: 進程池閒置多久後關閉（預設讀取 EMBED_POOL_IDLE_SECONDS，0 表示用完立即關閉）
+        """
+        cpu_count = os.cpu_count() or 1
+        self.workers = min(workers or int(get_config("EMBED_WORKERS", "4")), cpu_count)
+        self.batch_size = batch_size or int(get_config("EMBEDDING_BATCH_SIZE", "32"))
+        self.min_texts = min_texts or int(get_config("EMBED_PARALLEL_MIN_TEXTS", "256"))
+        self.threads_per_worker = max(1, cpu_count // max(self.workers, 1))
+        self.idle_seconds = (idle_seconds if idle_seconds is not None
+                             else float(get_config("EMBED_POOL_IDLE_SECONDS", "60")))
+        self._local: Optional[Embeddings] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._active = 0
+        self._discard_pool = False
+        self._idle_timer: Optional[threading.Timer] = None
+
+    @property
+    def local(self) -> Embeddings:
+        """
+        本進程的嵌入模型（少量文字、查詢與進程池失敗時使用）
+
+        與查詢共用同一個模型實例（get_query_embeddings），不另外載入一份；
+        第一次用到時才取得，只走進程池的匯入不會在父進程載入模型。
+        """
+        if self._local is None:
+            from vectorstore.query_batcher import get_query_embeddings
+            self._local = get_query_embeddings()
+        return self._local
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """取得進程池，沒有時建立（呼叫者必須持有 self._lock）"""
+        if self._pool is None:
+            # 父進程可能已載入 torch（fork 後執行緒狀態不安全），子進程以 spawn 啟動
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.threads_per_worker,),
+            )
+            print(f"🧵 啟動嵌入進程池: {self.workers} 個進程，每個 {self.threads_per_worker} 執行緒")
+        return self._pool
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        """
+        計算嵌入向量（依長度分批、多進程計算，依原始順序返回）
+
+        Args:
+            texts: 文字列表
+
+        Returns:
+            向量列表
+        """
+        texts = list(texts)
+        if self.workers <= 1 or len(texts) < self.min_texts:
+            return self.local.embed_documents(texts)
+
+        batches = length_sorted_batches(texts, self.batch_size)
+        results: List[Optional[List[float]]] = [None] * len(texts)
+        done = set()
+        with self._lock:
+            self._active += 1
+            if self._idle_timer is not None:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+            try:
+                pool = self._get_pool()
+            except Exception:
+                self._active -= 1
+                raise
+        try:
+            futures = [(batch, pool.submit(_embed_in_worker, [texts[i] for i in batch])) for batch in batches]
+            for number, (batch, future) in enumerate(futures):
+                for index, vector in zip(batch, future.result()):
+                    results[index] = vector
+                done.add(number)
+        except (OSError, BrokenProcessPool, CancelledError, pickle.PicklingError) as e:
+            print(f"⚠️ 嵌入進程池失敗，剩餘批次改在本進程計算: {e}")
+            # 其他呼叫可能仍在使用進程池，由最後一個結束的呼叫關閉
+            with self._lock:
+                self._discard_pool = True
+            for number, batch in enumerate(batches):
+                if number in done:
+                    continue
+                for index, vector in zip(batch, self.local.embed_documents([texts[i] for i in batch])):
+                    results[index] = vector
+        finally:
+            self._release_pool()
+        return results
+
+    def _release_pool(self):
+        """
+        本次計算結束；沒有其他計算在使用進程池時，排程在閒置 idle_seconds 後關閉
+
+        進程池失敗過時（_discard_pool）由最後一個結束的呼叫立即關閉，
+        不會取消其他呼叫仍在等待的批次。
+        """
+        with self._lock:
+            self._active -= 1
+            if self._active:
+                return
+            discard, self._discard_pool = self._discard_pool, False
+            if self._pool is None:
+                return
+            if discard or self.idle_seconds <= 0:
+                self.close()
+                return
+            self._idle_timer = threading.Timer(self.idle_seconds, self._close_if_idle)
+            self._idle_timer.daemon = True
+            self._idle_timer.start()
+
+    def _close_if_idle(self):
+        """閒置計時到期：期間沒有新的計算時關閉進程池，釋放子進程中的模型"""
+        with self._lock:
+            if self._active or self._idle_timer is not threading.current_thread():
+                return
+            self._idle_timer = None
+            if self._pool is not None:
+                print(f"💤 嵌入進程池閒置 {self.idle_seconds:g} 秒，關閉以釋放模型記憶體")
+                self.close()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.local.embed_query(text)
+
+    def close(self):
+        """關閉進程池"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+# 全局實例（連續的匯入在閒置逾時前共用進程池，子進程不必重新載入模型）
+_bulk_lock = threading.Lock()
+_bulk_embeddings: Optional[Embeddings] = None
+
+
+def get_bulk_embeddings() -> Embeddings:
+    """
+    獲取大量匯入用的嵌入模型（單例模式）
+
+    OpenAI、使用嵌入服務或只有單核心時直接使用一般的嵌入模型。
+
+    Returns:
+        Embeddings
+    """
+    global _bulk_embeddings
+    with _bulk_lock:
+        if _bulk_embeddings is None:
+            from vectorstore.embedding_service import get_service_socket
+            if (get_config("EMBEDDING_PROVIDER", "huggingface") == "openai" or get_service_socket()
+                    or min(int(get_config("EMBED_WORKERS", "4")), os.cpu_count() or 1) <= 1):
+                from vectorstore.index_manager import get_embeddings
+                _bulk_embeddings = get_embeddings()
+            else:
+                _bulk_embeddings = ParallelEmbeddings()
+        return _bulk_embeddings
@@ -0,0 +1,245 @@
+"""
+本機嵌入服務（Unix socket）
+
+api_server 以多個 uvicorn worker 執行、再加上 Streamlit 的 app.py 時，每個進程都會
+透過 get_embeddings() 載入一份嵌入模型，記憶體與冷啟動時間成倍增加。此模組提供
+選用的嵌入服務：
+- 一個進程持有模型，透過 Unix socket 服務其他進程（python -m vectorstore.embedding_service）
+- 各進程同時送來的查詢經由 QueryBatcher 合併成批次計算
+- 用戶端 RemoteEmbeddings 實作 Embeddings 介面，設定 EMBEDDING_SERVICE_SOCKET 後
+  get_embeddings() 直接返回它；服務無法連線時改用進程內的模型
+
+傳輸格式：每個訊息為 4 bytes 長度（big-endian）+ 內容。請求內容為 JSON
+{"op": "embed", "texts": [...], "query": bool}；回應為一個 JSON 標頭訊息
+{"ok": true, "rows": n, "dim": d}，接著一個 float32 向量的二進位訊息。
+"""
+
+import os
+import json
+import time
+import socket
+import struct
+import threading
+import socketserver
+from typing import List, Optional, Dict, Any
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import get_config
+from .query_batcher import embed_queries
+
+_LENGTH = struct.Struct(">I")
+# 用戶端每個請求最多送出的文字數（大量文件分成多個請求）
+MAX_TEXTS_PER_REQUEST = 256
+
+
+class EmbeddingServiceError(RuntimeError):
+    """嵌入服務回應 {"ok": false}（服務端計算向量失敗）"""
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 1 << 20))
+        if not chunk:
+            raise ConnectionError("嵌入服務連線已關閉")
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def send_message(sock: socket.socket, payload: bytes):
+    """送出一個帶長度前綴的訊息"""
+    sock.sendall(_LENGTH.pack(len(payload)) + payload)
+
+
+def recv_message(sock: socket.socket) -> bytes:
+    """讀取一個帶長度前綴的訊息"""
+    (size,) = _LENGTH.unpack(_recv_exact(sock, _LENGTH.size))
+    return _recv_exact(sock, size)
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    """每個用戶端連線一個執行緒，連線內可連續送多個請求"""
+
+    def handle(self):
+        while True:
+            try:
+                request = json.loads(recv_message(self.request))
+            except (ConnectionError, OSError):
+                return
+            try:
+                texts = request.get("texts", [])
+                if request.get("op") == "ping":
+                    vectors = np.zeros((0, 0), dtype=np.float32)
+                elif request.get("query"):
+                    vectors = np.asarray(embed_queries(self.server.embeddings, texts), dtype=np.float32)
+                else:
+                    vectors = np.asarray(self.server.embeddings.embed_documents(texts), dtype=np.float32)
+                header = {"ok": True, "rows": int(vectors.shape[0]),
+                          "dim": int(vectors.shape[1]) if vectors.ndim == 2 else 0}
+                body = vectors.tobytes()
+            except Exception as e:
+                header, body = {"ok": False, "error": str(e)}, b""
+            try:
+                send_message(self.request, json.dumps(header).encode("utf-8"))
+                send_message(self.request, body)
+            except OSError:
+                return
+
+
+class EmbeddingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """持有嵌入模型、透過 Unix socket 提供嵌入的服務"""
+
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, embeddings: Embeddings):
+        """
+        初始化
+
+        Args:
+            socket_path: Unix socket 路徑（已存在的舊 socket 檔會先刪除）
+            embeddings: 實際計算向量的嵌入模型
+        """
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        os.makedirs(os.path.dirname(os.path.abspath(socket_path)), exist_ok=True)
+        self.embeddings = embeddings
+        super().__init__(socket_path, _EmbeddingRequestHandler)
+
+
+def serve(socket_path: Optional[str] = None):
+    """
+    啟動嵌入服務（阻塞直到中斷）
+
+    Args:
+        socket_path: Unix socket 路徑（預設讀取 EMBEDDING_SERVICE_SOCKET）
+    """
+    from vectorstore.index_manager import create_local_embeddings
+    from vectorstore.query_batcher import QueryBatcher
+
+    socket_path = socket_path or get_config("EMBEDDING_SERVICE_SOCKET", "") or "vector_db/embedding.sock"
+    server = EmbeddingServer(socket_path, QueryBatcher(create_local_embeddings()))
+    print(f"🛰️ 嵌入服務已啟動: {socket_path}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        print("🛑 嵌入服務已停止")
+
+
+class RemoteEmbeddings(Embeddings):
+    """透過 Unix socket 使用嵌入服務的用戶端；服務無法連線時改用進程內的模型"""
+
+    def __init__(self, socket_path: str, timeout: Optional[float] = None,
+                 retry_seconds: Optional[float] = None, fallback: Optional[Embeddings] = None):
+        """
+        初始化
+
+        Args:
+            socket_path: 嵌入服務的 Unix socket 路徑
+            timeout: 連線與讀取逾時秒數（預設讀取 EMBEDDING_SERVICE_TIMEOUT）
+            retry_seconds: 服務失敗後多久再嘗試連線（預設讀取 EMBEDDING_SERVICE_RETRY_SECONDS）
+            fallback: 服務無法使用時的嵌入模型（預設在第一次需要時於本進程載入）
+        """
+        self.socket_path = socket_path
+        self.timeout = timeout or float(get_config("EMBEDDING_SERVICE_TIMEOUT", "60"))
+        self.retry_seconds = (retry_seconds if retry_seconds is not None
+                              else float(get_config("EMBEDDING_SERVICE_RETRY_SECONDS", "30")))
+        self._fallback = fallback
+        self._fallback_lock = threading.Lock()
+        self._local = threading.local()
+        self._unavailable_until = 0.0
+
+    @property
+    def fallback(self) -> Embeddings:
+        """進程內的嵌入模型（只在服務無法使用時載入）"""
+        with self._fallback_lock:
+            if self._fallback is None:
+                from vectorstore.index_manager import create_local_embeddings
+                self._fallback = create_local_embeddings()
+            return self._fallback
+
+    def _connection(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            try:
+                sock.connect(self.socket_path)
+            except OSError:
+                sock.close()
+                raise
+            self._local.sock = sock
+        return sock
+
+    def _drop_connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _request(self, texts: List[str], query: bool) -> np.ndarray:
+        sock = self._connection()
+        send_message(sock, json.dumps({"op": "embed", "texts": texts, "query": query},
+                                      ensure_ascii=False).encode("utf-8"))
+        header: Dict[str, Any] = json.loads(recv_message(sock))
+        body = recv_message(sock)
+        if not header.get("ok"):
+            raise EmbeddingServiceError(f"嵌入服務錯誤: {header.get('error')}")
+        return np.frombuffer(body, dtype=np.float32).reshape(header["rows"], header["dim"])
+
+    def _embed(self, texts: List[str], query: bool) -> Optional[np.ndarray]:
+        """向服務請求向量；服務無法使用時返回 None"""
+        if time.monotonic() < self._unavailable_until:
+            return None
+        try:
+            parts = [self._request(texts[i:i + MAX_TEXTS_PER_REQUEST], query)
+                     for i in range(0, len(texts), MAX_TEXTS_PER_REQUEST)]
+        except (OSError, ConnectionError, ValueError, EmbeddingServiceError) as e:
+            self._drop_connection()
+            self._unavailable_until = time.monotonic() + self.retry_seconds
+            print(f"⚠️ 無法使用嵌入服務 {self.socket_path}，改用進程內的嵌入模型: {e}")
+            return None
+        return np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self._embed(texts, query=False)
+        if vectors is None:
+            return self.fallback.embed_documents(texts)
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        vectors = self._embed([text], query=True)
+        if vectors is None:
+            return self.fallback.embed_query(text)
+        return vectors[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        texts = list(texts)
+        if not texts:
+            return []
+        vectors = self._embed(texts, query=True)
+        if vectors is None:
+            return embed_queries(self.fallback, texts)
+        return vectors.tolist()
+
+
+def get_service_socket() -> Optional[str]:
+    """已設定且存在的嵌入服務 socket 路徑（未設定或服務未啟動時返回 None）"""
+    socket_path = get_config("EMBEDDING_SERVICE_SOCKET", "")
+    if socket_path and os.path.exists(socket_path):
+        return socket_path
+    return None
+
+
+if __name__ == "__main__":
+    serve()
@@ -66,26 +66,46 @@ def ensure_directory_permissions(directory_path: str):
         raise
 
 def get_embeddings():
-    """根據配置獲取嵌入模型"""
+    """
+    根據配置獲取嵌入模型
+
+    設定 EMBEDDING_SERVICE_SOCKET 且嵌入服務已啟動時，返回透過 Unix socket 使用
+    服務的用戶端（見 vectorstore.embedding_service），本進程不載入模型。
+    """
+    from vectorstore.embedding_service import RemoteEmbeddings, get_service_socket
+    socket_path = get_service_socket()
+    if socket_path:
+        print(f"🛰️ 使用嵌入服務: {socket_path}")
+        return RemoteEmbeddings(socket_path)
+    return create_local_embeddings()
+
+def create_local_embeddings():
+    """在本進程載入設定的嵌入模型"""
     provider = get_config("EMBEDDING_PROVIDER", "huggingface")
+    model_name = get_config("HUGGINGFACE_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
     
     if provider == "openai":
         print("🔑 使用 OpenAI 嵌入模型")
         return OpenAIEmbeddings(
             openai_api_key=get_config("OPENAI_API_KEY")
         )
+    elif provider == "onnx":
+        # 同一個模型以 ONNX Runtime int8 量化執行（CPU 節點較快）
+        from vectorstore.onnx_embeddings import OnnxEmbeddings
+        return OnnxEmbeddings(model_name=model_name)
     else:
         print("🤗 使用 HuggingFace 嵌入模型（免費）")
         # 使用更輕量的模型，支援中文
         return HuggingFaceEmbeddings(
-            model_name="sentence-transformers/all-MiniLM-L6-v2",
+            model_name=model_name,
             model_kwargs={'device': 'cpu'},
             encode_kwargs={'normalize_embeddings': True}
         )
 
-def get_vectorstore(collection_name: str = "rag_docs"):
-    """獲取或創建向量存儲"""
+def get_vectorstore(collection_name: str = "rag_docs", embeddings=None):
+    """獲取或創建向量存儲（embeddings 預設為 get_embeddings()）"""
     vector_db = get_config("VECTOR_DB", "chroma")
+    embeddings = embeddings or get_embeddings()
     
     if vector_db == "chroma":
         persist_dir = get_config("CHROMA_PERSIST_DIR", "vector_db/chroma")
@@ -96,7 +116,7 @@ def get_vectorstore(collection_name: str = "rag_docs"):
         try:
             vectorstore = Chroma(
                 collection_name=collection_name,
-                embedding_function=get_embeddings(),
+                embedding_function=embeddings,
                 persist_directory=persist_dir
             )
             return vectorstore
@@ -107,7 +127,7 @@ def get_vectorstore(collection_name: str = "rag_docs"):
                 # 創建新的集合
                 vectorstore = Chroma(
                     collection_name=collection_name,
-                    embedding_function=get_embeddings(),
+                    embedding_function=embeddings,
                     persist_directory=persist_dir
                 )
                 return vectorstore
@@ -125,10 +145,30 @@ def get_vectorstore(collection_name: str = "rag_docs"):
                     print("\n3. 或使用 Docker 環境避免權限問題")
                 raise
     
+    elif vector_db == "local":
+        # 本機記憶體映射向量庫（不需要另外的服務，多個進程可同時開啟）
+        from vectorstore.local_store import LocalVectorStore
+        return LocalVectorStore(embeddings, collection_name=collection_name)
+    
     # 其他向量資料庫實現...
     else:
         raise NotImplementedError(f"向量資料庫 {vector_db} 尚未實現")
 
+def add_documents_bulk(docs, collection_name: str = "rag_docs"):
+    """
+    大量匯入片段：嵌入分散到多個進程計算（見 vectorstore.bulk_embedder）
+
+    Args:
+        docs: 片段列表
+        collection_name: 集合名稱
+
+    Returns:
+        寫入的片段 ID 列表
+    """
+    from vectorstore.bulk_embedder import get_bulk_embeddings
+    vs = get_vectorstore(collection_name, embeddings=get_bulk_embeddings())
+    return vs.add_documents(docs)
+
 def clear_vectorstore(collection_name: str = "rag_docs"):
     """清空向量存儲"""
     vector_db = get_config("VECTOR_DB", "chroma")
@@ -146,6 +186,10 @@ def clear_vectorstore(collection_name: str = "rag_docs"):
             # 重新創建目錄
             ensure_directory_permissions(persist_dir)
             
+            # 檔案目錄記錄的是已索引檔案的分析結果，一併清空
+            from loader.file_catalog import clear_catalog
+            clear_catalog()
+            
         except PermissionError:
             print(f"❌ 無法刪除 {persist_dir}，權限不足")
             print("請手動執行:")
@@ -154,6 +198,12 @@ def clear_vectorstore(collection_name: str = "rag_docs"):
         except Exception as e:
             print(f"❌ 清空向量資料庫失敗: {str(e)}")
             raise
+    
+    elif vector_db == "local":
+        from vectorstore.local_store import clear_local_vectorstore
+        clear_local_vectorstore()
+        from loader.file_catalog import clear_catalog
+        clear_catalog()
 
 # 添加一個測試函數
 def test_vectorstore_access():
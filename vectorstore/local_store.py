@@ -0,0 +1,651 @@
+"""
+本機記憶體映射向量庫（VECTOR_DB=local）
+
+不需要另外的服務，索引由三個檔案組成（LOCAL_VECTOR_DIR/<集合名稱>/）：
+- vectors.bin：正規化後的向量（float32 / float16 / int8，見 vector_codec），依列號連續存放，以 np.memmap 唯讀映射
+- signs.bin：選用的 1-bit 二元簽名，精確計算前先以 Hamming 距離篩出候選再重算分數
+- meta.sqlite3：每列的 ID（有 chunk_id 的片段以 chunk_id 為 ID）、文字與 metadata（JSON），過濾條件轉成 SQL 在這裡查詢
+  （chunk_id 另存一個有索引的欄位，log 記錄索引的 chunk_id $in 前置過濾不必掃描整個表）
+- hnsw.bin：hnswlib 的 HNSW 圖（選用；列數達 LOCAL_HNSW_MIN_ROWS 才建立）
+
+未建立 HNSW 圖時，開啟索引只連線 SQLite 並映射檔案，不把向量讀進記憶體，多個進程
+可以同時開啟搜尋（搜尋不取得寫入鎖）。寫入以檔案鎖互斥，新向量附加在檔尾，同 ID 的舊列標記為
+刪除（upsert）；HNSW 圖尚未涵蓋的新列以精確計算補上。寫入者把 HNSW 圖留在記憶體中
+逐批加入新列，每新增 LOCAL_HNSW_SAVE_ROWS 列或關閉索引時才寫回 hnsw.bin。
+
+注意：hnswlib 在圖中保存每筆向量的 float32 副本，hnsw.bin 開啟時整個讀進記憶體
+（384 維、M=16 約每筆 1.7 KB）。float16 / int8 只減少 vectors.bin 的大小，建立圖之後
+記憶體用量由圖決定；要以壓縮向量控制記憶體，請調高 LOCAL_HNSW_MIN_ROWS 不建立圖，
+改用二元簽名預篩（見 test_script/bench_vector_compression.py 的比較）。
+"""
+
+import os
+import json
+import uuid
+import atexit
+import sqlite3
+import threading
+from pathlib import Path
+from contextlib import contextmanager
+from typing import List, Optional, Dict, Any, Iterable, Tuple, Iterator
+
+import numpy as np
+from langchain.schema import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.vectorstores import VectorStore
+
+from config import get_config
+from .vector_codec import VectorCodec, binary_signatures, hamming_shortlist
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+try:
+    import hnswlib
+    HAS_HNSWLIB = True
+except ImportError:
+    hnswlib = None
+    HAS_HNSWLIB = False
+
+VECTOR_FILE = "vectors.bin"
+META_FILE = "meta.sqlite3"
+HNSW_FILE = "hnsw.bin"
+SIGNS_FILE = "signs.bin"
+LOCK_FILE = ".lock"
+
+# 精確計算時每次轉成 float32 的列數
+_SCAN_BLOCK_ROWS = 65536
+
+_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+# 另存成有索引欄位的 metadata 鍵（過濾時直接比對欄位，不用 json_extract 掃描）
+_INDEXED_COLUMNS = {"chunk_id": "chunk_id"}
+
+
+def normalize_vectors(vectors: np.ndarray) -> np.ndarray:
+    """L2 正規化（內積即為餘弦相似度）"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    return vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+
+
+def filter_to_sql(where: Dict[str, Any]) -> Tuple[str, List[Any]]:
+    """
+    把 Chroma 格式的 metadata 過濾條件轉成 SQL 條件
+
+    支援 {"key": value}、$eq / $ne / $gt / $gte / $lt / $lte / $in / $nin，以及 $and / $or。
+
+    Args:
+        where: 過濾條件
+
+    Returns:
+        (SQL 條件, 參數列表)
+    """
+    clauses, params = [], []
+    for key, value in where.items():
+        if key in ("$and", "$or"):
+            parts = [filter_to_sql(item) for item in value]
+            joined = (" AND " if key == "$and" else " OR ").join(f"({sql})" for sql, _ in parts)
+            clauses.append(f"({joined})" if parts else "1")
+            for _, part_params in parts:
+                params.extend(part_params)
+            continue
+
+        column = _INDEXED_COLUMNS.get(key) or f"json_extract(metadata, '$.\"{key.replace(chr(34), '')}\"')"
+        conditions = value if isinstance(value, dict) else {"$eq": value}
+        for operator, operand in conditions.items():
+            if operator in ("$in", "$nin"):
+                operand = list(operand)
+                if not operand:
+                    clauses.append("0" if operator == "$in" else "1")
+                    continue
+                negate = "NOT " if operator == "$nin" else ""
+                clauses.append(f"{column} {negate}IN ({','.join('?' * len(operand))})")
+                params.extend(operand)
+            elif operator in _OPERATORS:
+                clauses.append(f"{column} {_OPERATORS[operator]} ?")
+                params.append(operand)
+            else:
+                raise ValueError(f"不支援的過濾運算子: {operator}")
+    return " AND ".join(clauses) or "1", params
+
+
+class LocalVectorIndex:
+    """記憶體映射的向量檔 + SQLite metadata + 選用的 HNSW 圖"""
+
+    def __init__(self, path: str, dtype: Optional[str] = None, binary: Optional[bool] = None):
+        """
+        初始化（第一次使用時才建立檔案）
+
+        Args:
+            path: 索引目錄
+            dtype: 向量儲存型別 float32 / float16 / int8（預設讀取 LOCAL_VECTOR_DTYPE；既有索引沿用建立時的設定）
+            binary: 是否保存二元簽名做 Hamming 預篩（預設讀取 LOCAL_BINARY_PREFILTER；既有索引沿用建立時的設定）
+        """
+        self.path = Path(path)
+        self.default_dtype = dtype or get_config("LOCAL_VECTOR_DTYPE", "float16")
+        self.default_binary = (binary if binary is not None
+                               else get_config("LOCAL_BINARY_PREFILTER", "false").lower() == "true")
+        self.rescore_factor = int(get_config("LOCAL_RESCORE_FACTOR", "10"))
+        self.hnsw_min_rows = int(get_config("LOCAL_HNSW_MIN_ROWS", "5000"))
+        self.hnsw_m = int(get_config("LOCAL_HNSW_M", "16"))
+        self.hnsw_ef_construction = int(get_config("LOCAL_HNSW_EF_CONSTRUCTION", "200"))
+        self.hnsw_ef_search = int(get_config("LOCAL_HNSW_EF_SEARCH", "64"))
+        self.hnsw_save_rows = int(get_config("LOCAL_HNSW_SAVE_ROWS", "50000"))
+
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        # 依 version 快取的讀取狀態
+        self._version = None
+        self._info: Dict[str, str] = {}
+        self._codec: Optional[VectorCodec] = None
+        self._vectors: Optional[np.ndarray] = None
+        self._signs: Optional[np.ndarray] = None
+        self._alive: Optional[np.ndarray] = None
+        self._deleted_count = 0
+        self._hnsw = None
+        self._hnsw_rows = 0
+        self._hnsw_alive = 0
+        # self._hnsw 是本進程寫入時維護的圖（可能比 hnsw.bin 新），不從檔案重新載入
+        self._hnsw_owned = False
+
+    # ---- 儲存 ----
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            meta_path = self.path / META_FILE
+            self.path.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(meta_path), check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT)")
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    row      INTEGER PRIMARY KEY,
+                    id       TEXT NOT NULL,
+                    text     TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    deleted  INTEGER NOT NULL DEFAULT 0,
+                    chunk_id TEXT
+                )
+                """
+            )
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+            if "chunk_id" not in columns:
+                # 舊版建立的索引：補上欄位並從 metadata 回填
+                self._conn.execute("ALTER TABLE chunks ADD COLUMN chunk_id TEXT")
+                self._conn.execute("UPDATE chunks SET chunk_id = json_extract(metadata, '$.chunk_id')")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_id ON chunks (id)")
+            self._conn.execute("CREATE INDEX IF NOT EXISTS chunks_chunk_id ON chunks (chunk_id)")
+            self._conn.commit()
+        return self._conn
+
+    @contextmanager
+    def _write_lock(self) -> Iterator[sqlite3.Connection]:
+        """跨進程的寫入鎖（同一時間只有一個寫入者），區塊結束時提交"""
+        with self._lock:
+            conn = self._connect()
+            with open(self.path / LOCK_FILE, "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield conn
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_info(self, conn: sqlite3.Connection) -> Dict[str, str]:
+        return dict(conn.execute("SELECT key, value FROM info").fetchall())
+
+    def _codec_for(self, info: Dict[str, str]) -> VectorCodec:
+        return VectorCodec(info["dtype"], int(info["dim"]))
+
+    def _sign_bytes(self, info: Dict[str, str]) -> int:
+        return (int(info["dim"]) + 7) // 8
+
+    def _refresh(self) -> bool:
+        """索引有變動（version 改變）時重新映射向量檔、更新存活列與 HNSW 圖；索引不存在時返回 False"""
+        conn = self._connect()
+        try:
+            info = self._read_info(conn)
+        except sqlite3.OperationalError:
+            return False
+        if "dim" not in info:
+            return False
+        if info.get("version") == self._version:
+            return True
+
+        codec = self._codec_for(info)
+        rows = int(info.get("rows", "0"))
+        vector_path = self.path / VECTOR_FILE
+        available = vector_path.stat().st_size // codec.row_bytes if vector_path.exists() else 0
+        rows = min(rows, available)
+        self._codec = codec
+        self._vectors = codec.memmap(str(vector_path), rows)
+
+        self._signs = None
+        signs_path = self.path / SIGNS_FILE
+        if info.get("binary") == "1" and rows and signs_path.exists():
+            sign_bytes = self._sign_bytes(info)
+            sign_rows = min(rows, signs_path.stat().st_size // sign_bytes)
+            if sign_rows == rows:
+                self._signs = np.memmap(signs_path, dtype=np.uint8, mode="r", shape=(rows, sign_bytes))
+
+        self._alive = np.ones(rows, dtype=bool)
+        deleted = [row for (row,) in conn.execute("SELECT row FROM chunks WHERE deleted = 1") if row < rows]
+        self._alive[deleted] = False
+        self._deleted_count = len(deleted)
+
+        hnsw_rows = int(info.get("hnsw_rows", "0"))
+        if self._hnsw_owned:
+            pass
+        elif not HAS_HNSWLIB or not hnsw_rows:
+            self._hnsw, self._hnsw_rows = None, 0
+        elif self._hnsw is None or info.get("hnsw_rows") != self._info.get("hnsw_rows"):
+            hnsw_path = self.path / HNSW_FILE
+            if hnsw_path.exists():
+                index = hnswlib.Index(space="ip", dim=int(info["dim"]))
+                index.load_index(str(hnsw_path), max_elements=hnsw_rows)
+                index.set_ef(self.hnsw_ef_search)
+                self._hnsw = index
+        if self._hnsw is not None:
+            # 圖可能比這個版本新（寫入者已替換檔案但尚未提交），只使用已提交的列
+            self._hnsw_rows = min(self._hnsw.element_count, rows)
+            self._hnsw_alive = int(np.count_nonzero(self._alive[:self._hnsw_rows]))
+
+        self._info = info
+        self._version = info.get("version")
+        return True
+
+    def upsert(self, ids: List[str], vectors: np.ndarray, texts: List[str], metadatas: List[Dict[str, Any]]):
+        """
+        寫入向量（同 ID 的舊列標記為刪除）
+
+        Args:
+            ids: 片段 ID
+            vectors: (n, dim) 向量（會先正規化）
+            texts: 片段文字
+            metadatas: 片段 metadata
+        """
+        vectors = normalize_vectors(vectors)
+        with self._write_lock() as conn:
+            info = self._read_info(conn)
+            if "dim" not in info:
+                info = {"dim": str(vectors.shape[1]), "dtype": self.default_dtype,
+                        "binary": "1" if self.default_binary else "0", "rows": "0", "version": "0"}
+            elif int(info["dim"]) != vectors.shape[1]:
+                raise ValueError(f"向量維度 {vectors.shape[1]} 與索引的 {info['dim']} 不一致")
+
+            start = int(info["rows"])
+            codec = self._codec_for(info)
+            # 從已提交的列數之後寫入（覆蓋中斷的寫入留下的殘餘資料）
+            _write_rows(self.path / VECTOR_FILE, start * codec.row_bytes, codec.encode(vectors).tobytes())
+            if info.get("binary") == "1":
+                _write_rows(self.path / SIGNS_FILE, start * self._sign_bytes(info),
+                            binary_signatures(vectors).tobytes())
+
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                conn.execute(
+                    f"UPDATE chunks SET deleted = 1 WHERE deleted = 0 AND id IN ({','.join('?' * len(batch))})", batch
+                )
+            conn.executemany(
+                "INSERT INTO chunks (row, id, text, metadata, chunk_id) VALUES (?, ?, ?, ?, ?)",
+                [(start + i, row_id, text, json.dumps(metadata or {}, ensure_ascii=False, default=str),
+                  (metadata or {}).get("chunk_id"))
+                 for i, (row_id, text, metadata) in enumerate(zip(ids, texts, metadatas))],
+            )
+            info["rows"] = str(start + len(ids))
+            info["version"] = str(int(info["version"]) + 1)
+            info.update(self._update_hnsw(info, vectors, start))
+            conn.executemany("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", list(info.items()))
+
+    def _update_hnsw(self, info: Dict[str, str], vectors: np.ndarray, start: int) -> Dict[str, str]:
+        """
+        把新列加入 HNSW 圖（列數未達門檻時不建立）；返回要更新的 info 欄位
+
+        圖留在記憶體中跨批次使用，只有累積 LOCAL_HNSW_SAVE_ROWS 列未保存時才寫回檔案；
+        未保存的列在其他進程中以精確計算補上。
+        """
+        rows = int(info["rows"])
+        if not HAS_HNSWLIB or rows < self.hnsw_min_rows:
+            return {}
+
+        # 沿用本進程已有的圖（自己維護的，或讀取時載入的），只補上它尚未涵蓋的列
+        index = self._hnsw
+        if index is not None and index.element_count > start:
+            # 上一次寫入失敗時圖中留有未提交的列，改從檔案重新載入
+            index = None
+        hnsw_path = self.path / HNSW_FILE
+        if index is None and int(info.get("hnsw_rows", "0")) and hnsw_path.exists():
+            index = hnswlib.Index(space="ip", dim=int(info["dim"]))
+            index.load_index(str(hnsw_path), max_elements=rows)
+            if index.element_count > start:
+                index = None
+        if index is None:
+            index = hnswlib.Index(space="ip", dim=int(info["dim"]))
+            index.init_index(max_elements=rows, ef_construction=self.hnsw_ef_construction, M=self.hnsw_m)
+        index.set_ef(self.hnsw_ef_search)
+        if index.get_max_elements() < rows:
+            index.resize_index(max(rows, 2 * index.get_max_elements()))
+
+        covered = index.element_count
+        if covered < start:
+            # 第一次建立（或其他寫入者新增了列）：從向量檔補上之前的列
+            codec = self._codec_for(info)
+            existing = codec.memmap(str(self.path / VECTOR_FILE), start)
+            for block in range(covered, start, _SCAN_BLOCK_ROWS):
+                end = min(block + _SCAN_BLOCK_ROWS, start)
+                index.add_items(codec.decode(existing[block:end]), np.arange(block, end))
+        index.add_items(vectors, np.arange(start, rows))
+        self._hnsw, self._hnsw_owned = index, True
+
+        if rows - int(info.get("hnsw_rows", "0")) < self.hnsw_save_rows:
+            return {}
+        return self._save_hnsw(index)
+
+    def _save_hnsw(self, index) -> Dict[str, str]:
+        """把圖寫回 hnsw.bin（呼叫者必須持有寫入鎖）；返回要更新的 info 欄位"""
+        # 先寫到暫存檔再替換，讀取中的進程不會看到寫到一半的檔案
+        hnsw_path = self.path / HNSW_FILE
+        temp_path = hnsw_path.with_suffix(".tmp")
+        index.save_index(str(temp_path))
+        os.replace(temp_path, hnsw_path)
+        return {"hnsw_rows": str(index.element_count)}
+
+    def flush(self):
+        """把記憶體中尚未保存的 HNSW 圖寫回檔案"""
+        with self._lock:
+            if not self._hnsw_owned or self._hnsw is None:
+                return
+            with self._write_lock() as conn:
+                info = self._read_info(conn)
+                covered = self._hnsw.element_count
+                if not int(info.get("hnsw_rows", "0")) < covered <= int(info.get("rows", "0")):
+                    return
+                info.update(self._save_hnsw(self._hnsw))
+                info["version"] = str(int(info["version"]) + 1)
+                conn.executemany("INSERT OR REPLACE INTO info (key, value) VALUES (?, ?)", list(info.items()))
+
+    def delete(self, ids: Iterable[str]):
+        """標記刪除"""
+        ids = list(ids)
+        with self._write_lock() as conn:
+            info = self._read_info(conn)
+            if "dim" not in info:
+                return
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                conn.execute(f"UPDATE chunks SET deleted = 1 WHERE id IN ({','.join('?' * len(batch))})", batch)
+            conn.execute("INSERT OR REPLACE INTO info (key, value) VALUES ('version', ?)",
+                         (str(int(info["version"]) + 1),))
+
+    # ---- 搜尋 ----
+
+    def _candidate_rows(self, where: Dict[str, Any]) -> np.ndarray:
+        sql, params = filter_to_sql(where)
+        rows = self._conn.execute(f"SELECT row FROM chunks WHERE deleted = 0 AND ({sql})", params).fetchall()
+        candidates = np.fromiter((row for (row,) in rows), dtype=np.int64, count=len(rows))
+        return candidates[candidates < len(self._alive)]
+
+    def _exact(self, query: np.ndarray, k: int, rows: Optional[np.ndarray] = None,
+               start: int = 0) -> List[Tuple[int, float]]:
+        """精確計算（rows 為候選列；否則掃描 start 之後的所有存活列）"""
+        shortlist = k * self.rescore_factor
+        if self._signs is not None:
+            # 二元簽名預篩：以 Hamming 距離取 k × LOCAL_RESCORE_FACTOR 個候選，再以儲存的向量重算分數
+            if rows is None and (start or self._deleted_count):
+                rows = start + np.flatnonzero(self._alive[start:])
+            total = len(rows) if rows is not None else len(self._vectors)
+            if total > shortlist:
+                rows = hamming_shortlist(self._signs, binary_signatures(query[None, :])[0], shortlist, rows)
+
+        if rows is not None:
+            rows = np.sort(rows)
+            scores = self._codec.decode(self._vectors[rows]) @ query
+        else:
+            parts = []
+            for block in range(start, len(self._vectors), _SCAN_BLOCK_ROWS):
+                end = min(block + _SCAN_BLOCK_ROWS, len(self._vectors))
+                parts.append(self._codec.decode(self._vectors[block:end]) @ query)
+            scores = np.concatenate(parts) if parts else np.zeros(0, dtype=np.float32)
+            rows = np.arange(start, start + len(scores))
+            alive = self._alive[rows]
+            rows, scores = rows[alive], scores[alive]
+        return _top_k(rows, scores, k)
+
+    def _graph(self, query: np.ndarray, k: int, allowed: Optional[np.ndarray]) -> Optional[List[Tuple[int, float]]]:
+        """HNSW 搜尋已涵蓋的列（排除已刪除或不符合過濾條件的列）；圖找不到足夠的列時返回 None"""
+        covered = self._hnsw_rows
+        if allowed is not None:
+            allowed_set = set(allowed[allowed < covered].tolist())
+            accept = allowed_set.__contains__
+        elif self._deleted_count or self._hnsw.element_count > covered:
+            alive = self._alive
+            accept = lambda row: row < covered and bool(alive[row])
+        else:
+            accept = None
+        k = min(k, self._hnsw_alive if allowed is None else len(allowed_set))
+        if k <= 0:
+            return []
+        try:
+            labels, distances = self._hnsw.knn_query(query, k=k, filter=accept)
+        except RuntimeError:
+            return None
+        return [(int(row), float(1 - distance)) for row, distance in zip(labels[0], distances[0])]
+
+    def search(self, query: np.ndarray, k: int, where: Optional[Dict[str, Any]] = None) -> List[Tuple[int, float]]:
+        """
+        搜尋最相近的列
+
+        Args:
+            query: 查詢向量
+            k: 返回筆數
+            where: Chroma 格式的過濾條件
+
+        Returns:
+            [(列號, 餘弦相似度)]，依相似度由高到低
+        """
+        with self._lock:
+            if not self._refresh() or not len(self._vectors):
+                return []
+            query = normalize_vectors(query)[0]
+
+            allowed = self._candidate_rows(where) if where else None
+            if allowed is not None and not len(allowed):
+                return []
+
+            exact_max = int(get_config("LOCAL_FLAT_MAX_CANDIDATES", "20000"))
+            if self._hnsw is None or (allowed is not None and len(allowed) <= exact_max):
+                return self._exact(query, k, rows=allowed)
+
+            hits = self._graph(query, k, allowed)
+            if hits is None:
+                return self._exact(query, k, rows=allowed)
+            # HNSW 圖尚未涵蓋的新列以精確計算補上
+            if self._hnsw_rows < len(self._vectors):
+                if allowed is None:
+                    hits += self._exact(query, k, start=self._hnsw_rows)
+                elif (allowed >= self._hnsw_rows).any():
+                    hits += self._exact(query, k, rows=allowed[allowed >= self._hnsw_rows])
+            hits.sort(key=lambda hit: -hit[1])
+            return hits[:k]
+
+    def get_rows(self, rows: List[int]) -> Dict[int, Document]:
+        """讀取列的文字與 metadata"""
+        result = {}
+        with self._lock:
+            for i in range(0, len(rows), 500):
+                batch = rows[i:i + 500]
+                for row, text, metadata in self._conn.execute(
+                    f"SELECT row, text, metadata FROM chunks WHERE row IN ({','.join('?' * len(batch))})", batch
+                ):
+                    result[row] = Document(page_content=text, metadata=json.loads(metadata))
+        return result
+
+    def count(self) -> int:
+        """存活的列數"""
+        with self._lock:
+            if not self._refresh():
+                return 0
+            return int(self._alive.sum())
+
+    def size_bytes(self) -> int:
+        """索引檔案的總大小"""
+        return sum(path.stat().st_size for path in self.path.glob("*") if path.is_file())
+
+    def close(self):
+        """保存 HNSW 圖、關閉連線並釋放映射"""
+        with self._lock:
+            if self._hnsw_owned:
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"⚠️ 保存 HNSW 圖失敗（下次寫入時會從向量檔補上）: {e}")
+                self._hnsw_owned = False
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+            self._vectors = self._signs = self._alive = self._hnsw = None
+            self._version = None
+
+
+def _write_rows(path: Path, offset: int, data: bytes):
+    """從 offset 寫入並截掉之後的內容"""
+    with open(path, "r+b" if path.exists() else "wb") as f:
+        f.seek(offset)
+        f.write(data)
+        f.truncate()
+
+
+def _top_k(rows: np.ndarray, scores: np.ndarray, k: int) -> List[Tuple[int, float]]:
+    if not len(scores):
+        return []
+    if len(scores) > k:
+        best = np.argpartition(-scores, k - 1)[:k]
+    else:
+        best = np.arange(len(scores))
+    best = best[np.argsort(-scores[best])]
+    return [(int(rows[i]), float(scores[i])) for i in best]
+
+
+# 同一進程共用的索引（HNSW 圖與映射只載入一次）
+_indexes: Dict[str, LocalVectorIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_local_index(path: str) -> LocalVectorIndex:
+    """獲取索引實例（同一路徑在同一進程只開啟一次）"""
+    key = str(Path(path).resolve())
+    with _indexes_lock:
+        if key not in _indexes:
+            _indexes[key] = LocalVectorIndex(path)
+        return _indexes[key]
+
+
+def close_local_indexes():
+    """關閉所有已開啟的索引（清空向量庫前、進程結束時呼叫）"""
+    with _indexes_lock:
+        for index in _indexes.values():
+            index.close()
+        _indexes.clear()
+
+
+# 進程結束時保存寫入者記憶體中的 HNSW 圖
+atexit.register(close_local_indexes)
+
+
+def clear_local_vectorstore(persist_directory: Optional[str] = None):
+    """刪除本機向量庫的所有集合"""
+    import shutil
+    root = persist_directory or get_config("LOCAL_VECTOR_DIR", "vector_db/local")
+    close_local_indexes()
+    if os.path.exists(root):
+        shutil.rmtree(root)
+        print(f"✅ 已清空本機向量庫: {root}")
+
+
+def _default_row_id(metadata: Dict[str, Any]) -> str:
+    """列 ID：子片段共用父片段的 chunk_id，需加上子片段起點才能各自唯一"""
+    chunk_id = metadata.get("chunk_id")
+    if not chunk_id:
+        return str(uuid.uuid4())
+    if metadata.get("child_start") is not None:
+        return f"{chunk_id}#{metadata['child_start']}"
+    return chunk_id
+
+
+class LocalVectorStore(VectorStore):
+    """以 LocalVectorIndex 為後端的 LangChain VectorStore"""
+
+    def __init__(self, embedding_function: Embeddings, collection_name: str = "rag_docs",
+                 persist_directory: Optional[str] = None):
+        """
+        初始化
+
+        Args:
+            embedding_function: 嵌入模型
+            collection_name: 集合名稱（每個集合一個目錄）
+            persist_directory: 根目錄（預設讀取 LOCAL_VECTOR_DIR）
+        """
+        self._embedding_function = embedding_function
+        root = persist_directory or get_config("LOCAL_VECTOR_DIR", "vector_db/local")
+        self.index = get_local_index(os.path.join(root, collection_name))
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embedding_function
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None,
+                  ids: Optional[List[str]] = None, **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = list(metadatas) if metadatas else [{} for _ in texts]
+        # 沒有指定 ID 時以 chunk_id 為 ID，重新匯入同一個檔案會取代舊列而不是新增重複的向量
+        ids = list(ids) if ids else [None] * len(texts)
+        ids = [row_id or _default_row_id(metadata or {}) for row_id, metadata in zip(ids, metadatas)]
+        vectors = np.asarray(self._embedding_function.embed_documents(texts), dtype=np.float32)
+        self.index.upsert(ids, vectors, texts, metadatas)
+        return ids
+
+    def delete(self, ids: Optional[List[str]] = None, **kwargs: Any) -> Optional[bool]:
+        if ids:
+            self.index.delete(ids)
+        return True
+
+    def similarity_search_by_vector_with_score(self, embedding: List[float], k: int = 4,
+                                               filter: Optional[Dict[str, Any]] = None) -> List[Tuple[Document, float]]:
+        """以向量搜尋，分數為餘弦相似度（越大越相近）"""
+        hits = self.index.search(np.asarray(embedding, dtype=np.float32), k, filter)
+        documents = self.index.get_rows([row for row, _ in hits])
+        return [(documents[row], score) for row, score in hits if row in documents]
+
+    def similarity_search_with_score(self, query: str, k: int = 4,
+                                     filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Tuple[Document, float]]:
+        return self.similarity_search_by_vector_with_score(self._embedding_function.embed_query(query), k, filter)
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4,
+                                    filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_by_vector_with_score(embedding, k, filter)]
+
+    def similarity_search(self, query: str, k: int = 4,
+                          filter: Optional[Dict[str, Any]] = None, **kwargs: Any) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k, filter)]
+
+    def _select_relevance_score_fn(self):
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   ids: Optional[List[str]] = None, **kwargs: Any) -> "LocalVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas, ids)
+        return store
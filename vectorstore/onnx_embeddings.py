@@ -0,0 +1,257 @@
+"""
+ONNX Runtime 量化嵌入模型（CPU）
+
+HuggingFaceEmbeddings 以完整的 PyTorch 執行 sentence-transformers 模型，在只有 CPU
+的節點上是匯入與查詢最慢的一段。此模組把同一個模型匯出成 ONNX 並做 int8 動態量化：
+- 第一次使用時匯出並量化，之後直接載入快取的 model-int8.onnx
+- 以 ONNX Runtime 執行，intra-op 執行緒數與批次大小可設定
+- mean pooling + L2 正規化，與 sentence-transformers 的輸出一致（可用 cosine_parity 驗證）
+"""
+
+import os
+import inspect
+from pathlib import Path
+from typing import List, Optional, Dict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from config import get_config
+
+try:
+    import onnxruntime as ort
+    HAS_ONNXRUNTIME = True
+except ImportError:
+    ort = None
+    HAS_ONNXRUNTIME = False
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def _model_dir(model_name: str) -> Path:
+    return Path(get_config("ONNX_MODEL_DIR", "vector_db/onnx")) / model_name.replace("/", "__")
+
+
+def export_input_names(model, available) -> List[str]:
+    """
+    檢查 tokenizer 輸出的欄位都是 model.forward 接受的參數
+
+    torch.onnx.export 依位置傳入參數，而 tokenizer 輸出的順序（input_ids, token_type_ids,
+    attention_mask）與 BertModel.forward 的參數順序（input_ids, attention_mask, token_type_ids）
+    不同；匯出時改以 NamedInputs 依名稱傳入，圖中每個輸入名稱都對應到同名參數。
+
+    Args:
+        model: 要匯出的模型
+        available: tokenizer 輸出的欄位名稱
+
+    Returns:
+        匯出的輸入名稱（依 tokenizer 輸出順序）
+    """
+    parameters = inspect.signature(model.forward).parameters
+    names = list(available)
+    unknown = [name for name in names if name not in parameters]
+    if unknown:
+        raise ValueError(f"模型的 forward 不接受 tokenizer 輸出的欄位: {unknown}")
+    return names
+
+
+def named_inputs_module(model, input_names: List[str]):
+    """
+    包裝模型：第 i 個位置參數以 input_names[i] 為名稱傳給 model，只輸出 last_hidden_state
+
+    Args:
+        model: HuggingFace 模型
+        input_names: 匯出的輸入名稱
+
+    Returns:
+        torch.nn.Module
+    """
+    import torch
+
+    class NamedInputs(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs)), return_dict=True).last_hidden_state
+
+    return NamedInputs()
+
+
+def export_quantized_model(model_name: str, output_dir: Optional[str] = None) -> str:
+    """
+    把 HuggingFace 模型匯出成 ONNX 並做 int8 動態量化（需要 torch、transformers、onnx）
+
+    Args:
+        model_name: HuggingFace 模型名稱
+        output_dir: 輸出目錄（預設為 ONNX_MODEL_DIR 下以模型名稱命名的目錄）
+
+    Returns:
+        量化後模型的路徑
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    output = Path(output_dir) if output_dir else _model_dir(model_name)
+    output.mkdir(parents=True, exist_ok=True)
+    fp32_path = output / "model.onnx"
+    int8_path = output / "model-int8.onnx"
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = AutoModel.from_pretrained(model_name)
+    model.eval()
+
+    sample = tokenizer(["export sample"], return_tensors="pt")
+    input_names = export_input_names(model, sample.keys())
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+    # torch 2.9 起預設以 dynamo 匯出（需要 onnxscript、opset 18 以上），這裡固定使用 TorchScript 匯出
+    options = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+
+    print(f"📦 匯出 ONNX 模型: {model_name}")
+    with torch.no_grad():
+        torch.onnx.export(
+            named_inputs_module(model, input_names),
+            tuple(sample[name] for name in input_names),
+            str(fp32_path),
+            input_names=input_names,
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+            **options,
+        )
+
+    print("🗜️ int8 動態量化")
+    quantize_dynamic(str(fp32_path), str(int8_path), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(str(output))
+    fp32_path.unlink()
+    return str(int8_path)
+
+
+def mean_pooling(hidden: np.ndarray, attention_mask: np.ndarray, normalize: bool = True) -> np.ndarray:
+    """
+    依 attention mask 對 token 向量取平均（與 sentence-transformers 的 pooling 相同）
+
+    Args:
+        hidden: (batch, sequence, dim) 的 token 向量
+        attention_mask: (batch, sequence) 的 mask
+        normalize: 是否做 L2 正規化
+
+    Returns:
+        (batch, dim) 的句向量
+    """
+    mask = attention_mask[..., None].astype(np.float32)
+    pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+    if normalize:
+        pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+    return pooled
+
+
+class OnnxEmbeddings(Embeddings):
+    """以 ONNX Runtime 執行的 int8 量化嵌入模型"""
+
+    def __init__(self, model_name: Optional[str] = None, model_path: Optional[str] = None,
+                 threads: Optional[int] = None, batch_size: Optional[int] = None,
+                 max_length: int = 256, session=None, tokenizer=None):
+        """
+        初始化
+
+        Args:
+            model_name: HuggingFace 模型名稱（預設讀取 HUGGINGFACE_MODEL）
+            model_path: 量化後的 ONNX 模型路徑（預設讀取 ONNX_MODEL_PATH；不存在時自動匯出）
+            threads: intra-op 執行緒數（預設讀取 ONNX_INTRA_OP_THREADS，0 表示 CPU 核心數）
+            batch_size: 每批句數（預設讀取 EMBEDDING_BATCH_SIZE）
+            max_length: 最大 token 數（超過截斷，與模型的 max_seq_length 一致）
+            session: 已建立的推論 session（測試用）
+            tokenizer: 已建立的 tokenizer（測試用）
+        """
+        self.model_name = model_name or get_config("HUGGINGFACE_MODEL", DEFAULT_MODEL)
+        self.batch_size = batch_size or int(get_config("EMBEDDING_BATCH_SIZE", "32"))
+        self.max_length = max_length
+
+        if session is None:
+            if not HAS_ONNXRUNTIME:
+                raise ImportError("需要安裝 onnxruntime 才能使用 ONNX 嵌入模型: pip install onnxruntime onnx")
+            path = model_path or get_config("ONNX_MODEL_PATH", "")
+            if not path:
+                path = str(_model_dir(self.model_name) / "model-int8.onnx")
+            if not os.path.exists(path):
+                path = export_quantized_model(self.model_name, os.path.dirname(path))
+
+            threads = threads if threads is not None else int(get_config("ONNX_INTRA_OP_THREADS", "0"))
+            options = ort.SessionOptions()
+            options.intra_op_num_threads = threads or os.cpu_count() or 1
+            options.inter_op_num_threads = 1
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+            if tokenizer is None:
+                from transformers import AutoTokenizer
+                model_dir = os.path.dirname(path)
+                source = model_dir if os.path.exists(os.path.join(model_dir, "tokenizer_config.json")) else self.model_name
+                tokenizer = AutoTokenizer.from_pretrained(source)
+            print(f"⚡ 使用 ONNX Runtime int8 嵌入模型: {self.model_name}（{options.intra_op_num_threads} 執行緒）")
+
+        self.session = session
+        self.tokenizer = tokenizer
+        self._input_names = [node.name for node in session.get_inputs()]
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encoded = self.tokenizer(texts, padding=True, truncation=True,
+                                 max_length=self.max_length, return_tensors="np")
+        feeds: Dict[str, np.ndarray] = {
+            name: np.asarray(encoded[name], dtype=np.int64) for name in self._input_names if name in encoded
+        }
+        if "token_type_ids" in self._input_names and "token_type_ids" not in feeds:
+            feeds["token_type_ids"] = np.zeros_like(feeds["input_ids"])
+        hidden = self.session.run(None, feeds)[0]
+        return mean_pooling(hidden, feeds["attention_mask"])
+
+    def embed_array(self, texts: List[str]) -> np.ndarray:
+        """
+        批次計算嵌入向量
+
+        Args:
+            texts: 文字列表
+
+        Returns:
+            (len(texts), dim) 的 float32 陣列（已正規化）
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack([
+            self._embed_batch(texts[i:i + self.batch_size])
+            for i in range(0, len(texts), self.batch_size)
+        ]).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_array(list(texts)).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_array([text])[0].tolist()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # 查詢與文件使用相同的編碼方式
+        return self.embed_array(list(texts)).tolist()
+
+
+def cosine_parity(embeddings: Embeddings, reference: Embeddings, texts: List[str]) -> Dict[str, float]:
+    """
+    比較兩個嵌入模型對同一批文字的輸出（例如 ONNX int8 與 PyTorch）
+
+    Args:
+        embeddings: 待驗證的嵌入模型
+        reference: 參考的嵌入模型
+        texts: 文字列表
+
+    Returns:
+        {'min': 最小餘弦相似度, 'mean': 平均餘弦相似度}
+    """
+    a = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    b = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    a /= np.clip(np.linalg.norm(a, axis=1, keepdims=True), 1e-12, None)
+    b /= np.clip(np.linalg.norm(b, axis=1, keepdims=True), 1e-12, None)
+    cosine = (a * b).sum(axis=1)
+    return {'min': float(cosine.min()), 'mean': float(cosine.mean())}
@@ -0,0 +1,249 @@
+"""
+小片段檢索、大片段回傳（small-to-big）
+
+片段越小，嵌入向量越能對準單一重點，但送給 LLM 的上下文又需要足夠的前後文。
+此模組把原本的片段當作父片段，只把切得更小的子片段放進向量資料庫：
+- 父片段的文字存放在檔案目錄的 SQLite 側表，向量索引只保存子片段
+- 子片段 metadata 帶有 parent_id 與在父片段中的起訖位移（child_start / child_end）
+- 搜尋後依排名把子片段換回父片段，同一來源中重疊或相接的父片段合併成一個視窗
+"""
+
+import json
+from typing import List, Dict, Optional, Iterable, Any
+
+from langchain.schema import Document
+
+from config import get_config
+from loader.file_catalog import FileCatalog, get_file_catalog, compute_file_id
+from loader.offset_splitter import OffsetTextSplitter
+
+
+class ParentStore:
+    """父片段的文字與 metadata（存放在檔案目錄的 SQLite 中，不進向量資料庫）"""
+
+    def __init__(self, catalog: Optional[FileCatalog] = None):
+        """
+        初始化
+
+        Args:
+            catalog: 檔案目錄（預設使用全局實例；臨時分析可傳入 ":memory:" 的目錄）
+        """
+        self._catalog = catalog
+        self._schema_conn = None
+
+    @property
+    def catalog(self) -> FileCatalog:
+        return self._catalog or get_file_catalog()
+
+    def _ensure_schema(self, conn):
+        if self._schema_conn is conn:
+            return
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS parent_chunks (
+                parent_id TEXT PRIMARY KEY,
+                source    TEXT,
+                text      TEXT NOT NULL,
+                metadata  TEXT NOT NULL
+            )
+            """
+        )
+        self._schema_conn = conn
+
+    def add(self, parents: Iterable[Document]):
+        """
+        寫入父片段（metadata 中需帶有 parent_id）
+
+        Args:
+            parents: 父片段列表
+        """
+        rows = [
+            (doc.metadata['parent_id'], doc.metadata.get('source'), doc.page_content,
+             json.dumps(doc.metadata, ensure_ascii=False, default=str))
+            for doc in parents
+        ]
+        if not rows:
+            return
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            conn.executemany(
+                "INSERT OR REPLACE INTO parent_chunks (parent_id, source, text, metadata) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def get_many(self, parent_ids: Iterable[str]) -> Dict[str, Document]:
+        """
+        批次讀取父片段
+
+        Args:
+            parent_ids: 父片段 ID 列表
+
+        Returns:
+            parent_id -> 父片段
+        """
+        ids = list({pid for pid in parent_ids if pid})
+        result = {}
+        if not ids:
+            return result
+        with self.catalog.transaction() as conn:
+            self._ensure_schema(conn)
+            for i in range(0, len(ids), 500):
+                batch = ids[i:i + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = conn.execute(
+                    f"SELECT parent_id, text, metadata FROM parent_chunks WHERE parent_id IN ({placeholders})",
+                    batch,
+                ).fetchall()
+                for parent_id, text, metadata in rows:
+                    result[parent_id] = Document(page_content=text, metadata=json.loads(metadata))
+        return result
+
+
+def small_to_big_enabled() -> bool:
+    """是否啟用小片段檢索、大片段回傳"""
+    return get_config("SMALL_TO_BIG", "true").lower() == "true"
+
+
+def split_into_children(documents: List[Document], store: Optional[ParentStore] = None,
+                        splitter: Optional[OffsetTextSplitter] = None) -> List[Document]:
+    """
+    把片段切成子片段，父片段寫入父片段表
+
+    只切出一個子片段的片段（摘要、短片段）原樣保留，不寫入父片段表。
+    未啟用 SMALL_TO_BIG 時直接返回原片段。
+
+    Args:
+        documents: 分割後的片段（作為父片段）
+        store: 父片段表（預設使用全局實例）
+        splitter: 子片段分割器（預設讀取 CHILD_CHUNK_TOKENS / CHILD_CHUNK_OVERLAP_TOKENS）
+
+    Returns:
+        要嵌入的片段列表
+    """
+    if not documents or not small_to_big_enabled():
+        return documents
+
+    store = store or get_parent_store()
+    splitter = splitter or OffsetTextSplitter(
+        chunk_size=int(get_config("CHILD_CHUNK_TOKENS", "64")),
+        chunk_overlap=int(get_config("CHILD_CHUNK_OVERLAP_TOKENS", "8")),
+    )
+
+    children = []
+    parents = []
+    for doc in documents:
+        text = doc.page_content
+        spans = splitter.split_offsets(text)
+        if len(spans) <= 1:
+            children.append(doc)
+            continue
+
+        parent_id = compute_file_id(f"{doc.metadata.get('source', '')}\n{text}")
+        parents.append(Document(page_content=text, metadata={**doc.metadata, 'parent_id': parent_id}))
+        for start, end in spans:
+            children.append(Document(page_content=text[start:end], metadata={
+                **doc.metadata,
+                'parent_id': parent_id,
+                'child_start': start,
+                'child_end': end,
+            }))
+
+    store.add(parents)
+    print(f"🧩 小片段索引: {len(documents)} 個片段 → {len(children)} 個子片段（父片段 {len(parents)} 個）")
+    return children
+
+
+def _window_key(metadata: Dict[str, Any]):
+    """可合併的父片段需來自同一來源的同一段原文（PDF 同一頁、同一工作表）"""
+    if metadata.get('start_offset') is None or metadata.get('end_offset') is None:
+        return None
+    return metadata.get('source'), metadata.get('page'), metadata.get('sheet')
+
+
+def _merge_windows(windows: List[Document]) -> List[Document]:
+    """合併同一來源中重疊或緊接的父片段（依原文位移），保留排名較前者的位置"""
+    merged: List[Document] = []
+    for doc in windows:
+        key = _window_key(doc.metadata)
+        target = None
+        if key is not None:
+            start, end = doc.metadata['start_offset'], doc.metadata['end_offset']
+            for candidate in merged:
+                if (_window_key(candidate.metadata) == key
+                        and start <= candidate.metadata['end_offset']
+                        and candidate.metadata['start_offset'] <= end):
+                    target = candidate
+                    break
+
+        if target is None:
+            merged.append(doc)
+            continue
+
+        meta = target.metadata
+        if start < meta['start_offset']:
+            head, tail = doc, target
+        else:
+            head, tail = target, doc
+        head_start, head_end = head.metadata['start_offset'], head.metadata['end_offset']
+        tail_start, tail_end = tail.metadata['start_offset'], tail.metadata['end_offset']
+        # 兩者都是原文的切片，重疊部分只保留一份
+        if tail_end > head_end:
+            target.page_content = head.page_content + tail.page_content[head_end - tail_start:]
+        else:
+            target.page_content = head.page_content
+        meta['start_offset'] = head_start
+        meta['end_offset'] = max(head_end, tail_end)
+        meta['matched_children'] = meta.get('matched_children', 1) + doc.metadata.get('matched_children', 1)
+    return merged
+
+
+def expand_to_parents(docs: List[Document], store: Optional[ParentStore] = None,
+                      limit: Optional[int] = None) -> List[Document]:
+    """
+    把檢索到的子片段依排名換回父片段並合併視窗
+
+    Args:
+        docs: 檢索結果（依相關度排序）
+        store: 父片段表（預設使用全局實例）
+        limit: 最多返回的視窗數
+
+    Returns:
+        父片段視窗列表；沒有 parent_id 的片段原樣保留
+    """
+    parent_ids = [doc.metadata.get('parent_id') for doc in docs]
+    if not any(parent_ids):
+        return docs[:limit] if limit else docs
+
+    store = store or get_parent_store()
+    parents = store.get_many(parent_ids)
+
+    windows: List[Document] = []
+    by_parent: Dict[str, Document] = {}
+    for doc, parent_id in zip(docs, parent_ids):
+        parent = parents.get(parent_id) if parent_id else None
+        if parent is None:
+            windows.append(doc)
+            continue
+        if parent_id in by_parent:
+            by_parent[parent_id].metadata['matched_children'] += 1
+            continue
+        window = Document(page_content=parent.page_content,
+                          metadata={**parent.metadata, 'matched_children': 1})
+        by_parent[parent_id] = window
+        windows.append(window)
+
+    windows = _merge_windows(windows)
+    print(f"🧩 {len(docs)} 個子片段 → {len(windows)} 個父片段視窗")
+    return windows[:limit] if limit else windows
+
+
+# 全局實例
+_parent_store: Optional[ParentStore] = None
+
+
+def get_parent_store() -> ParentStore:
+    """獲取父片段表實例（單例模式）"""
+    global _parent_store
+    if _parent_store is None:
+        _parent_store = ParentStore()
+    return _parent_store
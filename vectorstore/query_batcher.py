@@ -0,0 +1,180 @@
+"""
+查詢嵌入的動態微批次
+
+同時進來的多個 API 請求各自呼叫 embed_query，每次只嵌入一個字串；在 CPU 上
+一批 32 句的成本與一批 4 句差不多。此模組在嵌入模型前加一層批次器：
+- 背景執行緒收集查詢，等到 QUERY_BATCH_MAX_WAIT_MS 毫秒或湊滿 QUERY_BATCH_MAX_SIZE 筆
+- 以查詢路徑整批計算（embed_queries），再把結果交還給各個等待中的呼叫者；
+  查詢與文件不對稱的模型（e5 / bge 的指令前綴、HuggingFaceInstructEmbeddings）不會拿到文件向量
+- 記錄每批大小的分布（stats()）
+文件嵌入（embed_documents）不經過批次器，直接交給原本的模型。
+"""
+
+import time
+import queue
+import threading
+from collections import Counter
+from concurrent.futures import Future
+from typing import List, Optional, Dict, Any, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+from config import get_config
+
+
+def _symmetric_query_methods() -> tuple:
+    """embed_query 只是轉呼叫 embed_documents([text])[0] 的模型實作（查詢可以直接以 embed_documents 整批計算）"""
+    methods = []
+    try:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+        methods.append(HuggingFaceEmbeddings.embed_query)
+    except ImportError:
+        pass
+    try:
+        from langchain_openai import OpenAIEmbeddings
+        methods.append(OpenAIEmbeddings.embed_query)
+    except ImportError:
+        pass
+    return tuple(methods)
+
+
+def embed_queries(embeddings: Embeddings, texts: List[str]) -> List[List[float]]:
+    """
+    以查詢路徑計算多個查詢的向量
+
+    模型提供 embed_queries 時整批計算；embed_query 只是轉呼叫 embed_documents 的對稱模型
+    以 embed_documents 整批計算；其餘模型（可能有查詢專用的指令前綴）逐筆呼叫 embed_query。
+
+    Args:
+        embeddings: 嵌入模型
+        texts: 查詢列表
+
+    Returns:
+        向量列表
+    """
+    batch = getattr(embeddings, "embed_queries", None)
+    if callable(batch):
+        return batch(texts)
+    if getattr(type(embeddings), "embed_query", None) in _symmetric_query_methods():
+        return embeddings.embed_documents(texts)
+    return [embeddings.embed_query(text) for text in texts]
+
+
+class QueryBatcher(Embeddings):
+    """把並行的 embed_query 合併成批次計算的嵌入模型包裝"""
+
+    def __init__(self, embeddings: Embeddings, max_wait_ms: Optional[float] = None,
+                 max_batch: Optional[int] = None):
+        """
+        初始化
+
+        Args:
+            embeddings: 實際計算向量的嵌入模型
+            max_wait_ms: 收到第一筆查詢後最多等待的毫秒數（預設讀取 QUERY_BATCH_MAX_WAIT_MS）
+            max_batch: 每批最多筆數（預設讀取 QUERY_BATCH_MAX_SIZE）
+        """
+        self.embeddings = embeddings
+        self.max_wait = (max_wait_ms if max_wait_ms is not None
+                         else float(get_config("QUERY_BATCH_MAX_WAIT_MS", "5"))) / 1000
+        self.max_batch = max_batch or int(get_config("QUERY_BATCH_MAX_SIZE", "32"))
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._histogram: Counter = Counter()
+        self._stats_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="query-batcher", daemon=True)
+        self._worker.start()
+
+    def _collect(self) -> List[Tuple[str, Future]]:
+        """阻塞到第一筆查詢，再收集到等待時間用完或湊滿一批"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            with self._stats_lock:
+                self._histogram[len(batch)] += 1
+            try:
+                vectors = embed_queries(self.embeddings, [text for text, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+    def embed_query(self, text: str) -> List[float]:
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """多個查詢一起排入批次（嵌入服務收到多筆查詢時使用）"""
+        futures = []
+        for text in texts:
+            future: Future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_documents(texts)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        批次統計
+
+        Returns:
+            {'batches': 批次數, 'queries': 查詢數, 'mean_batch_size': 平均批次大小,
+             'histogram': {批次大小: 次數}}
+        """
+        with self._stats_lock:
+            histogram = dict(sorted(self._histogram.items()))
+        batches = sum(histogram.values())
+        queries = sum(size * count for size, count in histogram.items())
+        return {
+            'batches': batches,
+            'queries': queries,
+            'mean_batch_size': queries / batches if batches else 0.0,
+            'histogram': histogram,
+        }
+
+
+# 全局實例
+_query_embeddings: Optional[Embeddings] = None
+_query_embeddings_lock = threading.Lock()
+
+
+def get_query_embeddings() -> Embeddings:
+    """
+    獲取查詢用的共用嵌入模型（單例模式）
+
+    QUERY_BATCHING=true 時包上 QueryBatcher；同一進程的所有查詢共用一個模型實例。
+
+    Returns:
+        Embeddings
+    """
+    global _query_embeddings
+    with _query_embeddings_lock:
+        if _query_embeddings is None:
+            from vectorstore.index_manager import get_embeddings
+            embeddings = get_embeddings()
+            if get_config("QUERY_BATCHING", "true").lower() == "true":
+                embeddings = QueryBatcher(embeddings)
+            _query_embeddings = embeddings
+        return _query_embeddings
+
+
+def get_query_batch_stats() -> Optional[Dict[str, Any]]:
+    """目前查詢批次器的統計（未啟用時返回 None）"""
+    if isinstance(_query_embeddings, QueryBatcher):
+        return _query_embeddings.stats()
+    return None
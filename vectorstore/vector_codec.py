@@ -0,0 +1,139 @@
+"""
+向量壓縮
+
+384 維 float32 向量每筆 1.5 KB，知識庫變大後向量佔掉大部分的磁碟與記憶體。此模組
+提供本機向量庫使用的壓縮表示：
+- float16：每維 2 bytes
+- int8：每筆向量以自己的最大絕對值做對稱純量量化，每維 1 byte + 每筆 4 bytes 的比例
+- 1-bit 二元簽名（每維取正負號）：先以 Hamming 距離篩出候選，再以儲存的向量精確重算分數
+"""
+
+from typing import Optional
+
+import numpy as np
+
+SUPPORTED_DTYPES = ("float32", "float16", "int8")
+
+# 每個 byte 中 1 的個數
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+
+class VectorCodec:
+    """把正規化後的 float32 向量編碼成固定長度的紀錄"""
+
+    def __init__(self, dtype: str, dim: int):
+        """
+        初始化
+
+        Args:
+            dtype: float32 / float16 / int8
+            dim: 向量維度
+        """
+        if dtype not in SUPPORTED_DTYPES:
+            raise ValueError(f"不支援的向量儲存型別: {dtype}（可用: {', '.join(SUPPORTED_DTYPES)}）")
+        self.dtype = dtype
+        self.dim = dim
+        if dtype == "int8":
+            self.record = np.dtype([("scale", "<f4"), ("codes", "i1", (dim,))])
+        else:
+            self.record = np.dtype((np.dtype(dtype).newbyteorder("<"), (dim,)))
+
+    @property
+    def row_bytes(self) -> int:
+        return self.record.itemsize
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        """
+        編碼
+
+        Args:
+            vectors: (n, dim) float32 向量
+
+        Returns:
+            可直接寫入檔案的紀錄陣列
+        """
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if self.dtype != "int8":
+            return vectors.astype(self.record.base)
+        records = np.empty(len(vectors), dtype=self.record)
+        scale = np.clip(np.abs(vectors).max(axis=1), 1e-12, None) / 127
+        records["scale"] = scale
+        records["codes"] = np.clip(np.rint(vectors / scale[:, None]), -127, 127)
+        return records
+
+    def decode(self, records: np.ndarray) -> np.ndarray:
+        """
+        解碼
+
+        Args:
+            records: 紀錄陣列（可為記憶體映射的切片）
+
+        Returns:
+            (n, dim) float32 向量
+        """
+        if self.dtype != "int8":
+            return np.asarray(records, dtype=np.float32)
+        return records["codes"].astype(np.float32) * records["scale"][:, None]
+
+    def memmap(self, path: str, rows: int) -> np.ndarray:
+        """唯讀映射前 rows 筆紀錄"""
+        if not rows:
+            return np.zeros((0, self.dim), dtype=np.float32) if self.dtype != "int8" else np.zeros(0, dtype=self.record)
+        return np.memmap(path, dtype=self.record, mode="r", shape=(rows,))
+
+
+def binary_signatures(vectors: np.ndarray) -> np.ndarray:
+    """
+    1-bit 二元簽名（每維取正負號，8 維壓成 1 byte）
+
+    Args:
+        vectors: (n, dim) 向量
+
+    Returns:
+        (n, ceil(dim / 8)) uint8
+    """
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+def hamming_distances(signatures: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """
+    計算每個簽名與查詢簽名的 Hamming 距離
+
+    Args:
+        signatures: (n, bytes) uint8
+        query: (bytes,) uint8
+
+    Returns:
+        (n,) 距離
+    """
+    return _POPCOUNT[np.bitwise_xor(signatures, query)].sum(axis=1, dtype=np.uint16)
+
+
+def hamming_shortlist(signatures: np.ndarray, query: np.ndarray, size: int,
+                      rows: Optional[np.ndarray] = None, block_rows: int = 65536) -> np.ndarray:
+    """
+    以 Hamming 距離挑出最接近的候選列
+
+    Args:
+        signatures: 所有列的簽名（可為記憶體映射）
+        query: 查詢簽名
+        size: 候選數
+        rows: 只在這些列中挑選（None 表示全部）
+        block_rows: 每次計算的列數
+
+    Returns:
+        候選列號
+    """
+    if rows is not None:
+        distances = hamming_distances(np.asarray(signatures[rows]), query)
+        candidates = rows
+    else:
+        distances = np.concatenate([
+            hamming_distances(np.asarray(signatures[block:block + block_rows]), query)
+            for block in range(0, len(signatures), block_rows)
+        ]) if len(signatures) else np.zeros(0, dtype=np.uint16)
+        candidates = np.arange(len(distances))
+    if len(distances) > size:
+        best = np.argpartition(distances, size - 1)[:size]
+        return candidates[best]
+    return candidates